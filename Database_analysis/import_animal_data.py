@@ -8,8 +8,13 @@
 import sqlite3
 import json
 import os
+import sys
 from datetime import datetime
 
+# 添加项目根目录到路径，以便导入common模块
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common.coordinates import parse_longitude, parse_latitude
+
 def import_animal_data():
     """
     将animal_info.jsonl数据导入到image_info.db数据库
@@ -73,8 +78,9 @@ def import_animal_data():
                     insert_sql = """
                     INSERT INTO image_info (
                         object, animal, count, behavior, status, 
-                        location, longitude, latitude, time, date, caption
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        location, longitude, latitude, time, date, caption,
+                        lon, lat
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     """
                     
                     # 提取数据字段
@@ -89,7 +95,9 @@ def import_animal_data():
                         data.get('latitude', ''),
                         data.get('time', ''),
                         data.get('date', ''),
-                        data.get('caption', '')
+                        data.get('caption', ''),
+                        parse_longitude(data.get('longitude')),
+                        parse_latitude(data.get('latitude'))
                     )
                     
                     # 执行插入
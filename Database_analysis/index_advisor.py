@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+image_info索引检查脚本
+依次调用实时图表（realtime_chart/realtime_chart_data_functions.py）和ECharts地图
+（ECharts_map/echarts_map_data_functions.py）中所有的 get_* 数据函数，记录它们实际执行的SQL，
+再逐条用 EXPLAIN QUERY PLAN 查看查询计划，报告仍在扫描表的语句。
+
+- 每个函数分别以 只传必填参数、每个可选参数单独传入、全部参数传入 的方式调用，覆盖各种筛选条件组合；
+  参数取值来自数据库中记录最多的动物、该动物的行为和点位、最新日期
+- 实时图表函数额外以不使用预聚合表的方式再调用一遍（与MySQL后端执行的SQL相同），检查原表聚合是否走索引
+- 查询计划分为：索引查找（SEARCH）、覆盖索引扫描（只读索引，如无筛选条件的全量汇总）、
+  索引扫描（按索引顺序读取全部记录并回表）和全表扫描；后两种会列出查询计划，存在全表扫描时退出码为1
+
+检查范围：只重放上述两个模块的 get_* 函数。热力图（heatmap/heatmap_app.py、sensor_registry.py）的SQL
+和查询服务（mysql_query/）执行的用户SQL不会被重放；后者在执行前由 mysql_query/query_guard.py 检查查询计划。
+
+索引定义见 common/image_info_schema.py 中的 COVERING_INDEXES。
+只执行只读查询，不修改数据库；数据库需先用 migrate_image_info.py 执行表结构迁移（未迁移时直接报告并退出）。
+
+使用方法：
+    python index_advisor.py [数据库路径]
+    不指定路径时默认检查 Database/image_info.db
+"""
+
+import inspect
+import os
+import sys
+from contextlib import contextmanager
+
+# 添加项目根目录和ECharts_map目录到路径（ECharts_map 使用模块级导入）
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(os.path.join(PROJECT_ROOT, 'ECharts_map'))
+
+from common.image_info_schema import check_image_info_schema
+import realtime_chart.db_config as realtime_db_config
+import realtime_chart.realtime_chart_data_functions as realtime_functions
+import db_config as echarts_db_config
+import echarts_map_data_functions as echarts_functions
+
+SCOPE = "实时图表和ECharts地图的 get_* 数据函数（不含热力图和查询服务的SQL）"
+FULL_SCAN = "全表扫描"
+INDEX_SCAN = "索引扫描"
+COVERING_SCAN = "覆盖索引扫描"
+SEARCH = "索引查找"
+SEVERITY = {SEARCH: 0, COVERING_SCAN: 1, INDEX_SCAN: 2, FULL_SCAN: 3}
+ICONS = {SEARCH: "✅", COVERING_SCAN: "ℹ️ ", INDEX_SCAN: "⚠️ ", FULL_SCAN: "❌"}
+
+
+@contextmanager
+def capture_statements(backend):
+    """
+    在 with 块内记录经由 backend 借出的连接执行的SQL（sqlite3 的 trace 回调，参数已展开为字面值）
+
+    Yields:
+        list: 执行过的SQL文本，按执行顺序追加
+    """
+    statements = []
+    connect = backend.connect
+
+    def traced_connect():
+        connection = connect()
+        connection.set_trace_callback(statements.append)
+        return connection
+
+    backend.connect = traced_connect
+    try:
+        yield statements
+    finally:
+        del backend.connect  # 恢复为类上定义的 connect
+
+
+def load_samples(backend):
+    """从数据库中取出调用数据函数的参数值"""
+    connection = backend.connect()
+    try:
+        animal = connection.execute(
+            "SELECT animal FROM image_info GROUP BY animal ORDER BY COUNT(*) DESC LIMIT 1").fetchone()
+        if animal is None:
+            raise RuntimeError("image_info表中没有数据")
+        animal = animal[0]
+        behavior, location, lon, lat, latest = connection.execute("""
+            SELECT behavior, location, lon, lat, MAX(date) FROM image_info
+            WHERE animal = ? AND lon IS NOT NULL""", (animal,)).fetchone()
+    finally:
+        connection.close()
+
+    zoom = 6
+    _, x, y = echarts_functions.get_tile_keys((lon, lat, lon, lat), zoom)[0]
+    latest = latest or "20250101"
+    return {
+        'animal_filter': animal,
+        'animal_type': animal,
+        'animal_name': animal,
+        'animal_names': [animal],
+        'behavior_filter': behavior,
+        'days_filter': 30,
+        'start_date': f"{int(latest[:4]) - 1}-{latest[4:6]}-{latest[6:8]}",
+        'end_date': f"{latest[:4]}-{latest[4:6]}-{latest[6:8]}",
+        'bbox': (lon - 1, lat - 1, lon + 1, lat + 1),
+        'longitude': lon,
+        'latitude': lat,
+        'location': location,
+        'zoom': zoom,
+        'x': x,
+        'y': y,
+    }
+
+
+def data_functions(module):
+    """模块中定义的 get_* 函数"""
+    return [func for name, func in sorted(vars(module).items())
+            if name.startswith('get_') and inspect.isfunction(func) and func.__module__ == module.__name__]
+
+
+def call_variants(func, samples):
+    """
+    生成调用参数组合：只传必填参数、每个可选参数单独传入、全部参数传入
+
+    Returns:
+        list: [kwargs, ...]；有必填参数无法取值时返回空列表
+    """
+    parameters = inspect.signature(func).parameters.values()
+    required = [p.name for p in parameters if p.default is inspect.Parameter.empty]
+    optional = [p.name for p in parameters if p.default is not inspect.Parameter.empty and p.name in samples]
+    if any(name not in samples for name in required):
+        return []
+
+    base = {name: samples[name] for name in required}
+    variants = [base] + [dict(base, **{name: samples[name]}) for name in optional]
+    if len(optional) > 1:
+        variants.append(dict(base, **{name: samples[name] for name in optional}))
+    return variants
+
+
+def classify(detail, tables):
+    """按一行查询计划判断访问方式，不是对表的访问（如子查询、临时B树）时返回None"""
+    words = detail.split()
+    if len(words) < 2 or words[1] not in tables:
+        return None
+    if words[0] == "SEARCH":
+        return SEARCH
+    if words[0] != "SCAN":
+        return None
+    if "COVERING INDEX" in detail:
+        return COVERING_SCAN
+    if "USING INDEX" in detail or "USING INTEGER PRIMARY KEY" in detail:
+        return INDEX_SCAN
+    return FULL_SCAN
+
+
+def explain(connection, sql, tables):
+    """
+    EXPLAIN QUERY PLAN
+
+    Returns:
+        tuple: (最差的访问方式, [(访问方式, 计划明细), ...])
+    """
+    plan = []
+    for row in connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall():
+        detail = row[-1]
+        plan.append((classify(detail, tables), detail))
+    kinds = [kind for kind, _ in plan if kind]
+    return max(kinds, key=SEVERITY.get, default=SEARCH), plan
+
+
+def format_call(func, kwargs):
+    args = ", ".join(f"{name}={value!r}" for name, value in kwargs.items())
+    return f"{func.__name__}({args})"
+
+
+def replay(label, module, backend, samples):
+    """
+    调用模块中所有 get_* 函数并记录执行的SQL
+
+    Returns:
+        list: [(调用说明, SQL), ...]，同一条SQL只保留第一次出现
+    """
+    replayed = []
+    seen = set()
+    for func in data_functions(module):
+        for kwargs in call_variants(func, samples):
+            with capture_statements(backend) as statements:
+                func(**kwargs)
+            for sql in statements:
+                sql = " ".join(sql.split())
+                if not sql.upper().startswith(("SELECT", "WITH")) or sql in seen:
+                    continue
+                seen.add(sql)
+                replayed.append((f"{label}.{format_call(func, kwargs)}", sql))
+    return replayed
+
+
+def check_database(db_path):
+    """
+    重放数据函数的SQL并报告查询计划
+
+    Returns:
+        bool: 没有全表扫描时返回True
+    """
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        return False
+
+    for config in (realtime_db_config, echarts_db_config):
+        config.use_backend("sqlite")
+        config.DB_PATH = db_path
+    realtime_backend = realtime_db_config.get_backend()
+    echarts_backend = echarts_db_config.get_backend()
+
+    print(f"📂 数据库路径: {db_path}")
+    print(f"🔭 检查范围: {SCOPE}")
+    connection = realtime_backend.connect()
+    try:
+        migrated = check_image_info_schema(connection)['migrated']
+    finally:
+        connection.close()
+    if not migrated:
+        print(f"❌ 表结构尚未迁移，请先运行 python Database_analysis/migrate_image_info.py {db_path}")
+        return False
+    samples = load_samples(realtime_backend)
+    print(f"🔎 参数取值: 动物 {samples['animal_filter']}，行为 {samples['behavior_filter']}，"
+          f"地点 {samples['location']}，日期 {samples['start_date']} ~ {samples['end_date']}")
+
+    replayed = replay("realtime", realtime_functions, realtime_backend, samples)
+    # 不使用预聚合表再调用一遍：与MySQL后端执行的SQL相同，直接在image_info上聚合
+    has_rollups = realtime_backend.has_rollups
+    realtime_backend.has_rollups = False
+    try:
+        replayed += replay("realtime(原表聚合)", realtime_functions, realtime_backend, samples)
+    finally:
+        realtime_backend.has_rollups = has_rollups
+    replayed += replay("echarts", echarts_functions, echarts_backend, samples)
+
+    connection = realtime_backend.connect()
+    try:
+        tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        results = [(call, sql) + explain(connection, sql, tables) for call, sql in replayed]
+        sizes = {table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                 for table in sorted({detail.split()[1] for *_, plan in results for kind, detail in plan if kind})}
+    finally:
+        connection.close()
+
+    print(f"\n📊 共 {len(results)} 条不同的SQL:")
+    print("-" * 100)
+    for call, sql, kind, plan in results:
+        print(f"{ICONS[kind]} {kind:<8} {call}")
+        if SEVERITY[kind] >= SEVERITY[INDEX_SCAN]:
+            print(f"      SQL: {sql}")
+            for row_kind, detail in plan:
+                size = f"（{sizes[detail.split()[1]]:,} 行）" if row_kind else ""
+                print(f"      计划: {detail}{size}")
+
+    counts = {kind: sum(1 for *_, k, _ in results if k == kind) for kind in SEVERITY}
+    print("-" * 100)
+    print("📈 " + "，".join(f"{kind} {counts[kind]} 条" for kind in SEVERITY))
+    print(f"   （范围: {SCOPE}）")
+    if counts[FULL_SCAN]:
+        print("❌ 存在全表扫描，请在 common/image_info_schema.py 的 COVERING_INDEXES 中补充索引")
+    elif counts[INDEX_SCAN]:
+        print("⚠️  没有全表扫描；索引扫描会按索引顺序读取全部记录并回表，请确认是否符合预期（如带 LIMIT 的倒序取最新记录）")
+    else:
+        print("✅ 所有查询都通过索引查找或只读索引完成")
+    return counts[FULL_SCAN] == 0
+
+
+def main():
+    """
+    主函数
+    """
+    print("🚀 image_info索引检查")
+    print("=" * 100)
+
+    if len(sys.argv) > 1:
+        db_path = sys.argv[1]
+    else:
+        db_path = os.path.join(PROJECT_ROOT, 'Database', 'image_info.db')
+
+    ok = check_database(os.path.abspath(db_path))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,8 +7,13 @@ SQLite数据库初始化脚本
 
 import sqlite3
 import os
+import sys
 from datetime import datetime
 
+# 添加项目根目录到路径，以便导入common模块
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common.image_info_schema import ensure_image_info_schema
+
 def create_sqlite_database():
     """
     创建SQLite数据库和image_info表
@@ -49,11 +54,15 @@ def create_sqlite_database():
         date TEXT,
         caption TEXT,
         type TEXT,
-        path TEXT
+        path TEXT,
+        lon REAL,
+        lat REAL
     );
     """
     
     cursor.execute(create_table_sql)
+    # 执行增量迁移（数值坐标索引等），与迁移脚本 migrate_image_info.py 保持一致
+    ensure_image_info_schema(conn)
     conn.commit()
     
     print(f"✅ 成功创建SQLite数据库: {db_path}")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+image_info表结构迁移脚本
+对已存在的image_info.db执行增量迁移（可重复执行）
+
+迁移内容见 common/image_info_schema.py：
+- 添加数值坐标列 lon/lat 并建立 (lon, lat) 索引，回填历史记录
+- 创建实时图表使用的预聚合表及维护它们的触发器，新建时全量回填
+- 按看板和地图查询建立image_info和预聚合表上的覆盖索引（检查查询计划见 index_advisor.py）
+
+使用方法：
+    python migrate_image_info.py [数据库路径]
+    不指定路径时默认迁移 Database/image_info.db
+    python migrate_image_info.py --mysql
+    迁移MySQL后端的image_info（连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量）：
+    lon/lat 数值坐标列及索引、覆盖索引、坐标回填；MYSQL_DRIVER=shim 时数据库路径为替身数据库
+
+说明：迁移是部署步骤；插入、看板和地图服务启动时也会对SQLite数据库执行同样的迁移（已迁移时只做只读检查），
+请求中不执行迁移。MySQL后端的迁移只由本脚本执行，服务启动和连接时不执行。
+经纬度无法解析的记录只在第一次迁移时检查一次（回填进度记在 image_info_meta 表中）。
+"""
+
+import argparse
+import sqlite3
+import os
+import sys
+
+# 添加项目根目录到路径，以便导入common模块
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from common.image_info_schema import ensure_image_info_schema, ROLLUP_TABLES
+from common import db_backend
+
+
+def migrate_database(db_path):
+    """
+    执行迁移并显示迁移结果
+    """
+    if not os.path.exists(db_path):
+        print(f"❌ 数据库文件不存在: {db_path}")
+        return False
+
+    try:
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+
+        print(f"📂 数据库路径: {db_path}")
+        print("🚀 开始迁移...")
+        ensure_image_info_schema(conn)
+        conn.commit()
+
+        # 显示迁移结果
+        cursor.execute("SELECT COUNT(*), COUNT(lon) FROM image_info")
+        total_count, parsed_count = cursor.fetchone()
+        print(f"✅ 迁移完成，总记录数: {total_count}，已解析数值坐标: {parsed_count}")
+        if parsed_count < total_count:
+            print(f"⚠️  {total_count - parsed_count} 条记录的经纬度为空或无法解析，lon/lat 保持为NULL")
+
+        cursor.execute("PRAGMA index_list(image_info)")
+        indexes = [row[1] for row in cursor.fetchall()]
+        print(f"📊 image_info表索引: {indexes}")
+
+        print("📊 预聚合表:")
+        for rollup_name in ROLLUP_TABLES:
+            cursor.execute(f"SELECT COUNT(*), IFNULL(SUM(row_count), 0) FROM {rollup_name}")
+            group_count, row_count = cursor.fetchone()
+            print(f"   {rollup_name}: {group_count} 个分组，汇总 {row_count} 条记录")
+
+        conn.close()
+        return True
+
+    except Exception as e:
+        print(f"❌ 迁移过程中发生错误: {e}")
+        return False
+
+
+def migrate_mysql(shim_path=None):
+    """
+    执行MySQL后端的迁移并显示迁移结果
+    """
+    try:
+        backend = db_backend.MySQLBackend(db_backend.get_mysql_config(), shim_path=shim_path, pool_size=1)
+        print(f"📂 MySQL: {backend.pool_name}")
+        print("🚀 开始迁移...")
+        backfilled = backend.migrate()
+
+        connection = backend.connect()
+        try:
+            total_count, parsed_count = connection.execute("SELECT COUNT(*), COUNT(lon) FROM image_info").fetchone()
+        finally:
+            connection.close()
+        print(f"✅ 迁移完成，本次回填 {backfilled} 条，总记录数: {total_count}，已解析数值坐标: {parsed_count}")
+        if parsed_count < total_count:
+            print(f"⚠️  {total_count - parsed_count} 条记录的经纬度为空或无法解析，lon/lat 保持为NULL")
+        return True
+
+    except Exception as e:
+        print(f"❌ 迁移过程中发生错误: {e}")
+        return False
+
+
+def main():
+    """
+    主函数
+    """
+    parser = argparse.ArgumentParser(description="image_info表结构迁移")
+    parser.add_argument('db_path', nargs='?', help="SQLite数据库路径（--mysql 且 MYSQL_DRIVER=shim 时为替身数据库）")
+    parser.add_argument('--mysql', action='store_true', help="迁移MySQL后端（MYSQL_* 环境变量配置的服务器）")
+    args = parser.parse_args()
+
+    print("🚀 image_info表结构迁移")
+    print("=" * 60)
+
+    if args.mysql:
+        ok = migrate_mysql(os.path.abspath(args.db_path) if args.db_path else None)
+    else:
+        db_path = args.db_path or os.path.join(os.path.dirname(__file__), '..', 'Database', 'image_info.db')
+        ok = migrate_database(os.path.abspath(db_path))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,31 @@
 # db_config.py
 import os
+import sys
 
-# SQLite数据库配置
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+# 添加项目根目录到Python路径，以便导入common模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from common.sqlite_pool import get_pool
+from common.db_backend import CONFIGURED_BACKEND, get_backend as get_db_backend, migrate_at_startup
+from common.protection_index import ProtectionLevelIndex
+
+# SQLite数据库配置（可用环境变量 IMAGE_INFO_DB_PATH / PROTECTED_DB_PATH 覆盖，如指向合成数据生成器生成的数据库）
+DB_PATH = os.environ.get(
+    "IMAGE_INFO_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+)
+PROTECTED_DB_PATH = os.environ.get(
+    "PROTECTED_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "protected_wildlife.db")
+)
+
+# image_info的数据库后端（见 common/db_backend.py）：
+# - "sqlite": 本地SQLite数据库 DB_PATH（默认）
+# - "mysql":  MySQL，连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量
+# 保护级别数据库只用于加载内存索引，始终为SQLite
+DB_BACKEND = CONFIGURED_BACKEND
 
 def get_db_path():
     """
@@ -10,8 +33,63 @@ def get_db_path():
     """
     return DB_PATH
 
+def get_protected_db_path():
+    """
+    获取保护级别数据库路径
+    """
+    return PROTECTED_DB_PATH
+
 def get_table_name():
     """
     获取主要数据表名称
     """
-    return "image_info"
\ No newline at end of file
+    return "image_info"
+
+def get_backend():
+    """
+    获取当前配置的image_info数据访问后端（SQLiteBackend 或 MySQLBackend）
+    """
+    return get_db_backend(DB_BACKEND, get_db_path())
+
+def use_backend(name):
+    """
+    切换image_info数据访问后端（"sqlite" 或 "mysql"），供基准测试使用
+    """
+    global DB_BACKEND
+    DB_BACKEND = name.lower()
+
+def migrate_schema():
+    """
+    服务启动时执行image_info表结构迁移，地图查询依赖迁移添加的 lon/lat 列，仓库自带的 image_info.db 未迁移
+    迁移失败（如数据库只读）时打印错误后继续启动
+    """
+    migrate_at_startup(get_backend(), strict=False)
+
+def get_db_connection():
+    """
+    从当前后端的连接池借出image_info数据库的连接（close() 时归还连接池），SQL使用 ? 占位符
+    表结构迁移在服务启动时执行（migrate_schema），请求中不执行，建池时只做只读检查
+    """
+    return get_backend().connect()
+
+def get_protected_db_connection():
+    """
+    从连接池借出保护级别数据库的只读连接（close() 时归还连接池）
+    只读连接池只以 mode=ro 打开数据库，不切换日志模式，仓库自带的 protected_wildlife.db 不会被改动
+    """
+    return get_pool(get_protected_db_path(), readonly=True).connect()
+
+def get_data_version():
+    """
+    读取image_info数据库的数据版本号（插入服务每次提交时加1），用于响应缓存失效
+    MySQL后端没有数据版本号，返回固定值，响应缓存只按TTL失效
+    """
+    return get_backend().data_version()
+
+_protection_index = ProtectionLevelIndex(PROTECTED_DB_PATH, get_protected_db_connection)
+
+def get_protection_index():
+    """
+    获取保护级别内存索引（首次调用时加载并启动修改时间检查线程）
+    """
+    return _protection_index.start()
@@ -9,23 +9,28 @@
 - get_location_list(): 获取地点列表  
 - get_map_data(): 获取地图数据点
 - get_location_detail(): 获取位置详细信息
+- get_map_tile(): 获取一个瓦片内按网格聚合的监测点（按视野范围和级别加载）
 
 技术特点：
-- 使用SQLite数据库连接
+- 使用连接池（db_config.get_db_connection），SQLite和MySQL后端共用这些函数（db_config.py 中的 DB_BACKEND，见 common/db_backend.py）
+- 保护级别查询使用内存索引（db_config.get_protection_index），数据库文件变化时自动重新加载
 - 支持动物类型和日期筛选
-- 处理带方向前缀的经纬度数据
+- 使用迁移生成的数值坐标列 lon/lat（带索引）进行坐标和范围查询
 - 返回结构化的JSON数据
 """
 
-import sqlite3
-import os
-from db_config import get_db_path, get_table_name
+import math
+
+from db_config import get_table_name, get_backend, get_db_connection, get_protection_index
+
+# 坐标点查询的容差（度）
+COORD_TOLERANCE = 0.01
 
 # ==================== 动物保护级别查询功能 ====================
 
 def get_animal_protection_level(animal_name):
     """
-    根据动物名称查询保护级别
+    根据动物名称（中文名或学名）查询保护级别
     
     Args:
         animal_name (str): 动物名称
@@ -34,30 +39,8 @@ def get_animal_protection_level(animal_name):
         str: 保护级别（如"一级"、"二级"等），如果未找到则返回"未知"
     """
     try:
-        # 连接保护级别数据库
-        protected_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "protected_wildlife.db")
-        connection = sqlite3.connect(protected_db_path)
-        cursor = connection.cursor()
-        
-        # 查询保护级别
-        sql = """
-        SELECT protection_level 
-        FROM protected_species 
-        WHERE species_name = ? OR scientific_name = ?
-        LIMIT 1
-        """
-        
-        cursor.execute(sql, (animal_name, animal_name))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        connection.close()
-        
-        if result:
-            return result[0]
-        else:
-            return "未知"
-            
+        # 查内存索引，不访问数据库
+        return get_protection_index().lookup(animal_name)
     except Exception as e:
         print(f"查询动物保护级别时出错: {e}")
         return "未知"
@@ -68,7 +51,7 @@ def get_multiple_animals_protection_levels(animal_names):
     批量查询多个动物的保护级别
     
     Args:
-        animal_names (list): 动物名称列表
+        animal_names (list): 动物名称列表（中文名或学名）
     
     Returns:
         dict: 动物名称到保护级别的映射字典
@@ -76,37 +59,8 @@ def get_multiple_animals_protection_levels(animal_names):
     try:
         if not animal_names:
             return {}
-            
-        # 连接保护级别数据库
-        protected_db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "protected_wildlife.db")
-        connection = sqlite3.connect(protected_db_path)
-        cursor = connection.cursor()
-        
-        # 构建批量查询SQL
-        placeholders = ','.join(['?' for _ in animal_names])
-        sql = f"""
-        SELECT species_name, protection_level 
-        FROM protected_species 
-        WHERE species_name IN ({placeholders})
-        """
-        
-        cursor.execute(sql, animal_names)
-        results = cursor.fetchall()
-        
-        cursor.close()
-        connection.close()
-        
-        # 构建结果字典
-        protection_levels = {}
-        for animal_name, protection_level in results:
-            protection_levels[animal_name] = protection_level
-            
-        # 为未找到的动物设置默认值
-        for animal_name in animal_names:
-            if animal_name not in protection_levels:
-                protection_levels[animal_name] = "未知"
-                
-        return protection_levels
+        # 查内存索引，不访问数据库
+        return get_protection_index().lookup_many(animal_names)
         
     except Exception as e:
         print(f"批量查询动物保护级别时出错: {e}")
@@ -121,35 +75,39 @@ def get_animal_list():
     
     Returns:
         list: 动物种类列表
+
+    Raises:
+        Exception: 查询出错时抛出（不返回空列表），接口返回500，错误结果不进入响应缓存
     """
     try:
-        # 连接SQLite数据库
-        db_path = get_db_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        
-        table_name = get_table_name()
-        sql = f"""
-        SELECT DISTINCT animal
-        FROM {table_name}
-        WHERE animal IS NOT NULL AND animal != ''
-        ORDER BY animal
-        """
-        
-        cursor.execute(sql)
-        results = cursor.fetchall()
-        
-        # 处理结果
-        animal_list = [row[0] for row in results]
-        
-        cursor.close()
-        connection.close()
-        
-        return animal_list
-        
+        # 从连接池借出连接
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+
+            table_name = get_table_name()
+            sql = f"""
+            SELECT DISTINCT animal
+            FROM {table_name}
+            WHERE animal IS NOT NULL AND animal != ''
+            ORDER BY animal
+            """
+
+            cursor.execute(sql)
+            results = cursor.fetchall()
+
+            # 处理结果
+            animal_list = [row[0] for row in results]
+
+            cursor.close()
+
+            return animal_list
+        finally:
+            connection.close()  # 归还连接池
+
     except Exception as e:
         print(f"获取动物列表时出错: {e}")
-        return []
+        raise
 
 
 def get_location_list():
@@ -158,39 +116,43 @@ def get_location_list():
     
     Returns:
         list: 地点列表
+
+    Raises:
+        Exception: 查询出错时抛出，同 get_animal_list()
     """
     try:
-        # 连接SQLite数据库
-        db_path = get_db_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        
-        table_name = get_table_name()
-        sql = f"""
-        SELECT DISTINCT location
-        FROM {table_name}
-        WHERE location IS NOT NULL AND location != ''
-        ORDER BY location
-        """
-        
-        cursor.execute(sql)
-        results = cursor.fetchall()
-        
-        # 处理结果
-        location_list = [row[0] for row in results]
-        
-        cursor.close()
-        connection.close()
-        
-        return location_list
-        
+        # 从连接池借出连接
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+
+            table_name = get_table_name()
+            sql = f"""
+            SELECT DISTINCT location
+            FROM {table_name}
+            WHERE location IS NOT NULL AND location != ''
+            ORDER BY location
+            """
+
+            cursor.execute(sql)
+            results = cursor.fetchall()
+
+            # 处理结果
+            location_list = [row[0] for row in results]
+
+            cursor.close()
+
+            return location_list
+        finally:
+            connection.close()  # 归还连接池
+
     except Exception as e:
         print(f"获取地点列表时出错: {e}")
-        return []
+        raise
 
 # ==================== 地图数据和位置详情功能 ====================
 
-def get_map_data(animal_type=None, start_date=None, end_date=None):
+def get_map_data(animal_type=None, start_date=None, end_date=None, bbox=None):
     """
     获取地图数据 - 动物分布监测点（基于经纬度坐标）
     
@@ -198,104 +160,89 @@ def get_map_data(animal_type=None, start_date=None, end_date=None):
         animal_type (str, optional): 动物种类筛选
         start_date (str, optional): 开始日期 (YYYY-MM-DD)
         end_date (str, optional): 结束日期 (YYYY-MM-DD)
+        bbox (tuple, optional): 矩形范围 (min_lng, min_lat, max_lng, max_lat)，只返回范围内的监测点
     
     Returns:
         list: 包含地理位置和动物数量的数据列表
+
+    Raises:
+        Exception: 查询出错时抛出，同 get_animal_list()
     """
     try:
-        # 连接SQLite数据库
-        db_path = get_db_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        
-        # 构建SQL查询
-        table_name = get_table_name()
-        base_sql = f"""
-        SELECT 
-            longitude,
-            latitude,
-            location,
-            SUM(count) as count,
-            GROUP_CONCAT(DISTINCT animal) as animal_types
-        FROM {table_name}
-        WHERE longitude IS NOT NULL 
-        AND latitude IS NOT NULL 
-        AND longitude != '' 
-        AND latitude != ''
-        """
-        
-        params = []
-        
-        # 添加筛选条件
-        if animal_type and animal_type != 'all':
-            base_sql += " AND animal = ?"
-            params.append(animal_type)
-            
-        # 使用date字段进行日期筛选
-        # 注意：数据库中date字段格式为YYYYMMDD，前端传递的是YYYY-MM-DD
-        if start_date:
-            # 将YYYY-MM-DD格式转换为YYYYMMDD格式
-            start_date_formatted = start_date.replace('-', '')
-            base_sql += " AND date >= ?"
-            params.append(start_date_formatted)
-            
-        if end_date:
-            # 将YYYY-MM-DD格式转换为YYYYMMDD格式
-            end_date_formatted = end_date.replace('-', '')
-            base_sql += " AND date <= ?"
-            params.append(end_date_formatted)
-        
-        base_sql += " GROUP BY longitude, latitude, location ORDER BY count DESC"
-        
-        # 执行查询
-        cursor.execute(base_sql, params)
-        results = cursor.fetchall()
-        
-        # 处理结果
-        map_data = []
-        for row in results:
-            longitude, latitude, location, count, animal_types = row
-            try:
-                # 处理带有方向前缀的经纬度数据
-                # 经度: E/W前缀，纬度: N/S前缀
-                lng_str = str(longitude).strip()
-                lat_str = str(latitude).strip()
-                
-                # 解析经度
-                if lng_str.startswith('E'):
-                    lng = float(lng_str[1:])  # 东经为正
-                elif lng_str.startswith('W'):
-                    lng = -float(lng_str[1:])  # 西经为负
-                else:
-                    lng = float(lng_str)  # 直接数字
-                
-                # 解析纬度
-                if lat_str.startswith('N'):
-                    lat = float(lat_str[1:])  # 北纬为正
-                elif lat_str.startswith('S'):
-                    lat = -float(lat_str[1:])  # 南纬为负
-                else:
-                    lat = float(lat_str)  # 直接数字
-                
+        # 从连接池借出连接
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+
+            # 构建SQL查询
+            # lon/lat 为迁移时由 longitude/latitude 解析出的带符号数值坐标（东经/北纬为正），
+            # 无法解析的坐标为NULL，会在这里被过滤掉
+            table_name = get_table_name()
+            base_sql = f"""
+            SELECT 
+                lon,
+                lat,
+                location,
+                SUM(count) as count,
+                GROUP_CONCAT(DISTINCT animal) as animal_types
+            FROM {table_name}
+            WHERE lon IS NOT NULL 
+            AND lat IS NOT NULL
+            """
+
+            params = []
+
+            # 矩形范围筛选，走 (lon, lat) 索引
+            if bbox:
+                min_lng, min_lat, max_lng, max_lat = bbox
+                base_sql += " AND lon BETWEEN ? AND ? AND lat BETWEEN ? AND ?"
+                params.extend([min_lng, max_lng, min_lat, max_lat])
+
+            # 添加筛选条件
+            if animal_type and animal_type != 'all':
+                base_sql += " AND animal = ?"
+                params.append(animal_type)
+
+            # 使用date字段进行日期筛选
+            # 注意：数据库中date字段格式为YYYYMMDD，前端传递的是YYYY-MM-DD
+            if start_date:
+                # 将YYYY-MM-DD格式转换为YYYYMMDD格式
+                start_date_formatted = start_date.replace('-', '')
+                base_sql += " AND date >= ?"
+                params.append(start_date_formatted)
+
+            if end_date:
+                # 将YYYY-MM-DD格式转换为YYYYMMDD格式
+                end_date_formatted = end_date.replace('-', '')
+                base_sql += " AND date <= ?"
+                params.append(end_date_formatted)
+
+            base_sql += " GROUP BY lon, lat, location ORDER BY count DESC"
+
+            # 执行查询
+            cursor.execute(base_sql, params)
+            results = cursor.fetchall()
+
+            # 处理结果
+            map_data = []
+            for row in results:
+                lng, lat, location, count, animal_types = row
                 map_data.append({
                     'name': location or f"位置({lng:.4f},{lat:.4f})",
                     'value': count,
                     'animal_types': animal_types.split(',') if animal_types else [],
-                    'coord': [lng, lat]  # 直接使用数据库中的经纬度
+                    'coord': [lng, lat]  # 直接使用数据库中的数值经纬度
                 })
-            except (ValueError, TypeError) as e:
-                # 跳过无效的坐标数据
-                print(f"坐标转换失败: {e}, 原始数据: 经度='{longitude}', 纬度='{latitude}'")
-                continue
-        
-        cursor.close()
-        connection.close()
-        
-        return map_data
-        
+
+            cursor.close()
+
+            return map_data
+        finally:
+            connection.close()  # 归还连接池
+
     except Exception as e:
         print(f"获取地图数据时出错: {e}")
-        return []
+        raise
 
 
 def get_location_detail(longitude=None, latitude=None, location=None, start_date=None, end_date=None, animal_type=None, limit=100):
@@ -315,137 +262,299 @@ def get_location_detail(longitude=None, latitude=None, location=None, start_date
         dict: 包含详情列表和最新媒体信息的字典
     """
     try:
-        # 连接SQLite数据库
-        db_path = get_db_path()
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        
-        table_name = get_table_name()
-        
-        # 调试：查看数据库中的经纬度格式
-        debug_sql = f"SELECT longitude, latitude, location FROM {table_name} LIMIT 5"
-        cursor.execute(debug_sql)
-        debug_results = cursor.fetchall()
-        print(f"🔍 数据库中的经纬度格式示例: {debug_results}")
-        
-        # 构建基础SQL查询 - 获取最新的图片/视频和描述信息
-        base_sql = f"""
-        SELECT 
-            animal,
-            caption,
-            time,
-            location,
-            longitude,
-            latitude,
-            image_id,
-            count,
-            date,
-            path,
-            type
-        FROM {table_name}
-        WHERE 1=1
-        """
-        
-        params = []
-        
-        # 添加位置筛选条件
-        if longitude is not None and latitude is not None:
-            # 使用模糊匹配，允许小数点后2位的误差
-            base_sql += " AND ABS(CAST(REPLACE(REPLACE(longitude, 'E', ''), 'W', '') AS DECIMAL(10,6)) - ?) < 0.01"
-            base_sql += " AND ABS(CAST(REPLACE(REPLACE(latitude, 'N', ''), 'S', '') AS DECIMAL(10,6)) - ?) < 0.01"
-            params.extend([longitude, latitude])
-        elif location:
-            base_sql += " AND location LIKE ?"
-            params.append(f"%{location}%")
-        else:
-            return []
-        
-        # 添加时间段筛选条件
-        if start_date:
-            # 将YYYY-MM-DD格式转换为YYYYMMDD格式
-            start_date_formatted = start_date.replace('-', '')
-            base_sql += " AND date >= ?"
-            params.append(start_date_formatted)
-            
-        if end_date:
-            # 将YYYY-MM-DD格式转换为YYYYMMDD格式
-            end_date_formatted = end_date.replace('-', '')
-            base_sql += " AND date <= ?"
-            params.append(end_date_formatted)
-        
-        # 添加动物类型筛选条件
-        if animal_type and animal_type != 'all':
-            base_sql += " AND animal = ?"
-            params.append(animal_type)
-        
-        # 按日期和时间排序，获取最新的记录
-        base_sql += " ORDER BY date DESC, time DESC LIMIT ?"
-        params.append(limit)
-        
-        cursor.execute(base_sql, params)
-        results = cursor.fetchall()
-        
-        # 处理结果 - 按动物类型分组，获取每种动物的最新图片和描述
-        animal_latest_data = {} # 一条记录用字典保存
-        detail_data = []        # 所有记录用列表保存
-        animal_names = set()    # 收集所有动物名称，用于批量查询保护级别
-        
-        for row in results:
-            animal, caption, time, location, lng, lat, image_id, count, date, path, media_type = row
-            
-            # 收集动物名称
-            if animal:
-                animal_names.add(animal)
-            
-            # 为每种动物保存最新的媒体文件和描述信息（因为返回的result是按照时间日期降序排列的，所以第一个记录就是最新的）
-            if animal not in animal_latest_data:
-                animal_latest_data[animal] = {
-                    'latest_media': path if path else None,
-                    'latest_media_type': media_type if media_type else 'image',  # 默认为图片类型
-                    'latest_caption': caption,
-                    'latest_time': str(time),
-                    'latest_date': str(date)
-                }
-            
-            detail_data.append({
-                'animal_type': animal,
-                'caption': caption,
-                'time': str(time),
-                'date': str(date),
-                'location': location,
-                'longitude': lng,
-                'latitude': lat,
-                'coordinates': f"({lng}, {lat})" if lng and lat else None,
-                'media_path': path if path else None,
-                'media_type': media_type if media_type else 'image',  # 默认为图片类型
-                'count': count
-            })
-        
-        cursor.close()
-        connection.close()
-        
-        # 批量查询所有动物的保护级别
-        protection_levels = get_multiple_animals_protection_levels(list(animal_names))
-        
-        # 将保护级别信息添加到animal_latest_data中
-        for animal in animal_latest_data:
-            animal_latest_data[animal]['protection_level'] = protection_levels.get(animal, "未知")
-        
-        # 将保护级别信息添加到detail_data中
-        for detail in detail_data:
-            detail['protection_level'] = protection_levels.get(detail['animal_type'], "未知")
-        
-        # 将最新图片信息添加到返回数据中
-        return {
-            'details': detail_data,
-            'latest_by_animal': animal_latest_data,
-            'protection_levels': protection_levels  # 添加保护级别映射
-        }
-        
+        # 从连接池借出连接
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+
+            table_name = get_table_name()
+
+            # 构建基础SQL查询 - 获取最新的图片/视频和描述信息
+            base_sql = f"""
+            SELECT 
+                animal,
+                caption,
+                time,
+                location,
+                longitude,
+                latitude,
+                image_id,
+                count,
+                date,
+                path,
+                type
+            FROM {table_name}
+            WHERE 1=1
+            """
+
+            params = []
+
+            # 添加位置筛选条件
+            if longitude is not None and latitude is not None:
+                # 使用模糊匹配，允许小数点后2位的误差
+                # 在数值坐标列上做范围查询，可以走 (lon, lat) 索引，避免逐行解析文本坐标
+                base_sql += " AND lon > ? AND lon < ? AND lat > ? AND lat < ?"
+                params.extend([longitude - COORD_TOLERANCE, longitude + COORD_TOLERANCE,
+                               latitude - COORD_TOLERANCE, latitude + COORD_TOLERANCE])
+            elif location:
+                base_sql += " AND location LIKE ?"
+                params.append(f"%{location}%")
+            else:
+                return []
+
+            # 添加时间段筛选条件
+            if start_date:
+                # 将YYYY-MM-DD格式转换为YYYYMMDD格式
+                start_date_formatted = start_date.replace('-', '')
+                base_sql += " AND date >= ?"
+                params.append(start_date_formatted)
+
+            if end_date:
+                # 将YYYY-MM-DD格式转换为YYYYMMDD格式
+                end_date_formatted = end_date.replace('-', '')
+                base_sql += " AND date <= ?"
+                params.append(end_date_formatted)
+
+            # 添加动物类型筛选条件
+            if animal_type and animal_type != 'all':
+                base_sql += " AND animal = ?"
+                params.append(animal_type)
+
+            # 按日期和时间排序，获取最新的记录
+            base_sql += " ORDER BY date DESC, time DESC LIMIT ?"
+            params.append(limit)
+
+            cursor.execute(base_sql, params)
+            results = cursor.fetchall()
+
+            # 处理结果 - 按动物类型分组，获取每种动物的最新图片和描述
+            animal_latest_data = {} # 一条记录用字典保存
+            detail_data = []        # 所有记录用列表保存
+            animal_names = set()    # 收集所有动物名称，用于批量查询保护级别
+
+            for row in results:
+                animal, caption, time, location, lng, lat, image_id, count, date, path, media_type = row
+
+                # 收集动物名称
+                if animal:
+                    animal_names.add(animal)
+
+                # 为每种动物保存最新的媒体文件和描述信息（因为返回的result是按照时间日期降序排列的，所以第一个记录就是最新的）
+                if animal not in animal_latest_data:
+                    animal_latest_data[animal] = {
+                        'latest_media': path if path else None,
+                        'latest_media_type': media_type if media_type else 'image',  # 默认为图片类型
+                        'latest_caption': caption,
+                        'latest_time': str(time),
+                        'latest_date': str(date)
+                    }
+
+                detail_data.append({
+                    'animal_type': animal,
+                    'caption': caption,
+                    'time': str(time),
+                    'date': str(date),
+                    'location': location,
+                    'longitude': lng,
+                    'latitude': lat,
+                    'coordinates': f"({lng}, {lat})" if lng and lat else None,
+                    'media_path': path if path else None,
+                    'media_type': media_type if media_type else 'image',  # 默认为图片类型
+                    'count': count
+                })
+
+            cursor.close()
+
+            # 批量查询所有动物的保护级别
+            protection_levels = get_multiple_animals_protection_levels(list(animal_names))
+
+            # 将保护级别信息添加到animal_latest_data中
+            for animal in animal_latest_data:
+                animal_latest_data[animal]['protection_level'] = protection_levels.get(animal, "未知")
+
+            # 将保护级别信息添加到detail_data中
+            for detail in detail_data:
+                detail['protection_level'] = protection_levels.get(detail['animal_type'], "未知")
+
+            # 将最新图片信息添加到返回数据中
+            return {
+                'details': detail_data,
+                'latest_by_animal': animal_latest_data,
+                'protection_levels': protection_levels  # 添加保护级别映射
+            }
+        finally:
+            connection.close()  # 归还连接池
+
     except Exception as e:
         print(f"获取地点详情时出错: {e}")
         return []
 
+# ==================== 地图瓦片（监测点聚合）功能 ====================
+
+# 瓦片金字塔：第z级把经度360°等分为 2^z 列，瓦片为边长 360/2^z 度的正方形（纬度从北纬90°向南编号），
+# 每个瓦片再划分为 TILE_GRID_SIZE x TILE_GRID_SIZE 个网格，同一网格内的监测点聚合为一个点
+TILE_GRID_SIZE = 8
+MAX_TILE_ZOOM = 16           # 最大级别（瓦片边长约0.0055度，网格内基本只有一个监测点）
+TILES_ACROSS = 4             # 自动选择级别时，视野宽度大约覆盖的瓦片列数
+MAX_TILES_PER_REQUEST = 64   # 一次请求最多返回的瓦片数
+
+
+def tile_size(zoom):
+    """第zoom级瓦片的边长（度）"""
+    return 360.0 / (2 ** zoom)
+
+
+def tile_rows(zoom):
+    """第zoom级的瓦片行数：纬度范围只有经度的一半，zoom>=1 时为 2**(zoom-1) 行"""
+    return max(1, 2 ** zoom // 2)
+
+
+def is_valid_tile(zoom, x, y):
+    """瓦片编号是否在范围内：0 <= zoom <= MAX_TILE_ZOOM，0 <= x < 2**zoom，0 <= y < tile_rows(zoom)"""
+    return 0 <= zoom <= MAX_TILE_ZOOM and 0 <= x < 2 ** zoom and 0 <= y < tile_rows(zoom)
+
+
+def tile_bounds(zoom, x, y):
+    """
+    瓦片的经纬度范围
+
+    Returns:
+        tuple: (min_lng, min_lat, max_lng, max_lat)
+    """
+    size = tile_size(zoom)
+    min_lng = -180.0 + x * size
+    max_lat = 90.0 - y * size
+    return (min_lng, max_lat - size, min_lng + size, max_lat)
+
+
+def choose_tile_zoom(bbox):
+    """根据视野范围选择瓦片级别：视野宽度大约覆盖 TILES_ACROSS 列瓦片"""
+    min_lng, min_lat, max_lng, max_lat = bbox
+    width = max(max_lng - min_lng, max_lat - min_lat, 1e-6)
+    zoom = int(math.floor(math.log2(360.0 * TILES_ACROSS / width)))
+    return max(0, min(MAX_TILE_ZOOM, zoom))
+
+
+def get_tile_keys(bbox, zoom):
+    """
+    获取覆盖视野范围的瓦片编号
+
+    Args:
+        bbox (tuple): (min_lng, min_lat, max_lng, max_lat)
+        zoom (int): 瓦片级别
+
+    Returns:
+        list: [(zoom, x, y), ...]
+    """
+    min_lng, min_lat, max_lng, max_lat = bbox
+    size = tile_size(zoom)
+    columns = 2 ** zoom
+    rows = tile_rows(zoom)
+    min_x = max(0, int(math.floor((max(min_lng, -180.0) + 180.0) / size)))
+    max_x = min(columns - 1, int(math.floor((min(max_lng, 180.0) + 180.0) / size)))
+    min_y = max(0, int(math.floor((90.0 - min(max_lat, 90.0)) / size)))
+    max_y = min(rows - 1, int(math.floor((90.0 - max(min_lat, -90.0)) / size)))
+    return [(zoom, x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+
+def get_map_tile(zoom, x, y, animal_type=None, start_date=None, end_date=None):
+    """
+    获取一个瓦片内聚合后的监测点
+
+    先按 (lon, lat, location) 汇总成监测点（与 get_map_data 相同），再按网格聚合：
+    坐标为网格内监测点坐标的平均值，value 为动物数量之和，point_count 为监测点数。
+    只有一个监测点的网格保留该监测点的名称和精确坐标。
+
+    Args:
+        zoom, x, y (int): 瓦片编号
+        animal_type (str, optional): 动物种类筛选
+        start_date (str, optional): 开始日期 (YYYY-MM-DD)
+        end_date (str, optional): 结束日期 (YYYY-MM-DD)
+
+    Returns:
+        dict: key（瓦片键 "z/x/y"）、bbox（瓦片范围）、clusters（聚合点列表）；
+              查询出错时另有 error（错误信息），clusters 为空，调用方不应缓存该瓦片
+    """
+    min_lng, min_lat, max_lng, max_lat = tile_bounds(zoom, x, y)
+    cell = tile_size(zoom) / TILE_GRID_SIZE
+    tile = {'key': f"{zoom}/{x}/{y}", 'bbox': [min_lng, min_lat, max_lng, max_lat], 'clusters': []}
+
+    try:
+        # 从连接池借出连接
+        connection = get_db_connection()
+        try:
+            cursor = connection.cursor()
+
+            table_name = get_table_name()
+            # 瓦片范围为左闭右开，落在边界上的监测点只属于一个瓦片；范围条件走 (lon, lat) 索引
+            point_sql = f"""
+            SELECT lon, lat, location, SUM(count) AS count, GROUP_CONCAT(DISTINCT animal) AS animal_types
+            FROM {table_name}
+            WHERE lon >= ? AND lon < ? AND lat > ? AND lat <= ?
+            """
+            params = [min_lng, max_lng, min_lat, max_lat]
+
+            if animal_type and animal_type != 'all':
+                point_sql += " AND animal = ?"
+                params.append(animal_type)
+            # 数据库中date字段格式为YYYYMMDD，前端传递的是YYYY-MM-DD
+            if start_date:
+                point_sql += " AND date >= ?"
+                params.append(start_date.replace('-', ''))
+            if end_date:
+                point_sql += " AND date <= ?"
+                params.append(end_date.replace('-', ''))
+            point_sql += " GROUP BY lon, lat, location"
+
+            # 网格编号：向下取整并限制在瓦片内（取整和取小的写法由后端方言生成）
+            dialect = get_backend().dialect
+            cell_x_sql = dialect.least(dialect.floor_int("(lon - ?) / ?"), TILE_GRID_SIZE - 1)
+            cell_y_sql = dialect.least(dialect.floor_int("(? - lat) / ?"), TILE_GRID_SIZE - 1)
+            sql = f"""
+            SELECT
+                {cell_x_sql} AS cell_x,
+                {cell_y_sql} AS cell_y,
+                COUNT(*) AS point_count,
+                SUM(count) AS count,
+                AVG(lon) AS lon,
+                AVG(lat) AS lat,
+                MIN(location) AS location,
+                GROUP_CONCAT(animal_types) AS animal_types
+            FROM ({point_sql}) AS points
+            GROUP BY cell_x, cell_y
+            ORDER BY count DESC
+            """
+            cursor.execute(sql, [min_lng, cell, max_lat, cell] + params)
+
+            for cell_x, cell_y, point_count, count, lng, lat, location, animal_types in cursor.fetchall():
+                # 各监测点的动物种类拼接后去重（保持出现顺序）
+                animals = list(dict.fromkeys(animal_types.split(','))) if animal_types else []
+                if point_count == 1:
+                    name = location or f"位置({lng:.4f},{lat:.4f})"
+                else:
+                    name = f"{point_count}个监测点"
+                cell_min_lng = min_lng + cell_x * cell
+                cell_max_lat = max_lat - cell_y * cell
+                tile['clusters'].append({
+                    'name': name,
+                    'value': count or 0,
+                    'point_count': point_count,
+                    'animal_types': animals,
+                    'coord': [lng, lat],
+                    'bbox': [cell_min_lng, cell_max_lat - cell, cell_min_lng + cell, cell_max_lat]  # 点击聚合点时可放大到该范围
+                })
+
+            cursor.close()
+            return tile
+        finally:
+            connection.close()  # 归还连接池
+
+    except Exception as e:
+        print(f"获取地图瓦片时出错: {e}")
+        tile['clusters'] = []
+        tile['error'] = f"获取地图瓦片时出错: {e}"
+        return tile
+
 # ==================== 测试和调试功能 ====================
 
 def main():
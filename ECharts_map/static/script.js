@@ -8,7 +8,9 @@
 class AnimalMapSystem {
     constructor() {
         this.mapChart = null;        // ECharts地图实例
-        this.currentData = [];       // 当前显示的数据
+        this.currentData = [];       // 当前显示的数据（视野内聚合后的监测点）
+        this.roamTimer = null;       // 缩放/平移后延迟加载数据的定时器
+        this.loadSeq = 0;            // 加载序号，丢弃过期的响应
         this.init();
     }
 
@@ -74,7 +76,7 @@ class AnimalMapSystem {
                                     `<p style="margin: 5px 0; color: #333;"><strong>经纬度:</strong> <span style="color: #1890ff;">${formatCoordinate(longitude, latitude)}</span></p>` : 
                                     ''
                                 }
-                                <p style="margin: 10px 0 0 0; color: #666; font-size: 12px;">💡 点击查看详细信息</p>
+                                <p style="margin: 10px 0 0 0; color: #666; font-size: 12px;">💡 ${data.point_count > 1 ? `包含 ${data.point_count} 个监测点，点击放大` : '点击查看详细信息'}</p>
                             </div>
                         `;
                     }
@@ -164,9 +166,12 @@ class AnimalMapSystem {
             console.log('🖱️ 地图点击事件:', params);
             if (params.componentType === 'series' && params.data) {
                 // 从地图数据中获取对应的经纬度坐标
-                const clickedData = this.currentData.find(item => item.name === params.data.name);
+                const clickedData = this.currentData[params.dataIndex];
                 console.log('📍 找到的数据:', clickedData);
-                if (clickedData && clickedData.coord) {
+                if (clickedData && clickedData.point_count > 1 && clickedData.bbox) {
+                    // 聚合点：放大到该聚合点的网格范围
+                    this.zoomToBbox(clickedData.bbox);
+                } else if (clickedData && clickedData.coord) {
                     this.showLocationDetail(clickedData.coord[0], clickedData.coord[1], params.data.name);
                 } else {
                     this.showLocationDetail(null, null, params.data.name);
@@ -174,9 +179,16 @@ class AnimalMapSystem {
             }
         });
 
+        // 缩放/平移结束后按新的视野范围重新加载瓦片（300ms防抖）
+        this.mapChart.on('georoam', () => {
+            clearTimeout(this.roamTimer);
+            this.roamTimer = setTimeout(() => this.loadMapData(false), 300);
+        });
+
         // 响应式调整 - 窗口大小变化时重新调整图表
         window.addEventListener('resize', () => {
             this.mapChart.resize();
+            this.loadMapData(false);
         });
     }
 
@@ -292,15 +304,59 @@ class AnimalMapSystem {
         }
     }
 
+    /**
+     * 获取当前视野的经纬度范围 [min_lng, min_lat, max_lng, max_lat]
+     * 地图尚未注册时返回中国范围
+     */
+    getViewportBbox() {
+        const width = this.mapChart.getWidth();
+        const height = this.mapChart.getHeight();
+        const topLeft = this.mapChart.convertFromPixel({ geoIndex: 0 }, [0, 0]);
+        const bottomRight = this.mapChart.convertFromPixel({ geoIndex: 0 }, [width, height]);
+        if (!topLeft || !bottomRight || topLeft.some(isNaN) || bottomRight.some(isNaN)) {
+            return [73, 18, 135, 54];
+        }
+        return [
+            Math.max(-180, topLeft[0]),
+            Math.max(-90, bottomRight[1]),
+            Math.min(180, bottomRight[0]),
+            Math.min(90, topLeft[1])
+        ];
+    }
+
+    /**
+     * 放大地图到指定经纬度范围，并重新加载该范围的瓦片
+     */
+    zoomToBbox(bbox) {
+        const view = this.getViewportBbox();
+        const geo = this.mapChart.getOption().geo[0];
+        const factor = Math.min(
+            (view[2] - view[0]) / Math.max(bbox[2] - bbox[0], 1e-6),
+            (view[3] - view[1]) / Math.max(bbox[3] - bbox[1], 1e-6)
+        );
+        this.mapChart.setOption({
+            geo: {
+                center: [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2],
+                zoom: geo.zoom * factor * 0.8
+            }
+        });
+        this.loadMapData(false);
+    }
+
     /**
      * 加载地图数据
-     * 根据筛选条件从API获取地图数据，并更新地图和统计信息
+     * 根据筛选条件和当前视野范围，从瓦片API获取服务端聚合后的监测点，并更新地图和统计信息
+     * @param {boolean} showLoading 是否显示加载遮罩（缩放/平移时不显示）
      */
-    async loadMapData() {
-        this.showLoading();
+    async loadMapData(showLoading = true) {
+        const seq = ++this.loadSeq;
+        if (showLoading) {
+            this.showLoading();
+        }
         
         try {
             const params = new URLSearchParams();
+            params.append('bbox', this.getViewportBbox().map(v => v.toFixed(4)).join(','));
             
             // 获取筛选条件
             const animalType = document.getElementById('animalSelect').value;
@@ -318,9 +374,16 @@ class AnimalMapSystem {
                 params.append('end_date', endDate);
             }
             
-            // 请求数据
-            const response = await fetch(`/api/map-data?${params}`);
-            const data = await response.json();
+            // 请求视野内的瓦片（服务端按瓦片键缓存），合并各瓦片的聚合点
+            const response = await fetch(`/api/map-tiles?${params}`);
+            const result = await response.json();
+            if (seq !== this.loadSeq) {
+                return;  // 已有更新的请求，丢弃过期结果
+            }
+            if (!response.ok) {
+                throw new Error(result.error || response.statusText);
+            }
+            const data = result.tiles.flatMap(tile => tile.clusters);
             
             // 更新数据和界面
             this.currentData = data;
@@ -331,7 +394,9 @@ class AnimalMapSystem {
             console.error('加载地图数据失败:', error);
             this.showError('加载数据失败，请检查网络连接');
         } finally {
-            this.hideLoading();
+            if (showLoading) {
+                this.hideLoading();
+            }
         }
     }
 
@@ -343,7 +408,8 @@ class AnimalMapSystem {
         const seriesData = data.map(item => ({
             name: item.name,
             value: [...item.coord, item.value],  // [经度, 纬度, 数值]
-            animal_types: item.animal_types
+            animal_types: item.animal_types,
+            point_count: item.point_count
         }));
 
         // 调试信息：显示圆点大小计算结果
@@ -377,11 +443,14 @@ class AnimalMapSystem {
      * 计算并显示监测点数量、记录总数、动物种类数
      */
     updateStats(data) {
-        const totalLocations = data.length;
+        let totalLocations = 0;
         let totalRecords = 0;
         const speciesSet = new Set();
         
         data.forEach(item => {
+            // 聚合点包含多个监测点
+            totalLocations += item.point_count || 1;
+
             // value是数值，直接累加
             totalRecords += parseInt(item.value) || 0;
             
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据访问后端对比测试
+同一套数据函数（实时图表、ECharts地图、写入、只读查询）分别在 sqlite 和 mysql 两种后端
+（common/db_backend.py，由各子系统 db_config.py 的 DB_BACKEND 选择）上运行，
+多个并发线程持续调用 duration 秒，报告每个函数的吞吐量和 p50/p95 延迟，用于按部署环境选择后端。
+
+- 数据来自合成数据生成器（generate_image_info.py），在临时目录中生成，每个后端各用一份副本，不会修改原数据库
+- 默认 mysql 后端使用本地SQLite替身（common/mysql_shim.py）：没有网络往返，可用 --connect-delay-ms 模拟建连耗时；
+  替身测到的是连接池、预处理语句和方言（没有预聚合表，直接在 image_info 上聚合）的差异
+- --driver pymysql / mysql.connector 时连接 common/db_backend.py 中 MYSQL_* 环境变量配置的服务器，
+  数据以服务器上已有的为准；写入测试会向服务器插入记录，需加 --mysql-writes 才执行
+
+使用方法：
+    python benchmark/bench_backends.py [--rows 100000] [--duration 3] [--clients 1,8]
+        [--backends sqlite,mysql] [--driver shim|pymysql|mysql.connector] [--connect-delay-ms 0] [--mysql-writes]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCHMARK_DIR)  # 同目录的 generate_image_info 等模块，不依赖当前目录或启动方式
+sys.path.append(os.path.join(PROJECT_ROOT, 'ECharts_map'))
+
+from generate_image_info import create_database
+
+import common.db_backend as db_backend
+import realtime_chart.db_config as realtime_db_config
+import realtime_chart.realtime_chart_data_functions as realtime_functions
+import db_config as echarts_db_config  # ECharts_map/db_config.py（ECharts_map 使用模块级导入）
+import echarts_map_data_functions as echarts_functions
+import mysql_insert.db_config as insert_db_config
+from mysql_insert.sql_operations import insert_record, execute_batch
+import mysql_query.db_config as query_db_config
+from mysql_query.sql_query import query_sql
+
+SUBSYSTEM_CONFIGS = (realtime_db_config, echarts_db_config, insert_db_config, query_db_config)
+BATCH_SIZE = 100
+
+
+def use_backend(name, db_path):
+    """把所有子系统切换到指定后端和数据库"""
+    for config in SUBSYSTEM_CONFIGS:
+        config.use_backend(name)
+        config.DB_PATH = db_path
+
+
+def build_operations(animals, records, writes):
+    """
+    压测的操作列表 [(名称, 函数)]，函数参数 rng 为每个线程独立的随机数生成器
+
+    读操作与看板和地图页面的请求一致，写操作为单条参数化插入和批量插入
+    """
+    def pick(rng):
+        return rng.choice(animals)
+
+    operations = [
+        ("realtime.get_realtime_data", lambda rng: realtime_functions.get_realtime_data()),
+        ("realtime.get_location_data", lambda rng: realtime_functions.get_location_data(pick(rng))),
+        ("realtime.get_time_series_data", lambda rng: realtime_functions.get_time_series_data(pick(rng))),
+        ("realtime.get_activity_data", lambda rng: realtime_functions.get_activity_data(pick(rng))),
+        ("echarts.get_map_data", lambda rng: echarts_functions.get_map_data(animal_type=pick(rng))),
+        ("echarts.get_map_tile", lambda rng: echarts_functions.get_map_tile(
+            2, rng.randrange(4), rng.randrange(4), animal_type=pick(rng))),
+        ("query.query_sql", lambda rng: query_sql(
+            f"SELECT location, SUM(count) AS total FROM image_info WHERE animal = '{pick(rng)}' "
+            f"GROUP BY location ORDER BY total DESC LIMIT 20")),
+    ]
+    if writes:
+        operations += [
+            ("insert.insert_record", lambda rng: insert_record(rng.choice(records))),
+            (f"insert.execute_batch({BATCH_SIZE})", lambda rng: execute_batch(rng.sample(records, BATCH_SIZE))),
+        ]
+    return operations
+
+
+def check(result):
+    """数据函数返回错误时终止测试（列表结果为 get_animal_list 等直接返回的数据）"""
+    if isinstance(result, dict) and result.get('status') == 'error':
+        raise RuntimeError(result.get('message'))
+
+
+def run_operation(func, clients, duration):
+    """clients 个线程持续调用 func duration 秒，返回 (每秒调用次数, 延迟列表)"""
+    latencies = []
+    lock = threading.Lock()
+    failures = []
+    deadline = time.monotonic() + duration
+
+    def client(client_id):
+        rng = random.Random(client_id)
+        local = []
+        try:
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                check(func(rng))
+                local.append(time.perf_counter() - start)
+        except Exception as e:
+            failures.append(e)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if failures:
+        raise failures[0]
+    return len(latencies) / elapsed, latencies
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据访问后端对比测试")
+    parser.add_argument('--rows', type=int, default=100000, help="合成数据行数")
+    parser.add_argument('--duration', type=float, default=3.0, help="每个函数、每个并发级别的测试时长（秒）")
+    parser.add_argument('--clients', default="1,8", help="并发线程数，逗号分隔")
+    parser.add_argument('--backends', default="sqlite,mysql", help="参与对比的后端，逗号分隔")
+    parser.add_argument('--driver', default="shim", choices=["shim", "pymysql", "mysql.connector"],
+                        help="mysql 后端使用的驱动")
+    parser.add_argument('--connect-delay-ms', type=float, default=0.0, help="SQLite替身每次建连额外等待的毫秒数")
+    parser.add_argument('--mysql-writes', action='store_true', help="连接真实MySQL服务器时也执行写入测试")
+    args = parser.parse_args()
+
+    backends = [name.strip() for name in args.backends.split(",")]
+    clients_levels = [int(c) for c in args.clients.split(",")]
+    db_backend.MYSQL_DRIVER = args.driver
+    db_backend.MYSQL_SHIM_CONNECT_DELAY = args.connect_delay_ms / 1000
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_backends_")
+    source_path = os.path.join(temp_dir, 'image_info.db')
+    print("🚀 数据访问后端对比测试")
+    print("=" * 100)
+    start = time.perf_counter()
+    generator = create_database(source_path, args.rows)
+    records = generator.records(BATCH_SIZE * 10)  # 写入测试的记录，与合成数据同分布
+    print(f"📂 合成数据: {args.rows:,} 条记录（生成 {time.perf_counter() - start:.1f} 秒），"
+          f"后端: {', '.join(backends)}，mysql 驱动: {args.driver}")
+    print(f"⏱️ 每个函数每级 {args.duration} 秒，并发 {', '.join(map(str, clients_levels))}")
+
+    summary = {}
+    try:
+        for name in backends:
+            db_path = os.path.join(temp_dir, f'{name}.db')
+            shutil.copy(source_path, db_path)
+            use_backend(name, db_path)
+            realtime_db_config.get_backend().migrate()  # 部署步骤：表结构迁移（合成数据库已迁移，MySQL后端补充覆盖索引）
+            writes = name == db_backend.SQLITE or args.driver == "shim" or args.mysql_writes
+
+            animals = echarts_functions.get_animal_list()
+            if not animals:
+                raise RuntimeError(f"{name} 后端没有可用的动物数据")
+            operations = build_operations(animals, records, writes)
+
+            # 预热：建立连接池并预处理各函数的语句（合成数据库已执行过表结构迁移）
+            rng = random.Random(0)
+            for _, func in operations:
+                check(func(rng))
+
+            print(f"\n后端: {name}  {realtime_db_config.get_backend().describe()}")
+            for label, func in operations:
+                for clients in clients_levels:
+                    ops, latencies = run_operation(func, clients, args.duration)
+                    ordered = sorted(latencies)
+                    summary[(label, clients, name)] = ops
+                    print(f"  {label:<34} {clients:>3} 线程: {ops:9.1f} 次/秒 | "
+                          f"p50 {percentile(ordered, 0.50) * 1000:8.2f} ms  p95 {percentile(ordered, 0.95) * 1000:8.2f} ms")
+
+        if len(backends) == 2:
+            first, second = backends
+            print("\n" + "-" * 100)
+            print(f"吞吐量对比（{second} / {first}）:")
+            for (label, clients, name), ops in summary.items():
+                if name != first or (label, clients, second) not in summary:
+                    continue
+                ratio = summary[(label, clients, second)] / ops if ops else 0.0
+                print(f"  {label:<34} {clients:>3} 线程: {ratio:6.2f} 倍")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
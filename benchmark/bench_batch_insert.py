@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量插入性能测试
+对比逐条插入（generate_and_execute_sql，每条记录一次连接+提交）
+与批量插入（execute_batch，一个事务内 executemany）的吞吐量（rows/sec）
+
+测试在 Database/image_info.db 的临时副本上进行，不会修改原数据库。
+
+使用方法：
+    python benchmark/bench_batch_insert.py [--rows 10000] [--single-rows 500]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+import mysql_insert.db_config as insert_db_config
+from mysql_insert.sql_operations import generate_and_execute_sql, execute_batch
+
+
+def load_sample_records(rows):
+    """以 animal_info.jsonl 为模板，生成指定数量的待插入记录"""
+    jsonl_path = os.path.join(PROJECT_ROOT, 'Database', 'animal_info.jsonl')
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        templates = [json.loads(line) for line in f if line.strip()]
+
+    records = []
+    for i in range(rows):
+        record = dict(templates[i % len(templates)])
+        record.update({
+            'percentage': 25,
+            'confidence': 95,
+            'image_id': f"bench_{i:08d}",
+            'sensor_id': f"sensor_{i % 50:03d}",
+        })
+        records.append(record)
+    return records
+
+
+def bench_single(records):
+    """逐条插入"""
+    start = time.perf_counter()
+    for record in records:
+        result = generate_and_execute_sql(record)
+        if result['status'] != 'success':
+            raise RuntimeError(result['message'])
+    return time.perf_counter() - start
+
+
+def bench_batch(records):
+    """批量插入"""
+    start = time.perf_counter()
+    result = execute_batch(records)
+    if result['status'] != 'success' or result['failed']:
+        raise RuntimeError(result['message'])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量插入性能测试")
+    parser.add_argument('--rows', type=int, default=10000, help="批量插入的记录数")
+    parser.add_argument('--single-rows', type=int, default=500, help="逐条插入的记录数（逐条插入较慢，默认少插一些）")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_insert_")
+    db_path = os.path.join(temp_dir, 'image_info.db')
+    shutil.copy(os.path.join(PROJECT_ROOT, 'Database', 'image_info.db'), db_path)
+    insert_db_config.DB_PATH = db_path
+    insert_db_config.migrate_schema()  # 与插入服务启动时相同，先执行表结构迁移
+
+    print("🚀 批量插入性能测试")
+    print("=" * 60)
+    print(f"📂 临时数据库: {db_path}")
+
+    try:
+        single_records = load_sample_records(args.single_rows)
+        batch_records = load_sample_records(args.rows)
+
+        # 预热：建立写连接，避免计入第一条插入的耗时
+        generate_and_execute_sql(single_records[0])
+
+        single_time = bench_single(single_records)
+        batch_time = bench_batch(batch_records)
+
+        single_rate = len(single_records) / single_time
+        batch_rate = len(batch_records) / batch_time
+        print(f"逐条插入: {len(single_records):>8} 条, {single_time:8.3f} 秒, {single_rate:12.1f} rows/sec")
+        print(f"批量插入: {len(batch_records):>8} 条, {batch_time:8.3f} 秒, {batch_rate:12.1f} rows/sec")
+        print(f"📈 吞吐量提升: {batch_rate / single_rate:.1f} 倍")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图表聚合引擎性能测试
+对比实时图表的 get_*_data 在两种引擎下的单次耗时：
+- sqlite:   查询由触发器维护的预聚合表（默认引擎）
+- columnar: 在内存列式快照上做向量化分组汇总（common/columnar_snapshot.py）
+并列出直接对 image_info 原始表 GROUP BY 的耗时（没有预聚合表时的做法，也是新增统计维度时的代价）
+
+对每个数据规模，在临时目录中用合成数据生成器（generate_image_info.py）新建数据库，
+然后报告快照全量加载耗时、内存占用、增量刷新耗时和每个图表接口的平均耗时，并核对两种引擎的结果。
+不会修改原数据库。
+
+使用方法：
+    python benchmark/bench_columnar_snapshot.py [--rows 10000,1000000,10000000] [--repeat 20] [--append 1000]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCHMARK_DIR)  # 同目录的 generate_image_info 等模块，不依赖当前目录或启动方式
+
+import realtime_chart.db_config as chart_db_config
+from realtime_chart.realtime_chart_data_functions import (
+    get_realtime_data, get_location_data, get_time_series_data, get_activity_data
+)
+from generate_image_info import build_catalog, create_database, write_rows
+
+QUARTER_SQL = "substr(date, 1, 4), (CAST(substr(date, 5, 2) AS INTEGER) + 2) / 3"
+RAW_SQL = {
+    'animal': "SELECT animal, SUM(count) AS n FROM image_info {where} GROUP BY animal ORDER BY n DESC LIMIT 10",
+    'location': "SELECT location, SUM(count) AS n FROM image_info {where} GROUP BY location ORDER BY n DESC LIMIT 10",
+    'quarter': (f"SELECT {QUARTER_SQL}, SUM(count), AVG(confidence), AVG(percentage) FROM image_info "
+                f"WHERE date IS NOT NULL AND date != '' {{where}} GROUP BY 1, 2 ORDER BY 1 DESC, 2 DESC LIMIT 20"),
+    'hour': ("SELECT CAST(strftime('%H', time) AS INTEGER) AS hour, SUM(count) FROM image_info "
+             "WHERE time IS NOT NULL AND time != '' {where} GROUP BY hour"),
+}
+
+
+def append_rows(db_path, rows, generator):
+    """模拟插入服务追加记录（触发器维护预聚合表，数据版本号加1）"""
+    write_rows(db_path, rows, generator, append=True)
+
+
+def time_call(func, args, repeat):
+    """返回 (平均耗时秒, 最后一次结果)"""
+    result = func(*args)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(*args)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def time_raw_sql(db_path, sql, params, repeat):
+    """直接对原始表执行 GROUP BY 的平均耗时"""
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute(sql, params).fetchall()  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(sql, params).fetchall()
+        return (time.perf_counter() - start) / repeat
+    finally:
+        connection.close()
+
+
+def same_result(a, b):
+    """核对两种引擎的结果（前N名中总数相同的分组顺序可能不同，只比较总数）"""
+    if a['status'] != 'success' or b['status'] != 'success':
+        return False
+    if isinstance(a['data'], dict):
+        return a['data'] == b['data']
+    if a['data'] and 'date' in a['data'][0]:
+        return a['data'] == b['data']
+    return [item['count'] for item in a['data']] == [item['count'] for item in b['data']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图表聚合引擎性能测试")
+    parser.add_argument('--rows', default="10000,1000000,10000000", help="数据规模，逗号分隔")
+    parser.add_argument('--repeat', type=int, default=20, help="每个接口的重复次数")
+    parser.add_argument('--append', type=int, default=1000, help="测试增量刷新时追加的记录数")
+    args = parser.parse_args()
+
+    # 与 create_database 使用相同的默认素材：排名第一的物种及其第一个行为
+    species = build_catalog()['species'][0]
+    animal, behavior = species['name'], species['behaviors'][0]
+    cutoff = time.strftime('%Y%m%d', time.localtime(time.time() - 365 * 86400))
+    # (名称, 函数, 参数, 原始表SQL, SQL参数)
+    calls = [
+        ("动物排行", get_realtime_data, (),
+         RAW_SQL['animal'].format(where=""), ()),
+        ("动物排行(365天)", get_realtime_data, (365,),
+         RAW_SQL['animal'].format(where="WHERE date >= ?"), (cutoff,)),
+        ("地点排行", get_location_data, (),
+         RAW_SQL['location'].format(where=""), ()),
+        ("地点排行(单个动物)", get_location_data, (animal,),
+         RAW_SQL['location'].format(where="WHERE animal = ?"), (animal,)),
+        ("季度序列", get_time_series_data, (),
+         RAW_SQL['quarter'].format(where=""), ()),
+        ("季度序列(单个动物)", get_time_series_data, (animal,),
+         RAW_SQL['quarter'].format(where="AND animal = ?"), (animal,)),
+        ("活动时间", get_activity_data, (),
+         RAW_SQL['hour'].format(where=""), ()),
+        ("活动时间(动物+行为)", get_activity_data, (animal, behavior),
+         RAW_SQL['hour'].format(where="AND animal = ? AND behavior = ?"), (animal, behavior)),
+    ]
+
+    print("🚀 图表聚合引擎性能测试（原始表 GROUP BY / sqlite 预聚合表 / columnar 列式快照）")
+    print("=" * 90)
+
+    for rows in [int(r) for r in args.rows.split(",")]:
+        temp_dir = tempfile.mkdtemp(prefix="bench_columnar_")
+        db_path = os.path.join(temp_dir, 'image_info.db')
+        try:
+            start = time.perf_counter()
+            generator = create_database(db_path, rows)
+            print(f"\n📂 {rows:,} 条记录（生成数据库 {time.perf_counter() - start:.1f} 秒）")
+            chart_db_config.DB_PATH = db_path
+
+            snapshot = chart_db_config.get_columnar_snapshot()
+            start = time.perf_counter()
+            snapshot.refresh(full=True)
+            load_time = time.perf_counter() - start
+            stats = snapshot.stats()
+            print(f"  快照全量加载: {load_time:8.3f} 秒, 内存 {stats['memory_bytes'] / 1024 / 1024:.1f} MB, "
+                  f"字典大小 {stats['dictionary_sizes']}")
+
+            append_rows(db_path, args.append, generator)
+            start = time.perf_counter()
+            snapshot.ensure_fresh()
+            stats = snapshot.stats()
+            print(f"  增量刷新 {args.append} 条: {(time.perf_counter() - start) * 1000:8.2f} ms "
+                  f"(全量加载次数 {stats['full_loads']}, 快照行数 {stats['rows']:,})")
+
+            print(f"  {'接口':<22}{'原始表':>12}{'sqlite':>12}{'columnar':>12}{'比原始表':>10}{'比预聚合':>10}  结果")
+            for name, func, call_args, raw_sql, raw_params in calls:
+                raw_time = time_raw_sql(db_path, raw_sql, raw_params, max(1, args.repeat // 5))
+                chart_db_config.CHART_ENGINE = "sqlite"
+                sqlite_time, sqlite_result = time_call(func, call_args, args.repeat)
+                chart_db_config.CHART_ENGINE = "columnar"
+                columnar_time, columnar_result = time_call(func, call_args, args.repeat)
+                match = "✓ 一致" if same_result(sqlite_result, columnar_result) else "✗ 不一致"
+                print(f"  {name:<22}{raw_time * 1000:9.3f} ms{sqlite_time * 1000:9.3f} ms{columnar_time * 1000:9.3f} ms"
+                      f"{raw_time / columnar_time:9.1f}x{sqlite_time / columnar_time:9.1f}x  {match}")
+        finally:
+            chart_db_config.CHART_ENGINE = "sqlite"
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
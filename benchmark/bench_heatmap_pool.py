@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+热力图服务连接池性能测试
+分别以 direct（每次请求新建连接，即连接池之前的行为）和 pool（连接池 + 预处理语句）两种方式启动热力图服务，
+用多个并发客户端按地图刷新的比例请求各接口，报告 QPS、p50/p95/p99 延迟，
+以及 /metrics 中的建连次数、连接池耗尽等待次数和超时次数。
+
+- 默认使用本地SQLite替身（common/mysql_shim.py），数据来自合成数据生成器（generate_image_info.py），
+  在临时目录中生成，不会修改原数据库；替身没有网络往返，可用 --connect-delay-ms 模拟每次建连的握手和认证耗时
+- --driver mysql 时连接 heatmap/db_config.py 中配置的MySQL服务器（需安装 mysql-connector-python）
+
+使用方法：
+    python benchmark/bench_heatmap_pool.py [--rows 100000] [--duration 5] [--clients 1,8,32]
+        [--pool-size 8] [--connect-delay-ms 2] [--driver sqlite|mysql]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCHMARK_DIR)  # 同目录的 generate_image_info 等模块，不依赖当前目录或启动方式
+
+from generate_image_info import create_database
+
+HEATMAP_DIR = os.path.join(PROJECT_ROOT, 'heatmap')
+POOL_METRICS = ['connects', 'waits', 'timeouts', 'health_failures', 'prepares', 'prepared_hits']
+
+
+def serve(port):
+    """子进程：按环境变量中的配置启动热力图服务"""
+    sys.path.insert(0, HEATMAP_DIR)
+    from werkzeug.serving import make_server
+    import heatmap_app
+
+    heatmap_app.app.logger.disabled = True
+    server = make_server("127.0.0.1", port, heatmap_app.app, threaded=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/metrics", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("热力图服务启动超时")
+
+
+def pool_metrics(url):
+    """读取 /metrics 中的 mysql_pool_* 计数"""
+    text = urllib.request.urlopen(f"{url}/metrics", timeout=5).read().decode("utf-8")
+    values = {}
+    for line in text.splitlines():
+        if line.startswith("mysql_pool_") and "_total{" in line:
+            name = line[len("mysql_pool_"):line.index("_total{")]
+            values[name] = values.get(name, 0) + float(line.rsplit(" ", 1)[1])
+    return values
+
+
+def load_targets(db_path):
+    """从数据库中取出压测用的动物名称和点位坐标"""
+    connection = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        animals = [row[0] for row in connection.execute(
+            "SELECT animal FROM image_info GROUP BY animal ORDER BY COUNT(*) DESC LIMIT 20")]
+        points = connection.execute("SELECT DISTINCT lat, lon FROM image_info WHERE lat IS NOT NULL").fetchall()
+    finally:
+        connection.close()
+    return animals, points
+
+
+def request_paths(animals, points, rng):
+    """一次地图刷新：按动物筛选的热力图为主，夹杂点位详情、摄像头位置和统计"""
+    roll = rng.random()
+    if roll < 0.5:
+        return f"/api/heatmap-by-animal/{urllib.parse.quote(rng.choice(animals))}"
+    if roll < 0.8:
+        lat, lon = rng.choice(points)
+        return f"/api/point-details?lat={lat}&lng={lon}"
+    if roll < 0.9:
+        return "/api/sensor-locations"
+    return "/api/animal-stats"
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run_clients(url, clients, duration, animals, points):
+    """clients 个线程持续发送请求 duration 秒，返回 (QPS, 延迟列表, 错误数)"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(client_id):
+        rng = random.Random(client_id)
+        while time.monotonic() < deadline:
+            path = request_paths(animals, points, rng)
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(f"{url}{path}", timeout=60) as resp:
+                    json.loads(resp.read())
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            else:
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, latencies, len(errors)
+
+
+def format_latency(latencies):
+    ordered = sorted(latencies)
+    return (f"p50 {percentile(ordered, 0.50) * 1000:7.2f} ms  p95 {percentile(ordered, 0.95) * 1000:7.2f} ms  "
+            f"p99 {percentile(ordered, 0.99) * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="热力图服务连接池性能测试")
+    parser.add_argument('--rows', type=int, default=100000, help="合成数据行数（SQLite替身）")
+    parser.add_argument('--duration', type=float, default=5.0, help="每个并发级别的测试时长（秒）")
+    parser.add_argument('--clients', default="1,8,32", help="并发客户端数，逗号分隔")
+    parser.add_argument('--pool-size', type=int, default=8, help="pool 模式的最大连接数")
+    parser.add_argument('--connect-delay-ms', type=float, default=2.0, help="SQLite替身每次建连额外等待的毫秒数")
+    parser.add_argument('--driver', default="sqlite", choices=["sqlite", "mysql"], help="数据库驱动")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)  # 内部使用：以子进程方式启动服务
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_heatmap_")
+    db_path = os.path.join(temp_dir, 'image_info.db')
+    print("🚀 热力图服务连接池性能测试")
+    print("=" * 100)
+    start = time.perf_counter()
+    create_database(db_path, args.rows)
+    animals, points = load_targets(db_path)
+    if args.driver == "sqlite":
+        print(f"📂 SQLite替身: {db_path}，{args.rows:,} 条记录（生成 {time.perf_counter() - start:.1f} 秒），"
+              f"模拟建连耗时 {args.connect_delay_ms} ms")
+    else:
+        print("📂 MySQL: heatmap/db_config.py 中配置的服务器（动物名称和点位取自合成数据）")
+    print(f"⏱️ 每级 {args.duration} 秒")
+
+    try:
+        for mode, size in (("direct", 0), ("pool", args.pool_size)):
+            port = free_port()
+            env = dict(os.environ, HEATMAP_DB_DRIVER=args.driver, IMAGE_INFO_DB_PATH=db_path,
+                       HEATMAP_POOL_SIZE=str(size), HEATMAP_SHIM_CONNECT_DELAY_MS=str(args.connect_delay_ms),
+                       METRICS_ENABLED="1")
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                                      cwd=HEATMAP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            url = f"http://127.0.0.1:{port}"
+            try:
+                wait_ready(url)
+                # 预热：建立连接并预处理各接口的语句
+                rng = random.Random(0)
+                for _ in range(max(size, 1) * 4):
+                    urllib.request.urlopen(f"{url}{request_paths(animals, points, rng)}", timeout=60).read()
+
+                print(f"\n模式: {mode}（{'每次请求新建连接' if size == 0 else f'连接池 {size} 个连接 + 预处理语句'}）")
+                for clients in [int(c) for c in args.clients.split(",")]:
+                    before = pool_metrics(url)
+                    qps, latencies, errors = run_clients(url, clients, args.duration, animals, points)
+                    after = pool_metrics(url)
+                    delta = {key: int(after.get(key, 0) - before.get(key, 0)) for key in POOL_METRICS}
+                    print(f"  {clients:>3} 客户端: {qps:9.1f} QPS | {format_latency(latencies)}"
+                          + (f" | 错误 {errors}" if errors else ""))
+                    print(f"      建连 {delta['connects']} | 池耗尽等待 {delta['waits']} | 等待超时 {delta['timeouts']}"
+                          f" | 健康检查失败 {delta['health_failures']}"
+                          f" | 预处理 {delta['prepares']} / 复用 {delta['prepared_hits']}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
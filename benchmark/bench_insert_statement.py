@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单条插入延迟测试
+对比拼接SQL插入（generate_and_execute_sql，每条记录一次连接+解析+提交）
+与参数化插入（insert_record，复用写连接和预编译语句）的每条记录耗时
+
+另外在同一事务内单独测量语句执行开销：每条记录一条不同的拼接SQL（每次都要重新解析）
+与同一条参数化语句（只解析一次）的对比，排除连接和提交的影响。
+
+测试在 Database/image_info.db 的临时副本上进行，不会修改原数据库。
+
+使用方法：
+    python benchmark/bench_insert_statement.py [--rows 500] [--statement-rows 20000]
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCHMARK_DIR)  # 同目录的 generate_image_info 等模块，不依赖当前目录或启动方式
+
+import mysql_insert.db_config as insert_db_config
+from mysql_insert.sql_operations import generate_and_execute_sql, insert_record, generate_sql, prepare_insert
+from bench_batch_insert import load_sample_records
+
+
+def bench_per_row(insert_func, records):
+    """逐条插入，返回每条记录的耗时列表（秒）"""
+    latencies = []
+    for record in records:
+        start = time.perf_counter()
+        result = insert_func(record)
+        latencies.append(time.perf_counter() - start)
+        if result['status'] != 'success':
+            raise RuntimeError(result['message'])
+    return latencies
+
+
+def bench_statements(db_path, records):
+    """同一事务内分别执行拼接SQL和参数化SQL，返回 (拼接耗时, 参数化耗时)（秒）"""
+    literal_sqls = [generate_sql(record)['message'] for record in records]
+    prepared = [prepare_insert(record) for record in records]
+
+    connection = sqlite3.connect(db_path)
+    try:
+        start = time.perf_counter()
+        for sql in literal_sqls:
+            connection.execute(sql)
+        literal_time = time.perf_counter() - start
+        connection.rollback()
+
+        start = time.perf_counter()
+        for item in prepared:
+            connection.execute(item['sql'], item['params'])
+        param_time = time.perf_counter() - start
+        connection.rollback()
+    finally:
+        connection.close()
+    return literal_time, param_time
+
+
+def format_latency(latencies):
+    """格式化耗时统计（毫秒）"""
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) >= 20 else ordered[-1]
+    return (f"平均 {statistics.mean(ordered) * 1000:7.3f} ms, "
+            f"p50 {statistics.median(ordered) * 1000:7.3f} ms, "
+            f"p95 {p95 * 1000:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="单条插入延迟测试")
+    parser.add_argument('--rows', type=int, default=500, help="逐条插入（含连接和提交）的记录数")
+    parser.add_argument('--statement-rows', type=int, default=20000, help="同一事务内测量语句开销的记录数")
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_statement_")
+    db_path = os.path.join(temp_dir, 'image_info.db')
+    shutil.copy(os.path.join(PROJECT_ROOT, 'Database', 'image_info.db'), db_path)
+    insert_db_config.DB_PATH = db_path
+    insert_db_config.migrate_schema()  # 与插入服务启动时相同，先执行表结构迁移
+
+    print("🚀 单条插入延迟测试")
+    print("=" * 60)
+    print(f"📂 临时数据库: {db_path}")
+
+    try:
+        records = load_sample_records(args.rows)
+
+        # 预热：建立写连接并预编译语句，避免计入第一条插入的耗时
+        generate_and_execute_sql(records[0])
+        insert_record(records[0])
+
+        literal_latencies = bench_per_row(generate_and_execute_sql, records)
+        param_latencies = bench_per_row(insert_record, records)
+        print(f"拼接SQL插入: {len(records):>6} 条, {format_latency(literal_latencies)}")
+        print(f"参数化插入:  {len(records):>6} 条, {format_latency(param_latencies)}")
+        print(f"📈 平均延迟降低: {statistics.mean(literal_latencies) / statistics.mean(param_latencies):.1f} 倍")
+
+        statement_records = load_sample_records(args.statement_rows)
+        literal_time, param_time = bench_statements(db_path, statement_records)
+        count = len(statement_records)
+        print("-" * 60)
+        print("同一事务内的语句执行开销（不含连接和提交）:")
+        print(f"拼接SQL:  {count:>6} 条, {literal_time * 1e6 / count:8.2f} µs/条")
+        print(f"参数化:   {count:>6} 条, {param_time * 1e6 / count:8.2f} µs/条")
+        print(f"📈 语句开销降低: {literal_time / param_time:.1f} 倍")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询服务并发性能测试
+分别以 inline（请求线程直接执行，每次新建读写连接）、thread、process 三种方式启动 /query-sql 服务，
+用 1/4/16 个并发客户端发送快慢混合的查询，报告 QPS 和 p50/p95/p99 延迟
+
+- 快查询：按 species_name 走唯一索引查一条记录
+- 慢查询：对全表做模糊匹配并分组排序（每 --slow-every 个请求发送一次）
+
+测试在 Database/protected_wildlife.db 的临时副本上进行，不会修改原数据库。
+
+使用方法：
+    python benchmark/bench_query_concurrency.py [--duration 5] [--clients 1,4,16] [--modes inline,thread,process]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+SLOW_QUERY = ("SELECT class, order_name, family, COUNT(*) AS n FROM protected_species "
+              "WHERE remarks LIKE '%{}%' OR scientific_name LIKE '%a%' GROUP BY class, order_name, family ORDER BY n DESC")
+
+
+def serve(port):
+    """子进程：按环境变量中的配置启动查询服务"""
+    from werkzeug.serving import make_server
+    import mysql_query_app
+
+    mysql_query_app.app.logger.disabled = True
+    server = make_server("127.0.0.1", port, mysql_query_app.app, threaded=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}/worker-stats", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("查询服务启动超时")
+
+
+def post_query(url, query):
+    body = json.dumps({"query": query}).encode("utf-8")
+    req = urllib.request.Request(f"{url}/query-sql", data=body, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        payload = json.loads(resp.read())
+    if payload.get("status") != "success":
+        raise RuntimeError(payload.get("message"))
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def run_clients(url, clients, duration, species, slow_every):
+    """clients 个线程持续发送请求 duration 秒，返回 (QPS, 快查询延迟列表, 慢查询延迟列表, 错误数)"""
+    fast_latencies, slow_latencies, errors = [], [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(client_id):
+        i = client_id
+        while time.monotonic() < deadline:
+            slow = slow_every and i % slow_every == 0
+            query = SLOW_QUERY.format(i % 10) if slow else \
+                f"SELECT * FROM protected_species WHERE species_name = '{species[i % len(species)]}'"
+            start = time.perf_counter()
+            try:
+                post_query(url, query)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+            else:
+                elapsed = time.perf_counter() - start
+                with lock:
+                    (slow_latencies if slow else fast_latencies).append(elapsed)
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (len(fast_latencies) + len(slow_latencies)) / elapsed, fast_latencies, slow_latencies, len(errors)
+
+
+def format_latency(latencies):
+    ordered = sorted(latencies)
+    return (f"p50 {percentile(ordered, 0.50) * 1000:7.2f} ms  p95 {percentile(ordered, 0.95) * 1000:7.2f} ms  "
+            f"p99 {percentile(ordered, 0.99) * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询服务并发性能测试")
+    parser.add_argument('--duration', type=float, default=5.0, help="每个并发级别的测试时长（秒）")
+    parser.add_argument('--clients', default="1,4,16", help="并发客户端数，逗号分隔")
+    parser.add_argument('--modes', default="inline,thread,process", help="查询执行方式，逗号分隔")
+    parser.add_argument('--workers', type=int, default=4, help="thread/process 模式的工作数")
+    parser.add_argument('--slow-every', type=int, default=10, help="每多少个请求发送一次慢查询，0表示不发送")
+    parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)  # 内部使用：以子进程方式启动服务
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    temp_dir = tempfile.mkdtemp(prefix="bench_query_")
+    db_path = os.path.join(temp_dir, 'protected_wildlife.db')
+    shutil.copy(os.path.join(PROJECT_ROOT, 'Database', 'protected_wildlife.db'), db_path)
+    connection = sqlite3.connect(db_path)
+    species = [row[0] for row in connection.execute(
+        "SELECT species_name FROM protected_species WHERE species_name IS NOT NULL AND species_name NOT LIKE '%''%'")]
+    connection.close()
+
+    print("🚀 查询服务并发性能测试")
+    print("=" * 100)
+    print(f"📂 临时数据库: {db_path}，每级 {args.duration} 秒，慢查询比例 1/{args.slow_every or '∞'}")
+
+    try:
+        for mode in args.modes.split(","):
+            port = free_port()
+            env = dict(os.environ, QUERY_DB_PATH=db_path, QUERY_WORKER_MODE=mode, QUERY_WORKERS=str(args.workers),
+                       QUERY_READONLY="0" if mode == "inline" else "1")
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                                      cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            url = f"http://127.0.0.1:{port}"
+            try:
+                wait_ready(url)
+                # 预热：建立连接池/工作进程
+                for _ in range(args.workers * 2):
+                    post_query(url, f"SELECT * FROM protected_species WHERE species_name = '{species[0]}'")
+
+                print(f"\n模式: {mode}（只读连接池: {'否' if mode == 'inline' else '是'}）")
+                for clients in [int(c) for c in args.clients.split(",")]:
+                    qps, fast, slow, errors = run_clients(url, clients, args.duration, species, args.slow_every)
+                    print(f"  {clients:>3} 客户端: {qps:9.1f} QPS | 快查询 {format_latency(fast)}"
+                          + (f" | 慢查询 {format_latency(slow)}" if slow else "")
+                          + (f" | 错误 {errors}" if errors else ""))
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+image_info 合成数据生成器
+以 Database/animal_info.jsonl（保护区、坐标、各物种的行为和活动时间）和
+protected_wildlife.db 的 protected_species 名录为素材，生成任意规模（1万 ~ 1000万行）的 image_info 记录：
+
+- 监测点（sensor_id）：分布在 animal_info.jsonl 的各保护区内，坐标在保护区中心附近随机偏移
+- 物种：animal_info.jsonl 中的物种排在前面（看板中最常见），其后是从保护名录中随机抽取的物种，
+  名录物种随机分配到1~3个保护区
+- 偏斜：物种、监测点按 Zipf 分布抽样（指数为0时均匀分布），日期按指数分布偏向近期（系数为0时均匀分布）
+- 时间：animal_info.jsonl 中的物种按其出现过的小时抽样，其余物种随机为昼行或夜行
+- 数量、置信度、占比、状态、图片/视频类型、路径、描述随机生成
+
+数据先写入没有触发器的新表，再执行表结构迁移（一次性 GROUP BY 回填预聚合表），
+lon/lat 数值坐标在写入时直接填好，不需要迁移时逐行解析。
+
+使用方法：
+    python benchmark/generate_image_info.py --output /tmp/image_info_1m.db --rows 1000000
+        [--species 60] [--sites 50] [--species-skew 1.1] [--site-skew 0.8] [--date-skew 2.0]
+        [--start-date 20210101] [--end-date 20251231] [--seed 42] [--append]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+
+from common.coordinates import parse_longitude, parse_latitude
+from common.image_info_schema import prepare_image_info_db, bump_data_version
+
+CHUNK_SIZE = 100000
+SITE_JITTER = 0.08  # 监测点相对保护区中心的最大坐标偏移（度）
+CHINESE_NUMBERS = ['零', '一', '两', '三', '四', '五', '六', '七', '八', '九', '十']
+DIURNAL_HOURS = np.array([0.2, 0.1, 0.1, 0.1, 0.3, 1, 2, 3, 3, 2.5, 2, 1.5,
+                          1.5, 1.5, 2, 2.5, 3, 3, 2, 1, 0.5, 0.3, 0.2, 0.2])
+NOCTURNAL_HOURS = np.roll(DIURNAL_HOURS, 12)
+
+RECORD_FIELDS = ['object', 'animal', 'count', 'behavior', 'status', 'percentage', 'confidence', 'image_id',
+                 'sensor_id', 'location', 'longitude', 'latitude', 'time', 'date', 'caption', 'type', 'path']
+INSERT_SQL = """INSERT INTO image_info (id, object, animal, count, behavior, status, percentage, confidence,
+                                        image_id, sensor_id, location, longitude, latitude, time, date,
+                                        caption, type, path, lon, lat)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+
+def zipf_weights(n, exponent):
+    """第k名的权重 ∝ 1/k^exponent，归一化为概率"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def format_coordinate(value, positive, negative):
+    """把带符号的坐标格式化为 E103.10 / N31.02 形式"""
+    return f"{positive if value >= 0 else negative}{abs(value):.2f}"
+
+
+def build_catalog(protected_db=None, species=60, sites=50, seed=42):
+    """
+    构建生成数据用的素材：保护区、监测点、物种（行为、活动时间、所在保护区）
+
+    Args:
+        protected_db (str): protected_wildlife.db 路径，None时使用 Database/protected_wildlife.db
+        species (int): 物种总数（animal_info.jsonl 中的物种不足时从保护名录中补充）
+        sites (int): 监测点总数
+    """
+    rng = np.random.default_rng(seed)
+    with open(os.path.join(PROJECT_ROOT, 'Database', 'animal_info.jsonl'), 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+
+    reserves, species_info = {}, {}
+    for record in records:
+        location = record.get('location')
+        lon, lat = parse_longitude(record.get('longitude')), parse_latitude(record.get('latitude'))
+        if location and lon is not None and lat is not None:
+            reserves.setdefault(location, (lon, lat))
+        animal = record.get('animal')
+        if not animal:
+            continue
+        info = species_info.setdefault(animal, {'behaviors': set(), 'hours': [], 'reserves': set()})
+        if record.get('behavior'):
+            info['behaviors'].add(record['behavior'])
+        if location in reserves:
+            info['reserves'].add(location)
+        try:
+            info['hours'].append(int(str(record.get('time', ''))[:2]))
+        except ValueError:
+            pass
+    reserve_names = sorted(reserves)
+    all_behaviors = sorted({b for info in species_info.values() for b in info['behaviors']})
+
+    # 物种：animal_info.jsonl 中的物种在前，不足时从保护名录补充
+    names = sorted(species_info, key=lambda name: -len(species_info[name]['hours']))[:species]
+    if len(names) < species:
+        connection = sqlite3.connect(protected_db or os.path.join(PROJECT_ROOT, 'Database', 'protected_wildlife.db'))
+        try:
+            candidates = [row[0] for row in connection.execute(
+                "SELECT DISTINCT species_name FROM protected_species WHERE species_name IS NOT NULL AND species_name != ''")]
+        finally:
+            connection.close()
+        candidates = [name for name in candidates if name not in species_info]
+        picked = rng.choice(len(candidates), size=min(species - len(names), len(candidates)), replace=False)
+        for index in picked:
+            name = candidates[index]
+            names.append(name)
+            species_info[name] = {
+                'behaviors': {str(b) for b in rng.choice(all_behaviors, size=min(4, len(all_behaviors)), replace=False)},
+                'hours': [],
+                'reserves': {str(r) for r in rng.choice(reserve_names, size=int(rng.integers(1, 4)), replace=False)},
+                'nocturnal': bool(rng.random() < 0.4),
+            }
+
+    catalog_species = []
+    for name in names:
+        info = species_info[name]
+        if info['hours']:
+            hour_weights = np.bincount(info['hours'], minlength=24).astype(float) + 0.05
+        else:
+            hour_weights = NOCTURNAL_HOURS.copy() if info.get('nocturnal') else DIURNAL_HOURS.copy()
+        catalog_species.append({
+            'name': name,
+            'behaviors': sorted(info['behaviors']) or all_behaviors,
+            'hour_p': hour_weights / hour_weights.sum(),
+            'reserves': sorted(info['reserves']) or reserve_names,
+        })
+
+    # 监测点：轮流分配到各保护区，随机打乱后作为 Zipf 排名
+    catalog_sites = []
+    for i in range(sites):
+        reserve = reserve_names[i % len(reserve_names)]
+        lon, lat = reserves[reserve]
+        catalog_sites.append({
+            'sensor_id': f"cam_{i:04d}",
+            'location': reserve,
+            'lon': round(lon + rng.uniform(-SITE_JITTER, SITE_JITTER), 4),
+            'lat': round(lat + rng.uniform(-SITE_JITTER, SITE_JITTER), 4),
+        })
+    rng.shuffle(catalog_sites)
+    return {'species': catalog_species, 'sites': catalog_sites}
+
+
+class ImageInfoGenerator:
+    """
+    按素材和偏斜参数分块生成 image_info 记录
+
+    Args:
+        catalog (dict): build_catalog() 的结果
+        species_skew (float): 物种 Zipf 指数，0为均匀分布
+        site_skew (float): 监测点 Zipf 指数，0为均匀分布
+        date_skew (float): 日期偏向近期的程度，权重 ∝ exp(date_skew * t)，t 从0（最早）到1（最近）
+        start_date (str): 最早日期 YYYYMMDD
+        end_date (str): 最晚日期 YYYYMMDD
+        seed (int): 随机种子
+    """
+
+    def __init__(self, catalog, species_skew=1.1, site_skew=0.8, date_skew=2.0,
+                 start_date="20210101", end_date="20251231", seed=42):
+        self.species = catalog['species']
+        self.sites = catalog['sites']
+        self.rng = np.random.default_rng(seed)
+        self.species_p = zipf_weights(len(self.species), species_skew)
+
+        # 每个物种只出现在其所在保护区的监测点上，监测点之间按 Zipf 权重抽样
+        site_weights = zipf_weights(len(self.sites), site_skew)
+        self.species_sites = []
+        for info in self.species:
+            indexes = np.array([i for i, site in enumerate(self.sites) if site['location'] in info['reserves']])
+            if not len(indexes):
+                indexes = np.arange(len(self.sites))
+            p = site_weights[indexes]
+            self.species_sites.append((indexes, p / p.sum()))
+
+        first = date(int(start_date[:4]), int(start_date[4:6]), int(start_date[6:8]))
+        last = date(int(end_date[:4]), int(end_date[4:6]), int(end_date[6:8]))
+        days = (last - first).days + 1
+        self.dates = [(first + timedelta(days=i)).strftime('%Y%m%d') for i in range(days)]
+        date_weights = np.exp(date_skew * np.linspace(0, 1, days))
+        self.date_p = date_weights / date_weights.sum()
+
+    def chunk(self, n, first_id):
+        """生成 n 条记录（id 从 first_id 开始），返回 INSERT_SQL 的参数元组列表"""
+        rng = self.rng
+        species_idx = rng.choice(len(self.species), size=n, p=self.species_p)
+        site_idx = np.empty(n, dtype=np.int64)
+        hours = np.empty(n, dtype=np.int64)
+        behavior_pick = rng.random(n)
+        for s in np.unique(species_idx):
+            rows = np.flatnonzero(species_idx == s)
+            indexes, p = self.species_sites[s]
+            site_idx[rows] = indexes[rng.choice(len(indexes), size=len(rows), p=p)]
+            hours[rows] = rng.choice(24, size=len(rows), p=self.species[s]['hour_p'])
+        minutes = rng.integers(0, 60, size=n)
+        date_idx = rng.choice(len(self.dates), size=n, p=self.date_p)
+        counts = np.minimum(rng.geometric(0.6, size=n), 10)
+        confidence = rng.integers(50, 100, size=n)
+        percentage = rng.integers(5, 91, size=n)
+        is_video = rng.random(n) < 0.1
+        healthy = rng.random(n) < 0.97
+
+        result = []
+        for i in range(n):
+            info = self.species[species_idx[i]]
+            site = self.sites[site_idx[i]]
+            animal = info['name']
+            behaviors = info['behaviors']
+            behavior = behaviors[int(behavior_pick[i] * len(behaviors))]
+            count = int(counts[i])
+            record_id = first_id + i
+            day = self.dates[date_idx[i]]
+            image_id = f"syn_{record_id:010d}"
+            media_type = 'video' if is_video[i] else 'image'
+            result.append((
+                record_id, '动物', animal, count, behavior, '健康' if healthy[i] else '受伤',
+                int(percentage[i]), int(confidence[i]), image_id, site['sensor_id'], site['location'],
+                format_coordinate(site['lon'], 'E', 'W'), format_coordinate(site['lat'], 'N', 'S'),
+                f"{hours[i]:02d}:{minutes[i]:02d}", day,
+                f"{CHINESE_NUMBERS[count] if count < len(CHINESE_NUMBERS) else count}只{animal}在{behavior}",
+                media_type, f"/data/{site['sensor_id']}/{day}/{image_id}.{'mp4' if is_video[i] else 'jpg'}",
+                site['lon'], site['lat'],
+            ))
+        return result
+
+    def records(self, n, first_id=1):
+        """生成 n 条 /exec-sql 格式的记录（字典，不含 id 和 lon/lat）"""
+        return [dict(zip(RECORD_FIELDS, row[1:1 + len(RECORD_FIELDS)])) for row in self.chunk(n, first_id)]
+
+
+def create_image_info_table(connection):
+    """按 Database/image_info.db 中的表结构创建 image_info 表，并加上 lon/lat 数值坐标列"""
+    source = sqlite3.connect(os.path.join(PROJECT_ROOT, 'Database', 'image_info.db'))
+    try:
+        create_sql = source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'image_info'").fetchone()[0]
+    finally:
+        source.close()
+    connection.execute(create_sql)
+    connection.execute("ALTER TABLE image_info ADD COLUMN lon REAL")
+    connection.execute("ALTER TABLE image_info ADD COLUMN lat REAL")
+
+
+def write_rows(db_path, rows, generator, append=False, progress=False):
+    """
+    写入 rows 条合成记录
+
+    Args:
+        append (bool): True 时追加到已有数据库（经触发器维护预聚合表，并把数据版本号加1），
+                       False 时新建数据库（写完后执行表结构迁移，一次性回填预聚合表）
+    """
+    if not append and os.path.exists(db_path):
+        raise FileExistsError(f"数据库已存在: {db_path}（追加数据请使用 --append）")
+
+    connection = sqlite3.connect(db_path)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=OFF")
+        if append:
+            first_id = (connection.execute("SELECT MAX(id) FROM image_info").fetchone()[0] or 0) + 1
+        else:
+            create_image_info_table(connection)
+            first_id = 1
+
+        start = time.perf_counter()
+        written = 0
+        while written < rows:
+            n = min(CHUNK_SIZE, rows - written)
+            connection.executemany(INSERT_SQL, generator.chunk(n, first_id + written))
+            written += n
+            if append:
+                bump_data_version(connection)
+            connection.commit()
+            if progress:
+                rate = written / (time.perf_counter() - start)
+                print(f"\r  已写入 {written:,}/{rows:,} 条（{rate:,.0f} rows/sec）", end="", flush=True)
+        if progress:
+            print()
+    finally:
+        connection.close()
+
+    if not append:
+        prepare_image_info_db(db_path)
+
+
+def create_database(db_path, rows, species=60, sites=50, species_skew=1.1, site_skew=0.8, date_skew=2.0,
+                    start_date="20210101", end_date="20251231", seed=42, progress=False):
+    """新建包含 rows 条合成记录的 image_info 数据库，返回使用的生成器（可继续用于追加）"""
+    catalog = build_catalog(species=species, sites=sites, seed=seed)
+    generator = ImageInfoGenerator(catalog, species_skew, site_skew, date_skew, start_date, end_date, seed)
+    write_rows(db_path, rows, generator, progress=progress)
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="image_info 合成数据生成器")
+    parser.add_argument('--output', required=True, help="输出数据库路径（不能是已存在的文件，除非使用 --append）")
+    parser.add_argument('--rows', type=int, default=10000, help="生成的记录数")
+    parser.add_argument('--species', type=int, default=60, help="物种数")
+    parser.add_argument('--sites', type=int, default=50, help="监测点数")
+    parser.add_argument('--species-skew', type=float, default=1.1, help="物种 Zipf 指数，0为均匀分布")
+    parser.add_argument('--site-skew', type=float, default=0.8, help="监测点 Zipf 指数，0为均匀分布")
+    parser.add_argument('--date-skew', type=float, default=2.0, help="日期偏向近期的程度，0为均匀分布")
+    parser.add_argument('--start-date', default="20210101", help="最早日期 YYYYMMDD")
+    parser.add_argument('--end-date', default="20251231", help="最晚日期 YYYYMMDD")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--append', action='store_true', help="追加到已有数据库（经触发器维护预聚合表）")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    if os.path.dirname(output) == os.path.join(PROJECT_ROOT, 'Database') and \
+            os.path.basename(output) in ('image_info.db', 'protected_wildlife.db'):
+        parser.error("不能写入项目自带的数据库，请指定其他路径")
+
+    print("🧪 image_info 合成数据生成")
+    print("=" * 60)
+    start = time.perf_counter()
+    catalog = build_catalog(species=args.species, sites=args.sites, seed=args.seed)
+    generator = ImageInfoGenerator(catalog, args.species_skew, args.site_skew, args.date_skew,
+                                   args.start_date, args.end_date, args.seed)
+    print(f"📂 输出: {output}（{'追加' if args.append else '新建'}）")
+    print(f"🐾 物种 {len(catalog['species'])} 个，监测点 {len(catalog['sites'])} 个，"
+          f"日期 {args.start_date}~{args.end_date}")
+    write_rows(output, args.rows, generator, append=args.append, progress=True)
+    print(f"✅ 完成: {args.rows:,} 条记录，耗时 {time.perf_counter() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
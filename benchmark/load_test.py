@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+看板接口负载测试
+在合成数据（generate_image_info.py 生成）上分别启动各个Flask服务，用多个客户端回放混合的看板流量，
+报告每个接口的请求数、错误数、吞吐量和 p50/p95/p99 延迟。
+
+- realtime: 实时图表（动物/地点排行、季度序列、活动时间、列表接口）
+- map:      地图（地图数据、视野瓦片、地点详情、列表接口）
+- query:    SQL查询服务（按物种名查保护级别、按类别/级别统计等 Agent 常见查询）
+- insert:   插入服务（/exec-sql 写入合成记录，与看板读取同时进行时可观察写入对读取的影响）
+- heatmap:  热力图服务依赖MySQL，不自动启动；用 --target heatmap=http://127.0.0.1:5004 对已启动的服务测试
+
+请求参数按数据本身的分布抽样（记录多的物种被查询得更频繁），约一半请求不带动物筛选。
+测试在数据库的临时副本上进行，不会修改原数据库（--in-place 时直接使用 --db 指定的数据库）。
+
+使用方法：
+    python benchmark/load_test.py [--rows 100000 | --db /tmp/image_info_1m.db]
+        [--apps realtime,map,query,insert] [--clients 8] [--duration 10] [--think-ms 0]
+        [--target heatmap=http://127.0.0.1:5004]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCHMARK_DIR)
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCHMARK_DIR)  # 同目录的 generate_image_info 等模块，不依赖当前目录或启动方式
+
+from generate_image_info import build_catalog, create_database, ImageInfoGenerator
+
+# 应用名 -> (模块名, 就绪检查路径)
+APPS = {
+    'realtime': ('realtime_chart_app', '/api/pool-stats'),
+    'map': ('echarts_map_app', '/api/pool-stats'),
+    'query': ('mysql_query_app', '/worker-stats'),
+    'insert': ('mysql_insert_app', '/queue-stats'),
+    'heatmap': (None, '/api/sensor-locations'),
+}
+
+
+def serve(app_name, port):
+    """子进程：按环境变量中的配置启动服务"""
+    from werkzeug.serving import make_server
+    if app_name == 'map':
+        sys.path.append(os.path.join(PROJECT_ROOT, 'ECharts_map'))
+    module = __import__(APPS[app_name][0])
+    module.app.logger.disabled = True
+    server = make_server("127.0.0.1", port, module.app, threaded=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, path, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"{url}{path}", timeout=2).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"服务启动超时: {url}")
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+# ==================== 流量模型 ====================
+
+class TrafficModel:
+    """
+    从数据库读取请求参数的抽样分布，按权重生成各服务的请求
+
+    每个请求为 (接口名, 方法, 路径, 请求体)，接口名用于分组统计
+    """
+
+    def __init__(self, db_path, protected_db_path, seed=0):
+        self.rng = random.Random(seed)
+        connection = sqlite3.connect(db_path)
+        try:
+            rows = connection.execute(
+                "SELECT animal, SUM(total_count) FROM rollup_animal_date GROUP BY animal").fetchall()
+            self.animals = [row[0] for row in rows]
+            self.animal_weights = [row[1] or 1 for row in rows]
+            self.behaviors = {}
+            for animal, behavior in connection.execute(
+                    "SELECT DISTINCT animal, behavior FROM rollup_animal_behavior_hour WHERE behavior IS NOT NULL"):
+                self.behaviors.setdefault(animal, []).append(behavior)
+            self.locations = [row[0] for row in connection.execute(
+                "SELECT DISTINCT location FROM rollup_animal_location WHERE location IS NOT NULL")]
+            # 坐标点（监测点位置）：只读 (lon, lat) 索引
+            self.points = connection.execute(
+                "SELECT DISTINCT lon, lat FROM image_info WHERE lon IS NOT NULL LIMIT 1000").fetchall()
+        finally:
+            connection.close()
+
+        connection = sqlite3.connect(protected_db_path)
+        try:
+            self.species = [row[0] for row in connection.execute(
+                "SELECT species_name FROM protected_species WHERE species_name IS NOT NULL AND species_name NOT LIKE '%''%'")]
+            self.classes = [row[0] for row in connection.execute(
+                "SELECT DISTINCT class FROM protected_species WHERE class IS NOT NULL AND class NOT LIKE '%''%'")]
+        finally:
+            connection.close()
+
+        self.insert_generator = ImageInfoGenerator(build_catalog(seed=seed), seed=seed)
+        self._insert_id = 10 ** 9 + seed * 10 ** 7  # 插入记录的 image_id 与已有数据不重复
+
+    # ---------- 参数抽样 ----------
+
+    def animal(self):
+        return self.rng.choices(self.animals, weights=self.animal_weights)[0] if self.animals else 'all'
+
+    def animal_or_all(self):
+        return 'all' if self.rng.random() < 0.5 else self.animal()
+
+    def point(self):
+        return self.rng.choice(self.points) if self.points else (103.1, 31.0)
+
+    def viewport(self):
+        """以某个记录点为中心、随机缩放级别的视野范围"""
+        lon, lat = self.point()
+        half_width = self.rng.choice([0.05, 0.2, 1.0, 4.0])
+        return f"{lon - half_width:.4f},{lat - half_width / 2:.4f},{lon + half_width:.4f},{lat + half_width / 2:.4f}"
+
+    # ---------- 各服务的请求 ----------
+
+    def realtime(self):
+        animal = self.animal_or_all()
+        behaviors = self.behaviors.get(animal)
+        behavior = self.rng.choice(behaviors) if behaviors and self.rng.random() < 0.3 else 'all'
+        return self.rng.choices([
+            ('/api/animal-list', 'GET', '/api/animal-list', None),
+            ('/api/behavior-list', 'GET', f'/api/behavior-list?animal={quote(animal)}', None),
+            ('/api/chart-data', 'GET', '/api/chart-data', None),
+            ('/api/chart-data?days', 'GET', f'/api/chart-data?days={self.rng.choice([7, 30, 365])}', None),
+            ('/api/timeseries-data', 'GET', f'/api/timeseries-data?animal={quote(animal)}', None),
+            ('/api/location-data', 'GET', f'/api/location-data?animal={quote(animal)}', None),
+            ('/api/activity-data', 'GET', f'/api/activity-data?animal={quote(animal)}&behavior={quote(behavior)}', None),
+        ], weights=[1, 1, 3, 2, 3, 3, 3])[0]
+
+    def map(self):
+        animal = self.animal_or_all()
+        lon, lat = self.point()
+        location = self.rng.choice(self.locations) if self.locations else ''
+        return self.rng.choices([
+            ('/api/animal-list', 'GET', '/api/animal-list', None),
+            ('/api/location-list', 'GET', '/api/location-list', None),
+            ('/api/map-data', 'GET', f'/api/map-data?animal_type={quote(animal)}', None),
+            ('/api/map-tiles', 'GET', f'/api/map-tiles?bbox={self.viewport()}&animal_type={quote(animal)}', None),
+            ('/api/location-detail?coord', 'GET', f'/api/location-detail?longitude={lon}&latitude={lat}&limit=20', None),
+            ('/api/location-detail?location', 'GET',
+             f'/api/location-detail?location={quote(location)}&animal_type={quote(animal)}&limit=20', None),
+        ], weights=[1, 1, 2, 4, 2, 1])[0]
+
+    def query(self):
+        species = self.rng.choice(self.species)
+        klass = self.rng.choice(self.classes)
+        queries = [
+            ('按物种查保护级别', f"SELECT species_name, protection_level FROM protected_species WHERE species_name = '{species}'"),
+            ('按级别统计', "SELECT protection_level, COUNT(*) AS n FROM protected_species GROUP BY protection_level"),
+            ('按纲列出物种', f"SELECT species_name, order_name, family FROM protected_species WHERE class = '{klass}' LIMIT 50"),
+            ('模糊匹配物种', f"SELECT species_name, protection_level FROM protected_species WHERE species_name LIKE '%{species[-1]}%'"),
+        ]
+        name, sql = self.rng.choices(queries, weights=[6, 1, 2, 1])[0]
+        return (f'/query-sql {name}', 'POST', '/query-sql', {'query': sql})
+
+    def insert(self):
+        self._insert_id += 1
+        record = self.insert_generator.records(1, self._insert_id)[0]
+        return ('/exec-sql', 'POST', '/exec-sql', {'data': record})
+
+    def heatmap(self):
+        lon, lat = self.point()
+        return self.rng.choices([
+            ('/api/heatmap-data', 'GET', '/api/heatmap-data', None),
+            ('/api/sensor-locations', 'GET', '/api/sensor-locations', None),
+            ('/api/animal-stats', 'GET', '/api/animal-stats', None),
+            ('/api/point-details', 'GET', f'/api/point-details?lat={lat}&lng={lon}', None),
+            ('/api/heatmap-by-animal', 'GET', f'/api/heatmap-by-animal/{quote(self.animal())}', None),
+        ], weights=[2, 1, 1, 2, 2])[0]
+
+
+def quote(value):
+    return urllib.parse.quote(str(value), safe='')
+
+
+# ==================== 回放 ====================
+
+def send(url, method, path, body):
+    """发送一个请求，返回响应体字节数；HTTP错误或 status=error 时抛出异常"""
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = urllib.request.Request(f"{url}{path}", data=data, method=method,
+                                 headers={'Content-Type': 'application/json'} if data else {})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        payload = resp.read()
+    if payload[:1] == b'{' and b'"status"' in payload[:200]:
+        if json.loads(payload).get('status') == 'error':
+            raise RuntimeError(json.loads(payload).get('message'))
+    return len(payload)
+
+
+def replay(url, make_request, clients, duration, think_ms):
+    """clients 个线程持续发送请求 duration 秒，返回 ({接口名: 延迟列表}, {接口名: 错误数}, {接口名: 响应字节数}, 实际时长)"""
+    latencies, errors, sizes = {}, {}, {}
+    error_examples = {}
+    lock = threading.Lock()
+    request_lock = threading.Lock()  # 流量模型的随机数生成器不是线程安全的
+    deadline = time.monotonic() + duration
+
+    def client():
+        while time.monotonic() < deadline:
+            with request_lock:
+                name, method, path, body = make_request()
+            start = time.perf_counter()
+            try:
+                size = send(url, method, path, body)
+            except (urllib.error.URLError, OSError, RuntimeError, ValueError) as e:
+                with lock:
+                    errors[name] = errors.get(name, 0) + 1
+                    error_examples.setdefault(name, str(e)[:200])
+            else:
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.setdefault(name, []).append(elapsed)
+                    sizes[name] = sizes.get(name, 0) + size
+            if think_ms:
+                time.sleep(think_ms / 1000)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors, sizes, time.perf_counter() - start, error_examples
+
+
+def report(app_name, latencies, errors, sizes, elapsed, error_examples):
+    """按接口打印请求数、错误数、吞吐量、平均响应大小和延迟分位数"""
+    names = sorted(set(latencies) | set(errors))
+    total = sum(len(v) for v in latencies.values())
+    total_errors = sum(errors.values())
+    print(f"\n📊 {app_name}: {total} 个成功请求, {total_errors} 个错误, 吞吐量 {total / elapsed:.1f} req/s")
+    print(f"  {'接口':<40}{'请求数':>8}{'错误':>6}{'req/s':>9}{'平均KB':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    all_latencies = []
+    for name in names:
+        values = sorted(latencies.get(name, []))
+        all_latencies += values
+        avg_kb = sizes.get(name, 0) / len(values) / 1024 if values else 0
+        print(f"  {name:<40}{len(values):>8}{errors.get(name, 0):>6}{len(values) / elapsed:>9.1f}{avg_kb:>9.1f}"
+              f"{percentile(values, 0.50) * 1000:>10.2f}{percentile(values, 0.95) * 1000:>10.2f}"
+              f"{percentile(values, 0.99) * 1000:>10.2f}")
+    all_latencies.sort()
+    print(f"  {'合计':<40}{total:>8}{total_errors:>6}{total / elapsed:>9.1f}{'':>9}"
+          f"{percentile(all_latencies, 0.50) * 1000:>10.2f}{percentile(all_latencies, 0.95) * 1000:>10.2f}"
+          f"{percentile(all_latencies, 0.99) * 1000:>10.2f}")
+    for name, message in error_examples.items():
+        print(f"  ⚠️ {name}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="看板接口负载测试")
+    parser.add_argument('--db', help="image_info 数据库（默认用合成数据生成器新建）")
+    parser.add_argument('--rows', type=int, default=100000, help="未指定 --db 时生成的记录数")
+    parser.add_argument('--in-place', action='store_true', help="直接使用 --db 指定的数据库，不复制（insert 会写入该数据库）")
+    parser.add_argument('--apps', default="realtime,map,query,insert", help="要测试的服务，逗号分隔")
+    parser.add_argument('--target', action='append', default=[],
+                        help="对已启动的服务测试，格式 应用名=URL（如 heatmap=http://127.0.0.1:5004），可重复")
+    parser.add_argument('--clients', type=int, default=8, help="并发客户端数")
+    parser.add_argument('--duration', type=float, default=10.0, help="每个服务的测试时长（秒）")
+    parser.add_argument('--think-ms', type=float, default=0, help="每个客户端两次请求之间的间隔（毫秒）")
+    parser.add_argument('--seed', type=int, default=0, help="流量抽样的随机种子")
+    parser.add_argument('--serve', nargs=2, metavar=('APP', 'PORT'), help=argparse.SUPPRESS)  # 内部使用：以子进程方式启动服务
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve[0], int(args.serve[1]))
+        return
+
+    targets = dict(item.split('=', 1) for item in args.target)
+    apps = [app for app in args.apps.split(',') if app] + [app for app in targets if app not in args.apps.split(',')]
+    unknown = [app for app in apps if app not in APPS]
+    if unknown:
+        parser.error(f"未知的服务: {', '.join(unknown)}（可选 {', '.join(APPS)}）")
+
+    temp_dir = tempfile.mkdtemp(prefix="load_test_")
+    db_path = os.path.join(temp_dir, 'image_info.db')
+    protected_db_path = os.path.join(temp_dir, 'protected_wildlife.db')
+    shutil.copy(os.path.join(PROJECT_ROOT, 'Database', 'protected_wildlife.db'), protected_db_path)
+
+    print("🚀 看板接口负载测试")
+    print("=" * 100)
+    try:
+        if args.db and args.in_place:
+            db_path = os.path.abspath(args.db)
+        elif args.db:
+            print(f"📂 复制数据库: {args.db}")
+            shutil.copy(args.db, db_path)
+        else:
+            start = time.perf_counter()
+            create_database(db_path, args.rows)
+            print(f"📂 生成合成数据: {args.rows:,} 条记录（{time.perf_counter() - start:.1f} 秒）")
+        print(f"📂 数据库: {db_path}，每个服务 {args.duration} 秒，{args.clients} 个客户端，间隔 {args.think_ms} ms")
+
+        traffic = TrafficModel(db_path, protected_db_path, seed=args.seed)
+        env = dict(os.environ, IMAGE_INFO_DB_PATH=db_path, PROTECTED_DB_PATH=protected_db_path,
+                   QUERY_DB_PATH=protected_db_path,
+                   INSERT_QUEUE_JOURNAL=os.path.join(temp_dir, 'insert_queue.jsonl'))
+
+        for app_name in apps:
+            server = None
+            url = targets.get(app_name)
+            if url is None:
+                if APPS[app_name][0] is None:
+                    print(f"\n⏭️ {app_name}: 需要外部服务，请用 --target {app_name}=URL 指定")
+                    continue
+                port = free_port()
+                server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", app_name, str(port)],
+                                          cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                url = f"http://127.0.0.1:{port}"
+            try:
+                try:
+                    wait_ready(url, APPS[app_name][1], timeout=60.0 if server else 5.0)
+                except RuntimeError as e:
+                    print(f"\n⚠️ {app_name}: {e}")
+                    continue
+                make_request = getattr(traffic, app_name)
+                # 预热：建立连接池、加载索引
+                for _ in range(args.clients * 2):
+                    try:
+                        send(url, *make_request()[1:])
+                    except Exception:
+                        pass
+                report(app_name, *replay(url, make_request, args.clients, args.duration, args.think_ms))
+            finally:
+                if server is not None:
+                    server.terminate()
+                    server.wait()
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
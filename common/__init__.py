@@ -0,0 +1 @@
+# common - 各子系统（ECharts_map、realtime_chart、mysql_insert、mysql_query）共用的数据库工具
@@ -0,0 +1,399 @@
+# columnar_snapshot.py - image_info列式内存快照
+"""
+实时图表只用到image_info的几列：animal、location、date、time、behavior、count、confidence、percentage。
+这里把这几列读入内存，保存为紧凑的NumPy列数组，图表聚合直接在内存中做向量化分组汇总：
+
+- 字符串列（animal、location、date、time、behavior）做字典编码：每行只保存int32编码，
+  字典（编码 -> 原值）只增不减，已有编码永不改变
+- count 为int32（NULL记为0，与预聚合表的 IFNULL(count, 0) 一致），
+  confidence/percentage 为float32（NULL记为0）加一列uint8非空标记，求平均值时忽略NULL
+- 由字典派生的查找表：date -> 年份/季度分组，time -> 小时（用SQLite的 strftime 计算，与预聚合表一致）
+- 分组汇总用 np.bincount 按编码累加；季度和小时先按 date/time 编码汇总（分组数很少），
+  再用查找表合并到季度/小时，不需要为每行计算派生值
+
+增量刷新：
+- 数据版本号（data_version）变化时，只读取 id 大于快照最大id的新记录，追加到按容量倍增的列缓冲区中
+- 读取新记录的同一个读事务中核对预聚合表的总行数和 count 总和，
+  不一致（有记录被删除或修改）时全量重新加载
+- 只修改字符串字段、总数不变的更新无法由总数发现，每隔 full_reload_interval 秒全量重新加载一次
+
+查询只读取发布时的行数范围内的数据，追加新记录不影响正在进行的查询。
+"""
+
+import json
+import threading
+import time
+
+import numpy as np
+
+from common.image_info_schema import read_data_version
+
+TABLE_NAME = "image_info"
+STRING_COLUMNS = ('animal', 'location', 'date', 'time', 'behavior')
+DEFAULT_CHUNK_SIZE = 100000            # 每次从数据库读取的行数
+DEFAULT_FULL_RELOAD_INTERVAL = 600.0   # 定期全量重新加载的间隔（秒），0表示不定期重新加载
+INITIAL_CAPACITY = 1024
+QUARTER_LABELS = {'01': '1季度', '02': '1季度', '03': '1季度',
+                  '04': '2季度', '05': '2季度', '06': '2季度',
+                  '07': '3季度', '08': '3季度', '09': '3季度',
+                  '10': '4季度', '11': '4季度', '12': '4季度'}
+
+
+def quarter_of(date):
+    """与预聚合表 rollup_animal_quarter 相同的年份和季度划分，date 为空时返回None"""
+    if date is None or date == '':
+        return None
+    date = str(date)
+    return date[:4], QUARTER_LABELS.get(date[4:6], '未知')
+
+
+class _Dictionary:
+    """字符串列的字典编码（只增不减）"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, values):
+        """把一批原值编码为int32数组，新出现的值追加到字典末尾"""
+        codes, dictionary = self.codes, self.values
+
+        def code_of(value):
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(dictionary)
+                dictionary.append(value)
+            return code
+
+        return np.fromiter(map(code_of, values), dtype=np.int32, count=len(values))
+
+
+class _State:
+    """一次发布的快照：行数范围内的列视图、字典副本和派生查找表（发布后不再修改）"""
+
+    def __init__(self, rows, columns, dictionaries, hour_lut, period_lut, periods, max_id, data_version):
+        self.rows = rows
+        self.columns = columns            # 列名 -> 长度为 rows 的数组视图
+        self.dictionaries = dictionaries  # 列名 -> (原值元组, 原值 -> 编码)
+        self.hour_lut = hour_lut          # time编码 -> 小时（0-23，无法解析为-1）
+        self.period_lut = period_lut      # date编码 -> 季度分组编码（date为空为-1）
+        self.periods = periods            # 季度分组编码 -> (年份, 季度)
+        self.max_id = max_id
+        self.data_version = data_version
+
+
+class ColumnarSnapshot:
+    """
+    image_info列式内存快照
+
+    Args:
+        db_path (str): 数据库路径（仅用于指标展示）
+        connect (callable): 返回数据库连接的函数，连接用完后调用 close()
+        version_getter (callable): 返回当前数据版本号的函数，版本号变化时增量刷新
+        chunk_size (int): 每次从数据库读取的行数
+        full_reload_interval (float): 定期全量重新加载的间隔（秒）
+    """
+
+    def __init__(self, db_path, connect, version_getter, chunk_size=DEFAULT_CHUNK_SIZE,
+                 full_reload_interval=DEFAULT_FULL_RELOAD_INTERVAL):
+        self.db_path = db_path
+        self.connect = connect
+        self.version_getter = version_getter
+        self.chunk_size = chunk_size
+        self.full_reload_interval = full_reload_interval
+
+        self._refresh_lock = threading.Lock()
+        self._state = None
+        self._reset()
+
+        self._full_loads = 0
+        self._incremental_refreshes = 0
+        self._rows_appended = 0
+        self._last_refresh_time = 0.0
+        self._last_full_load_time = 0.0
+        self._loaded_at = None
+
+    def _reset(self):
+        """清空列缓冲区和字典（全量重新加载前调用）"""
+        self._rows = 0
+        self._max_id = 0
+        self._count_total = 0
+        self._buffers = {
+            **{name: np.empty(INITIAL_CAPACITY, dtype=np.int32) for name in STRING_COLUMNS},
+            'count': np.empty(INITIAL_CAPACITY, dtype=np.int32),
+            'confidence': np.empty(INITIAL_CAPACITY, dtype=np.float32),
+            'confidence_n': np.empty(INITIAL_CAPACITY, dtype=np.uint8),
+            'percentage': np.empty(INITIAL_CAPACITY, dtype=np.float32),
+            'percentage_n': np.empty(INITIAL_CAPACITY, dtype=np.uint8),
+        }
+        self._dictionaries = {name: _Dictionary() for name in STRING_COLUMNS}
+        self._hours = []       # time编码 -> 小时
+        self._period_of = []   # date编码 -> 季度分组编码
+        self._periods = _Dictionary()
+
+    # ==================== 加载和刷新 ====================
+
+    def _append(self, rows):
+        """把一批 (id, animal, location, date, time, behavior, count, confidence, percentage) 追加到列缓冲区"""
+        n = len(rows)
+        start, end = self._rows, self._rows + n
+        capacity = len(self._buffers['count'])
+        if end > capacity:
+            # 容量倍增：已发布的旧缓冲区保持不变，正在进行的查询不受影响
+            capacity = max(end, capacity * 2)
+            for name, buffer in self._buffers.items():
+                grown = np.empty(capacity, dtype=buffer.dtype)
+                grown[:start] = buffer[:start]
+                self._buffers[name] = grown
+
+        columns = list(zip(*rows))
+        for offset, name in enumerate(STRING_COLUMNS, start=1):
+            self._buffers[name][start:end] = self._dictionaries[name].encode(columns[offset])
+        # NULL 转换为 0，置信度/占比另记非空标记
+        counts = np.fromiter((value or 0 for value in columns[6]), dtype=np.int32, count=n)
+        self._buffers['count'][start:end] = counts
+        for offset, name in ((7, 'confidence'), (8, 'percentage')):
+            values = np.array(columns[offset], dtype=np.float64)
+            not_null = ~np.isnan(values)
+            self._buffers[name][start:end] = np.where(not_null, values, 0)
+            self._buffers[name + '_n'][start:end] = not_null
+        self._rows = end
+        self._max_id = rows[-1][0]
+        self._count_total += int(counts.sum(dtype=np.int64))
+
+    def _update_luts(self, connection):
+        """为新出现的 time/date 字典值计算小时和季度分组"""
+        times = self._dictionaries['time'].values[len(self._hours):]
+        if times:
+            # 小时用SQLite的时间函数解析，与预聚合表 rollup_animal_behavior_hour 的结果完全一致
+            hours = dict(connection.execute(
+                "SELECT key, CAST(strftime('%H', value) AS INTEGER) FROM json_each(?)",
+                (json.dumps(times, ensure_ascii=False),)).fetchall())
+            self._hours.extend(-1 if hours.get(i) is None else hours[i] for i in range(len(times)))
+        dates = self._dictionaries['date'].values[len(self._period_of):]
+        for date in dates:
+            period = quarter_of(date)
+            self._period_of.append(-1 if period is None else int(self._periods.encode([period])[0]))
+
+    def _publish(self, data_version):
+        """发布当前行数范围内的快照"""
+        rows = self._rows
+        self._state = _State(
+            rows=rows,
+            columns={name: buffer[:rows] for name, buffer in self._buffers.items()},
+            dictionaries={name: (tuple(d.values), dict(d.codes)) for name, d in self._dictionaries.items()},
+            hour_lut=np.array(self._hours, dtype=np.int16),
+            period_lut=np.array(self._period_of, dtype=np.int32),
+            periods=tuple(self._periods.values),
+            max_id=self._max_id,
+            data_version=data_version,
+        )
+
+    def refresh(self, full=False):
+        """
+        从数据库读取新记录并发布新快照
+
+        Args:
+            full (bool): 是否全量重新加载
+
+        Returns:
+            int: 本次追加的记录数（全量加载时为总记录数）
+        """
+        with self._refresh_lock:
+            start = time.perf_counter()
+            if self._state is None or (self.full_reload_interval and self._loaded_at
+                                       and time.time() - self._loaded_at > self.full_reload_interval):
+                full = True
+            if full:
+                self._reset()
+            appended = self._read_new_rows()
+            if appended is None:
+                # 数据库中有记录被删除或修改，全量重新加载
+                self._reset()
+                full = True
+                appended = self._read_new_rows()
+
+            elapsed = time.perf_counter() - start
+            self._last_refresh_time = elapsed
+            if full:
+                self._full_loads += 1
+                self._last_full_load_time = elapsed
+                self._loaded_at = time.time()
+            else:
+                self._incremental_refreshes += 1
+                self._rows_appended += appended
+            return appended
+
+    def _read_new_rows(self):
+        """在同一个读事务中读取新记录并核对总数；总数不一致时返回None（调用方应全量重新加载）"""
+        connection = self.connect()
+        try:
+            connection.execute("BEGIN")  # 读事务：新记录、总数和版本号来自同一个数据库快照
+            data_version = read_data_version(connection)
+            appended = 0
+            while True:
+                rows = connection.execute(f"""
+                    SELECT id, animal, location, date, time, behavior, count, confidence, percentage
+                    FROM {TABLE_NAME} WHERE id > ? ORDER BY id LIMIT ?""",
+                    (self._max_id, self.chunk_size)).fetchall()
+                if not rows:
+                    break
+                self._append(rows)
+                appended += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+            self._update_luts(connection)
+
+            expected_rows, expected_count = connection.execute(
+                "SELECT IFNULL(SUM(row_count), 0), IFNULL(SUM(total_count), 0) FROM rollup_animal_date").fetchone()
+            if expected_rows != self._rows or expected_count != self._count_total:
+                return None
+            self._publish(data_version)
+            return appended
+        finally:
+            connection.close()
+
+    def ensure_fresh(self):
+        """数据版本号变化（或从未加载）时刷新，返回当前快照"""
+        state = self._state
+        if state is None or self.version_getter() != state.data_version or (
+                self.full_reload_interval and time.time() - self._loaded_at > self.full_reload_interval):
+            self.refresh()
+        return self._state
+
+    # ==================== 向量化聚合 ====================
+
+    @staticmethod
+    def _mask(state, filters):
+        """按 {列名: 值} 的等值条件计算行掩码；没有条件时返回None，值不存在时返回全False"""
+        mask = None
+        for name, value in (filters or {}).items():
+            code = state.dictionaries[name][1].get(value)
+            if code is None:
+                return np.zeros(state.rows, dtype=bool)
+            column_mask = state.columns[name] == code
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def top_counts(self, by, filters=None, date_from=None, limit=10):
+        """
+        按 by 列分组汇总 count，返回总数最大的 limit 组
+
+        Args:
+            by (str): 分组列（animal、location等字符串列）
+            filters (dict, optional): 等值筛选条件 {列名: 值}
+            date_from (str, optional): 只统计 date >= date_from 的记录（文本比较，与SQL一致）
+
+        Returns:
+            list: [(分组值, count总和)]，按总数降序
+        """
+        state = self.ensure_fresh()
+        mask = self._mask(state, filters)
+        if date_from is not None:
+            # 先在字典上比较，再按编码查表
+            date_values = state.dictionaries['date'][0]
+            date_ok = np.fromiter((d is not None and str(d) >= date_from for d in date_values),
+                                  dtype=bool, count=len(date_values))
+            date_mask = date_ok[state.columns['date']] if len(date_values) else np.zeros(state.rows, dtype=bool)
+            mask = date_mask if mask is None else mask & date_mask
+
+        codes, counts = state.columns[by], state.columns['count']
+        if mask is not None:
+            codes, counts = codes[mask], counts[mask]
+        values = state.dictionaries[by][0]
+        totals = np.bincount(codes, weights=counts, minlength=len(values))
+        present = np.bincount(codes, minlength=len(values)) > 0
+        groups = np.flatnonzero(present)
+        order = groups[np.argsort(-totals[groups], kind='stable')][:limit]
+        return [(values[code], int(totals[code])) for code in order]
+
+    def quarter_series(self, filters=None, limit=20):
+        """
+        按季度汇总 count 以及 confidence/percentage 的平均值（忽略NULL），只统计 date 非空的记录
+
+        Returns:
+            list: [(年份, 季度, count总和, 平均置信度或None, 平均占比或None)]，按年份、季度降序
+        """
+        state = self.ensure_fresh()
+        if not state.periods:
+            return []
+        mask = self._mask(state, filters)
+        columns = state.columns if mask is None else {
+            name: state.columns[name][mask] for name in ('date', 'count', 'confidence', 'confidence_n',
+                                                         'percentage', 'percentage_n')}
+
+        # 先按 date 编码汇总，再把各日期合并到所属季度（date为空的日期不参与）
+        dates = columns['date']
+        date_size = len(state.period_lut)
+        valid = state.period_lut >= 0
+        period_of = state.period_lut[valid]
+        period_size = len(state.periods)
+
+        def by_period(weights=None):
+            by_date = np.bincount(dates, weights=weights, minlength=date_size)
+            return np.bincount(period_of, weights=by_date[valid], minlength=period_size)
+
+        row_count = by_period()
+        totals = by_period(columns['count'])
+        averages = [(by_period(columns[name]), by_period(columns[name + '_n']))
+                    for name in ('confidence', 'percentage')]
+
+        groups = sorted(np.flatnonzero(row_count > 0), key=lambda code: state.periods[code], reverse=True)[:limit]
+        result = []
+        for code in groups:
+            year, quarter = state.periods[code]
+            avg = [float(sums[code] / n[code]) if n[code] else None for sums, n in averages]
+            result.append((year, quarter, int(totals[code]), avg[0], avg[1]))
+        return result
+
+    def hourly_counts(self, filters=None):
+        """
+        按小时汇总 count（只统计 time 可以解析出小时的记录）
+
+        Returns:
+            dict: 小时(0-23) -> count总和
+        """
+        state = self.ensure_fresh()
+        mask = self._mask(state, filters)
+        times, counts = state.columns['time'], state.columns['count']
+        if mask is not None:
+            times, counts = times[mask], counts[mask]
+        # 先按 time 编码汇总，再把各时间合并到所属小时
+        by_time = np.bincount(times, weights=counts, minlength=len(state.hour_lut))
+        valid = (state.hour_lut >= 0) & (state.hour_lut < 24)
+        totals = np.bincount(state.hour_lut[valid], weights=by_time[valid], minlength=24)
+        return {hour: int(totals[hour]) for hour in range(24)}
+
+    def distinct_values(self, column, filters=None):
+        """列中出现过的不重复值（去掉NULL和空字符串，排序）"""
+        state = self.ensure_fresh()
+        mask = self._mask(state, filters)
+        codes = state.columns[column] if mask is None else state.columns[column][mask]
+        values = state.dictionaries[column][0]
+        present = np.flatnonzero(np.bincount(codes, minlength=len(values)))
+        return sorted(values[code] for code in present if values[code] not in (None, ''))
+
+    # ==================== 指标 ====================
+
+    def stats(self):
+        """
+        获取快照指标
+
+        Returns:
+            dict: 行数、最大id、各字典大小、内存占用、加载/刷新次数和耗时
+        """
+        state = self._state
+        return {
+            'db_path': self.db_path,
+            'rows': state.rows if state else 0,
+            'max_id': state.max_id if state else 0,
+            'data_version': state.data_version if state else None,
+            'dictionary_sizes': {name: len(d[0]) for name, d in state.dictionaries.items()} if state else {},
+            'memory_bytes': sum(buffer.nbytes for buffer in self._buffers.values()),
+            'full_loads': self._full_loads,
+            'incremental_refreshes': self._incremental_refreshes,
+            'rows_appended': self._rows_appended,
+            'last_refresh_ms': round(self._last_refresh_time * 1000, 3),
+            'last_full_load_ms': round(self._last_full_load_time * 1000, 3),
+            'loaded_at': self._loaded_at,
+        }
@@ -0,0 +1,52 @@
+# coordinates.py - 经纬度解析
+"""
+数据库中 longitude/latitude 字段为带方向前缀的文本（如 E103.10、N31.02），
+这里统一转换为带符号的浮点数：东经/北纬为正，西经/南纬为负。
+"""
+
+import math
+
+
+def parse_coordinate(value, positive_prefix, negative_prefix):
+    """
+    解析带方向前缀的坐标文本
+
+    Args:
+        value: 坐标值，如 "E103.10"、"W70.5"、"31.02" 或数字
+        positive_prefix (str): 正方向前缀（'E' 或 'N'）
+        negative_prefix (str): 负方向前缀（'W' 或 'S'）
+
+    Returns:
+        float: 带符号的坐标值，无法解析时返回 None
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+
+    text = str(value).strip().upper()
+    if not text:
+        return None
+
+    sign = 1.0
+    if text[0] == positive_prefix:
+        text = text[1:]
+    elif text[0] == negative_prefix:
+        sign = -1.0
+        text = text[1:]
+
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return sign * number if math.isfinite(number) else None
+
+
+def parse_longitude(value):
+    """解析经度：E为正，W为负"""
+    return parse_coordinate(value, 'E', 'W')
+
+
+def parse_latitude(value):
+    """解析纬度：N为正，S为负"""
+    return parse_coordinate(value, 'N', 'S')
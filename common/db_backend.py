@@ -0,0 +1,590 @@
+# db_backend.py - 可切换SQLite/MySQL的统一数据访问层
+"""
+各子系统原来各有一份 mysql/ 目录下的MySQL版本（每次调用新建 pymysql 连接），性能修复要做两遍且逐渐走样。
+这里把数据库差异收拢到一处，数据函数只写一份，由各子系统 db_config.py 中的 DB_BACKEND 选择后端
+（默认值为部署时的环境变量 DB_BACKEND，只在本模块读取一次：CONFIGURED_BACKEND）：
+
+- SQLiteBackend: 只读连接来自 common/sqlite_pool.py 的连接池；写入复用一个读写连接（size=1 的读写连接池）；
+  image_info 数据库提供预聚合表和数据版本号（响应缓存据此失效）。表结构迁移不在请求中执行：
+  部署时运行 Database_analysis/migrate_image_info.py，或由各服务启动时调用 migrate_at_startup()；
+  只读连接池建池时只做只读检查，未迁移的数据库（如启动迁移失败）不使用预聚合表并打印提示
+- MySQLBackend: 连接来自 common/mysql_pool.py 的连接池（健康检查、预处理语句）；
+  驱动可选 pymysql、mysql.connector 或本地SQLite替身 shim（common/mysql_shim.py）；
+  没有预聚合表和数据版本号，图表直接在 image_info 上聚合，响应缓存只按TTL失效；
+  表结构迁移（lon/lat 列、覆盖索引）同样是部署步骤：migrate_image_info.py --mysql 调用 migrate()，连接时不执行
+
+两种后端借出的连接接口一致（与 sqlite3 相同）：cursor()/execute()/executemany() 使用 ? 占位符，
+close() 时归还连接池；游标均为计时游标，SQL耗时计入 /metrics。
+MySQL驱动的异常统一包装为 DatabaseError（errno 为驱动的错误码），调用方用 DB_ERRORS 捕获两种后端的数据库错误。
+
+方言差异（SQLiteDialect / MySQLDialect）：
+- 占位符 ? → %s（并把SQL中的 % 转义为 %%）
+- hour_of(): 由 HH:MM 文本取小时；least(): 两数取小；floor_int(): 向下取整
+- with_time_budget(): MySQL用 MAX_EXECUTION_TIME 优化器提示限制SELECT耗时（SQLite用进度回调，见 mysql_query/sql_query.py）
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from common.sqlite_pool import get_pool
+from common.mysql_pool import get_mysql_pool
+from common.image_info_schema import (
+    prepare_image_info_db, check_image_info_schema, ensure_mysql_image_info_schema,
+    read_data_version, bump_data_version
+)
+
+SQLITE = "sqlite"
+MYSQL = "mysql"
+BACKENDS = (SQLITE, MYSQL)
+
+# 部署时用环境变量 DB_BACKEND 选择的后端，各子系统 db_config.py 的 DB_BACKEND 以此为初始值（查询服务的工作进程同样读取）；
+# db_config.use_backend() 只在基准测试中切换当前进程的模块变量，不改变这里的值
+CONFIGURED_BACKEND = os.environ.get("DB_BACKEND", SQLITE).lower()
+
+# MySQL连接配置（可用环境变量覆盖）
+MYSQL_HOST = os.environ.get("MYSQL_HOST", "localhost")
+MYSQL_USER = os.environ.get("MYSQL_USER", "root")
+MYSQL_PASSWORD = os.environ.get("MYSQL_PASSWORD", "123456")
+MYSQL_DATABASE = os.environ.get("MYSQL_DATABASE", "dify_test")
+MYSQL_PORT = int(os.environ.get("MYSQL_PORT", "3306"))
+MYSQL_CHARSET = os.environ.get("MYSQL_CHARSET", "utf8mb4")
+
+# MySQL驱动：
+# - "pymysql":         原 mysql/ 目录各版本使用的驱动（默认）
+# - "mysql.connector": 支持服务端预处理语句
+# - "shim":            本地SQLite替身，数据库为子系统配置的SQLite文件，用于没有MySQL服务器时运行和压测
+#                      （替身会给 image_info 加列，须用 IMAGE_INFO_DB_PATH 指向数据库副本，不能是仓库 Database/ 中的数据库）
+MYSQL_DRIVER = os.environ.get("MYSQL_DRIVER", "pymysql")
+MYSQL_POOL_SIZE = int(os.environ.get("MYSQL_POOL_SIZE", "8"))                           # 最大连接数
+MYSQL_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("MYSQL_POOL_ACQUIRE_TIMEOUT", "5"))   # 连接池耗尽时的最长等待时间（秒）
+MYSQL_POOL_HEALTH_CHECK = float(os.environ.get("MYSQL_POOL_HEALTH_CHECK", "30"))        # 空闲超过该时间（秒）的连接借出前先 ping
+MYSQL_SHIM_CONNECT_DELAY = float(os.environ.get("MYSQL_SHIM_CONNECT_DELAY_MS", "0")) / 1000  # 替身模拟的建连耗时（秒）
+
+WRITER_ACQUIRE_TIMEOUT = 30.0  # SQLite写连接被占用时的最长等待时间（秒），写入按借出顺序串行执行
+
+
+def get_mysql_config():
+    """
+    获取MySQL连接配置
+    """
+    return {
+        "host": MYSQL_HOST,
+        "user": MYSQL_USER,
+        "password": MYSQL_PASSWORD,
+        "database": MYSQL_DATABASE,
+        "port": MYSQL_PORT,
+        "charset": MYSQL_CHARSET
+    }
+
+
+MYSQL_QUERY_TIMEOUT = 3024  # ER_QUERY_TIMEOUT：超过 MAX_EXECUTION_TIME 被服务端中断
+
+
+class DatabaseError(Exception):
+    """
+    MySQL驱动抛出的数据库错误（message 为驱动的原始错误信息）
+
+    Args:
+        message (str): 错误信息
+        errno (int, optional): 驱动的错误码（mysql.connector 的 errno、pymysql 的 args[0]），没有时为None
+    """
+
+    def __init__(self, message, errno=None):
+        super().__init__(message)
+        self.errno = errno
+
+    @classmethod
+    def from_driver(cls, e):
+        """包装驱动异常，保留错误码"""
+        errno = getattr(e, 'errno', None)
+        if not isinstance(errno, int) and e.args and isinstance(e.args[0], int):
+            errno = e.args[0]
+        return cls(str(e), errno if isinstance(errno, int) else None)
+
+
+DB_ERRORS = (sqlite3.Error, DatabaseError)
+
+
+# ==================== SQL方言 ====================
+
+_PYFORMAT_RE = re.compile(r"'(?:[^']|'')*'|\?|%")
+
+
+@lru_cache(maxsize=512)
+def _to_pyformat(sql):
+    """? 占位符转换为 %s，其余 % 转义为 %%（字符串常量中的 ? 保持不变）"""
+    def replace(match):
+        token = match.group(0)
+        if token == '?':
+            return '%s'
+        return token.replace('%', '%%')
+    return _PYFORMAT_RE.sub(replace, sql)
+
+
+class SQLiteDialect:
+    """SQLite写法（数据函数中的SQL即按此书写）"""
+
+    name = SQLITE
+
+    def translate(self, sql, params):
+        return sql
+
+    def hour_of(self, column):
+        return f"CAST(strftime('%H', {column}) AS INTEGER)"
+
+    def least(self, a, b):
+        return f"MIN({a}, {b})"
+
+    def floor_int(self, expr):
+        # 只用于非负数，截断即向下取整
+        return f"CAST({expr} AS INTEGER)"
+
+    def with_time_budget(self, sql, seconds):
+        return sql
+
+
+class MySQLDialect:
+    """MySQL写法"""
+
+    name = MYSQL
+
+    def translate(self, sql, params):
+        # 没有参数时驱动不做 % 格式化，SQL原样执行
+        return _to_pyformat(sql) if params else sql
+
+    def hour_of(self, column):
+        return f"HOUR(TIME({column}))"
+
+    def least(self, a, b):
+        return f"LEAST({a}, {b})"
+
+    def floor_int(self, expr):
+        # CAST(x AS SIGNED) 会四舍五入，这里需要向下取整
+        return f"FLOOR({expr})"
+
+    def with_time_budget(self, sql, seconds):
+        if not seconds or seconds <= 0:
+            return sql
+        stripped = sql.lstrip()
+        if not stripped[:6].lower() == "select":
+            return sql
+        return f"{stripped[:6]} /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */{stripped[6:]}"
+
+
+# ==================== SQLite后端 ====================
+
+class SQLiteBackend:
+    """
+    SQLite后端
+
+    Args:
+        db_path (str): 数据库文件路径
+        image_info (bool): 是否为image_info数据库（提供预聚合表和数据版本号）
+        pool_size (int, optional): 只读连接池的最大连接数（仅首次建池时生效）
+    """
+
+    name = SQLITE
+
+    def __init__(self, db_path, image_info=True, pool_size=None):
+        self.db_path = db_path
+        self.image_info = image_info
+        self.dialect = SQLiteDialect()
+        self._has_rollups = None if image_info else False
+        self._init = self._check_schema if image_info else None
+        self._pool_options = {'size': pool_size} if pool_size else {}
+
+    @property
+    def has_rollups(self):
+        """是否使用预聚合表：由只读连接池建池时的检查得到，未迁移的数据库直接在image_info上聚合"""
+        if self._has_rollups is None:
+            connection = self.connect()
+            try:
+                if self._has_rollups is None:
+                    # 连接池已由其他实例创建，没有执行本实例的检查
+                    self._check_schema(connection)
+            finally:
+                connection.close()
+        return self._has_rollups
+
+    @has_rollups.setter
+    def has_rollups(self, value):
+        self._has_rollups = value
+
+    def _check_schema(self, connection):
+        """只读检查表结构迁移状态（在 mode=ro 连接上执行，不修改数据库）"""
+        status = check_image_info_schema(connection)
+        self._has_rollups = status['has_rollups']
+        if not status['migrated']:
+            print(f"⚠️ image_info表结构尚未迁移: {self.db_path}\n"
+                  f"   请先运行 python Database_analysis/migrate_image_info.py {self.db_path}"
+                  f"（迁移前图表直接在image_info上聚合，地图等依赖 lon/lat 的查询会出错）")
+
+    def migrate(self):
+        """执行image_info表结构迁移（部署脚本和服务启动时调用，同一进程内每个数据库只执行一次）"""
+        if self.image_info:
+            prepare_image_info_db(self.db_path)
+
+    def connect(self):
+        """从只读连接池借出连接（close() 时归还），首次建池时只读检查表结构迁移状态"""
+        return get_pool(self.db_path, init=self._init, **self._pool_options).connect()
+
+    def _writer_pool(self):
+        # 只有一个读写连接：连接复用后 sqlite3 按SQL文本缓存预编译语句，写入按借出顺序串行
+        return get_pool(self.db_path, readonly=False, size=1, acquire_timeout=WRITER_ACQUIRE_TIMEOUT)
+
+    @contextmanager
+    def transaction(self):
+        """
+        借出写连接，正常退出时提交，异常时回滚
+
+        用法：
+            with backend.transaction() as connection:
+                connection.execute(sql, params)
+                backend.bump_data_version(connection)
+        """
+        connection = self._writer_pool().connect()
+        try:
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def bump_data_version(self, connection):
+        """数据版本号加1（与写入在同一事务中提交），看板的响应缓存据此失效"""
+        if self.image_info:
+            bump_data_version(connection)
+
+    def data_version(self):
+        """读取数据版本号"""
+        if not self.image_info:
+            return 0
+        connection = self.connect()
+        try:
+            return read_data_version(connection)
+        finally:
+            connection.close()
+
+    def describe(self):
+        return {'backend': self.name, 'database': self.db_path}
+
+
+# ==================== MySQL后端 ====================
+
+class MySQLCursor:
+    """
+    MySQL游标的适配器：SQL使用 ? 占位符，执行时转换为驱动的写法；驱动异常包装为 DatabaseError
+
+    带参数的语句在支持预处理的驱动上使用连接缓存的 prepared 游标（同一条SQL只在服务端 PREPARE 一次）。
+    底层游标来自连接池借出的连接，已是计时游标。
+    """
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._backend = connection.backend
+        self._cursor = None
+
+    def execute(self, sql, params=()):
+        params = tuple(params or ())
+        operation = self._backend.dialect.translate(sql, params)
+        try:
+            if params and self._backend.prepared:
+                cursor = self._connection.raw.prepare(operation)
+            else:
+                cursor = self._connection.raw.cursor()
+            cursor.execute(operation, params or None)
+        except self._backend.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+        self._cursor = cursor
+        return self
+
+    def executemany(self, sql, seq_params):
+        seq_params = [tuple(params) for params in seq_params]
+        if not seq_params:
+            return self
+        operation = self._backend.dialect.translate(sql, seq_params[0])
+        try:
+            cursor = self._connection.raw.cursor()
+            cursor.executemany(operation, seq_params)
+        except self._backend.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+        self._cursor = cursor
+        return self
+
+    def _fetch(self, method, *args):
+        if self._cursor is None:
+            raise DatabaseError("游标尚未执行语句")
+        try:
+            return getattr(self._cursor, method)(*args)
+        except self._backend.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+
+    def fetchone(self):
+        return self._fetch('fetchone')
+
+    def fetchmany(self, size=1):
+        return list(self._fetch('fetchmany', size))
+
+    def fetchall(self):
+        return list(self._fetch('fetchall'))
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    @property
+    def description(self):
+        return self._cursor.description if self._cursor is not None else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._cursor is not None else -1
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid if self._cursor is not None else None
+
+    def close(self):
+        # prepared 游标由连接缓存复用，不在这里关闭
+        pass
+
+
+class MySQLConnection:
+    """连接池借出的MySQL连接的适配器，接口与 sqlite3 连接一致，close() 时归还连接池"""
+
+    def __init__(self, backend, raw):
+        self.backend = backend
+        self.raw = raw
+        self.row_factory = None  # 与 sqlite3 连接兼容，MySQL后端总是返回元组
+
+    def cursor(self):
+        return MySQLCursor(self)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_params):
+        return self.cursor().executemany(sql, seq_params)
+
+    def begin(self):
+        """显式开始事务（连接默认 autocommit，只读查询不会长时间持有事务快照）"""
+        try:
+            if hasattr(self.raw, 'start_transaction'):
+                self.raw.start_transaction()
+            else:
+                self.raw.begin()
+        except self.backend.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+
+    def commit(self):
+        try:
+            self.raw.commit()
+        except self.backend.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+
+    def rollback(self):
+        try:
+            self.raw.rollback()
+        except self.backend.driver_errors:
+            pass
+
+    def close(self):
+        """归还连接池（重复调用无副作用）"""
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _load_mysql_driver(driver):
+    """
+    延迟导入MySQL驱动，使用SQLite后端时不依赖任何MySQL驱动
+
+    Returns:
+        tuple: (建立连接的函数, 驱动异常基类, 是否支持预处理语句)
+    """
+    if driver == "pymysql":
+        import pymysql
+        return pymysql.connect, pymysql.Error, False
+    if driver == "mysql.connector":
+        import mysql.connector
+        return mysql.connector.connect, mysql.connector.Error, True
+    if driver == "shim":
+        from common import mysql_shim
+        return mysql_shim.connect, sqlite3.Error, True
+    raise ValueError(f"不支持的MySQL驱动: {driver}")
+
+
+class MySQLBackend:
+    """
+    MySQL后端
+
+    Args:
+        config (dict): 连接参数（driver 为 shim 时忽略）
+        driver (str, optional): "pymysql"、"mysql.connector" 或 "shim"，默认为 MYSQL_DRIVER
+        shim_path (str, optional): shim 驱动使用的SQLite数据库路径
+        image_info (bool): 是否为image_info数据库（migrate() 执行image_info表结构迁移）
+        pool_size (int, optional): 连接池最大连接数
+    """
+
+    name = MYSQL
+    has_rollups = False
+
+    def __init__(self, config, driver=None, shim_path=None, image_info=True, pool_size=None):
+        driver = driver or MYSQL_DRIVER
+        self.driver = driver
+        self.image_info = image_info
+        self.dialect = MySQLDialect()
+        self._connect_func, self.driver_errors, self.prepared = _load_mysql_driver(driver)
+        if driver == "shim":
+            from common import mysql_shim
+            mysql_shim.check_shim_path(shim_path)   # 替身会修改表结构，不能直接使用仓库中的数据库
+            self.config = {"db_path": shim_path, "connect_delay": MYSQL_SHIM_CONNECT_DELAY}
+            self.pool_name = f"shim:{os.path.basename(shim_path)}"
+        else:
+            # autocommit：只读查询不开启事务，写入由 transaction() 显式开始事务
+            self.config = dict(config, autocommit=True)
+            self.pool_name = f"{driver}:{config.get('host')}/{config.get('database')}"
+        self._pool_options = {
+            'size': pool_size or MYSQL_POOL_SIZE,
+            'acquire_timeout': MYSQL_POOL_ACQUIRE_TIMEOUT,
+            'health_check_interval': MYSQL_POOL_HEALTH_CHECK,
+        }
+
+    def _pool(self):
+        return get_mysql_pool(self.config, connect=self._connect_func, name=self.pool_name, **self._pool_options)
+
+    def connect(self):
+        """从连接池借出连接（close() 时归还）"""
+        try:
+            raw = self._pool().connect()
+        except self.driver_errors as e:
+            raise DatabaseError.from_driver(e) from e
+        return MySQLConnection(self, raw)
+
+    def migrate(self):
+        """
+        执行image_info表结构迁移：lon/lat 数值坐标列及索引、覆盖索引、坐标回填（可重复执行）
+        部署步骤（python Database_analysis/migrate_image_info.py --mysql），服务连接时不执行
+
+        Returns:
+            int: 本次回填的记录数
+        """
+        if not self.image_info:
+            return 0
+        connection = self.connect()
+        try:
+            backfilled = ensure_mysql_image_info_schema(connection)
+            connection.commit()
+            return backfilled
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    @contextmanager
+    def transaction(self):
+        """借出连接并显式开始事务，正常退出时提交，异常时回滚"""
+        connection = self.connect()
+        try:
+            connection.begin()
+            yield connection
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def bump_data_version(self, connection):
+        """MySQL后端没有数据版本号表，响应缓存只按TTL失效"""
+
+    def data_version(self):
+        # 固定值：缓存不会因版本号变化失效，只按TTL过期
+        return 0
+
+    def describe(self):
+        return {'backend': self.name, 'driver': self.driver, 'pool': self.pool_name}
+
+
+# ==================== 进程内后端注册表 ====================
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def require_mysql_backend():
+    """
+    各子系统 mysql/ 目录的兼容入口在导入时调用：要求部署时已设置环境变量 DB_BACKEND=mysql
+    兼容入口只重新导出合并后的数据函数，不替调用方切换同一进程中其他模块共用的后端
+
+    Raises:
+        RuntimeError: 部署时选择的后端不是MySQL
+    """
+    if CONFIGURED_BACKEND != MYSQL:
+        raise RuntimeError("MySQL兼容入口需要设置环境变量 DB_BACKEND=mysql")
+
+
+def get_backend(name, db_path, image_info=True, pool_size=None):
+    """
+    获取数据访问后端，同一进程内相同参数只创建一次
+
+    Args:
+        name (str): "sqlite" 或 "mysql"
+        db_path (str): SQLite数据库路径（MySQL后端使用 shim 驱动时作为替身数据库）
+        image_info (bool): 是否为image_info数据库
+        pool_size (int, optional): 连接池最大连接数（仅首次创建时生效）
+
+    Returns:
+        SQLiteBackend | MySQLBackend: 后端实例
+    """
+    name = (name or SQLITE).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"不支持的数据库后端: {name}（可选 {', '.join(BACKENDS)}）")
+    key = (name, db_path, image_info)
+    backend = _backends.get(key)
+    if backend is not None:
+        return backend
+
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            # 连接池按进程ID重建，后端对象本身可以在fork后继续使用
+            if name == SQLITE:
+                backend = SQLiteBackend(db_path, image_info=image_info, pool_size=pool_size)
+            else:
+                backend = MySQLBackend(get_mysql_config(), shim_path=db_path, image_info=image_info,
+                                       pool_size=pool_size)
+            _backends[key] = backend
+        return backend
+
+
+def migrate_at_startup(backend, strict=True):
+    """
+    服务启动时执行SQLite后端的image_info表结构迁移（已迁移的数据库只做只读检查），请求中不执行迁移
+    MySQL后端不在服务启动时迁移：ALTER TABLE 和建索引在大表上耗时长、需要DDL权限，且多个服务实例会同时执行，
+    部署时运行 python Database_analysis/migrate_image_info.py --mysql（MySQLBackend.migrate()）
+
+    Args:
+        backend: get_backend() 返回的后端
+        strict (bool): 迁移失败时是否抛出异常；为False时打印错误后继续启动（如数据库只读）
+    """
+    if backend.name != SQLITE:
+        return
+    try:
+        backend.migrate()
+    except sqlite3.Error as e:
+        if strict:
+            raise
+        print(f"❌ image_info表结构迁移失败: {backend.db_path}: {e}\n"
+              f"   请运行 python Database_analysis/migrate_image_info.py {backend.db_path}")
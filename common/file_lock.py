@@ -0,0 +1,42 @@
+# file_lock.py - 跨进程的文件锁
+"""
+同一台机器上的多个进程（如gunicorn多个worker）中只让一个进程承担某项工作：
+持有锁文件的进程负责该工作，进程退出时操作系统自动释放锁，其他进程可以接管。
+
+使用者：
+- mysql_insert/write_queue.py：写入队列日志的持有者
+- heatmap/sensor_registry.py：摄像头登记表的重建者
+"""
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def try_lock(f):
+    """对已打开的文件加非阻塞的独占锁（进程退出时操作系统自动释放），返回是否成功"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def acquire_lock_file(path):
+    """
+    打开锁文件并加锁
+
+    Returns:
+        file | None: 加锁成功时返回打开的锁文件（关闭即释放锁），锁被其他进程持有时返回None
+    """
+    f = open(path, 'a+', encoding='utf-8')
+    if not try_lock(f):
+        f.close()
+        return None
+    return f
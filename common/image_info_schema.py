@@ -0,0 +1,466 @@
+# image_info_schema.py - image_info表结构迁移
+"""
+image_info表的增量迁移，所有迁移均可重复执行（幂等）。
+
+迁移内容：
+- 数值坐标列：lon/lat（REAL，带符号），由 longitude/latitude 文本解析得到，
+  并建立 (lon, lat) 索引，供坐标点查询和矩形范围（bbox）查询使用
+- 预聚合表（rollup）：按 (动物, 日期)、(动物, 地点)、(动物, 季度)、(动物, 行为, 小时) 汇总 count，
+  由image_info上的触发器在插入/更新/删除时增量维护，实时图表直接查询这些小表
+- 覆盖索引：image_info和预聚合表上按看板、地图查询的筛选和分组字段建立的索引（COVERING_INDEXES），
+  查询只读索引、不再扫描全表
+- 数据版本号：data_version表只有一行，插入服务每次提交写入时加1，看板接口的响应缓存据此失效
+- 迁移状态：image_info_meta表记录坐标回填进度（已检查过的最大id），无法解析坐标的记录只检查一次；
+  迁移完成后把 PRAGMA user_version 设为 SCHEMA_VERSION
+
+迁移在部署时执行（Database_analysis/migrate_image_info.py），各服务（插入、看板、地图）启动时也会执行
+（common/db_backend.py 的 migrate_at_startup()）：已迁移的数据库只做只读检查，不会被打开为读写；
+请求中不执行迁移，只读连接池建池时用 check_image_info_schema() 检查迁移状态。
+
+使用方式：
+- ensure_image_info_schema(connection): 在一个读写连接上执行全部迁移（调用方负责commit）
+- prepare_image_info_db(db_path): 同一进程内每个数据库只执行一次迁移（已迁移时只做只读检查）
+- check_image_info_schema(connection): 只读检查迁移状态（可用 mode=ro 连接）
+- ensure_mysql_image_info_schema(connection): MySQL后端只补充 lon/lat 数值坐标列、image_info上的索引（没有预聚合表和数据版本号）
+"""
+
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+from common.coordinates import parse_longitude, parse_latitude
+
+TABLE_NAME = "image_info"
+META_TABLE = "image_info_meta"
+SCHEMA_VERSION = 1  # 迁移完成后写入 PRAGMA user_version；新增迁移时加1
+MYSQL_BLOB_KEY_WITHOUT_LENGTH = 1170  # ER_BLOB_KEY_WITHOUT_LENGTH：TEXT/BLOB 列建索引需要指定前缀长度
+
+_prepared_paths = set()
+_prepared_lock = threading.Lock()
+
+
+def _get_columns(connection, table_name):
+    """获取表的字段名集合"""
+    return {row[1] for row in connection.execute(f"PRAGMA table_info({table_name})")}
+
+
+def ensure_coordinate_columns(connection):
+    """
+    添加 lon/lat 数值坐标列及索引，并回填尚未解析的记录
+
+    Returns:
+        int: 本次回填的记录数
+    """
+    columns = _get_columns(connection, TABLE_NAME)
+    if 'lon' not in columns:
+        connection.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN lon REAL")
+    if 'lat' not in columns:
+        connection.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN lat REAL")
+    connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_lon_lat ON {TABLE_NAME} (lon, lat)")
+    ensure_meta_table(connection, "TEXT", "INTEGER")
+    return backfill_coordinates(connection)
+
+
+def ensure_meta_table(connection, name_type, value_type):
+    """创建迁移状态表 image_info_meta（name → 整数值），字段类型按数据库方言传入"""
+    connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS {META_TABLE} (
+            name {name_type} NOT NULL PRIMARY KEY,
+            value {value_type} NOT NULL
+        )""")
+
+
+def backfill_coordinates(connection):
+    """
+    回填 lon/lat：只检查上次回填之后新增的、有原始坐标但尚未解析的记录
+
+    检查过的最大id记在 image_info_meta 的 coordinate_backfill_id 中，无法解析的记录（lon/lat 保持为NULL）
+    不会在每次迁移时被重新扫描。插入服务写入时直接填好 lon/lat，这里只处理迁移前的历史数据和外部写入的记录。
+    SQL使用 ? 占位符，SQLite连接和 common/db_backend.py 的MySQL连接通用。
+
+    Returns:
+        int: 本次回填的记录数
+    """
+    row = connection.execute(f"SELECT value FROM {META_TABLE} WHERE name = ?", ("coordinate_backfill_id",)).fetchone()
+    checked_id = row[0] if row else 0
+    rows = connection.execute(f"""
+        SELECT id, longitude, latitude FROM {TABLE_NAME}
+        WHERE id > ? AND lon IS NULL AND longitude IS NOT NULL AND longitude != ''
+    """, (checked_id,)).fetchall()
+    updates = []
+    for row_id, longitude, latitude in rows:
+        lon, lat = parse_longitude(longitude), parse_latitude(latitude)
+        if lon is not None and lat is not None:
+            updates.append((lon, lat, row_id))
+    if updates:
+        connection.executemany(f"UPDATE {TABLE_NAME} SET lon = ?, lat = ? WHERE id = ?", updates)
+
+    max_id = connection.execute(f"SELECT MAX(id) FROM {TABLE_NAME}").fetchone()[0]
+    if max_id is not None and max_id > checked_id:
+        # REPLACE INTO 在SQLite和MySQL中含义相同
+        connection.execute(f"REPLACE INTO {META_TABLE} (name, value) VALUES (?, ?)",
+                           ("coordinate_backfill_id", max_id))
+    return len(updates)
+
+
+# ==================== 预聚合表 ====================
+
+# 每个预聚合表的定义：
+# - keys: (字段名, 字段类型, 由image_info行计算该字段的表达式)，表达式中的 {row} 会被替换为 NEW/OLD
+# - condition: 参与汇总的行需满足的条件
+# - measures: (字段名, 由image_info行计算的增量表达式)
+# 所有预聚合表都带有 total_count（SUM(count)）和 row_count（行数，为0时删除该分组）
+_QUARTER_EXPR = """CASE
+            WHEN substr({row}.date, 5, 2) IN ('01', '02', '03') THEN '1季度'
+            WHEN substr({row}.date, 5, 2) IN ('04', '05', '06') THEN '2季度'
+            WHEN substr({row}.date, 5, 2) IN ('07', '08', '09') THEN '3季度'
+            WHEN substr({row}.date, 5, 2) IN ('10', '11', '12') THEN '4季度'
+            ELSE '未知'
+        END"""
+
+
+ROLLUP_TABLES = {
+    # get_realtime_data：按动物汇总，支持按日期筛选
+    'rollup_animal_date': {
+        'keys': [('animal', 'TEXT', '{row}.animal'), ('date', 'TEXT', '{row}.date')],
+        'condition': '1',
+        'measures': [],
+    },
+    # get_location_data：按地点汇总，支持按动物筛选
+    'rollup_animal_location': {
+        'keys': [('animal', 'TEXT', '{row}.animal'), ('location', 'TEXT', '{row}.location')],
+        'condition': '1',
+        'measures': [],
+    },
+    # get_time_series_data：按季度汇总，保存置信度和占比的和与非空个数，用于计算平均值
+    'rollup_animal_quarter': {
+        'keys': [('animal', 'TEXT', '{row}.animal'),
+                 ('year', 'TEXT', 'substr({row}.date, 1, 4)'),
+                 ('quarter', 'TEXT', _QUARTER_EXPR)],
+        'condition': "{row}.date IS NOT NULL AND {row}.date != ''",
+        'measures': [('confidence_sum', 'IFNULL({row}.confidence, 0)'),
+                     ('confidence_n', '({row}.confidence IS NOT NULL)'),
+                     ('percentage_sum', 'IFNULL({row}.percentage, 0)'),
+                     ('percentage_n', '({row}.percentage IS NOT NULL)')],
+    },
+    # get_activity_data：按小时汇总，支持按动物和行为筛选
+    'rollup_animal_behavior_hour': {
+        'keys': [('animal', 'TEXT', '{row}.animal'),
+                 ('behavior', 'TEXT', '{row}.behavior'),
+                 ('hour', 'INTEGER', "CAST(strftime('%H', {row}.time) AS INTEGER)")],
+        'condition': "{row}.time IS NOT NULL AND {row}.time != ''",
+        'measures': [],
+    },
+}
+
+# 影响预聚合结果的image_info字段，只有这些字段被更新时才触发重新汇总
+_ROLLUP_SOURCE_COLUMNS = ['animal', 'date', 'location', 'behavior', 'time', 'count', 'confidence', 'percentage']
+
+
+def quarter_expr(row=TABLE_NAME):
+    """由 date（YYYYMMDD）计算季度标签（'1季度'…'4季度'）的SQL表达式，SQLite和MySQL通用"""
+    return _QUARTER_EXPR.format(row=row)
+
+
+def _rollup_apply_sql(table_name, spec, row, sign):
+    """
+    生成把一行image_info记录（NEW/OLD）计入（sign=1）或移出（sign=-1）预聚合表的SQL语句列表
+
+    键字段可能为NULL，所以用 IS 比较而不是唯一约束 + UPSERT
+    """
+    keys = [(name, expr.format(row=row)) for name, _, expr in spec['keys']]
+    condition = spec['condition'].format(row=row)
+    match = ' AND '.join(f"{name} IS {expr}" for name, expr in keys)
+    deltas = [('total_count', f'IFNULL({row}.count, 0)'), ('row_count', '1')]
+    deltas += [(name, expr.format(row=row)) for name, expr in spec['measures']]
+
+    statements = []
+    if sign > 0:
+        key_names = ', '.join(name for name, _ in keys)
+        key_values = ', '.join(expr for _, expr in keys)
+        statements.append(f"""
+        INSERT INTO {table_name} ({key_names})
+        SELECT {key_values}
+        WHERE {condition} AND NOT EXISTS (SELECT 1 FROM {table_name} WHERE {match});""")
+    operator = '+' if sign > 0 else '-'
+    assignments = ', '.join(f"{name} = {name} {operator} {expr}" for name, expr in deltas)
+    statements.append(f"""
+        UPDATE {table_name} SET {assignments}
+        WHERE {match} AND {condition};""")
+    if sign < 0:
+        statements.append(f"""
+        DELETE FROM {table_name} WHERE row_count <= 0 AND {match};""")
+    return statements
+
+
+def ensure_rollup_tables(connection):
+    """
+    创建预聚合表和维护它们的触发器；新建的预聚合表会从image_info全量回填一次
+
+    Returns:
+        list: 本次新建（并回填）的预聚合表名
+    """
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    created = []
+    for rollup_name, spec in ROLLUP_TABLES.items():
+        if rollup_name in tables:
+            continue
+        key_defs = ', '.join(f"{name} {column_type}" for name, column_type, _ in spec['keys'])
+        measure_defs = ''.join(f", {name} INTEGER NOT NULL DEFAULT 0" for name, _ in spec['measures'])
+        key_names = ', '.join(name for name, _, _ in spec['keys'])
+        connection.execute(f"""
+            CREATE TABLE {rollup_name} (
+                {key_defs},
+                total_count INTEGER NOT NULL DEFAULT 0,
+                row_count INTEGER NOT NULL DEFAULT 0{measure_defs}
+            )""")
+        connection.execute(f"CREATE INDEX idx_{rollup_name} ON {rollup_name} ({key_names})")
+
+        # 全量回填
+        key_exprs = ', '.join(expr.format(row=TABLE_NAME) for _, _, expr in spec['keys'])
+        measure_names = ''.join(f", {name}" for name, _ in spec['measures'])
+        measure_sums = ''.join(f", SUM({expr.format(row=TABLE_NAME)})" for _, expr in spec['measures'])
+        connection.execute(f"""
+            INSERT INTO {rollup_name} ({key_names}, total_count, row_count{measure_names})
+            SELECT {key_exprs}, IFNULL(SUM({TABLE_NAME}.count), 0), COUNT(*){measure_sums}
+            FROM {TABLE_NAME}
+            WHERE {spec['condition'].format(row=TABLE_NAME)}
+            GROUP BY {key_exprs}""")
+        created.append(rollup_name)
+
+    # 触发器：插入计入、删除移出、更新先移出旧值再计入新值
+    insert_body = ''.join(stmt for name, spec in ROLLUP_TABLES.items()
+                          for stmt in _rollup_apply_sql(name, spec, 'NEW', 1))
+    delete_body = ''.join(stmt for name, spec in ROLLUP_TABLES.items()
+                          for stmt in _rollup_apply_sql(name, spec, 'OLD', -1))
+    connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{TABLE_NAME}_rollup_insert AFTER INSERT ON {TABLE_NAME}
+        BEGIN{insert_body}
+        END""")
+    connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{TABLE_NAME}_rollup_delete AFTER DELETE ON {TABLE_NAME}
+        BEGIN{delete_body}
+        END""")
+    connection.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{TABLE_NAME}_rollup_update
+        AFTER UPDATE OF {', '.join(_ROLLUP_SOURCE_COLUMNS)} ON {TABLE_NAME}
+        BEGIN{delete_body}{insert_body}
+        END""")
+    return created
+
+
+# ==================== 覆盖索引 ====================
+
+# 看板和地图查询的筛选、分组字段对应的索引：(索引名, 表名, 字段)
+# 字段顺序为 等值筛选 → 范围/分组/排序 → 只被读取的字段，查询所需字段都在索引中时不再回表。
+# 索引会增加写入开销（预聚合表上的索引由触发器随每次写入维护），只为实际存在的查询建立；
+# 新增查询后用 Database_analysis/index_advisor.py 检查是否仍有扫描
+COVERING_INDEXES = [
+    # ---- image_info：地图和位置详情；实时图表在原表上聚合时（MySQL后端没有预聚合表）----
+    # get_realtime_data / get_time_series_data：按动物、日期筛选，汇总数量、置信度和占比；
+    # 地图、位置详情的 动物 + 日期 筛选；get_animal_list
+    (f"idx_{TABLE_NAME}_animal_date", TABLE_NAME, ('animal', 'date', 'count', 'confidence', 'percentage')),
+    # get_location_data（不按动物筛选）、get_location_list
+    (f"idx_{TABLE_NAME}_location", TABLE_NAME, ('location', 'count')),
+    # get_location_data（按动物筛选）
+    (f"idx_{TABLE_NAME}_animal_location", TABLE_NAME, ('animal', 'location', 'count')),
+    # get_activity_data（按动物、行为筛选）、get_behavior_list
+    (f"idx_{TABLE_NAME}_animal_behavior_time", TABLE_NAME, ('animal', 'behavior', 'time', 'count')),
+    # get_location_detail：按日期、时间倒序取最新记录
+    (f"idx_{TABLE_NAME}_date_time", TABLE_NAME, ('date', 'time')),
+
+    # ---- 预聚合表：建表时的索引只有分组字段，汇总字段需要回表 ----
+    # get_realtime_data：按动物汇总（可按日期筛选），按分组顺序读取，不需要临时B树分组
+    ("idx_rollup_animal_date_total", "rollup_animal_date", ('animal', 'date', 'total_count')),
+    # get_location_data（不按动物筛选）
+    ("idx_rollup_animal_location_location", "rollup_animal_location", ('location', 'total_count')),
+    # get_time_series_data（不按动物筛选）
+    ("idx_rollup_animal_quarter_quarter", "rollup_animal_quarter",
+     ('year', 'quarter', 'total_count', 'confidence_sum', 'confidence_n', 'percentage_sum', 'percentage_n')),
+    # get_activity_data（不按动物筛选，可按行为筛选）
+    ("idx_rollup_animal_behavior_hour_behavior", "rollup_animal_behavior_hour", ('behavior', 'hour', 'total_count')),
+]
+
+
+def ensure_covering_indexes(connection):
+    """
+    建立 COVERING_INDEXES 中尚不存在的索引（需在预聚合表创建之后执行）
+
+    Returns:
+        list: 本次新建的索引名
+    """
+    indexes = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    created = []
+    for index_name, table_name, columns in COVERING_INDEXES:
+        if index_name in indexes:
+            continue
+        connection.execute(f"CREATE INDEX {index_name} ON {table_name} ({', '.join(columns)})")
+        created.append(index_name)
+    return created
+
+
+# ==================== 数据版本号 ====================
+
+DATA_VERSION_TABLE = "data_version"
+
+
+def ensure_data_version_table(connection):
+    """创建只有一行的数据版本号表"""
+    connection.execute(f"""
+        CREATE TABLE IF NOT EXISTS {DATA_VERSION_TABLE} (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )""")
+    connection.execute(f"INSERT OR IGNORE INTO {DATA_VERSION_TABLE} (id, version) VALUES (1, 0)")
+
+
+def bump_data_version(connection):
+    """
+    数据版本号加1，应与数据写入放在同一个事务中提交
+
+    Args:
+        connection (sqlite3.Connection): 正在写入数据的连接
+    """
+    connection.execute(f"UPDATE {DATA_VERSION_TABLE} SET version = version + 1 WHERE id = 1")
+
+
+def read_data_version(connection):
+    """
+    读取当前数据版本号
+
+    Returns:
+        int: 数据版本号，表不存在时返回0
+    """
+    try:
+        row = connection.execute(f"SELECT version FROM {DATA_VERSION_TABLE} WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+
+def ensure_image_info_schema(connection):
+    """
+    在读写连接上执行image_info的全部迁移（调用方负责commit）
+
+    Args:
+        connection (sqlite3.Connection): 读写连接
+    """
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    if TABLE_NAME not in tables:
+        # 表尚未创建（例如空数据库），由建库脚本负责创建
+        return
+
+    # 所有迁移放在同一个写事务中，避免迁移过程中其他进程写入的数据漏计入预聚合表
+    if not connection.in_transaction:
+        connection.execute("BEGIN IMMEDIATE")
+    ensure_coordinate_columns(connection)
+    ensure_rollup_tables(connection)
+    ensure_covering_indexes(connection)
+    ensure_data_version_table(connection)
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+def check_image_info_schema(connection):
+    """
+    只读检查image_info的迁移状态，不修改数据库（只读连接池建池时、服务启动迁移前调用）
+
+    Args:
+        connection (sqlite3.Connection): 可以是 mode=ro 只读连接
+
+    Returns:
+        dict: migrated（已执行到 SCHEMA_VERSION）、has_rollups（预聚合表和触发器都已建立）
+    """
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    names = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    has_rollups = all(name in names for name in ROLLUP_TABLES) and f"trg_{TABLE_NAME}_rollup_insert" in names
+    return {
+        'migrated': version >= SCHEMA_VERSION,
+        'has_rollups': has_rollups,
+    }
+
+
+def prepare_image_info_db(db_path):
+    """
+    同一进程内对每个数据库只执行一次迁移
+    先用 mode=ro 连接检查，已迁移到 SCHEMA_VERSION 的数据库不会被打开为读写（不改动文件头和日志模式）
+
+    Args:
+        db_path (str): 数据库文件路径
+    """
+    if db_path in _prepared_paths:
+        return
+    with _prepared_lock:
+        if db_path in _prepared_paths:
+            return
+        if os.path.exists(db_path):
+            connection = sqlite3.connect(f"file:{pathname2url(db_path)}?mode=ro", uri=True, timeout=5.0)
+            try:
+                migrated = check_image_info_schema(connection)['migrated']
+            finally:
+                connection.close()
+            if migrated:
+                _prepared_paths.add(db_path)
+                return
+        connection = sqlite3.connect(db_path, timeout=5.0)
+        try:
+            ensure_image_info_schema(connection)
+            connection.commit()
+        finally:
+            connection.close()
+        _prepared_paths.add(db_path)
+
+
+# ==================== MySQL ====================
+
+def _mysql_errno(e):
+    """数据库异常的MySQL错误码：DatabaseError.errno，或被包装的驱动异常的 errno / args[0]"""
+    for error in (e, e.__cause__):
+        if error is None:
+            continue
+        errno = getattr(error, 'errno', None)
+        if isinstance(errno, int):
+            return errno
+        if error.args and isinstance(error.args[0], int):
+            return error.args[0]
+    return None
+
+
+def ensure_mysql_image_info_schema(connection):
+    """
+    MySQL后端的image_info迁移：添加 lon/lat 数值坐标列及索引、image_info上的覆盖索引，并回填尚未解析的记录（调用方负责commit）
+    部署步骤，由 MySQLBackend.migrate() 执行（python Database_analysis/migrate_image_info.py --mysql），服务连接时不执行
+
+    Args:
+        connection: common/db_backend.py 的 MySQLConnection（SQL使用 ? 占位符）
+
+    Returns:
+        int: 本次回填的记录数
+    """
+    columns = {row[0] for row in connection.execute(f"SHOW COLUMNS FROM {TABLE_NAME}").fetchall()}
+    if not columns:
+        return 0
+    if 'lon' not in columns:
+        connection.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN lon DOUBLE NULL")
+    if 'lat' not in columns:
+        connection.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN lat DOUBLE NULL")
+    index_name = f"idx_{TABLE_NAME}_lon_lat"
+    if not connection.execute(f"SHOW INDEX FROM {TABLE_NAME} WHERE Key_name = ?", (index_name,)).fetchall():
+        connection.execute(f"CREATE INDEX {index_name} ON {TABLE_NAME} (lon, lat)")
+
+    # image_info上的覆盖索引（MySQL后端没有预聚合表，实时图表直接在原表上聚合，最依赖这些索引）
+    for index_name, table_name, columns in COVERING_INDEXES:
+        if table_name != TABLE_NAME:
+            continue
+        if connection.execute(f"SHOW INDEX FROM {TABLE_NAME} WHERE Key_name = ?", (index_name,)).fetchall():
+            continue
+        try:
+            connection.execute(f"CREATE INDEX {index_name} ON {TABLE_NAME} ({', '.join(columns)})")
+        except Exception as e:
+            # 字段为TEXT类型时MySQL要求指定前缀长度，前缀索引无法覆盖查询，只跳过这种索引；其他错误照常抛出
+            if _mysql_errno(e) != MYSQL_BLOB_KEY_WITHOUT_LENGTH:
+                raise
+            print(f"⚠️ 跳过索引 {index_name}（字段为TEXT/BLOB类型，需要前缀索引）: {e}")
+
+    ensure_meta_table(connection, "VARCHAR(64)", "BIGINT")
+    return backfill_coordinates(connection)
@@ -0,0 +1,359 @@
+# metrics.py - 接口耗时和SQL耗时指标
+"""
+各Flask服务共用的请求指标，按路由统计并以Prometheus文本格式在 /metrics 输出：
+
+- http_request_duration_seconds: 请求耗时直方图（按 路由、方法、状态码）
+- http_response_size_bytes:      序列化后的响应大小直方图（按路由）
+- db_query_duration_seconds:     每个请求中SQL执行（execute + fetch）的总耗时直方图（按路由）
+- db_rows_returned:              每个请求从数据库取出的行数直方图（按路由）
+- db_queries_total:              执行的SQL语句数（按路由）
+- sqlite_pool_*:                 连接池的使用和等待指标
+- mysql_pool_*:                  MySQL连接池的使用、等待（池耗尽）、健康检查和预处理语句指标
+
+SQL耗时的采集：
+- 连接池借出的连接（common/sqlite_pool.py）在请求内调用 execute()/cursor() 时返回计时游标，
+  execute 和 fetch 的耗时、取出的行数计入当前请求
+- 不经过连接池的连接可以用 with sql_timer(): ... 手动计时
+- 请求状态保存在 contextvars 中，请求线程之外的后台线程（如索引重新加载）不会计入；
+  交给线程池执行的函数用 contextvars.copy_context().run 提交即可计入发起请求的路由
+
+开关：环境变量 METRICS_ENABLED（默认开启，设为 0 关闭）。关闭时不注册请求钩子，
+连接池的 execute()/cursor() 只多一次 ContextVar 读取，/metrics 返回404。
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+# 直方图分桶（上界）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+def is_enabled():
+    """是否开启指标采集"""
+    return METRICS_ENABLED
+
+
+# ==================== 请求内的SQL计时 ====================
+
+class _RequestStats:
+    """一个请求内累计的SQL耗时、语句数和行数"""
+
+    __slots__ = ('sql_time', 'queries', 'rows')
+
+    def __init__(self):
+        self.sql_time = 0.0
+        self.queries = 0
+        self.rows = 0
+
+
+class TimedCursor:
+    """计时游标：execute/fetch 的耗时和取出的行数计入当前请求，其余属性转发给底层游标"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def _timed(self, func, *args, count_rows=False):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        finally:
+            self._stats.sql_time += time.perf_counter() - start
+        if count_rows:
+            self._stats.rows += len(result) if isinstance(result, list) else (result is not None)
+        return result
+
+    def execute(self, *args):
+        self._stats.queries += 1
+        self._timed(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._stats.queries += 1
+        self._timed(self._cursor.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone, count_rows=True)
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, *args, count_rows=True)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall, count_rows=True)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self._timed(self._cursor.__next__)
+        self._stats.rows += 1
+        return row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def track_cursor(cursor):
+    """在请求内时返回计时游标，否则原样返回"""
+    stats = _current.get()
+    return cursor if stats is None else TimedCursor(cursor, stats)
+
+
+def tracking():
+    """当前是否在采集指标的请求内"""
+    return _current.get() is not None
+
+
+@contextmanager
+def sql_timer(rows=0):
+    """
+    手动记录一段SQL执行的耗时（用于不经过连接池的连接）
+
+    Args:
+        rows (int): 计入的行数
+    """
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.sql_time += time.perf_counter() - start
+        stats.queries += 1
+        stats.rows += rows
+
+
+# ==================== 直方图和注册表 ====================
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """
+    按标签保存直方图和计数器，输出Prometheus文本格式
+
+    Args:
+        app_name (str): 服务名，作为每个指标的 app 标签
+    """
+
+    HISTOGRAMS = {
+        'http_request_duration_seconds': ('请求耗时（秒）', LATENCY_BUCKETS),
+        'http_response_size_bytes': ('序列化后的响应大小（字节）', SIZE_BUCKETS),
+        'db_query_duration_seconds': ('每个请求的SQL执行总耗时（秒）', LATENCY_BUCKETS),
+        'db_rows_returned': ('每个请求从数据库取出的行数', ROWS_BUCKETS),
+    }
+    COUNTERS = {
+        'db_queries_total': '执行的SQL语句数',
+    }
+
+    def __init__(self, app_name):
+        self.app_name = app_name
+        self._lock = threading.Lock()
+        self._histograms = {name: {} for name in self.HISTOGRAMS}  # 指标名 -> 标签元组 -> _Histogram
+        self._counters = {name: {} for name in self.COUNTERS}       # 指标名 -> 标签元组 -> 数值
+
+    def observe(self, name, labels, value):
+        """记录一次直方图观测值"""
+        buckets = self.HISTOGRAMS[name][1]
+        with self._lock:
+            histogram = self._histograms[name].get(labels)
+            if histogram is None:
+                histogram = self._histograms[name][labels] = _Histogram(buckets)
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram.counts[i] += 1
+                    break
+            histogram.sum += value
+            histogram.count += 1
+
+    def inc(self, name, labels, value=1):
+        """计数器加 value"""
+        with self._lock:
+            self._counters[name][labels] = self._counters[name].get(labels, 0) + value
+
+    def record_request(self, route, method, status, duration, size, stats):
+        """记录一个请求的全部指标"""
+        self.observe('http_request_duration_seconds', (('route', route), ('method', method), ('status', str(status))),
+                     duration)
+        if size is not None:
+            self.observe('http_response_size_bytes', (('route', route),), size)
+        if stats is not None and stats.queries:
+            self.observe('db_query_duration_seconds', (('route', route),), stats.sql_time)
+            self.observe('db_rows_returned', (('route', route),), stats.rows)
+            self.inc('db_queries_total', (('route', route),), stats.queries)
+
+    def render(self):
+        """输出Prometheus文本格式（text/plain; version=0.0.4）"""
+        lines = []
+        with self._lock:
+            for name, (help_text, buckets) in self.HISTOGRAMS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(self._histograms[name].items()):
+                    base = self._format_labels(labels)
+                    cumulative = 0
+                    for bound, count in zip(buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{base},le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{{base},le="+Inf"}} {histogram.count}')
+                    lines.append(f"{name}_sum{{{base}}} {histogram.sum}")
+                    lines.append(f"{name}_count{{{base}}} {histogram.count}")
+            for name, help_text in self.COUNTERS.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{{{self._format_labels(labels)}}} {value}")
+        lines += self._render_pool_stats()
+        lines += self._render_mysql_pool_stats()
+        return "\n".join(lines) + "\n"
+
+    def _format_labels(self, labels):
+        return ",".join(f'{key}="{_escape(value)}"' for key, value in (('app', self.app_name),) + tuple(labels))
+
+    def _render_pool_stats(self):
+        """连接池指标（gauge/counter）"""
+        from common.sqlite_pool import get_all_pool_stats
+        metrics = [
+            ('sqlite_pool_in_use', 'gauge', '借出中的连接数', 'in_use'),
+            ('sqlite_pool_connections', 'gauge', '已创建的连接数', 'created'),
+            ('sqlite_pool_acquired_total', 'counter', '借出连接的次数', 'acquired'),
+            ('sqlite_pool_waits_total', 'counter', '等待空闲连接的次数', 'waits'),
+            ('sqlite_pool_timeouts_total', 'counter', '等待连接超时的次数', 'timeouts'),
+        ]
+        pools = get_all_pool_stats()
+        lines = []
+        for name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for pool in pools:
+                labels = self._format_labels((('db', os.path.basename(pool['db_path'])),
+                                              ('readonly', str(pool['readonly']).lower())))
+                lines.append(f"{name}{{{labels}}} {pool[key]}")
+        return lines
+
+    def _render_mysql_pool_stats(self):
+        """MySQL连接池指标（只在进程内建立过MySQL连接池时输出）"""
+        from common.mysql_pool import get_all_mysql_pool_stats
+        pools = get_all_mysql_pool_stats()
+        if not pools:
+            return []
+        metrics = [
+            ('mysql_pool_in_use', 'gauge', '借出中的连接数', 'in_use'),
+            ('mysql_pool_connections', 'gauge', '已创建的连接数', 'created'),
+            ('mysql_pool_size', 'gauge', '最大连接数', 'size'),
+            ('mysql_pool_connects_total', 'counter', '建立物理连接的次数', 'connects'),
+            ('mysql_pool_acquired_total', 'counter', '借出连接的次数', 'acquired'),
+            ('mysql_pool_waits_total', 'counter', '连接池耗尽、等待空闲连接的次数', 'waits'),
+            ('mysql_pool_wait_time_ms_total', 'counter', '等待空闲连接的总耗时（毫秒）', 'wait_time_total_ms'),
+            ('mysql_pool_timeouts_total', 'counter', '等待连接超时的次数', 'timeouts'),
+            ('mysql_pool_health_checks_total', 'counter', '借出前 ping 的次数', 'health_checks'),
+            ('mysql_pool_health_failures_total', 'counter', 'ping 失败并重建连接的次数', 'health_failures'),
+            ('mysql_pool_prepares_total', 'counter', '服务端预处理语句的次数', 'prepares'),
+            ('mysql_pool_prepared_hits_total', 'counter', '复用已预处理语句的次数', 'prepared_hits'),
+        ]
+        lines = []
+        for name, metric_type, help_text, key in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for pool in pools:
+                labels = self._format_labels((('pool', pool['name']),))
+                lines.append(f"{name}{{{labels}}} {pool[key]}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# ==================== Flask集成 ====================
+
+def init_metrics(app, app_name, enabled=None):
+    """
+    为Flask应用注册指标采集钩子和 /metrics 接口
+
+    Args:
+        app: Flask应用
+        app_name (str): 服务名（指标的 app 标签）
+        enabled (bool, optional): 是否开启，None时使用 METRICS_ENABLED 配置
+
+    Returns:
+        MetricsRegistry: 开启时返回注册表，关闭时返回None
+    """
+    # 在这里导入Flask，连接池等非Web模块引用本模块时不依赖Flask
+    from flask import request, Response
+
+    if enabled is None:
+        enabled = METRICS_ENABLED
+    registry = MetricsRegistry(app_name) if enabled else None
+
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus格式的接口指标"""
+        if registry is None:
+            return Response("指标采集未开启（METRICS_ENABLED=0）\n", status=404, mimetype="text/plain")
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+    if registry is None:
+        return None
+
+    @app.before_request
+    def _start_request_metrics():
+        request.environ['metrics.start'] = time.perf_counter()
+        request.environ['metrics.token'] = _current.set(_RequestStats())
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = request.environ.get('metrics.start')
+        if start is None:
+            return response
+        stats = _current.get()
+        token = request.environ.pop('metrics.token', None)
+        if token is not None:
+            _current.reset(token)
+        route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+        method, status = request.method, response.status_code
+
+        if response.is_streamed:
+            # 流式响应（如NDJSON）：边取边发送时的SQL耗时同样计入本请求，发送完毕时记录耗时和累计的字节数
+            sizes = [0]
+            body = response.response
+
+            def counting_body():
+                body_token = _current.set(stats)
+                try:
+                    for chunk in body:
+                        sizes[0] += len(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+                        yield chunk
+                finally:
+                    try:
+                        _current.reset(body_token)
+                    except ValueError:
+                        pass  # 在其他上下文中关闭（如被垃圾回收）
+
+            response.response = counting_body()
+            response.call_on_close(lambda: registry.record_request(
+                route, method, status, time.perf_counter() - start, sizes[0], stats))
+        else:
+            registry.record_request(route, method, status, time.perf_counter() - start,
+                                    response.calculate_content_length(), stats)
+        return response
+
+    return registry
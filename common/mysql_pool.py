@@ -0,0 +1,401 @@
+# mysql_pool.py - MySQL连接池
+"""
+为使用MySQL的Flask服务（如热力图）提供可复用的连接，避免每次请求都重新进行TCP握手和认证。
+
+主要功能：
+- MySQLPool: 线程安全的连接池，按需创建连接，上限为 size，耗尽时等待 acquire_timeout 秒
+- PooledMySQLConnection: 借出的连接，用法与 mysql.connector 连接相同，close() 时归还连接池
+- get_mysql_pool(): 按连接配置获取（或创建）进程内唯一的连接池
+- get_all_mysql_pool_stats(): 汇总所有连接池的使用、等待、健康检查指标（见 common/metrics.py 的 mysql_pool_*）
+
+技术特点：
+- 健康检查：空闲超过 health_check_interval 秒的连接在借出前 ping 一次，失败则丢弃并重新建立连接；
+  使用中出错（归还时无法回滚）的连接直接丢弃
+- 预处理语句：prepare(sql) 返回该连接上缓存的 prepared 游标，同一条SQL只在服务端 PREPARE 一次，
+  之后的请求只发送参数（每个连接最多缓存 statement_cache_size 条，按最近使用淘汰）
+- 驱动可替换：connect 参数默认为 mysql.connector.connect，本地压测时可换成 common/mysql_shim.py 的SQLite替身
+- 检测进程ID变化（如gunicorn fork），fork后的子进程会重新建池，不复用父进程的连接
+
+标准库的 mysql.connector.pooling 在池耗尽时直接抛出 PoolError，且没有等待和使用指标，这里按
+common/sqlite_pool.py 的方式实现等待队列和指标。
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .metrics import track_cursor
+except ImportError:
+    from metrics import track_cursor
+
+# 连接池默认参数
+DEFAULT_POOL_SIZE = 8                   # 每个数据库的最大连接数
+DEFAULT_ACQUIRE_TIMEOUT = 5.0           # 连接池耗尽时的最长等待时间（秒）
+DEFAULT_HEALTH_CHECK_INTERVAL = 30.0    # 空闲超过该时间（秒）的连接借出前先 ping，0表示每次借出都检查
+DEFAULT_STATEMENT_CACHE_SIZE = 32       # 每个连接缓存的预处理语句数
+
+
+class PoolExhaustedError(Exception):
+    """等待空闲连接超时"""
+
+
+def _default_connect(**config):
+    # 在这里导入驱动，使用SQLite替身时不依赖 mysql.connector
+    import mysql.connector
+    return mysql.connector.connect(**config)
+
+
+class _PoolEntry:
+    """连接池中的一个物理连接及其预处理语句缓存"""
+
+    __slots__ = ('connection', 'statements', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.statements = OrderedDict()
+        self.last_used = time.monotonic()
+
+    def close(self):
+        for cursor in self.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.statements.clear()
+        try:
+            self.connection.close()
+        except Exception:
+            pass
+
+
+class MySQLPool:
+    """
+    线程安全的MySQL连接池
+
+    Args:
+        config (dict): 连接参数（host/user/password/database/port/charset 等），原样传给 connect
+        connect (callable, optional): 建立连接的函数，默认为 mysql.connector.connect
+        name (str, optional): 连接池名称（指标标签），默认为 host:port/database
+        size (int): 最大连接数，0表示不复用连接（每次借出都新建连接，用于对比测试）
+        acquire_timeout (float): 连接池耗尽时等待空闲连接的超时时间（秒）
+        health_check_interval (float): 空闲超过该时间（秒）的连接借出前先 ping
+        statement_cache_size (int): 每个连接缓存的预处理语句数
+    """
+
+    def __init__(self, config, connect=None, name=None, size=DEFAULT_POOL_SIZE,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT,
+                 health_check_interval=DEFAULT_HEALTH_CHECK_INTERVAL,
+                 statement_cache_size=DEFAULT_STATEMENT_CACHE_SIZE):
+        self.config = dict(config)
+        self.connect_func = connect or _default_connect
+        self.name = name or f"{config.get('host', 'localhost')}:{config.get('port', 3306)}/{config.get('database', '')}"
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.statement_cache_size = statement_cache_size
+        self.pid = os.getpid()
+
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用最近使用过的连接
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # 使用/等待/健康检查指标
+        self._connects = 0
+        self._acquired = 0
+        self._in_use = 0
+        self._max_in_use = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+        self._health_checks = 0
+        self._health_failures = 0
+        self._discarded = 0
+        self._prepares = 0
+        self._prepared_hits = 0
+
+    def _connect(self):
+        """建立一个新的物理连接"""
+        entry = _PoolEntry(self.connect_func(**self.config))
+        with self._lock:
+            self._connects += 1
+        return entry
+
+    def _create_or_wait(self):
+        """没有空闲连接时按需新建，达到上限则等待"""
+        create = False
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        start = time.perf_counter()
+        try:
+            entry = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolExhaustedError(f"连接池已耗尽，等待超过 {self.acquire_timeout} 秒: {self.name}")
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._waits += 1
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return entry
+
+    def _check_health(self, entry):
+        """空闲较久的连接先 ping，失败则换一个新连接（数据库重启、wait_timeout 断开等）"""
+        if time.monotonic() - entry.last_used < self.health_check_interval:
+            return entry
+        with self._lock:
+            self._health_checks += 1
+        try:
+            entry.connection.ping(reconnect=False)
+            return entry
+        except Exception:
+            entry.close()
+            with self._lock:
+                self._health_failures += 1
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+    def _acquire(self):
+        """取出一个健康的连接"""
+        if self._closed:
+            raise PoolExhaustedError(f"连接池已关闭: {self.name}")
+
+        if self.size <= 0:
+            # 不复用连接（用于对比测试）：每次借出都新建连接，归还时关闭
+            entry = self._connect()
+        else:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                entry = self._create_or_wait()
+            entry = self._check_health(entry)
+
+        with self._lock:
+            self._acquired += 1
+            self._in_use += 1
+            self._max_in_use = max(self._max_in_use, self._in_use)
+        return entry
+
+    def _release(self, entry):
+        """归还连接：回滚未结束的事务，出错的连接丢弃并允许重新创建"""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if getattr(entry.connection, 'in_transaction', False):
+                entry.connection.rollback()
+        except Exception:
+            entry.close()
+            with self._lock:
+                if self.size > 0:
+                    self._created -= 1
+                self._discarded += 1
+            return
+        if self._closed or self.size <= 0:
+            entry.close()
+            return
+        entry.last_used = time.monotonic()
+        self._idle.put(entry)
+
+    def _prepare(self, entry, sql):
+        """取出（或创建）该连接上 sql 对应的预处理游标"""
+        cursor = entry.statements.get(sql)
+        if cursor is not None:
+            entry.statements.move_to_end(sql)
+            with self._lock:
+                self._prepared_hits += 1
+            return cursor
+        cursor = entry.connection.cursor(prepared=True)
+        entry.statements[sql] = cursor
+        if len(entry.statements) > self.statement_cache_size:
+            _, evicted = entry.statements.popitem(last=False)
+            evicted.close()
+        with self._lock:
+            self._prepares += 1
+        return cursor
+
+    def connect(self):
+        """
+        借出一个连接，调用 close() 或退出with时归还连接池
+
+        用法：
+            connection = pool.connect()
+            try:
+                cursor = connection.prepare(sql)
+                cursor.execute(sql, params)
+                ...
+            finally:
+                connection.close()
+        """
+        return PooledMySQLConnection(self, self._acquire())
+
+    def stats(self):
+        """
+        获取连接池的使用、等待和健康检查指标
+
+        Returns:
+            dict: 连接数、借出次数、等待次数/耗时、超时次数、健康检查失败次数、预处理语句命中等
+        """
+        with self._lock:
+            return {
+                'name': self.name,
+                'size': self.size,
+                'created': self._created,
+                'connects': self._connects,
+                'idle': self._idle.qsize(),
+                'in_use': self._in_use,
+                'max_in_use': self._max_in_use,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+                'health_checks': self._health_checks,
+                'health_failures': self._health_failures,
+                'discarded': self._discarded,
+                'prepares': self._prepares,
+                'prepared_hits': self._prepared_hits,
+            }
+
+    def close(self):
+        """关闭所有空闲连接，借出中的连接会在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            entry.close()
+
+
+class PooledMySQLConnection:
+    """
+    连接池借出的连接，属性和方法均转发给底层连接，
+    区别在于 close() 不会真正关闭连接，而是归还给连接池（重复调用无副作用）
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+
+    def _raw(self):
+        if self._entry is None:
+            raise PoolExhaustedError("连接已归还连接池，不能继续使用")
+        return self._entry.connection
+
+    def __getattr__(self, name):
+        return getattr(self._raw(), name)
+
+    def cursor(self, *args, **kwargs):
+        # 在开启指标采集的请求内返回计时游标（见 common/metrics.py）
+        return track_cursor(self._raw().cursor(*args, **kwargs))
+
+    def prepare(self, sql):
+        """
+        获取 sql 的预处理游标（服务端 PREPARE 一次，之后只发送参数）
+
+        返回的游标按元组返回行，可用 fetch_dicts() 转为字典；执行时仍需传入同一条 sql：
+            cursor = connection.prepare(sql)
+            cursor.execute(sql, params)
+        """
+        self._raw()
+        return track_cursor(self._pool._prepare(self._entry, sql))
+
+    def close(self):
+        """归还连接池"""
+        entry = self._entry
+        if entry is not None:
+            self._entry = None
+            self._pool._release(entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        # 兜底：借出后忘记 close() 的连接在被回收时归还连接池
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def fetch_dicts(cursor):
+    """取出游标的全部结果，按列名转为字典列表（预处理游标只返回元组）"""
+    columns = cursor.column_names
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# ==================== 进程内连接池注册表 ====================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_mysql_pool(config, connect=None, **kwargs):
+    """
+    获取指定连接配置的连接池，同一进程内相同配置只创建一次
+
+    Args:
+        config (dict): 连接参数
+        connect (callable, optional): 建立连接的函数，默认为 mysql.connector.connect
+        **kwargs: 传给 MySQLPool 的其他参数（仅首次创建时生效）
+
+    Returns:
+        MySQLPool: 连接池实例
+    """
+    key = (tuple(sorted((k, str(v)) for k, v in config.items())), connect)
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            # fork后的子进程不能复用父进程的连接，直接丢弃旧连接池
+            pool = MySQLPool(config, connect=connect, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def get_all_mysql_pool_stats():
+    """
+    汇总当前进程所有MySQL连接池的指标
+
+    Returns:
+        list: 每个连接池的 stats() 结果
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools if pool.pid == os.getpid()]
+
+
+def close_all_mysql_pools():
+    """关闭当前进程的所有MySQL连接池"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
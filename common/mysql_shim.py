@@ -0,0 +1,223 @@
+# mysql_shim.py - MySQL驱动的SQLite替身
+"""
+在没有MySQL服务器的开发机上，用SQLite数据库模拟 mysql.connector 的连接接口，
+用于本地运行和压测使用MySQL的服务（如热力图），无需Docker或安装MariaDB。
+
+主要功能：
+- connect(): 与 mysql.connector.connect 参数兼容，额外接受 db_path（SQLite数据库路径）和 connect_delay
+  首次连接会给 image_info 表加列，db_path 必须显式指定，且不能是仓库 Database/ 目录中的数据库（请使用副本或合成数据库）
+- ShimConnection / ShimCursor: 支持 cursor(dictionary=True / prepared=True)、ping()、column_names 等
+- ensure_mysql_columns(): 为 SQLite 的 image_info 表补充 MySQL 版本才有的 image_path、created_at 列
+
+SQL方言转换（只覆盖本项目用到的写法）：
+- 参数占位符 %s → ?
+- NOW() - INTERVAL n DAY/HOUR/MINUTE → datetime('now', 'localtime', '-n days')
+- GROUP_CONCAT(DISTINCT x ORDER BY ... LIMIT n) → GROUP_CONCAT(DISTINCT x)（SQLite不支持组内排序和LIMIT）
+- SHOW INDEX FROM t WHERE Key_name = %s → 查询 sqlite_master（用于建索引前检查索引是否存在）
+- SHOW COLUMNS FROM t → 查询 pragma_table_info（第一列为字段名，用于加列前检查字段是否存在）
+- HOUR()、LEAST()、FLOOR() 注册为SQLite自定义函数（TIME() 为SQLite自带函数）
+
+注意：替身没有网络往返，测得的是连接池、语句和结果处理本身的开销；
+需要模拟TCP握手和认证的耗时时，可用 connect_delay（秒）让每次新建连接额外等待。
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+_INTERVAL_RE = re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+(%s|\d+)\s+(DAY|HOUR|MINUTE|SECOND)", re.IGNORECASE)
+_SHOW_INDEX_RE = re.compile(r"SHOW\s+INDEX\s+FROM\s+(\w+)\s+WHERE\s+Key_name\s*=\s*%s", re.IGNORECASE)
+_SHOW_COLUMNS_RE = re.compile(r"SHOW\s+COLUMNS\s+FROM\s+(\w+)", re.IGNORECASE)
+_GROUP_CONCAT_RE = re.compile(r"GROUP_CONCAT\(\s*(DISTINCT\s+)?([^()]*?)\s+ORDER\s+BY[^()]*\)", re.IGNORECASE)
+
+# 仓库自带的数据库目录：替身会修改表结构，不能直接用于这些数据库
+BUNDLED_DB_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Database")
+
+_prepared_paths = set()
+_prepare_lock = threading.Lock()
+
+
+@lru_cache(maxsize=256)
+def translate_sql(sql):
+    """把MySQL写法的SQL转换为SQLite可执行的SQL"""
+    sql = _INTERVAL_RE.sub(
+        lambda m: f"datetime('now', 'localtime', '-' || ({m.group(1)}) || ' {m.group(2).lower()}s')", sql)
+    sql = _SHOW_INDEX_RE.sub(r"SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = '\1' AND name = %s", sql)
+    sql = _SHOW_COLUMNS_RE.sub(r"SELECT name AS Field FROM pragma_table_info('\1')", sql)
+    sql = _GROUP_CONCAT_RE.sub(lambda m: f"GROUP_CONCAT({m.group(1) or ''}{m.group(2)})", sql)
+    return sql.replace('%s', '?').replace('%%', '%')
+
+
+def _hour(value):
+    """HOUR(TIME(x))：由 HH:MM[:SS] 文本取小时"""
+    try:
+        return int(str(value).split(':', 1)[0])
+    except (TypeError, ValueError):
+        return None
+
+
+def _least(*values):
+    return None if any(value is None for value in values) else min(values)
+
+
+def _floor(value):
+    return None if value is None else math.floor(value)
+
+
+def ensure_mysql_columns(connection):
+    """
+    为 image_info 表补充 MySQL 版本的 image_path、created_at 列（由 path、date、time 回填）
+
+    Args:
+        connection (sqlite3.Connection): 读写连接
+    """
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(image_info)")}
+    if not columns:
+        return
+    if 'image_path' not in columns:
+        connection.execute("ALTER TABLE image_info ADD COLUMN image_path TEXT")
+        connection.execute("UPDATE image_info SET image_path = path")
+    if 'created_at' not in columns:
+        connection.execute("ALTER TABLE image_info ADD COLUMN created_at TEXT")
+        connection.execute("""
+            UPDATE image_info
+            SET created_at = substr(date, 1, 4) || '-' || substr(date, 5, 2) || '-' || substr(date, 7, 2)
+                             || ' ' || COALESCE(time, '00:00') || ':00'
+            WHERE length(date) = 8
+        """)
+    connection.commit()
+
+
+class ShimCursor:
+    """模拟 mysql.connector 游标：execute(sql, params)、fetch*、column_names、rowcount"""
+
+    def __init__(self, connection, dictionary=False):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+        self.column_names = ()
+
+    def execute(self, operation, params=()):
+        self._cursor.execute(translate_sql(operation), tuple(params or ()))
+        self.column_names = tuple(column[0] for column in self._cursor.description or ())
+        return None
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(translate_sql(operation), seq_params)
+
+    def _convert(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._convert(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._convert(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._convert(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._convert(next(self._cursor))
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class ShimConnection:
+    """模拟 mysql.connector 连接（底层为 sqlite3 连接，可跨线程使用，由连接池保证同一时刻只有一个使用者）"""
+
+    def __init__(self, db_path, connect_delay=0.0):
+        if connect_delay:
+            time.sleep(connect_delay)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False, timeout=5.0)
+        self._connection.create_function("HOUR", 1, _hour, deterministic=True)
+        self._connection.create_function("LEAST", -1, _least, deterministic=True)
+        self._connection.create_function("FLOOR", 1, _floor, deterministic=True)
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None):
+        # sqlite3 自带按SQL文本缓存的预编译语句，prepared 游标与普通游标相同
+        return ShimCursor(self._connection, dictionary=dictionary)
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._connection.execute("SELECT 1")
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def start_transaction(self):
+        if not self._connection.in_transaction:
+            self._connection.execute("BEGIN")
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+def check_shim_path(db_path):
+    """
+    检查替身数据库路径：必须显式指定，且不在仓库的 Database/ 目录中
+
+    Raises:
+        ValueError: 未指定路径或路径指向仓库自带的数据库
+    """
+    if not db_path:
+        raise ValueError("SQLite替身需要显式指定数据库路径（如 IMAGE_INFO_DB_PATH=<数据库副本>）")
+    directory = os.path.dirname(os.path.realpath(db_path))
+    if os.path.normcase(directory) == os.path.normcase(os.path.realpath(BUNDLED_DB_DIR)):
+        raise ValueError(f"SQLite替身会修改表结构，不能直接使用仓库中的数据库: {db_path}，请先复制一份")
+
+
+def connect(db_path=None, connect_delay=0.0, **config):
+    """
+    建立替身连接（参数与 mysql.connector.connect 兼容，host/user/password 等被忽略）
+
+    Args:
+        db_path (str): SQLite数据库路径（必须显式指定，见 check_shim_path），首次连接时补充 MySQL 版本的 image_info 列
+        connect_delay (float): 每次新建连接额外等待的秒数，用于模拟网络握手和认证
+    """
+    if db_path not in _prepared_paths:
+        check_shim_path(db_path)
+        # 多个线程同时首次连接时只迁移一次
+        with _prepare_lock:
+            if db_path not in _prepared_paths:
+                connection = sqlite3.connect(db_path)
+                try:
+                    ensure_mysql_columns(connection)
+                finally:
+                    connection.close()
+                _prepared_paths.add(db_path)
+    return ShimConnection(db_path, connect_delay=connect_delay)
@@ -0,0 +1,150 @@
+# protection_index.py - 保护级别内存索引
+"""
+protected_species 表（国家重点保护野生动物名录）一年才更新一两次，
+不需要每次点击位置详情都查询数据库。这里把整张表读入内存：
+
+- ProtectionLevelIndex: species_name（中文名）和 scientific_name（学名）-> protection_level 的字典索引
+- lookup()/lookup_many(): 只查字典，不做任何I/O
+- 后台线程每 check_interval 秒检查一次数据库文件（及WAL文件）的修改时间，变化时重新加载
+
+加载失败时保留旧索引继续服务。
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_CHECK_INTERVAL = 5.0  # 检查数据库文件修改时间的间隔（秒）
+UNKNOWN_LEVEL = "未知"
+
+
+class ProtectionLevelIndex:
+    """
+    保护级别内存索引
+
+    Args:
+        db_path (str): protected_wildlife.db 路径（用于检查修改时间）
+        connect (callable): 返回数据库连接的函数，连接用完后调用 close()
+        check_interval (float): 检查修改时间的间隔（秒），0表示不自动重新加载
+    """
+
+    def __init__(self, db_path, connect, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.db_path = os.path.abspath(db_path)
+        self.connect = connect
+        self.check_interval = check_interval
+
+        self._by_species = {}
+        self._by_scientific = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+
+        self._reloads = 0
+        self._reload_errors = 0
+        self._loaded_at = None
+        self._load_time = 0.0
+
+    def _file_mtime(self):
+        """数据库文件和WAL文件的修改时间（WAL模式下写入先进入 -wal 文件）"""
+        mtimes = []
+        for path in (self.db_path, self.db_path + "-wal"):
+            try:
+                stat = os.stat(path)
+                mtimes.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def load(self):
+        """从数据库重新加载整张表，替换内存索引"""
+        start = time.perf_counter()
+        connection = self.connect()
+        # 在建立连接之后记录修改时间：首次建池时的初始化可能修改数据库文件
+        mtime = self._file_mtime()
+        try:
+            rows = connection.execute(
+                "SELECT species_name, scientific_name, protection_level FROM protected_species ORDER BY id"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        by_species, by_scientific = {}, {}
+        for species_name, scientific_name, protection_level in rows:
+            # 与 LIMIT 1 查询一致：同名时以id最小的记录为准
+            if species_name:
+                by_species.setdefault(species_name, protection_level)
+            if scientific_name:
+                by_scientific.setdefault(scientific_name, protection_level)
+
+        with self._lock:
+            self._by_species, self._by_scientific = by_species, by_scientific
+            self._mtime = mtime
+            self._reloads += 1
+            self._loaded_at = time.time()
+            self._load_time = time.perf_counter() - start
+        return self
+
+    def reload_if_changed(self):
+        """数据库文件修改时间变化时重新加载；返回是否重新加载"""
+        if self._file_mtime() == self._mtime:
+            return False
+        try:
+            self.load()
+            return True
+        except Exception as e:
+            with self._lock:
+                self._reload_errors += 1
+            print(f"重新加载保护级别索引失败: {e}")
+            return False
+
+    def _watch(self):
+        while True:
+            time.sleep(self.check_interval)
+            self.reload_if_changed()
+
+    def start(self):
+        """加载索引并启动后台检查线程（fork后的子进程会重新启动检查线程）"""
+        if self._mtime is not None and (not self.check_interval or self._watcher_pid == os.getpid()):
+            return self
+        with self._start_lock:
+            if self._mtime is None:
+                self.load()
+            if self.check_interval and self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                self._watcher = threading.Thread(target=self._watch, name="protection-index-watcher", daemon=True)
+                self._watcher.start()
+        return self
+
+    def lookup(self, name, default=UNKNOWN_LEVEL):
+        """按中文名或学名查询保护级别（中文名优先）"""
+        by_species, by_scientific = self._by_species, self._by_scientific
+        level = by_species.get(name)
+        if level is None:
+            level = by_scientific.get(name)
+        return level if level is not None else default
+
+    def lookup_many(self, names, default=UNKNOWN_LEVEL):
+        """批量查询保护级别，返回 名称 -> 保护级别 的字典"""
+        return {name: self.lookup(name, default) for name in names}
+
+    def stats(self):
+        """
+        获取索引指标
+
+        Returns:
+            dict: 条目数、加载次数、加载失败次数、最近加载时间和耗时
+        """
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'species_names': len(self._by_species),
+                'scientific_names': len(self._by_scientific),
+                'size': len(self._by_species) + len(self._by_scientific),
+                'reloads': self._reloads,
+                'reload_errors': self._reload_errors,
+                'loaded_at': self._loaded_at,
+                'load_time_ms': round(self._load_time * 1000, 3),
+                'check_interval': self.check_interval,
+            }
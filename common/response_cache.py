@@ -0,0 +1,174 @@
+# response_cache.py - 接口响应缓存
+"""
+为看板的列表/地图接口缓存JSON响应，避免每次请求都重新查询SQLite。
+
+主要功能：
+- ResponseCache: 带TTL和LRU容量上限的响应缓存，统计命中/未命中次数
+- ResponseCache.cached(): Flask视图装饰器，按 接口 + 规范化后的查询参数 缓存响应
+
+失效机制：
+- 每条缓存记录保存写入时的数据版本号（data_version表，由插入服务在每次提交时加1）
+- 读取时版本号不一致即视为失效；版本号最多每 version_check_interval 秒读取一次
+- 超过TTL的记录同样失效
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, make_response
+
+# 默认参数
+DEFAULT_TTL = 300                   # 缓存有效期（秒）
+DEFAULT_MAX_ENTRIES = 512           # 最多缓存的响应数量，超出后淘汰最久未使用的
+DEFAULT_VERSION_CHECK_INTERVAL = 1.0  # 读取数据版本号的最小间隔（秒）
+
+
+class ResponseCache:
+    """
+    带TTL、LRU容量上限和数据版本失效的响应缓存
+
+    Args:
+        ttl (float): 缓存有效期（秒）
+        max_entries (int): 最大缓存条数
+        version_getter (callable, optional): 返回当前数据版本号的函数，为None时只按TTL失效
+        version_check_interval (float): 读取数据版本号的最小间隔（秒），0表示每次请求都读取
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, version_getter=None,
+                 version_check_interval=DEFAULT_VERSION_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version_getter = version_getter
+        self.version_check_interval = version_check_interval
+
+        self._entries = OrderedDict()  # key -> (过期时间, 数据版本, 响应体, mimetype)
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def current_version(self):
+        """获取当前数据版本号（按 version_check_interval 节流）"""
+        if self.version_getter is None:
+            return None
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at >= self.version_check_interval:
+            try:
+                self._version = self.version_getter()
+            except Exception as e:
+                # 读取失败时不使用缓存中的旧版本，强制回源查询
+                print(f"读取数据版本号失败: {e}")
+                self._version = None
+                return None
+            self._version_checked_at = now
+        return self._version
+
+    @staticmethod
+    def make_key(endpoint, args):
+        """
+        生成缓存键：接口名 + 排序后的查询参数（去掉首尾空白和空值）
+
+        Args:
+            endpoint (str): 接口名
+            args: 查询参数（werkzeug MultiDict 或 dict）
+        """
+        items = args.items(multi=True) if hasattr(args, 'getlist') else args.items()
+        normalized = sorted((key, str(value).strip()) for key, value in items if str(value).strip() != '')
+        return (endpoint, tuple(normalized))
+
+    def get(self, key, version):
+        """读取缓存，过期或版本不一致时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, entry_version, body, mimetype = entry
+                if expires_at > time.monotonic() and entry_version == version:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return body, mimetype
+                del self._entries[key]
+                self._invalidations += 1
+            self._misses += 1
+            return None
+
+    def set(self, key, version, body, mimetype):
+        """写入缓存，超出容量时淘汰最久未使用的记录"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, version, body, mimetype)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        获取缓存指标
+
+        Returns:
+            dict: 条数、命中/未命中次数、命中率、淘汰和失效次数
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'data_version': self._version,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 4) if total else 0.0,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+            }
+
+    def cached(self, endpoint=None):
+        """
+        Flask视图装饰器：缓存状态码为200的响应
+
+        响应体为 {"status": "error", ...} 的结果不会被缓存
+
+        用法：
+            @app.route('/api/animal-list')
+            @response_cache.cached()
+            def api_animal_list(): ...
+        """
+        def decorator(view):
+            name = endpoint or view.__name__
+
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                version = self.current_version()
+                key = self.make_key(name, request.args)
+                # 版本号读取失败时（version为None且配置了version_getter）直接回源
+                use_cache = self.version_getter is None or version is not None
+
+                if use_cache:
+                    cached_entry = self.get(key, version)
+                    if cached_entry is not None:
+                        body, mimetype = cached_entry
+                        response = make_response(body)
+                        response.mimetype = mimetype
+                        response.headers['X-Cache'] = 'HIT'
+                        return response
+
+                response = make_response(view(*args, **kwargs))
+                if use_cache and response.status_code == 200 and not response.direct_passthrough:
+                    payload = response.get_json(silent=True)
+                    if not (isinstance(payload, dict) and payload.get('status') == 'error'):
+                        self.set(key, version, response.get_data(), response.mimetype)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            return wrapper
+        return decorator
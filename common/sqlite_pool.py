@@ -0,0 +1,332 @@
+# sqlite_pool.py - SQLite只读连接池
+"""
+为各个Flask服务提供可复用的SQLite只读连接，避免每次请求都重新建立连接和解析schema。
+
+主要功能：
+- SQLitePool: 线程安全的连接池，按需创建连接，上限为 size
+- PooledConnection: 借出的连接，用法与 sqlite3.Connection 相同，close() 时归还连接池
+- get_pool(): 按数据库路径获取（或创建）进程内唯一的连接池
+- get_all_pool_stats(): 汇总所有连接池的使用和等待指标
+
+技术特点：
+- 读写连接池首次建池时开启WAL模式（写入与只读连接互不阻塞）；只读连接池的连接均为 mode=ro，
+  不切换日志模式，不会改动仓库中自带的数据库文件头，也不会留下 -wal/-shm 文件
+- 每个连接设置 cache_size 和 mmap_size
+- 检测进程ID变化（如gunicorn fork），fork后的子进程会重新建池，不复用父进程的连接
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+try:
+    from .metrics import track_cursor
+except ImportError:
+    from metrics import track_cursor
+
+# 连接池默认参数
+DEFAULT_POOL_SIZE = 8                      # 每个数据库的最大连接数
+DEFAULT_CACHE_SIZE_KB = 16 * 1024          # 每个连接的页缓存大小（KB），即 PRAGMA cache_size=-16384
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024      # 内存映射大小（字节）
+DEFAULT_ACQUIRE_TIMEOUT = 5.0              # 连接池耗尽时的最长等待时间（秒）
+DEFAULT_BUSY_TIMEOUT = 5.0                 # SQLite忙等待超时（秒）
+
+
+class SQLitePool:
+    """
+    线程安全的SQLite连接池
+
+    Args:
+        db_path (str): 数据库文件路径
+        size (int): 最大连接数
+        readonly (bool): 是否以 mode=ro 只读方式打开连接
+        cache_size_kb (int): 每个连接的页缓存大小（KB）
+        mmap_size (int): 每个连接的内存映射大小（字节）
+        acquire_timeout (float): 连接池耗尽时等待空闲连接的超时时间（秒）
+        init (callable, optional): 建池时调用一次的初始化函数，参数为 sqlite3.Connection；
+            读写连接池传入读写连接（调用后提交），只读连接池传入 mode=ro 只读连接（只能做检查，不能修改数据库）
+    """
+
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE, readonly=True,
+                 cache_size_kb=DEFAULT_CACHE_SIZE_KB, mmap_size=DEFAULT_MMAP_SIZE,
+                 acquire_timeout=DEFAULT_ACQUIRE_TIMEOUT, init=None):
+        self.db_path = os.path.abspath(db_path)
+        self.size = size
+        self.readonly = readonly
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.acquire_timeout = acquire_timeout
+        self.pid = os.getpid()
+
+        self._idle = queue.LifoQueue()  # 后进先出，优先复用最近使用过的（缓存较热的）连接
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+        # 使用/等待指标
+        self._acquired = 0
+        self._in_use = 0
+        self._max_in_use = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+
+        self._prepare_database(init)
+
+    def _prepare_database(self, init):
+        """
+        建池时打开一次数据库并执行初始化函数
+
+        只有读写连接池以读写方式打开并开启WAL模式：日志模式写在数据库文件头中并会生成 -wal/-shm 文件，
+        只读连接池（如只读取仓库自带数据库的看板）不改动数据库文件，初始化函数在只读连接上执行
+        """
+        if self.readonly:
+            if init:
+                connection = self._connect()
+                try:
+                    init(connection)
+                finally:
+                    connection.close()
+            return
+        connection = sqlite3.connect(self.db_path, timeout=DEFAULT_BUSY_TIMEOUT)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            if init:
+                init(connection)
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _connect(self):
+        """创建一个新连接并设置PRAGMA参数"""
+        if self.readonly:
+            uri = f"file:{pathname2url(self.db_path)}?mode=ro"
+            connection = sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=DEFAULT_BUSY_TIMEOUT)
+        else:
+            connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=DEFAULT_BUSY_TIMEOUT)
+        connection.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return connection
+
+    def _acquire(self):
+        """取出一个空闲连接；没有空闲连接时按需新建，达到上限则等待"""
+        if self._closed:
+            raise sqlite3.OperationalError(f"连接池已关闭: {self.db_path}")
+
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+
+        if connection is None:
+            create = False
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+            if create:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                start = time.perf_counter()
+                try:
+                    connection = self._idle.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._timeouts += 1
+                    raise sqlite3.OperationalError(f"连接池已耗尽，等待超过 {self.acquire_timeout} 秒: {self.db_path}")
+                waited = time.perf_counter() - start
+                with self._lock:
+                    self._waits += 1
+                    self._wait_time_total += waited
+                    self._wait_time_max = max(self._wait_time_max, waited)
+
+        with self._lock:
+            self._acquired += 1
+            self._in_use += 1
+            self._max_in_use = max(self._max_in_use, self._in_use)
+        return connection
+
+    def _release(self, connection):
+        """归还连接：回滚未结束的事务并重置row_factory和进度回调，避免影响下一个使用者"""
+        with self._lock:
+            self._in_use -= 1
+        try:
+            if connection.in_transaction:
+                connection.rollback()
+            connection.row_factory = None
+            connection.set_progress_handler(None, 0)
+        except sqlite3.Error:
+            # 连接已损坏，丢弃并允许重新创建
+            connection.close()
+            with self._lock:
+                self._created -= 1
+            return
+        if self._closed:
+            connection.close()
+            return
+        self._idle.put(connection)
+
+    def connect(self):
+        """
+        借出一个连接，调用 close() 或退出with时归还连接池
+
+        用法：
+            connection = pool.connect()
+            try:
+                cursor = connection.cursor()
+                ...
+            finally:
+                connection.close()
+        """
+        return PooledConnection(self, self._acquire())
+
+    def stats(self):
+        """
+        获取连接池的使用和等待指标
+
+        Returns:
+            dict: 连接数、借出次数、等待次数/耗时、超时次数等
+        """
+        with self._lock:
+            return {
+                'db_path': self.db_path,
+                'readonly': self.readonly,
+                'size': self.size,
+                'created': self._created,
+                'idle': self._idle.qsize(),
+                'in_use': self._in_use,
+                'max_in_use': self._max_in_use,
+                'acquired': self._acquired,
+                'waits': self._waits,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._waits, 3) if self._waits else 0.0,
+                'timeouts': self._timeouts,
+            }
+
+    def close(self):
+        """关闭所有空闲连接，借出中的连接会在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+
+
+class PooledConnection:
+    """
+    连接池借出的连接，属性和方法均转发给底层的 sqlite3.Connection，
+    区别在于 close() 不会真正关闭连接，而是归还给连接池（重复调用无副作用）
+    """
+
+    def __init__(self, pool, connection):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_connection', connection)
+
+    def __getattr__(self, name):
+        connection = object.__getattribute__(self, '_connection')
+        if connection is None:
+            raise sqlite3.ProgrammingError("连接已归还连接池，不能继续使用")
+        return getattr(connection, name)
+
+    def __setattr__(self, name, value):
+        # row_factory 等属性直接设置到底层连接上，归还时由连接池重置；
+        # 与 close() 一样，归还之后的设置不做任何事（不能影响已被其他请求借出的连接）
+        connection = object.__getattribute__(self, '_connection')
+        if connection is not None:
+            setattr(connection, name, value)
+
+    def cursor(self, *args):
+        # 在开启指标采集的请求内返回计时游标（见 common/metrics.py）
+        return track_cursor(self.__getattr__('cursor')(*args))
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def close(self):
+        """归还连接池"""
+        connection = self._connection
+        if connection is not None:
+            object.__setattr__(self, '_connection', None)
+            self._pool._release(connection)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __del__(self):
+        # 兜底：借出后忘记 close() 的连接在被回收时归还连接池
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ==================== 进程内连接池注册表 ====================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, readonly=True, **kwargs):
+    """
+    获取指定数据库的连接池，同一进程内相同路径只创建一次
+
+    Args:
+        db_path (str): 数据库文件路径
+        readonly (bool): 是否为只读连接池
+        **kwargs: 传给 SQLitePool 的其他参数（仅首次创建时生效）
+
+    Returns:
+        SQLitePool: 连接池实例
+    """
+    key = (os.path.abspath(db_path), readonly)
+    pool = _pools.get(key)
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.pid != os.getpid():
+            # fork后的子进程不能复用父进程的连接，直接丢弃旧连接池
+            pool = SQLitePool(db_path, readonly=readonly, **kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def get_all_pool_stats():
+    """
+    汇总当前进程所有连接池的指标
+
+    Returns:
+        list: 每个连接池的 stats() 结果
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools if pool.pid == os.getpid()]
+
+
+def close_all_pools():
+    """关闭当前进程的所有连接池"""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -13,14 +13,60 @@ from echarts_map_data_functions import (
     get_map_data, 
     get_location_detail, 
     get_animal_list, 
-    get_location_list
+    get_location_list,
+    get_map_tile,
+    get_tile_keys,
+    is_valid_tile,
+    choose_tile_zoom,
+    MAX_TILE_ZOOM,
+    MAX_TILES_PER_REQUEST
     )
+from db_config import get_data_version, get_protection_index, migrate_schema
+from common.sqlite_pool import get_all_pool_stats
+from common.mysql_pool import get_all_mysql_pool_stats
+from common.response_cache import ResponseCache
+from common.metrics import init_metrics
 
 app = Flask(__name__, 
            template_folder='ECharts_map',
            static_folder='ECharts_map/static',
            static_url_path='/static')
 CORS(app)
+init_metrics(app, "echarts_map")  # 请求耗时和SQL耗时指标：GET /metrics
+
+migrate_schema()  # 启动时执行表结构迁移（地图查询依赖 lon/lat 列），不在请求中执行
+
+# 列表和地图数据接口的响应缓存：TTL到期或插入服务提交新数据（数据版本号变化）时失效
+response_cache = ResponseCache(ttl=300, max_entries=512, version_getter=get_data_version)
+
+# 地图瓦片缓存：按 瓦片键 + 筛选条件 缓存每个瓦片的聚合结果，失效规则与响应缓存相同
+tile_cache = ResponseCache(ttl=300, max_entries=4096, version_getter=get_data_version)
+TILE_MAX_AGE = 60  # 瓦片响应的浏览器缓存时间（秒）
+
+
+def parse_bbox(value):
+    """解析 min_lng,min_lat,max_lng,max_lat 格式的bbox参数，格式错误时返回None"""
+    try:
+        bbox = [float(item) for item in value.split(',')]
+    except ValueError:
+        return None
+    return bbox if len(bbox) == 4 else None
+
+
+def get_cached_tile(zoom, x, y, animal_type, start_date, end_date):
+    """
+    从瓦片缓存获取瓦片，未命中时查询数据库并写入缓存
+    查询出错的瓦片（带 error）不写入缓存，下次请求重新查询，避免一次数据库错误让该区域在TTL内一直为空
+    """
+    version = tile_cache.current_version()
+    key = ('map-tile', zoom, x, y, animal_type or 'all', start_date or '', end_date or '')
+    cached_entry = tile_cache.get(key, version)
+    if cached_entry is not None:
+        return cached_entry[0]
+    tile = get_map_tile(zoom, x, y, animal_type, start_date, end_date)
+    if version is not None and 'error' not in tile:
+        tile_cache.set(key, version, tile, None)
+    return tile
 
 @app.route('/')
 def index():
@@ -29,6 +75,7 @@ def index():
 
 
 @app.route('/api/animal-list')
+@response_cache.cached()
 def api_animal_list():
     """获取动物种类列表API"""
     try:
@@ -41,6 +88,7 @@ def api_animal_list():
 
 
 @app.route('/api/location-list')  # 待修改
+@response_cache.cached()
 def api_location_list():
     """获取地点列表API"""
     try:
@@ -53,6 +101,7 @@ def api_location_list():
     
 
 @app.route('/api/map-data')
+@response_cache.cached()
 def api_map_data():
     """
     获取地图数据API
@@ -60,13 +109,20 @@ def api_map_data():
     - animal_type: 动物种类筛选
     - start_date: 开始日期 (YYYY-MM-DD)
     - end_date: 结束日期 (YYYY-MM-DD)
+    - bbox: 矩形范围 min_lng,min_lat,max_lng,max_lat (可选)
     """
     try:
         animal_type = request.args.get('animal_type')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        bbox = request.args.get('bbox')
         
-        data = get_map_data(animal_type, start_date, end_date)
+        if bbox:
+            bbox = parse_bbox(bbox)
+            if bbox is None:
+                return jsonify({'error': 'bbox格式应为 min_lng,min_lat,max_lng,max_lat'}), 400
+        
+        data = get_map_data(animal_type, start_date, end_date, bbox)
         return jsonify(data)
         
     except Exception as e:
@@ -74,6 +130,62 @@ def api_map_data():
         return jsonify([]), 500
 
 
+@app.route('/api/map-tiles')
+def api_map_tiles():
+    """
+    按视野范围获取聚合后的地图瓦片API
+    支持参数:
+    - bbox: 视野范围 min_lng,min_lat,max_lng,max_lat (必需)
+    - zoom: 瓦片级别 (可选，不指定时根据视野范围自动选择)
+    - animal_type / start_date / end_date: 与 /api/map-data 相同的筛选条件
+    """
+    bbox = parse_bbox(request.args.get('bbox', ''))
+    if bbox is None:
+        return jsonify({'error': 'bbox格式应为 min_lng,min_lat,max_lng,max_lat'}), 400
+    zoom = request.args.get('zoom', type=int)
+    if zoom is None:
+        zoom = choose_tile_zoom(bbox)
+    zoom = max(0, min(MAX_TILE_ZOOM, zoom))
+
+    keys = get_tile_keys(bbox, zoom)
+    if len(keys) > MAX_TILES_PER_REQUEST:
+        return jsonify({'error': f'视野范围过大：需要 {len(keys)} 个瓦片，最多 {MAX_TILES_PER_REQUEST} 个，请降低zoom'}), 400
+
+    animal_type = request.args.get('animal_type')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    tiles = [get_cached_tile(z, x, y, animal_type, start_date, end_date) for z, x, y in keys]
+    response = jsonify({'zoom': zoom, 'tiles': tiles})
+    if any('error' in tile for tile in tiles):
+        response.headers['Cache-Control'] = 'no-store'  # 部分瓦片查询失败（见各瓦片的 error），不让浏览器缓存
+    return response
+
+
+@app.route('/api/map-tile')
+def api_map_tile():
+    """
+    获取单个地图瓦片API（可被浏览器/CDN按URL缓存）
+    支持参数:
+    - z, x, y: 瓦片编号 (必需)
+    - animal_type / start_date / end_date: 筛选条件
+    """
+    z = request.args.get('z', type=int)
+    x = request.args.get('x', type=int)
+    y = request.args.get('y', type=int)
+    if z is None or x is None or y is None or not is_valid_tile(z, x, y):
+        return jsonify({'error': '瓦片编号无效'}), 400
+
+    tile = get_cached_tile(z, x, y, request.args.get('animal_type'),
+                           request.args.get('start_date'), request.args.get('end_date'))
+    if 'error' in tile:
+        response = jsonify(tile)
+        response.headers['Cache-Control'] = 'no-store'
+        return response, 500
+    response = jsonify(tile)
+    response.headers['Cache-Control'] = f'public, max-age={TILE_MAX_AGE}'
+    return response
+
+
 @app.route('/api/location-detail')
 def api_location_detail():
     """
@@ -112,7 +224,6 @@ def api_location_detail():
             animal_type=animal_type,
             limit=limit
         )
-        print(f"📊 API返回数据: {data}")
         return jsonify(data)
         
     except Exception as e:
@@ -121,6 +232,24 @@ def api_location_detail():
 
 
 
+@app.route('/api/pool-stats')
+def api_pool_stats():
+    """连接池使用和等待指标API（SQLite连接池和MySQL后端的连接池）"""
+    return jsonify(get_all_pool_stats() + get_all_mysql_pool_stats())
+
+
+@app.route('/api/cache-stats')
+def api_cache_stats():
+    """响应缓存和瓦片缓存的命中/未命中指标API"""
+    return jsonify(dict(response_cache.stats(), tiles=tile_cache.stats()))
+
+
+@app.route('/api/protection-index-stats')
+def api_protection_index_stats():
+    """保护级别内存索引的条目数和重新加载次数API"""
+    return jsonify(get_protection_index().stats())
+
+
 @app.route('/debug')
 def debug():
     """调试页面 - 显示API状态"""
@@ -131,9 +260,14 @@ def debug():
         'endpoints': [
             {'path': '/', 'method': 'GET', 'description': '主页面'},
             {'path': '/api/map-data', 'method': 'GET', 'description': '获取地图数据'},
+            {'path': '/api/map-tiles', 'method': 'GET', 'description': '按视野范围获取聚合后的地图瓦片'},
+            {'path': '/api/map-tile', 'method': 'GET', 'description': '获取单个地图瓦片'},
             {'path': '/api/location-detail', 'method': 'GET', 'description': '获取地点详情'},
             {'path': '/api/animal-list', 'method': 'GET', 'description': '获取动物种类列表'},
             {'path': '/api/location-list', 'method': 'GET', 'description': '获取地点列表'},
+            {'path': '/api/pool-stats', 'method': 'GET', 'description': '连接池指标'},
+            {'path': '/api/cache-stats', 'method': 'GET', 'description': '响应缓存指标'},
+            {'path': '/api/protection-index-stats', 'method': 'GET', 'description': '保护级别索引指标'},
         ]
     }
     
@@ -175,5 +309,9 @@ if __name__ == '__main__':
     print("📍 访问地址: http://localhost:5005")
     print("🔧 调试页面: http://localhost:5005/debug")
     print("=" * 50)
+
+    # 启动时加载保护级别内存索引（未在此加载时会在首次查询时加载）
+    protection_stats = get_protection_index().stats()
+    print(f"🛡️ 保护级别索引已加载: {protection_stats['size']} 条")
     
     app.run(debug=True, host='0.0.0.0', port=5005)
\ No newline at end of file
@@ -1,4 +1,15 @@
 # db_config.py
+import os
+import sys
+import tempfile
+
+# 添加项目根目录到Python路径，以便导入common模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from common.mysql_pool import get_mysql_pool
+
 DB_HOST = "localhost"
 DB_USER = "root"
 DB_PASSWORD = "123456"
@@ -23,4 +34,92 @@ def get_table_name():
     """
     获取主要数据表名称
     """
-    return "image_info"
\ No newline at end of file
+    return "image_info"
+
+# ==================== 连接池 ====================
+
+# 数据库驱动：
+# - "mysql":  mysql.connector 连接MySQL（默认）
+# - "sqlite": 本地SQLite替身（common/mysql_shim.py），用于没有MySQL服务器时运行和压测
+HEATMAP_DB_DRIVER = os.environ.get("HEATMAP_DB_DRIVER", "mysql")
+# 替身会给 image_info 表加列，没有默认路径：需用 IMAGE_INFO_DB_PATH 指定数据库副本或合成数据库
+SHIM_DB_PATH = os.environ.get("IMAGE_INFO_DB_PATH", "")
+SHIM_CONNECT_DELAY = float(os.environ.get("HEATMAP_SHIM_CONNECT_DELAY_MS", "0")) / 1000  # 替身模拟的建连耗时（秒）
+
+POOL_SIZE = int(os.environ.get("HEATMAP_POOL_SIZE", "8"))                          # 最大连接数，0表示每次请求新建连接
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get("HEATMAP_POOL_ACQUIRE_TIMEOUT", "5"))  # 连接池耗尽时的最长等待时间（秒）
+POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("HEATMAP_POOL_HEALTH_CHECK", "30"))  # 空闲超过该时间（秒）的连接借出前先 ping
+POOL_STATEMENT_CACHE = int(os.environ.get("HEATMAP_POOL_STATEMENT_CACHE", "32"))   # 每个连接缓存的预处理语句数
+
+def get_pool_config():
+    """
+    获取连接池配置
+    """
+    return {
+        "driver": HEATMAP_DB_DRIVER,
+        "size": POOL_SIZE,
+        "acquire_timeout": POOL_ACQUIRE_TIMEOUT,
+        "health_check_interval": POOL_HEALTH_CHECK_INTERVAL,
+        "statement_cache_size": POOL_STATEMENT_CACHE
+    }
+
+def get_db_connection():
+    """
+    从连接池借出一个数据库连接（close() 时归还连接池）
+    """
+    config = get_pool_config()
+    options = {
+        "size": config["size"],
+        "acquire_timeout": config["acquire_timeout"],
+        "health_check_interval": config["health_check_interval"],
+        "statement_cache_size": config["statement_cache_size"]
+    }
+    if config["driver"] == "sqlite":
+        from common import mysql_shim
+        mysql_shim.check_shim_path(SHIM_DB_PATH)
+        pool = get_mysql_pool({"db_path": SHIM_DB_PATH, "connect_delay": SHIM_CONNECT_DELAY},
+                              connect=mysql_shim.connect, name=f"sqlite:{os.path.basename(SHIM_DB_PATH)}", **options)
+    else:
+        pool = get_mysql_pool(get_db_config(), **options)
+    return pool.connect()
+
+# ==================== 摄像头登记表 ====================
+
+SENSOR_REGISTRY_REFRESH = float(os.environ.get("HEATMAP_SENSOR_REFRESH", "300"))   # 重建登记表和内存索引的间隔（秒），0表示只在首次使用时重建
+SENSOR_SNAP_DISTANCE = float(os.environ.get("HEATMAP_SENSOR_SNAP_DISTANCE", "0.01"))  # 点击坐标与摄像头的最大距离（度）
+SENSOR_REGISTRY_LOCK_PATH = os.environ.get(                                         # 重建者的锁文件：多个worker中只有持有者重建登记表
+    "HEATMAP_SENSOR_LOCK_PATH",
+    os.path.join(tempfile.gettempdir(), "heatmap_sensor_registry.lock")
+)
+
+def get_sensor_registry_config():
+    """
+    获取摄像头登记表配置
+    """
+    return {
+        "refresh_interval": SENSOR_REGISTRY_REFRESH,
+        "snap_distance": SENSOR_SNAP_DISTANCE,
+        "lock_path": SENSOR_REGISTRY_LOCK_PATH
+    }
+
+# ==================== 密度网格 ====================
+
+GRID_DEFAULT_RESOLUTION = int(os.environ.get("HEATMAP_GRID_RESOLUTION", "256"))   # 默认网格列数
+GRID_MAX_RESOLUTION = int(os.environ.get("HEATMAP_GRID_MAX_RESOLUTION", "1024"))  # 网格行数/列数上限
+GRID_DEFAULT_BANDWIDTH = float(os.environ.get("HEATMAP_GRID_BANDWIDTH", "1.5"))   # 高斯核标准差（网格单元数）
+GRID_CACHE_TTL = float(os.environ.get("HEATMAP_GRID_CACHE_TTL", "60"))            # 点位汇总和网格的缓存有效期（秒）
+GRID_MAX_POINT_SETS = int(os.environ.get("HEATMAP_GRID_MAX_POINT_SETS", "64"))    # 缓存的 (动物, 时间窗口) 点位汇总数
+GRID_MAX_GRIDS = int(os.environ.get("HEATMAP_GRID_MAX_GRIDS", "256"))             # 缓存的网格数
+
+def get_density_grid_config():
+    """
+    获取密度网格配置
+    """
+    return {
+        "default_resolution": GRID_DEFAULT_RESOLUTION,
+        "max_resolution": GRID_MAX_RESOLUTION,
+        "default_bandwidth": GRID_DEFAULT_BANDWIDTH,
+        "cache_ttl": GRID_CACHE_TTL,
+        "max_point_sets": GRID_MAX_POINT_SETS,
+        "max_grids": GRID_MAX_GRIDS
+    }
@@ -0,0 +1,188 @@
+# density_grid.py - 热力图密度网格
+"""
+在服务端把检测点汇总为规则网格，浏览器只需按网格着色，渲染开销与检测数量无关。
+
+主要功能：
+- bin_counts():      按 bbox 和分辨率对点位做加权计数（NumPy 向量化，np.bincount）
+- kernel_density():  对计数网格做高斯核平滑（可分离卷积，用两个带状矩阵相乘实现）
+- encode_grid():     量化为 uint16 并 Base64 编码的紧凑类型数组，前端用 Uint16Array 直接读取
+- DensityGridService: 点位汇总按 (动物, 时间窗口) 缓存，网格按 (动物, 分辨率, 时间窗口, bbox, 方法) 缓存
+
+网格行序：第0行为 bbox 最北侧（与画布/图片的行序一致），第0列为最西侧。
+"""
+
+import base64
+import math
+
+import numpy as np
+
+try:
+    from .db_config import get_density_grid_config
+except ImportError:
+    from db_config import get_density_grid_config
+
+from common.response_cache import ResponseCache
+
+
+def bin_counts(lons, lats, weights, bbox, width, height):
+    """
+    按网格对点位做加权计数
+
+    Args:
+        lons, lats, weights: 等长的一维数组
+        bbox (tuple): (min_lon, min_lat, max_lon, max_lat)
+        width, height (int): 网格列数、行数
+
+    Returns:
+        np.ndarray: (height, width) 的 float64 网格，bbox 之外的点不计入
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    lons = np.asarray(lons, dtype=np.float64)
+    lats = np.asarray(lats, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+
+    inside = (lons >= min_lon) & (lons <= max_lon) & (lats >= min_lat) & (lats <= max_lat)
+    lons, lats, weights = lons[inside], lats[inside], weights[inside]
+
+    columns = ((lons - min_lon) / (max_lon - min_lon) * width).astype(np.int64)
+    rows = ((max_lat - lats) / (max_lat - min_lat) * height).astype(np.int64)
+    np.clip(columns, 0, width - 1, out=columns)   # 落在东/南边界上的点归入最后一列/行
+    np.clip(rows, 0, height - 1, out=rows)
+
+    grid = np.bincount(rows * width + columns, weights=weights, minlength=width * height)
+    return grid.reshape(height, width)
+
+
+def _gaussian_matrix(size, sigma):
+    """一维高斯卷积的带状矩阵（每列归一化，平滑前后总量不变）"""
+    radius = max(1, int(math.ceil(3 * sigma)))
+    offsets = np.arange(size)[:, None] - np.arange(size)[None, :]
+    matrix = np.where(np.abs(offsets) <= radius, np.exp(-0.5 * (offsets / sigma) ** 2), 0.0)
+    return matrix / matrix.sum(axis=0, keepdims=True)
+
+
+def kernel_density(grid, bandwidth):
+    """
+    高斯核密度：对计数网格做可分离的高斯平滑
+
+    Args:
+        grid (np.ndarray): bin_counts 的结果
+        bandwidth (float): 高斯核标准差（网格单元数），<=0 时原样返回
+    """
+    if bandwidth <= 0:
+        return grid
+    height, width = grid.shape
+    return _gaussian_matrix(height, bandwidth) @ grid @ _gaussian_matrix(width, bandwidth).T
+
+
+def encode_grid(grid, bbox):
+    """
+    网格编码为紧凑的类型数组载荷
+
+    数值按最大值线性量化到 0-65535（uint16，小端），原值 ≈ data[i] * scale
+
+    Returns:
+        dict: width, height, bbox, encoding, scale, max, total, nonzero, data（Base64）
+    """
+    height, width = grid.shape
+    peak = float(grid.max()) if grid.size else 0.0
+    scale = peak / 65535 if peak > 0 else 0.0
+    if peak > 0:
+        quantized = np.rint(grid * (65535 / peak)).astype('<u2')
+    else:
+        quantized = np.zeros(grid.shape, dtype='<u2')
+    return {
+        'width': width,
+        'height': height,
+        'bbox': [float(value) for value in bbox],
+        'encoding': 'uint16',
+        'scale': scale,
+        'max': round(peak, 6),
+        'total': round(float(grid.sum()), 6),
+        'nonzero': int(np.count_nonzero(quantized)),
+        'data': base64.b64encode(quantized.tobytes()).decode('ascii'),
+    }
+
+
+def data_extent(lons, lats, padding=0.05):
+    """点位范围（四周留出 padding 比例的边距），没有点位时返回None"""
+    if len(lons) == 0:
+        return None
+    min_lon, max_lon = float(np.min(lons)), float(np.max(lons))
+    min_lat, max_lat = float(np.min(lats)), float(np.max(lats))
+    pad_lon = max((max_lon - min_lon) * padding, 0.01)
+    pad_lat = max((max_lat - min_lat) * padding, 0.01)
+    return (max(min_lon - pad_lon, -180.0), max(min_lat - pad_lat, -90.0),
+            min(max_lon + pad_lon, 180.0), min(max_lat + pad_lat, 90.0))
+
+
+class DensityGridService:
+    """
+    密度网格服务
+
+    Args:
+        points_loader (callable): points_loader(animal, days) -> (lons, lats, weights)，
+                                  每个坐标一行的汇总结果（行数与点位数相同，与检测数量无关）
+        ttl (float): 缓存有效期（秒）
+    """
+
+    def __init__(self, points_loader, ttl=None):
+        config = get_density_grid_config()
+        ttl = config['cache_ttl'] if ttl is None else ttl
+        self.points_loader = points_loader
+        self._points_cache = ResponseCache(ttl=ttl, max_entries=config['max_point_sets'])
+        self._grid_cache = ResponseCache(ttl=ttl, max_entries=config['max_grids'])
+
+    def points(self, animal, days):
+        """(动物, 时间窗口) 的点位汇总（带缓存）"""
+        key = ('points', animal, days)
+        cached = self._points_cache.get(key, None)
+        if cached is not None:
+            return cached[0]
+        lons, lats, weights = self.points_loader(animal, days)
+        points = (np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64),
+                  np.asarray(weights, dtype=np.float64))
+        self._points_cache.set(key, None, points, None)
+        return points
+
+    def grid(self, animal=None, days=None, bbox=None, width=256, height=None, method='kde', bandwidth=1.5):
+        """
+        计算（或从缓存读取）密度网格
+
+        Args:
+            animal (str, optional): 动物名称
+            days (int, optional): 最近N天，None为全部
+            bbox (tuple, optional): (min_lon, min_lat, max_lon, max_lat)，默认为点位范围
+            width (int): 网格列数
+            height (int, optional): 网格行数，默认按 bbox 的经纬度比例计算
+            method (str): 'bins' 计数网格，'kde' 高斯核密度
+            bandwidth (float): 高斯核标准差（网格单元数）
+
+        Returns:
+            dict: encode_grid 的载荷，附加 animal/days/method/bandwidth/points；没有点位时 data 为空网格
+        """
+        lons, lats, weights = self.points(animal, days)
+        if bbox is None:
+            bbox = data_extent(lons, lats) or (-180.0, -90.0, 180.0, 90.0)
+        bbox = tuple(round(float(value), 6) for value in bbox)
+        if height is None:
+            ratio = (bbox[3] - bbox[1]) / (bbox[2] - bbox[0])
+            height = max(1, min(get_density_grid_config()['max_resolution'], int(round(width * ratio))))
+
+        key = ('grid', animal, days, bbox, width, height, method, bandwidth)
+        cached = self._grid_cache.get(key, None)
+        if cached is not None:
+            return cached[0]
+
+        grid = bin_counts(lons, lats, weights, bbox, width, height)
+        if method == 'kde':
+            grid = kernel_density(grid, bandwidth)
+        payload = encode_grid(grid, bbox)
+        payload.update({'animal': animal, 'days': days, 'method': method,
+                        'bandwidth': bandwidth if method == 'kde' else 0, 'points': int(len(lons))})
+        self._grid_cache.set(key, None, payload, None)
+        return payload
+
+    def stats(self):
+        """点位和网格缓存的命中指标"""
+        return {'points': self._points_cache.stats(), 'grids': self._grid_cache.stats()}
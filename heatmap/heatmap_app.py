@@ -3,34 +3,37 @@
 
 from flask import Flask, jsonify, render_template, send_from_directory
 from flask_cors import CORS
-import mysql.connector
-from db_config import get_db_config
+from db_config import get_density_grid_config, get_sensor_registry_config, get_db_connection as borrow_connection
 import json
 from datetime import datetime
 import os
 
+from common.coordinates import parse_longitude, parse_latitude
+from common.metrics import init_metrics
+from common.mysql_pool import fetch_dicts
+from density_grid import DensityGridService
+from sensor_registry import SensorRegistry
+
 app = Flask(__name__)
 CORS(app)
+init_metrics(app, "heatmap")  # 请求耗时、SQL耗时和连接池指标：GET /metrics
 
 def get_db_connection():
-    """获取数据库连接"""
+    """从连接池借出数据库连接（close() 时归还连接池），各查询使用预处理语句"""
     try:
-        config = get_db_config()
-        connection = mysql.connector.connect(**config)
-        return connection
+        return borrow_connection()
     except Exception as e:
         print(f"数据库连接错误: {e}")
         return None
 
 def get_heatmap_data():
     """获取热力图数据：动物种类在各摄像头点位的分布"""
+    connection = None
     try:
         connection = get_db_connection()
         if not connection:
             return []
         
-        cursor = connection.cursor(dictionary=True)
-        
         # 查询每个摄像头位置的动物种类分布
         query = """
         SELECT 
@@ -56,15 +59,18 @@ def get_heatmap_data():
         ORDER BY sensor_id, count DESC
         """
         
+        cursor = connection.prepare(query)
         cursor.execute(query)
-        results = cursor.fetchall()
+        results = fetch_dicts(cursor)
         
         # 转换数据格式
         heatmap_data = []
         for row in results:
             try:
-                lat = float(row['latitude'])
-                lng = float(row['longitude'])
+                lat = parse_latitude(row['latitude'])
+                lng = parse_longitude(row['longitude'])
+                if lat is None or lng is None:
+                    continue
                 
                 heatmap_data.append({
                     'sensor_id': row['sensor_id'],
@@ -85,24 +91,23 @@ def get_heatmap_data():
                 print(f"数据转换错误: {e}, 行数据: {row}")
                 continue
         
-        cursor.close()
-        connection.close()
-        
         return heatmap_data
         
     except Exception as e:
         print(f"获取热力图数据错误: {e}")
         return []
+    finally:
+        if connection is not None:
+            connection.close()
 
 def get_sensor_locations():
     """获取所有摄像头位置信息"""
+    connection = None
     try:
         connection = get_db_connection()
         if not connection:
             return []
         
-        cursor = connection.cursor(dictionary=True)
-        
         query = """
         SELECT DISTINCT
             sensor_id,
@@ -119,14 +124,17 @@ def get_sensor_locations():
         ORDER BY total_detections DESC
         """
         
+        cursor = connection.prepare(query)
         cursor.execute(query)
-        results = cursor.fetchall()
+        results = fetch_dicts(cursor)
         
         sensors = []
         for row in results:
             try:
-                lat = float(row['latitude'])
-                lng = float(row['longitude'])
+                lat = parse_latitude(row['latitude'])
+                lng = parse_longitude(row['longitude'])
+                if lat is None or lng is None:
+                    continue
                 
                 sensors.append({
                     'sensor_id': row['sensor_id'],
@@ -138,24 +146,23 @@ def get_sensor_locations():
             except (ValueError, TypeError):
                 continue
         
-        cursor.close()
-        connection.close()
-        
         return sensors
         
     except Exception as e:
         print(f"获取摄像头位置错误: {e}")
         return []
+    finally:
+        if connection is not None:
+            connection.close()
 
 def get_animal_stats():
     """获取动物种类统计数据"""
+    connection = None
     try:
         connection = get_db_connection()
         if not connection:
             return []
         
-        cursor = connection.cursor(dictionary=True)
-        
         query = """
         SELECT 
             COALESCE(animal, object) as animal_name,
@@ -169,8 +176,9 @@ def get_animal_stats():
         LIMIT 20
         """
         
+        cursor = connection.prepare(query)
         cursor.execute(query)
-        results = cursor.fetchall()
+        results = fetch_dicts(cursor)
         
         stats = []
         for row in results:
@@ -181,14 +189,61 @@ def get_animal_stats():
                 'avg_confidence': round(float(row['avg_confidence'] or 0), 2)
             })
         
-        cursor.close()
-        connection.close()
-        
         return stats
         
     except Exception as e:
         print(f"获取动物统计错误: {e}")
         return []
+    finally:
+        if connection is not None:
+            connection.close()
+
+def load_grid_points(animal=None, days=None):
+    """
+    密度网格的点位汇总：按坐标分组计数，返回 (经度列表, 纬度列表, 检测数列表)
+    行数等于点位数，与检测数量无关
+    """
+    connection = get_db_connection()
+    if not connection:
+        raise RuntimeError('数据库连接失败')
+    try:
+        query = """
+        SELECT longitude, latitude, COUNT(*) as count
+        FROM image_info
+        WHERE longitude IS NOT NULL
+        AND latitude IS NOT NULL
+        AND longitude != ''
+        AND latitude != ''
+        """
+        params = []
+        if animal:
+            query += " AND (animal = %s OR object = %s)"
+            params += [animal, animal]
+        if days:
+            query += " AND created_at >= NOW() - INTERVAL %s DAY"
+            params.append(int(days))
+        query += " GROUP BY longitude, latitude"
+
+        cursor = connection.prepare(query)
+        cursor.execute(query, tuple(params))
+        lons, lats, counts = [], [], []
+        for longitude, latitude, count in cursor.fetchall():
+            lon = parse_longitude(longitude)
+            lat = parse_latitude(latitude)
+            if lon is None or lat is None:
+                continue
+            lons.append(lon)
+            lats.append(lat)
+            counts.append(count)
+        return lons, lats, counts
+    finally:
+        connection.close()
+
+# 摄像头登记表和点击坐标的内存网格索引（服务启动时加载，登记表只由持有锁文件的一个进程重建）
+sensor_registry = SensorRegistry(borrow_connection, **get_sensor_registry_config()).start()
+
+# 点位汇总和网格按 (动物, 时间窗口, 分辨率, bbox, 方法) 缓存
+density_grid_service = DensityGridService(load_grid_points)
 
 @app.route('/')
 def index():
@@ -236,48 +291,52 @@ def api_point_details():
     if not lat or not lng:
         return jsonify({'status': 'error', 'message': '缺少坐标参数'})
     
+    connection = None
     try:
+        # 在内存网格索引中把点击坐标解析为最近的点位（start() 只在fork后的子进程中重新启动刷新线程）
+        sensor = sensor_registry.start().nearest(float(lng), float(lat))
+        if not sensor:
+            return jsonify({'status': 'error', 'message': '未找到该点位的数据'})
+
         connection = get_db_connection()
         if not connection:
             return jsonify({'status': 'error', 'message': '数据库连接失败'})
         
-        cursor = connection.cursor(dictionary=True)
-        
-        # 查询该点位的详细信息
+        # 按点位的坐标文本走 (longitude, latitude, created_at) 索引取最近的记录（包括没有 sensor_id 的记录），
+        # 各物种检测次数取自预先计算的登记表
         query = """
         SELECT 
             sensor_id,
             location,
-            longitude,
-            latitude,
             object as animal_type,
             animal,
             caption,
             image_path,
             confidence,
             percentage,
-            created_at,
-            COUNT(*) OVER (PARTITION BY sensor_id, object) as total_count
+            created_at
         FROM image_info 
-        WHERE ABS(latitude - %s) < 0.001 
-        AND ABS(longitude - %s) < 0.001
+        WHERE longitude = %s AND latitude = %s
         AND object IS NOT NULL
         ORDER BY created_at DESC
         LIMIT 10
         """
         
-        cursor.execute(query, (float(lat), float(lng)))
-        results = cursor.fetchall()
+        cursor = connection.prepare(query)
+        cursor.execute(query, (sensor['longitude_text'], sensor['latitude_text']))
+        results = fetch_dicts(cursor)
         
         if not results:
             return jsonify({'status': 'error', 'message': '未找到该点位的数据'})
         
         # 处理数据
+        object_counts = sensor_registry.object_counts(sensor['point_id'])
         point_info = {
-            'sensor_id': results[0]['sensor_id'],
-            'location': results[0]['location'],
-            'latitude': float(lat),
-            'longitude': float(lng),
+            'sensor_id': sensor['sensor_id'],
+            'location': sensor['location'],
+            'latitude': sensor['latitude'],
+            'longitude': sensor['longitude'],
+            'total_detections': sensor['total_count'],
             'detections': []
         }
         
@@ -290,7 +349,7 @@ def api_point_details():
                 'confidence': round(float(row['confidence'] or 0), 2),
                 'percentage': round(float(row['percentage'] or 0), 2),
                 'created_at': str(row['created_at']),
-                'total_count': row['total_count']
+                'total_count': object_counts.get(row['animal_type'], 0)
             })
         
         # 使用第一条记录的caption作为点位的主要描述，如果没有则生成
@@ -305,10 +364,8 @@ def api_point_details():
                 animals[animal] += 1
             
             animal_summary = ', '.join([f"{animal}({count}次)" for animal, count in animals.items()])
-            point_info['caption'] = f"摄像头{point_info['sensor_id']}位于{point_info['location']}，检测到：{animal_summary}"
-        
-        cursor.close()
-        connection.close()
+            camera = f"摄像头{point_info['sensor_id']}" if point_info['sensor_id'] else "监测点"
+            point_info['caption'] = f"{camera}位于{point_info['location']}，检测到：{animal_summary}"
         
         return jsonify({
             'status': 'success',
@@ -317,17 +374,19 @@ def api_point_details():
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
+    finally:
+        if connection is not None:
+            connection.close()
 
 @app.route('/api/heatmap-by-animal/<animal_name>')
 def api_heatmap_by_animal(animal_name):
     """按动物种类筛选的热力图数据"""
+    connection = None
     try:
         connection = get_db_connection()
         if not connection:
             return jsonify({'status': 'error', 'message': '数据库连接失败'})
         
-        cursor = connection.cursor(dictionary=True)
-        
         query = """
         SELECT 
             sensor_id,
@@ -346,14 +405,17 @@ def api_heatmap_by_animal(animal_name):
         ORDER BY count DESC
         """
         
+        cursor = connection.prepare(query)
         cursor.execute(query, (animal_name, animal_name))
-        results = cursor.fetchall()
+        results = fetch_dicts(cursor)
         
         data = []
         for row in results:
             try:
-                lat = float(row['latitude'])
-                lng = float(row['longitude'])
+                lat = parse_latitude(row['latitude'])
+                lng = parse_longitude(row['longitude'])
+                if lat is None or lng is None:
+                    continue
                 
                 data.append({
                     'sensor_id': row['sensor_id'],
@@ -367,9 +429,6 @@ def api_heatmap_by_animal(animal_name):
             except (ValueError, TypeError):
                 continue
         
-        cursor.close()
-        connection.close()
-        
         return jsonify({
             'status': 'success',
             'data': data,
@@ -379,6 +438,51 @@ def api_heatmap_by_animal(animal_name):
         
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)})
+    finally:
+        if connection is not None:
+            connection.close()
+
+@app.route('/api/heatmap-grid')
+def api_heatmap_grid():
+    """
+    密度网格API：服务端计算计数网格或高斯核密度，返回 uint16 类型数组（Base64）
+
+    参数：animal 动物名称、days 最近N天、bbox=最小经度,最小纬度,最大经度,最大纬度、
+         width/height 网格列数/行数、method=kde|bins、bandwidth 高斯核标准差（网格单元数）
+    """
+    from flask import request
+
+    config = get_density_grid_config()
+    try:
+        animal = request.args.get('animal') or None
+        days = request.args.get('days', type=int) or None
+        width = request.args.get('width', config['default_resolution'], type=int)
+        height = request.args.get('height', type=int)
+        method = request.args.get('method', 'kde')
+        bandwidth = request.args.get('bandwidth', config['default_bandwidth'], type=float)
+
+        bbox = None
+        if request.args.get('bbox'):
+            bbox = tuple(float(value) for value in request.args['bbox'].split(','))
+            if len(bbox) != 4 or bbox[0] >= bbox[2] or bbox[1] >= bbox[3]:
+                return jsonify({'status': 'error', 'message': 'bbox格式应为 最小经度,最小纬度,最大经度,最大纬度'})
+        if method not in ('kde', 'bins'):
+            return jsonify({'status': 'error', 'message': 'method只支持 kde 或 bins'})
+        for size in (width, height):
+            if size is not None and not 1 <= size <= config['max_resolution']:
+                return jsonify({'status': 'error', 'message': f"网格大小应在 1-{config['max_resolution']} 之间"})
+
+        data = density_grid_service.grid(animal=animal, days=days, bbox=bbox, width=width,
+                                         height=height, method=method, bandwidth=bandwidth)
+        return jsonify({
+            'status': 'success',
+            'data': data
+        })
+
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'bbox 参数无效'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)})
 
 if __name__ == '__main__':
     # 确保heatmap目录存在
@@ -389,5 +493,6 @@ if __name__ == '__main__':
     print("📍 访问地址: http://127.0.0.1:5003")
     print("🔥 热力图数据API: http://127.0.0.1:5003/api/heatmap-data")
     print("📊 动物统计API: http://127.0.0.1:5003/api/animal-stats")
+    print("🧮 密度网格API: http://127.0.0.1:5004/api/heatmap-grid")
     
     app.run(host='0.0.0.0', port=5004, debug=True)
\ No newline at end of file
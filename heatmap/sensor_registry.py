@@ -0,0 +1,328 @@
+# sensor_registry.py - 摄像头点位登记表和内存网格索引
+"""
+点位详情接口原来按 ABS(latitude - %s) < 0.001 AND ABS(longitude - %s) < 0.001 过滤，
+没有索引可以使用，每次点击都要扫描全表并对所有匹配行计算窗口函数。这里改为：
+
+- sensor_registry 表：每个不同的坐标（image_info 中的 longitude/latitude 文本）一行，即一个点位：
+  数值坐标（由 E103.10 / N31.02 等文本解析）、该点位最常见的 sensor_id（可为NULL）和位置、检测总数。
+  按坐标而不是 sensor_id 登记：没有 sensor_id 的记录同样可以点中，出现在多个坐标的摄像头每个坐标各有一个点位
+- sensor_object_counts 表：预先计算的 (点位, object) 检测次数，代替 COUNT(*) OVER (PARTITION BY ...)
+- image_info (longitude, latitude, created_at) 索引：点位详情只按坐标取最近的记录
+- SensorGridIndex: 内存中的均匀网格索引，点击坐标在微秒级解析为最近的点位
+- SensorRegistry: 服务启动时加载索引，后台线程每 refresh_interval 秒刷新一次，失败时保留旧索引
+  两张表只由持有锁文件（lock_path）的一个进程重建（多个worker时其他进程只读取登记表），
+  持有者退出后，下一个刷新的进程接管重建
+
+坐标无法解析的记录不进入登记表。建表语句和SQL同时兼容MySQL和本地SQLite替身（common/mysql_shim.py）。
+"""
+import math
+import os
+import tempfile
+import threading
+import time
+
+from common.coordinates import parse_longitude, parse_latitude
+from common.file_lock import acquire_lock_file
+
+DEFAULT_REFRESH_INTERVAL = 300.0   # 重建登记表和索引的间隔（秒）
+DEFAULT_SNAP_DISTANCE = 0.01       # 点击坐标与摄像头的最大距离（度），超过时视为未点中
+DEFAULT_LOCK_PATH = os.path.join(tempfile.gettempdir(), "heatmap_sensor_registry.lock")  # 重建者的锁文件
+MIN_LATITUDE_SCALE = 1e-6          # 纬度余弦的下限（两极附近经度方向的搜索范围按此封顶）
+
+REGISTRY_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS sensor_registry (
+        point_id INT NOT NULL PRIMARY KEY,
+        sensor_id VARCHAR(64),
+        location VARCHAR(255),
+        longitude_text VARCHAR(64) NOT NULL,
+        latitude_text VARCHAR(64) NOT NULL,
+        longitude DOUBLE NOT NULL,
+        latitude DOUBLE NOT NULL,
+        total_count INT NOT NULL DEFAULT 0,
+        last_detection DATETIME,
+        updated_at DATETIME
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sensor_object_counts (
+        point_id INT NOT NULL,
+        object VARCHAR(255) NOT NULL,
+        count INT NOT NULL,
+        PRIMARY KEY (point_id, object)
+    )
+    """,
+]
+DETAIL_INDEX = ("idx_image_info_coordinate_created", "image_info", "longitude, latitude, created_at")
+
+
+def ensure_registry_schema(connection):
+    """
+    创建登记表和 image_info 的 (longitude, latitude, created_at) 索引（已存在时跳过）
+    旧版按 sensor_id 登记的表（没有 point_id 列）直接删除重建，登记表的数据都由 rebuild_registry() 重新生成
+    """
+    cursor = connection.cursor()
+    for ddl in REGISTRY_TABLES:
+        cursor.execute(ddl)
+    cursor.execute("SHOW COLUMNS FROM sensor_registry")
+    if 'point_id' not in {row[0] for row in cursor.fetchall()}:
+        cursor.execute("DROP TABLE sensor_registry")
+        cursor.execute("DROP TABLE sensor_object_counts")
+        for ddl in REGISTRY_TABLES:
+            cursor.execute(ddl)
+    name, table, columns = DETAIL_INDEX
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (name,))
+    if not cursor.fetchall():
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    connection.commit()
+
+
+def rebuild_registry(connection):
+    """
+    从 image_info 重建 sensor_registry 和 sensor_object_counts：每个不同的坐标一个点位
+
+    点位的 sensor_id 和位置取该坐标上检测次数最多的（没有 sensor_id 的记录计入检测次数，sensor_id 保持为NULL）
+
+    Returns:
+        int: 登记的点位数
+    """
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT longitude, latitude, sensor_id, location, COUNT(*), MAX(created_at)
+        FROM image_info
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL
+        GROUP BY longitude, latitude, sensor_id, location
+    """)
+    points = {}
+    for longitude, latitude, sensor_id, location, count, last_detection in cursor.fetchall():
+        lon, lat = parse_longitude(longitude), parse_latitude(latitude)
+        if lon is None or lat is None:
+            continue
+        point = points.setdefault((longitude, latitude), {
+            'lon': lon, 'lat': lat, 'total': 0, 'last': None,
+            'sensor_id': None, 'sensor_count': 0, 'location': None, 'location_count': 0,
+        })
+        point['total'] += count
+        if last_detection is not None and (point['last'] is None or last_detection > point['last']):
+            point['last'] = last_detection
+        if sensor_id and count > point['sensor_count']:
+            point.update(sensor_id=sensor_id, sensor_count=count)
+        if location and count > point['location_count']:
+            point.update(location=location, location_count=count)
+
+    point_ids = {key: point_id for point_id, key in enumerate(points, start=1)}
+    cursor.execute("""
+        SELECT longitude, latitude, object, COUNT(*)
+        FROM image_info
+        WHERE longitude IS NOT NULL AND latitude IS NOT NULL AND object IS NOT NULL
+        GROUP BY longitude, latitude, object
+    """)
+    counts = [(point_ids[(longitude, latitude)], obj, count)
+              for longitude, latitude, obj, count in cursor.fetchall() if (longitude, latitude) in point_ids]
+
+    updated_at = time.strftime('%Y-%m-%d %H:%M:%S')
+    registry = [(point_ids[key], p['sensor_id'], p['location'], key[0], key[1], p['lon'], p['lat'],
+                 p['total'], p['last'], updated_at)
+                for key, p in points.items()]
+    cursor.execute("DELETE FROM sensor_registry")
+    cursor.execute("DELETE FROM sensor_object_counts")
+    if registry:
+        cursor.executemany("""
+            INSERT INTO sensor_registry
+                (point_id, sensor_id, location, longitude_text, latitude_text, longitude, latitude,
+                 total_count, last_detection, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, registry)
+    if counts:
+        cursor.executemany("INSERT INTO sensor_object_counts (point_id, object, count) VALUES (%s, %s, %s)", counts)
+    connection.commit()
+    return len(registry)
+
+
+class SensorGridIndex:
+    """
+    摄像头坐标的均匀网格索引：单元边长为 cell_size 度，查询时只检查距离范围内的单元
+    （纬度方向 max_distance / cell_size 个单元，经度方向按纬度余弦放大，高纬度地区1度经度更短）
+
+    Args:
+        sensors (list): 点位字典列表，需包含 longitude、latitude
+        cell_size (float): 网格单元边长（度），取最大吸附距离即可保证不漏检
+    """
+
+    def __init__(self, sensors, cell_size=DEFAULT_SNAP_DISTANCE):
+        self.cell_size = cell_size
+        self.sensors = sensors
+        self._cells = {}
+        for sensor in sensors:
+            self._cells.setdefault(self._cell(sensor['longitude'], sensor['latitude']), []).append(sensor)
+
+    def _cell(self, lon, lat):
+        return int(math.floor(lon / self.cell_size)), int(math.floor(lat / self.cell_size))
+
+    def nearest(self, lon, lat, max_distance=None):
+        """
+        查找距离 (lon, lat) 最近的摄像头（经度差按纬度余弦缩放）
+
+        Returns:
+            dict: 点位信息，超过 max_distance（默认为 cell_size）时返回None
+        """
+        max_distance = self.cell_size if max_distance is None else max_distance
+        scale = math.cos(math.radians(lat))
+        reach_lat = max(1, int(math.ceil(max_distance / self.cell_size)))
+        # 经度差按纬度余弦缩放后才与 max_distance 比较，经度方向要多搜索 1 / cos(纬度) 倍的单元（最多绕地球一周）
+        reach_lon = max(1, int(math.ceil(max_distance / (self.cell_size * max(scale, MIN_LATITUDE_SCALE)))))
+        reach_lon = min(reach_lon, int(math.ceil(180.0 / self.cell_size)))
+        cx, cy = self._cell(lon, lat)
+        best, best_distance = None, max_distance * max_distance
+        for x in range(cx - reach_lon, cx + reach_lon + 1):
+            for y in range(cy - reach_lat, cy + reach_lat + 1):
+                for sensor in self._cells.get((x, y), ()):
+                    dx = (sensor['longitude'] - lon) * scale
+                    dy = sensor['latitude'] - lat
+                    distance = dx * dx + dy * dy
+                    if distance <= best_distance:
+                        best, best_distance = sensor, distance
+        return best
+
+    def __len__(self):
+        return len(self.sensors)
+
+
+class SensorRegistry:
+    """
+    摄像头登记表的内存视图
+
+    Args:
+        connect (callable): 返回数据库连接的函数，连接用完后调用 close()
+        refresh_interval (float): 刷新登记表的间隔（秒），0表示只在启动时加载一次
+        snap_distance (float): 点击坐标与摄像头的最大距离（度）
+        lock_path (str): 重建者的锁文件，同一台机器上只有持有该文件锁的进程重建登记表
+    """
+
+    def __init__(self, connect, refresh_interval=DEFAULT_REFRESH_INTERVAL, snap_distance=DEFAULT_SNAP_DISTANCE,
+                 lock_path=DEFAULT_LOCK_PATH):
+        self.connect = connect
+        self.refresh_interval = refresh_interval
+        self.snap_distance = snap_distance
+        self.lock_path = lock_path
+
+        self._index = SensorGridIndex([], snap_distance)
+        self._counts = {}
+        self._started = False
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._watcher_pid = None
+        self._lock_file = None
+        self._lock_pid = None
+
+        self._reloads = 0
+        self._rebuilds = 0
+        self._reload_errors = 0
+        self._loaded_at = None
+        self._load_time = 0.0
+
+    def is_rebuild_owner(self):
+        """当前进程是否负责重建登记表（没有持有者时尝试接管）"""
+        if self._lock_pid == os.getpid():
+            return True
+        # fork 得到的子进程继承了父进程的锁文件，不算持有者，重新竞争
+        self._lock_file = acquire_lock_file(self.lock_path)
+        self._lock_pid = os.getpid() if self._lock_file is not None else None
+        return self._lock_file is not None
+
+    def load(self):
+        """刷新内存索引：持有重建锁的进程先从 image_info 重建登记表，其他进程只读取登记表"""
+        start = time.perf_counter()
+        rebuilt = self.is_rebuild_owner()
+        connection = self.connect()
+        try:
+            if rebuilt:
+                ensure_registry_schema(connection)
+                rebuild_registry(connection)
+            cursor = connection.cursor()
+            cursor.execute("SELECT point_id, sensor_id, location, longitude_text, latitude_text, longitude, latitude, "
+                           "total_count, last_detection FROM sensor_registry")
+            sensors = [{
+                'point_id': point_id,
+                'sensor_id': sensor_id,
+                'location': location,
+                'longitude_text': longitude_text,
+                'latitude_text': latitude_text,
+                'longitude': float(longitude),
+                'latitude': float(latitude),
+                'total_count': total_count,
+                'last_detection': str(last_detection) if last_detection else None,
+            } for (point_id, sensor_id, location, longitude_text, latitude_text, longitude, latitude,
+                   total_count, last_detection) in cursor.fetchall()]
+            cursor.execute("SELECT point_id, object, count FROM sensor_object_counts")
+            counts = {}
+            for point_id, obj, count in cursor.fetchall():
+                counts.setdefault(point_id, {})[obj] = count
+        finally:
+            connection.close()
+
+        index = SensorGridIndex(sensors, self.snap_distance)
+        with self._lock:
+            self._index, self._counts = index, counts
+            self._reloads += 1
+            self._rebuilds += int(rebuilt)
+            self._loaded_at = time.time()
+            self._load_time = time.perf_counter() - start
+        return self
+
+    def _try_load(self):
+        try:
+            self.load()
+        except Exception as e:
+            with self._lock:
+                self._reload_errors += 1
+            print(f"加载摄像头登记表失败: {e}")
+
+    def _watch(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            self._try_load()
+
+    def start(self):
+        """
+        加载索引并启动后台刷新线程，在服务启动时调用；请求中调用时只在fork后的子进程里重新启动线程，不在请求中加载
+        启动时加载失败（如数据库不可用）不抛出异常，由后台线程在下一次刷新时重试
+        """
+        if self._started and (not self.refresh_interval or self._watcher_pid == os.getpid()):
+            return self
+        with self._start_lock:
+            if not self._started:
+                self._try_load()
+                self._started = True
+            if self.refresh_interval and self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                threading.Thread(target=self._watch, name="sensor-registry-refresh", daemon=True).start()
+        return self
+
+    def nearest(self, lon, lat):
+        """点击坐标对应的点位，未点中时返回None"""
+        return self._index.nearest(lon, lat, self.snap_distance)
+
+    def object_counts(self, point_id):
+        """点位上各物种（object）的检测次数"""
+        return self._counts.get(point_id, {})
+
+    def stats(self):
+        """
+        获取索引指标
+
+        Returns:
+            dict: 点位数、加载次数、重建次数、加载失败次数、是否为重建者、最近加载时间和耗时
+        """
+        with self._lock:
+            return {
+                'sensors': len(self._index),
+                'reloads': self._reloads,
+                'rebuilds': self._rebuilds,
+                'reload_errors': self._reload_errors,
+                'rebuild_owner': self._lock_pid == os.getpid(),
+                'loaded_at': self._loaded_at,
+                'load_time_ms': round(self._load_time * 1000, 3),
+                'refresh_interval': self.refresh_interval,
+                'snap_distance': self.snap_distance,
+            }
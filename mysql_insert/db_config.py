@@ -1,8 +1,19 @@
 # db_config.py
 import os
+import sys
 
-# SQLite数据库文件路径
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+# 添加项目根目录到Python路径，以便导入common模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from common.db_backend import CONFIGURED_BACKEND, get_backend as get_db_backend, migrate_at_startup
+
+# SQLite数据库文件路径（可用环境变量 IMAGE_INFO_DB_PATH 覆盖，如指向合成数据生成器生成的数据库）
+DB_PATH = os.environ.get(
+    "IMAGE_INFO_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+)
 
 def get_db_config():
     """
@@ -17,3 +28,62 @@ def get_db_path():
     获取SQLite数据库文件路径
     """
     return DB_PATH
+
+# ==================== 数据库后端 ====================
+
+# 写入的数据库后端（见 common/db_backend.py）：
+# - "sqlite": 本地SQLite数据库 DB_PATH（默认），写入时数据版本号加1
+# - "mysql":  MySQL，连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量
+DB_BACKEND = CONFIGURED_BACKEND
+
+def get_backend():
+    """
+    获取当前配置的数据访问后端（SQLiteBackend 或 MySQLBackend）
+    """
+    return get_db_backend(DB_BACKEND, get_db_path())
+
+def use_backend(name):
+    """
+    切换数据访问后端（"sqlite" 或 "mysql"），供基准测试使用
+    """
+    global DB_BACKEND
+    DB_BACKEND = name.lower()
+
+def migrate_schema():
+    """
+    插入服务启动时执行image_info表结构迁移（见 common/db_backend.py 的 migrate_at_startup）
+    """
+    migrate_at_startup(get_backend())
+
+# ==================== 写入队列配置 ====================
+
+# /exec-sql 的写入方式：
+# - "queue": 记录写入磁盘日志后立即返回，由后台写线程批量提交（默认）
+# - "sync":  每个请求同步插入并提交后再返回
+INSERT_MODE = os.environ.get("INSERT_MODE", "queue")
+
+# 写入队列的日志文件（每行一条待写入记录，确认前已fsync到磁盘，服务重启后自动重放未提交的记录）
+QUEUE_JOURNAL_PATH = os.environ.get(
+    "INSERT_QUEUE_JOURNAL",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "insert_queue.jsonl")
+)
+
+QUEUE_MAX_BATCH = int(os.environ.get("INSERT_QUEUE_MAX_BATCH", "500"))          # 每次提交最多写入的记录数
+QUEUE_MAX_WAIT = float(os.environ.get("INSERT_QUEUE_MAX_WAIT_MS", "50")) / 1000  # 攒批的最长等待时间（秒）
+
+def get_insert_mode():
+    """
+    获取 /exec-sql 的写入方式（"queue" 或 "sync"）
+    写入队列直接提交到SQLite数据库，MySQL后端时总是同步写入
+    """
+    return INSERT_MODE if DB_BACKEND == "sqlite" else "sync"
+
+def get_queue_config():
+    """
+    获取写入队列配置
+    """
+    return {
+        "journal_path": QUEUE_JOURNAL_PATH,
+        "max_batch": QUEUE_MAX_BATCH,
+        "max_wait": QUEUE_MAX_WAIT
+    }
@@ -1,12 +1,75 @@
 # sql_operations.py
 # 合并了 sql_generator.py 和 sql_insert.py 的功能
+# 数据库访问经过 common/db_backend.py（db_config.py 中的 DB_BACKEND 选择SQLite或MySQL），
+# 写入在后端的 transaction() 中执行：SQLite复用同一个写连接并在同一事务中把数据版本号加1
 import json
-import sqlite3
+from functools import lru_cache
 
 try:
-    from .db_config import get_db_path
+    from .db_config import get_backend
 except ImportError:
-    from db_config import get_db_path
+    from db_config import get_backend
+
+from common.coordinates import parse_longitude, parse_latitude
+from common.db_backend import DB_ERRORS
+
+
+# image_info表的插入字段
+TABLE_NAME = "image_info"
+REQUIRED_FIELDS = ['object', 'animal', 'count', 'behavior', 'status', 'percentage', 'confidence', 'image_id', 'sensor_id', 'location', 'longitude', 'latitude', 'time', 'date', 'caption']
+OPTIONAL_FIELDS = ['type', 'path']
+NOT_NULL_FIELDS = ['object', 'animal']  # 表结构中 NOT NULL 的字段
+
+# 批量插入时每次 executemany 的记录数
+BATCH_CHUNK_SIZE = 1000
+
+
+def validate_record(data) -> str:
+    """
+    校验一条待插入的记录
+
+    Returns:
+        str: 错误信息，校验通过时返回None
+    """
+    if not isinstance(data, dict):
+        return f"错误：记录必须是JSON对象 - {type(data).__name__}"
+
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in data]
+    if missing_fields:
+        return f"错误：缺少必填字段 - {', '.join(missing_fields)}"
+
+    for field in REQUIRED_FIELDS + OPTIONAL_FIELDS:
+        if field in data and data[field] is not None and not isinstance(data[field], (str, int, float)):
+            return f"错误：字段 '{field}' 类型不支持 - {type(data[field])}"
+
+    null_fields = [field for field in NOT_NULL_FIELDS if data[field] is None]
+    if null_fields:
+        return f"错误：字段不能为空 - {', '.join(null_fields)}"
+    return None
+
+
+def build_insert_params(data: dict) -> tuple:
+    """
+    将一条（已校验的）记录转换为插入字段和参数值，包括解析出的数值坐标 lon/lat
+
+    Returns:
+        tuple: (字段名元组, 参数值元组)
+    """
+    fields = [field for field in REQUIRED_FIELDS + OPTIONAL_FIELDS if field in data]
+    values = [data[field] for field in fields]
+    fields += ['lon', 'lat']
+    values += [parse_longitude(data['longitude']), parse_latitude(data['latitude'])]
+    return tuple(fields), tuple(values)
+
+
+@lru_cache(maxsize=64)
+def build_insert_sql(fields: tuple) -> str:
+    """
+    根据字段名生成参数化的INSERT语句（? 占位符，MySQL后端执行时转换为 %s）
+    同一字段组合始终返回同一条SQL文本，配合复用的写连接可以命中预编译语句缓存
+    """
+    placeholders = ', '.join('?' for _ in fields)
+    return f"INSERT INTO {TABLE_NAME} ({', '.join(fields)}) VALUES ({placeholders});"
 
 
 def generate_sql(data: dict) -> dict:
@@ -14,11 +77,7 @@ def generate_sql(data: dict) -> dict:
     将JSON数据转换为SQLite INSERT语句
     """
     try:
-        table_name = "image_info"
-        required_fields = ['object', 'animal', 'count', 'behavior', 'status', 'percentage', 'confidence', 'image_id', 'sensor_id', 'location', 'longitude', 'latitude', 'time', 'date', 'caption']
-        optional_fields = ['type', 'path']
-
-        missing_fields = [field for field in required_fields if field not in data]
+        missing_fields = [field for field in REQUIRED_FIELDS if field not in data]
         if missing_fields:
             return {
                 'status': 'error',
@@ -28,7 +87,7 @@ def generate_sql(data: dict) -> dict:
         fields = []
         values = []
 
-        all_fields = required_fields + optional_fields
+        all_fields = REQUIRED_FIELDS + OPTIONAL_FIELDS
         for field in all_fields:
             if field in data:
                 fields.append(field)
@@ -47,7 +106,12 @@ def generate_sql(data: dict) -> dict:
                         'message': f"错误：字段 '{field}' 类型不支持 - {type(value)}"
                     }
 
-        sql = f"INSERT INTO {table_name} ({', '.join(fields)}) VALUES ({', '.join(values)});"
+        # 同步写入数值坐标列 lon/lat，供地图的坐标/范围查询走索引
+        for field, value in (('lon', parse_longitude(data['longitude'])), ('lat', parse_latitude(data['latitude']))):
+            fields.append(field)
+            values.append("NULL" if value is None else repr(value))
+
+        sql = f"INSERT INTO {TABLE_NAME} ({', '.join(fields)}) VALUES ({', '.join(values)});"
         return {'status': 'success', 'message': sql}
     
     except json.JSONDecodeError:
@@ -63,26 +127,153 @@ def execute_sql(sql: str) -> dict:
     if not sql.lower().startswith(("insert", "update")):
         return {"status": "error", "message": "仅允许执行 INSERT 或 UPDATE 语句"}
 
-    db_path = get_db_path()
-    # print(f"数据库路径: {db_path}")
+    backend = get_backend()
 
     try:
-        connection = sqlite3.connect(db_path)
-        cursor = connection.cursor()
-        cursor.execute(sql)
-        connection.commit()  # 提交数据库事务，持久化修改结果
+        # 借出写连接，正常退出时提交事务、持久化修改结果，出错时回滚
+        with backend.transaction() as connection:
+            connection.execute(sql)
+            backend.bump_data_version(connection)  # 数据版本号加1，与写入在同一事务中提交，看板的响应缓存据此失效
         return {"status": "success", "message": "SQL 执行成功"}
-    except sqlite3.Error as e: 
-        # 捕获 sqlite3 特有的错误（如连接失败、SQL 执行错误等）。如果数据库操作发生错误，代码会进入这个 except 块。
+    except DB_ERRORS as e: 
+        # 捕获数据库错误（如连接失败、SQL 执行错误等，MySQL驱动的错误已统一包装）。如果数据库操作发生错误，代码会进入这个 except 块。
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         # 捕获所有非数据库错误的异常。比如数据库连接建立成功，但是程序本身出现了其他错误，如内存溢出、文件操作失败等。
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally: 
-        # 无论是否成功，都会执行finally操作：关闭数据库连接释放资源。
-        if 'connection' in locals() and connection:
-            # 检查 connection 是否存在且有效。如果 connection 被成功创建并且是有效的，就执行关闭操作。
-            connection.close()
+
+
+def execute_batch(records) -> dict:
+    """
+    批量插入记录：逐条校验后，在同一个事务中用参数化的 executemany 分块插入
+
+    Args:
+        records: 可迭代对象，元素为待插入的记录（dict）；
+                 解析失败的记录可以直接传入异常对象（如NDJSON某一行JSON格式错误），会被记为该条的错误
+
+    Returns:
+        dict: status、插入条数 inserted、失败条数 failed，以及每条失败记录的 errors [{index, message}]
+    """
+    backend = get_backend()
+    errors = []
+    inserted = 0
+
+    try:
+        # 整批在一个事务中提交；数据库错误时整批回滚，已执行的插入不会生效
+        with backend.transaction() as connection:
+            cursor = connection.cursor()  # 连接池借出的游标，executemany 耗时计入请求指标
+
+            pending = {}  # 字段组合 -> 参数列表，字段相同的记录共用一条INSERT语句
+            pending_count = 0
+
+            def flush():
+                count = 0
+                for fields, rows in pending.items():
+                    cursor.executemany(build_insert_sql(fields), rows)
+                    count += len(rows)
+                pending.clear()
+                return count
+
+            for index, record in enumerate(records):
+                if isinstance(record, Exception):
+                    errors.append({'index': index, 'message': f"错误：无效的JSON格式 - {record}"})
+                    continue
+                error = validate_record(record)
+                if error:
+                    errors.append({'index': index, 'message': error})
+                    continue
+
+                fields, values = build_insert_params(record)
+                pending.setdefault(fields, []).append(values)
+                pending_count += 1
+                if pending_count >= BATCH_CHUNK_SIZE:
+                    inserted += flush()
+                    pending_count = 0
+            inserted += flush()
+
+            if inserted:
+                backend.bump_data_version(connection)  # 整批只加1次数据版本号
+        return {
+            'status': 'success',
+            'message': f"批量插入完成：成功 {inserted} 条，失败 {len(errors)} 条",
+            'inserted': inserted,
+            'failed': len(errors),
+            'errors': errors
+        }
+    except DB_ERRORS as e:
+        return {'status': 'error', 'message': f"数据库错误: {e}", 'inserted': 0, 'failed': len(errors), 'errors': errors}
+    except Exception as e:
+        return {'status': 'error', 'message': f"系统错误: {str(e)}", 'inserted': 0, 'failed': len(errors), 'errors': errors}
+
+
+def format_sql_value(value) -> str:
+    """将参数值格式化为SQL字面量（仅用于预览展示，不用于执行）"""
+    if value is None:
+        return "NULL"
+    if isinstance(value, str):
+        escaped_value = value.replace("'", "''")
+        return f"'{escaped_value}'"
+    return str(value)
+
+
+def render_sql_preview(sql: str, params: tuple) -> str:
+    """
+    把参数化SQL和参数值渲染为完整的SQL文本，用于在接口响应中回显
+
+    Args:
+        sql (str): 含 ? 占位符的SQL（值中不含 ?，占位符只出现在VALUES中）
+        params (tuple): 参数值
+    """
+    parts = sql.split('?')
+    rendered = [parts[0]]
+    for value, part in zip(params, parts[1:]):
+        rendered.append(format_sql_value(value))
+        rendered.append(part)
+    return ''.join(rendered)
+
+
+# ==================== 参数化插入（复用写连接） ====================
+
+
+def prepare_insert(data: dict) -> dict:
+    """
+    将JSON数据转换为参数化的INSERT语句和参数值
+
+    Returns:
+        dict: 成功时包含 sql（含 ? 占位符）、params 和渲染后的预览 preview
+    """
+    error = validate_record(data)
+    if error:
+        return {'status': 'error', 'message': error}
+    fields, params = build_insert_params(data)
+    sql = build_insert_sql(fields)
+    return {'status': 'success', 'sql': sql, 'params': params, 'preview': render_sql_preview(sql, params)}
+
+
+def insert_record(data: dict) -> dict:
+    """
+    参数化插入一条记录（与 generate_and_execute_sql 返回格式相同）
+
+    与拼接SQL的方式相比：值通过参数绑定，不需要手工转义；
+    同一字段组合共用一条预编译语句，并复用写连接，省去每次连接和解析SQL的开销。
+    返回的 sql 字段为渲染后的完整SQL预览。
+    """
+    prepared = prepare_insert(data)
+    if prepared['status'] == 'error':
+        return prepared
+
+    sql, params, preview = prepared['sql'], prepared['params'], prepared['preview']
+    backend = get_backend()
+    try:
+        # 后端复用写连接（SQLite按SQL文本缓存预编译语句，MySQL连接池缓存预处理语句），出错时回滚
+        with backend.transaction() as connection:
+            connection.execute(sql, params)
+            backend.bump_data_version(connection)  # 数据版本号加1，与写入在同一事务中提交
+        return {'status': 'success', 'message': "SQL 执行成功", 'sql': preview}
+    except DB_ERRORS as e:
+        return {'status': 'error', 'message': f"数据库错误: {e}", 'sql': preview}
+    except Exception as e:
+        return {'status': 'error', 'message': f"系统错误: {str(e)}", 'sql': preview}
 
 
 def generate_and_execute_sql(data: dict) -> dict:
@@ -147,4 +338,8 @@ if __name__ == "__main__":
     
     print("\n=== 测试 generate_and_execute_sql 组合函数 ===")
     combined_result = generate_and_execute_sql(test_data)
-    print(combined_result)
\ No newline at end of file
+    print(combined_result)
+
+    print("\n=== 测试 insert_record 参数化插入 ===")
+    insert_result = insert_record(test_data)
+    print(insert_result)
\ No newline at end of file
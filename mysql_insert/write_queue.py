@@ -0,0 +1,509 @@
+# write_queue.py - 插入服务的写入队列（write-behind + group commit）
+"""
+/exec-sql 默认不再在请求线程中同步提交，而是：
+1. 请求线程校验记录后追加到磁盘日志（fsync之后才返回成功），同时放入内存队列
+2. 单个后台写线程从队列中取记录，按条数（max_batch）或时间窗口（max_wait）攒批，
+   在一个事务中插入整批记录并提交，SQLite写锁只被这一个线程持有
+
+持久性：
+- 日志每行一条记录 {"seq": 序号, "data": 原始记录}，序号单调递增
+- 每次提交时把本批最大序号写入 insert_queue_state 表，与插入在同一事务中
+- 服务重启时重放日志中序号大于已提交序号的记录；队列清空后日志会被截断
+- 多个请求同时等待fsync时只执行一次fsync（group fsync）
+
+写入失败：
+- database is locked / busy：回滚后退避重试，最多 BUSY_RETRIES 次，仍失败时按其他错误处理
+- 其他数据库错误（缺少表或字段、只读数据库、个别记录违反约束等）：回滚后逐条重试，
+  仍失败的记录写入 *.failed.jsonl，不阻塞后续记录
+
+多进程（如gunicorn多个worker）：
+- 日志、已提交序号只有一份，由持有日志文件锁（*.jsonl.lock）的一个进程独占，其他进程不会截断或覆盖日志
+- 没有拿到锁的进程改为同步插入（insert_record），并每隔 LOCK_RETRY_INTERVAL 秒重试拿锁；
+  持有锁的进程退出后，下一个拿到锁的进程重放日志中未提交的记录
+"""
+
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+try:
+    from .db_config import get_db_path, get_queue_config
+    from .sql_operations import TABLE_NAME, prepare_insert, insert_record
+except ImportError:
+    from db_config import get_db_path, get_queue_config
+    from sql_operations import TABLE_NAME, prepare_insert, insert_record
+
+from common.file_lock import acquire_lock_file  # db_config 已把项目根目录加入路径
+from common.image_info_schema import prepare_image_info_db, bump_data_version
+
+STATE_TABLE = "insert_queue_state"
+LATENCY_SAMPLES = 1000    # 保留最近多少条记录的端到端延迟用于计算分位数
+RETRY_BACKOFF_MAX = 2.0   # 数据库忙时的最长退避时间（秒）
+BUSY_RETRIES = 10         # 数据库忙时整批重试的最多次数（约8秒），超过后改为逐条提交
+SHUTDOWN_RETRIES = 5      # 关闭时数据库忙的最多重试次数，超过后记录留在日志中等待下次启动重放
+LOCK_RETRY_INTERVAL = 5.0  # 日志被其他进程持有时，多久重试一次拿锁（秒）
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+_STOP = object()  # 通知写线程退出的哨兵
+
+
+class JournalLockedError(RuntimeError):
+    """日志文件已被其他进程的写入队列持有"""
+
+
+def is_busy_error(e):
+    """SQLITE_BUSY / SQLITE_LOCKED（database is locked）：其他连接持有锁，稍后重试可能成功"""
+    code = getattr(e, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xFF in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(e).lower()
+    return 'database is locked' in message or 'database table is locked' in message or 'busy' in message
+
+
+class WriteQueue:
+    """
+    插入记录的写入队列
+
+    Args:
+        db_path (str): 数据库文件路径
+        journal_path (str): 日志文件路径
+        max_batch (int): 每次提交最多写入的记录数
+        max_wait (float): 收到第一条记录后最多等待多久再提交（秒）
+    """
+
+    def __init__(self, db_path, journal_path, max_batch=500, max_wait=0.05):
+        self.db_path = db_path
+        self.journal_path = journal_path
+        self.failed_path = os.path.splitext(journal_path)[0] + ".failed.jsonl"
+        self.lock_path = journal_path + ".lock"
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait))
+        self.pid = os.getpid()
+
+        self._queue = queue.Queue()
+        self._journal = None
+        self._lock_file = None
+        self._journal_lock = threading.Lock()   # 保护日志写入和序号分配
+        self._sync_lock = threading.Lock()      # 保护fsync和日志截断
+        self._committed = threading.Condition()
+        self._thread = None
+        self._connection = None
+        self._closed = False
+
+        self._next_seq = 1
+        self._synced_seq = 0
+        self._committed_seq = 0
+
+        # 指标
+        self._enqueued = 0
+        self._replayed = 0
+        self._committed_rows = 0
+        self._failed_rows = 0
+        self._batches = 0
+        self._last_batch_size = 0
+        self._max_batch_size = 0
+        self._commit_time_total = 0.0
+        self._commit_time_max = 0.0
+        self._fsyncs = 0
+        self._retries = 0
+        self._last_error = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    # ==================== 启动 / 关闭 ====================
+
+    def start(self):
+        """
+        拿到日志文件锁后建立写连接、重放日志中未提交的记录并启动写线程
+
+        Raises:
+            JournalLockedError: 日志已被其他进程的写入队列持有
+        """
+        self._lock_file = acquire_lock_file(self.lock_path)
+        if self._lock_file is None:
+            raise JournalLockedError(f"写入队列日志已被其他进程持有: {self.journal_path}")
+
+        try:
+            prepare_image_info_db(self.db_path)  # 确保表结构已迁移（每个进程只执行一次）
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (id INTEGER PRIMARY KEY CHECK (id = 1), last_seq INTEGER NOT NULL)"
+            )
+            self._connection.execute(f"INSERT OR IGNORE INTO {STATE_TABLE} (id, last_seq) VALUES (1, 0)")
+            self._connection.commit()
+            self._committed_seq = self._connection.execute(f"SELECT last_seq FROM {STATE_TABLE} WHERE id = 1").fetchone()[0]
+
+            self._replay_journal()
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        except BaseException:
+            if self._connection is not None:
+                self._connection.close()
+            self._lock_file.close()
+            self._lock_file = None
+            raise
+
+        self._thread = threading.Thread(target=self._run, name="insert-write-queue", daemon=True)
+        self._thread.start()
+        return self
+
+    def _replay_journal(self):
+        """重放日志中序号大于已提交序号的记录"""
+        max_seq = self._committed_seq
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        seq, record = int(entry['seq']), entry['data']
+                    except (ValueError, KeyError, TypeError):
+                        continue  # 崩溃时写了一半的行
+                    max_seq = max(max_seq, seq)
+                    if seq <= self._committed_seq:
+                        continue
+                    prepared = prepare_insert(record)
+                    if prepared['status'] != 'success':
+                        self._write_failed(seq, record, prepared['message'])
+                        continue
+                    self._queue.put((seq, record, prepared, None))
+                    self._replayed += 1
+        self._next_seq = max_seq + 1
+        self._synced_seq = max_seq
+        if self._replayed:
+            print(f"写入队列: 从日志重放 {self._replayed} 条未提交的记录")
+
+    def flush(self, timeout=None):
+        """
+        等待当前已入队的记录全部提交
+
+        Returns:
+            bool: 是否在超时前全部提交
+        """
+        with self._journal_lock:
+            target = self._next_seq - 1
+        with self._committed:
+            return self._committed.wait_for(lambda: self._committed_seq >= target, timeout=timeout)
+
+    def close(self, timeout=30.0):
+        """停止接收新记录，提交队列中剩余的记录后关闭写线程和连接"""
+        with self._journal_lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                print(f"写入队列: 关闭超时，剩余 {self._queue.qsize()} 条记录将在下次启动时从日志重放")
+                return
+        if self._connection is not None:
+            self._connection.close()
+        if self._journal is not None:
+            self._journal.close()
+        if self._lock_file is not None:
+            self._lock_file.close()  # 释放日志文件锁，其他进程可以接管日志
+
+    # ==================== 入队 ====================
+
+    def enqueue(self, data):
+        """
+        校验记录并写入日志，fsync后返回（此时记录已持久化，但尚未插入数据库）
+
+        Returns:
+            dict: status、message、序号 seq、渲染后的SQL预览 sql；校验失败时只有 status 和 message
+        """
+        prepared = prepare_insert(data)
+        if prepared['status'] != 'success':
+            return prepared
+
+        try:
+            with self._journal_lock:
+                if self._closed:
+                    return {'status': 'error', 'message': "写入队列已关闭", 'sql': prepared['preview']}
+                seq = self._next_seq
+                self._next_seq += 1
+                self._journal.write(json.dumps({'seq': seq, 'data': data}, ensure_ascii=False) + '\n')
+                self._journal.flush()
+                self._queue.put((seq, data, prepared, time.perf_counter()))
+                self._enqueued += 1
+            self._sync_journal(seq)
+        except OSError as e:
+            return {'status': 'error', 'message': f"写入队列日志失败: {e}", 'sql': prepared['preview']}
+        return {'status': 'success', 'message': "已加入写入队列", 'seq': seq, 'sql': prepared['preview']}
+
+    def _sync_journal(self, seq):
+        """fsync日志直到包含序号seq；并发等待的请求共用一次fsync"""
+        with self._sync_lock:
+            if self._synced_seq >= seq:
+                return
+            with self._journal_lock:
+                target = self._next_seq - 1
+                fd = self._journal.fileno()
+            os.fsync(fd)
+            self._synced_seq = target
+            self._fsyncs += 1
+
+    # ==================== 写线程 ====================
+
+    def _run(self):
+        """写线程：按条数或时间窗口攒批，整批提交"""
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True  # 提交完当前这批后退出（关闭时已不再接收新记录）
+                    break
+                batch.append(item)
+            self._commit_batch(batch, stopping or self._closed)
+
+    def _commit_batch(self, batch, stopping=False):
+        """提交一批记录；数据库忙时退避重试（有次数上限），其他错误或重试用尽后改为逐条提交"""
+        backoff = 0.05
+        attempts = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                failed = self._write_rows(batch)
+                break
+            except sqlite3.Error as e:
+                self._rollback()
+                self._last_error = str(e)
+                if is_busy_error(e):
+                    attempts += 1
+                    if stopping and attempts >= SHUTDOWN_RETRIES:
+                        print(f"写入队列: 关闭时提交失败，{len(batch)} 条记录留在日志中等待重放: {e}")
+                        return
+                    if attempts < BUSY_RETRIES:
+                        # 其他连接持有锁：整批重试
+                        self._retries += 1
+                        time.sleep(backoff)
+                        backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+                        continue
+                # 缺少表或字段、只读数据库、个别记录违反约束、重试用尽等：逐条提交，把失败的记录挑出来
+                failed = self._write_rows_individually(batch)
+                break
+        elapsed = time.perf_counter() - start
+
+        now = time.perf_counter()
+        with self._committed:
+            self._committed_seq = batch[-1][0]
+            self._committed_rows += len(batch) - failed
+            self._failed_rows += failed
+            self._batches += 1
+            self._last_batch_size = len(batch)
+            self._max_batch_size = max(self._max_batch_size, len(batch))
+            self._commit_time_total += elapsed
+            self._commit_time_max = max(self._commit_time_max, elapsed)
+            self._latencies.extend(now - enqueued_at for _, _, _, enqueued_at in batch if enqueued_at is not None)
+            self._committed.notify_all()
+
+        if self._queue.empty():
+            self._truncate_journal()
+
+    def _write_rows(self, batch):
+        """在一个事务中插入整批记录并更新已提交序号"""
+        pending = {}  # 字段组合 -> 参数列表，与 execute_batch 一样按字段组合共用INSERT语句
+        for _, _, prepared, _ in batch:
+            pending.setdefault(prepared['sql'], []).append(prepared['params'])
+        cursor = self._connection.cursor()
+        for sql, rows in pending.items():
+            cursor.executemany(sql, rows)
+        self._save_progress(cursor, batch[-1][0])
+        bump_data_version(self._connection)  # 整批只加1次数据版本号
+        self._connection.commit()
+        return 0
+
+    def _write_rows_individually(self, batch):
+        """
+        逐条插入（每条一个保存点），返回失败条数
+
+        事务本身无法提交时（如只读数据库、数据库一直被锁），整批记录都写入失败文件
+        """
+        failed_seqs = set()
+        cursor = self._connection.cursor()
+        try:
+            cursor.execute("BEGIN")  # 显式开启事务，保存点释放时不会单独提交
+            for seq, record, prepared, _ in batch:
+                try:
+                    cursor.execute("SAVEPOINT queue_row")
+                    cursor.execute(prepared['sql'], prepared['params'])
+                    cursor.execute("RELEASE queue_row")
+                except sqlite3.Error as e:
+                    cursor.execute("ROLLBACK TO queue_row")
+                    cursor.execute("RELEASE queue_row")
+                    self._write_failed(seq, record, f"数据库错误: {e}")
+                    failed_seqs.add(seq)
+            self._save_progress(cursor, batch[-1][0])
+            if len(failed_seqs) < len(batch):
+                bump_data_version(self._connection)
+            self._connection.commit()
+        except sqlite3.Error as e:
+            self._rollback()
+            self._last_error = str(e)
+            for seq, record, _, _ in batch:
+                if seq not in failed_seqs:
+                    self._write_failed(seq, record, f"数据库错误: {e}")
+            return len(batch)
+        return len(failed_seqs)
+
+    def _rollback(self):
+        try:
+            self._connection.rollback()
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _save_progress(cursor, seq):
+        cursor.execute(f"UPDATE {STATE_TABLE} SET last_seq = ? WHERE id = 1", (seq,))
+
+    def _write_failed(self, seq, record, message):
+        """把无法写入的记录追加到失败文件，便于人工处理"""
+        print(f"写入队列: 记录 {seq} 写入 {TABLE_NAME} 失败: {message}")
+        try:
+            with open(self.failed_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'seq': seq, 'message': message, 'data': record}, ensure_ascii=False) + '\n')
+        except OSError as e:
+            print(f"写入队列: 写入失败文件出错: {e}")
+
+    def _truncate_journal(self):
+        """日志中的记录全部提交后截断日志，避免无限增长"""
+        with self._sync_lock, self._journal_lock:
+            if self._committed_seq < self._next_seq - 1:
+                return  # 截断前又有新记录入队
+            self._journal.truncate(0)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._synced_seq = self._next_seq - 1
+
+    # ==================== 指标 ====================
+
+    def stats(self):
+        """
+        获取写入队列指标
+
+        Returns:
+            dict: 队列深度、入队/提交/失败条数、每批条数、提交耗时和端到端延迟分位数等
+        """
+        with self._committed:
+            latencies = sorted(self._latencies)
+            batches = self._batches
+
+            def percentile(p):
+                if not latencies:
+                    return 0.0
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+            return {
+                'db_path': self.db_path,
+                'journal_path': self.journal_path,
+                'running': self._thread is not None and self._thread.is_alive(),
+                'queue_depth': self._queue.qsize(),
+                'max_batch': self.max_batch,
+                'max_wait_ms': round(self.max_wait * 1000, 3),
+                'enqueued': self._enqueued,
+                'replayed': self._replayed,
+                'committed': self._committed_rows,
+                'failed': self._failed_rows,
+                'committed_seq': self._committed_seq,
+                'batches': batches,
+                'batch_size_last': self._last_batch_size,
+                'batch_size_max': self._max_batch_size,
+                'batch_size_avg': round((self._committed_rows + self._failed_rows) / batches, 2) if batches else 0.0,
+                'commit_time_avg_ms': round(self._commit_time_total * 1000 / batches, 3) if batches else 0.0,
+                'commit_time_max_ms': round(self._commit_time_max * 1000, 3),
+                'latency_p50_ms': percentile(0.50),
+                'latency_p95_ms': percentile(0.95),
+                'latency_p99_ms': percentile(0.99),
+                'latency_max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+                'journal_fsyncs': self._fsyncs,
+                'retries': self._retries,
+                'last_error': self._last_error,
+            }
+
+
+# ==================== 进程内写入队列 ====================
+
+_write_queue = None
+_write_queue_lock = threading.Lock()
+
+
+_lock_retry_at = 0.0  # 日志被其他进程持有时，下一次尝试拿锁的时间
+
+
+def get_write_queue():
+    """
+    获取（首次调用时创建并启动）进程内唯一的写入队列
+    延迟到首次使用时启动，Flask debug 模式的reloader父进程不会启动写线程
+
+    Returns:
+        WriteQueue: 写入队列；日志已被其他进程持有时返回None（每隔 LOCK_RETRY_INTERVAL 秒重试一次）
+    """
+    global _write_queue, _lock_retry_at
+    write_queue = _write_queue
+    if write_queue is not None and write_queue.pid == os.getpid():
+        return write_queue
+
+    with _write_queue_lock:
+        if _write_queue is None or _write_queue.pid != os.getpid():
+            if time.monotonic() < _lock_retry_at:
+                return None
+            config = get_queue_config()
+            try:
+                _write_queue = WriteQueue(
+                    get_db_path(),
+                    config['journal_path'],
+                    max_batch=config['max_batch'],
+                    max_wait=config['max_wait']
+                ).start()
+            except JournalLockedError:
+                _write_queue = None
+                _lock_retry_at = time.monotonic() + LOCK_RETRY_INTERVAL
+                return None
+        return _write_queue
+
+
+def enqueue_record(data):
+    """
+    校验记录并加入写入队列，返回结果格式与 insert_record 相同（另含序号 seq）
+    写入队列的日志由其他进程持有时改为同步插入
+    """
+    write_queue = get_write_queue()
+    if write_queue is None:
+        return insert_record(data)
+    return write_queue.enqueue(data)
+
+
+def get_write_queue_stats():
+    """获取写入队列指标，队列尚未启动时返回None"""
+    write_queue = _write_queue
+    if write_queue is None or write_queue.pid != os.getpid():
+        return None
+    return write_queue.stats()
+
+
+def shutdown_write_queue(timeout=30.0):
+    """提交队列中剩余的记录并关闭写入队列（进程退出时自动调用）"""
+    global _write_queue
+    with _write_queue_lock:
+        write_queue, _write_queue = _write_queue, None
+    if write_queue is not None and write_queue.pid == os.getpid():
+        write_queue.close(timeout)
+
+
+atexit.register(shutdown_write_queue)
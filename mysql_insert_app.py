@@ -1,8 +1,17 @@
 # SQLite Insert App
+import json
 from flask import Flask, request, jsonify
-from mysql_insert.sql_operations import generate_sql, execute_sql, generate_and_execute_sql
+from mysql_insert.sql_operations import generate_and_execute_sql, insert_record, execute_batch
+from mysql_insert.db_config import get_insert_mode, migrate_schema
+from mysql_insert.write_queue import enqueue_record, get_write_queue_stats
+from common.metrics import init_metrics
 
 app = Flask(__name__)
+init_metrics(app, "mysql_insert")  # 请求耗时和SQL耗时指标：GET /metrics
+migrate_schema()  # 启动时执行表结构迁移，不在请求中执行
+
+# 按NDJSON（每行一条JSON记录）解析的请求类型
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/jsonl', 'application/json-lines')
 
 @app.route("/exec-sql", methods=["POST"])
 def exec_sql():
@@ -23,32 +32,34 @@ def exec_sql():
         json_data = request_data["data"]
         print(json_data)  # {'object': '动物', ...}
         
-        # 生成SQL语句
-        generate_result = generate_sql(json_data)
-        print(generate_result)
-        
-        # 检查生成结果
-        if generate_result["status"] != "success":
-            return jsonify(generate_result), 400
-        
-        # 获取生成的SQL语句
-        sql = generate_result["message"]
-        
-        # 执行SQL
-        execute_result = execute_sql(sql)
+        # queue模式：写入磁盘日志后立即返回，由后台写线程批量提交
+        # sync模式：参数化插入（同一字段组合复用预编译语句）并提交后返回
+        # 返回的sql为渲染后的SQL预览
+        if get_insert_mode() == "queue":
+            insert_result = enqueue_record(json_data)
+        else:
+            insert_result = insert_record(json_data)
+        print(insert_result)
         
         # 返回执行结果
-        if execute_result["status"] == "success":
-            return jsonify({
+        if insert_result["status"] == "success":
+            response = {
                 "status": "success",
                 "message": "操作成功",
-                "sql": sql
-            }), 200
+                "sql": insert_result["sql"]
+            }
+            if "seq" in insert_result:
+                response["queued"] = True
+                response["seq"] = insert_result["seq"]
+            return jsonify(response), 200
+        elif "sql" not in insert_result:
+            # 数据校验失败，未执行SQL
+            return jsonify(insert_result), 400
         else:
             return jsonify({
                 "status": "error",
-                "message": execute_result["message"],
-                "sql": sql
+                "message": insert_result["message"],
+                "sql": insert_result["sql"]
             }), 500
 
     except Exception as e:
@@ -99,6 +110,71 @@ def exec_sql_simple():
             "message": f"请求处理错误: {str(e)}"
         }), 500
 
+def iter_ndjson_records(stream):
+    """
+    逐行解析NDJSON请求体，边读边产出记录，不需要把整个请求体读入内存
+    JSON格式错误的行产出异常对象，由 execute_batch 记为该条记录的错误
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield e
+
+
+@app.route("/exec-sql-batch", methods=["POST"])
+def exec_sql_batch():
+    """
+    POST /exec-sql-batch
+    批量插入识别结果，整批在一个事务中提交
+    支持的请求体：
+    - JSON数组: [{...}, {...}]
+    - JSON对象: {"data": [{...}, {...}]}
+    - NDJSON（Content-Type: application/x-ndjson）: 每行一条JSON记录
+    """
+    try:
+        if request.mimetype in NDJSON_MIMETYPES:
+            records = iter_ndjson_records(request.stream)
+        else:
+            request_data = request.get_json(silent=True)
+            if isinstance(request_data, dict) and "data" in request_data:
+                request_data = request_data["data"]
+            if not isinstance(request_data, list):
+                return jsonify({
+                    "status": "error",
+                    "message": "请求体必须是JSON数组、包含 'data' 数组的JSON对象或NDJSON"
+                }), 400
+            records = request_data
+
+        result = execute_batch(records)
+
+        if result["status"] != "success":
+            return jsonify(result), 500
+        if result["inserted"] == 0 and result["failed"] > 0:
+            return jsonify(result), 400
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": f"请求处理错误: {str(e)}"
+        }), 500
+
+@app.route("/queue-stats", methods=["GET"])
+def queue_stats():
+    """
+    GET /queue-stats
+    写入队列指标：队列深度、每批提交条数、提交耗时、端到端延迟（入队到提交）分位数
+    """
+    return jsonify({
+        "status": "success",
+        "insert_mode": get_insert_mode(),
+        "data": get_write_queue_stats()
+    })
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
 
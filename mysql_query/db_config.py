@@ -1,8 +1,19 @@
 # db_config.py - SQLite版本
 import os
+import sys
 
-# SQLite数据库文件路径
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "protected_wildlife.db")
+# 添加项目根目录到Python路径，以便导入common模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from common.db_backend import CONFIGURED_BACKEND, get_backend as get_db_backend
+
+# SQLite数据库文件路径（可用环境变量 QUERY_DB_PATH 覆盖，进程池中的工作进程同样生效）
+DB_PATH = os.environ.get(
+    "QUERY_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "protected_wildlife.db")
+)
 
 def get_db_config():
     """
@@ -17,3 +28,83 @@ def get_db_path():
     获取SQLite数据库文件路径
     """
     return DB_PATH
+
+# ==================== 数据库后端 ====================
+
+# 查询的数据库后端（见 common/db_backend.py）：
+# - "sqlite": 本地SQLite数据库 DB_PATH（默认），支持查询计划检查和按进度回调中断的时间预算
+# - "mysql":  MySQL，连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量；
+#             时间预算用 MAX_EXECUTION_TIME 提示实现，不做查询计划检查
+DB_BACKEND = CONFIGURED_BACKEND
+
+def get_backend():
+    """
+    获取当前配置的数据访问后端（SQLiteBackend 或 MySQLBackend）
+    连接数不少于工作线程数，避免工作线程等待连接
+    """
+    return get_db_backend(DB_BACKEND, get_db_path(), image_info=False, pool_size=max(QUERY_WORKERS, 8))
+
+def use_backend(name):
+    """
+    切换数据访问后端（"sqlite" 或 "mysql"），供基准测试使用
+    查询工作进程只读取环境变量，不受本函数影响
+    """
+    global DB_BACKEND
+    DB_BACKEND = name.lower()
+
+# ==================== 查询限制 ====================
+
+QUERY_MAX_ROWS = int(os.environ.get("QUERY_MAX_ROWS", "10000"))         # 单次查询最多返回的行数（硬上限）
+QUERY_TIME_BUDGET = float(os.environ.get("QUERY_TIME_BUDGET", "5"))      # 单次查询的时间预算（秒），0表示不限制
+QUERY_PAGE_SIZE = int(os.environ.get("QUERY_PAGE_SIZE", "500"))          # 分页查询的默认每页行数
+
+def get_query_limits():
+    """
+    获取查询限制配置
+    """
+    return {
+        "max_rows": QUERY_MAX_ROWS,
+        "time_budget": QUERY_TIME_BUDGET,
+        "page_size": QUERY_PAGE_SIZE
+    }
+
+# ==================== 查询计划检查 ====================
+
+QUERY_SCAN_ROW_LIMIT = int(os.environ.get("QUERY_SCAN_ROW_LIMIT", "100000"))  # 允许全表扫描的估计行数上限，0表示不限制
+# 超过上限时：reject 拒绝（默认）/ rewrite 在外层加 LIMIT QUERY_SCAN_REWRITE_LIMIT 改写。
+# 改写只能让“很快凑够行数”的扫描提前结束，筛选条件很严格时（如 LIKE '%x%'）仍会读完整张表
+QUERY_SCAN_ACTION = os.environ.get("QUERY_SCAN_ACTION", "reject")
+QUERY_SCAN_REWRITE_LIMIT = int(os.environ.get("QUERY_SCAN_REWRITE_LIMIT", "100"))  # rewrite 时外层 LIMIT 的行数
+QUERY_PLAN_CACHE_SIZE = int(os.environ.get("QUERY_PLAN_CACHE_SIZE", "256"))    # 查询计划缓存条数
+
+def get_guard_config():
+    """
+    获取查询计划检查配置
+    """
+    return {
+        "scan_row_limit": QUERY_SCAN_ROW_LIMIT,
+        "action": QUERY_SCAN_ACTION,
+        "rewrite_limit": QUERY_SCAN_REWRITE_LIMIT,
+        "plan_cache_size": QUERY_PLAN_CACHE_SIZE
+    }
+
+# ==================== 查询工作池 ====================
+
+# 以 mode=ro 只读方式（连接池复用连接，不修改数据库文件）打开数据库；关闭时每次查询新建读写连接
+QUERY_READONLY = os.environ.get("QUERY_READONLY", "1").lower() not in ("0", "false", "no")
+# 查询执行方式：
+# - "thread":  在线程池中执行（默认）
+# - "process": 在进程池中执行，不受GIL限制，慢查询的结果转换不会拖慢其他查询
+# - "inline":  直接在请求线程中执行
+QUERY_WORKER_MODE = os.environ.get("QUERY_WORKER_MODE", "thread")
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "4"))  # 工作线程/进程数
+
+def get_worker_config():
+    """
+    获取查询工作池配置
+    """
+    return {
+        "readonly": QUERY_READONLY,
+        "mode": QUERY_WORKER_MODE,
+        "workers": QUERY_WORKERS
+    }
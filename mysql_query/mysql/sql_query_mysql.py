@@ -1,43 +1,13 @@
 # sql_query.py
-import pymysql
-# from db_config import get_db_config
-from mysql_query.db_config import get_db_config
+# 查询逻辑已与SQLite版本合并（mysql_query/sql_query.py），数据库访问经过 common/db_backend.py，
+# 同样支持行数上限、分页和时间预算（MAX_EXECUTION_TIME 提示）。
+# 本文件要求环境变量 DB_BACKEND=mysql，重新导出 query_sql，保留原有的导入方式；
+# MySQL连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量。
+from common.db_backend import require_mysql_backend
 
-def query_sql(sql: str) -> dict:
-    """
-    执行 SQL 语句（只允许 SELECT），无查询结果时返回空列表
-    """
-    if not sql.strip().lower().startswith(("select")):
-        return {"status": "error", "message": "仅允许执行 SELECT 语句"}
-    
-    config = get_db_config()
-    # print(config)
-    
-    try:
-        connection = pymysql.connect(**config)
-        with connection.cursor() as cursor:
-            cursor.execute(sql)
-            result = cursor.fetchall()  # 获取查询结果，<class 'tuple'>
-            # print(result) 
-            # print(type(result))
-            
-            # 将结果转换为字典列表
-            formatted_result = []
-            if result:
-                # 获取列名
-                columns = [col[0] for col in cursor.description]
-                
-                for row in result:
-                    formatted_result.append(dict(zip(columns, row)))
-        return {"status": "success", "data": formatted_result}
-        # return {"status": "success", "data": result}
-    except pymysql.Error as e:
-        return {"status": "error", "message": f"数据库错误: {e}"}
-    except Exception as e:
-        return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals() and connection:
-            connection.close()
+require_mysql_backend()
+
+from mysql_query.sql_query import query_sql, query_sql_page
 
 if __name__ == "__main__":
     # 测试 execute_sql 函数
@@ -45,5 +15,3 @@ if __name__ == "__main__":
 
     result = query_sql(test_sql)
     print(result)
-
-    
\ No newline at end of file
@@ -0,0 +1,297 @@
+# query_guard.py - 查询执行前的计划检查和查询统计
+"""
+LLM Agent 生成的 SELECT 语句在执行前先经过这里：
+
+1. 规范化SQL（去掉注释、字符串/数字字面量替换为 ?、合并空白、转小写）得到“查询形态”
+2. 按查询形态缓存 EXPLAIN QUERY PLAN 的结果（LRU；数据库 schema_version 变化时失效）
+3. 根据计划中的全表扫描（SCAN 表，旧版SQLite为 SCAN TABLE 表）和表的行数估计扫描行数，超过 scan_row_limit 时：
+   - reject:  拒绝执行（默认）
+   - rewrite: 不含排序/分组/聚合的查询在外层加 LIMIT rewrite_limit（远小于 QUERY_MAX_ROWS），
+              读够行数后即停止扫描；否则仍然拒绝。
+              注意筛选条件很严格（如 LIKE '%x%' 匹配的行很少）时，凑不够行数仍会扫描整张表
+4. 按查询形态统计执行次数、耗时、返回行数，供 /query-stats 列出最慢和最频繁的查询
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .db_config import get_guard_config
+except ImportError:
+    from db_config import get_guard_config
+
+ROW_ESTIMATE_TTL = 60.0  # 表行数估计的缓存时间（秒）
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.S)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_TABLE_ALIAS_RE = re.compile(r'\b(?:from|join)\s+["`\[]?(\w+)["`\]]?(?:\s+(?:as\s+)?(\w+))?', re.I)
+# FROM 后逗号分隔的表列表（FROM a x, b y），到下一个子句关键字或右括号为止
+_FROM_LIST_RE = re.compile(r"\bfrom\s+(.+?)(?=\b(?:where|join|inner|left|right|cross|natural|on|using|group|order|"
+                           r"limit|union|except|intersect|having|window)\b|\)|;|$)", re.I | re.S)
+_TABLE_REF_RE = re.compile(r'^\s*["`\[]?(\w+)["`\]]?(?:\s+(?:as\s+)?(\w+))?\s*$', re.I)
+_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)")  # SQLite 3.36 之前的计划为 SCAN TABLE 表名
+_AGGREGATE_RE = re.compile(r"\b(?:count|sum|avg|min|max|total|group_concat)\s*\(")
+_ALIAS_KEYWORDS = {'where', 'join', 'inner', 'left', 'right', 'cross', 'natural', 'on', 'using', 'group',
+                   'order', 'limit', 'union', 'except', 'intersect', 'having', 'window'}
+
+
+def table_aliases(sql, tables):
+    """
+    找出SQL中 FROM/JOIN 引用的表（含逗号连接 FROM a x, b y），返回 {表名或别名: 表名}
+
+    查询计划中的表用别名表示（如 SCAN x），需要据此找到实际的表来估计行数
+
+    Args:
+        tables (set): 数据库中实际存在的表名（小写），子查询、CTE 的名字不在其中
+    """
+    text = _STRING_RE.sub("''", _COMMENT_RE.sub(" ", sql))
+    refs = _TABLE_ALIAS_RE.findall(text)
+    for from_list in _FROM_LIST_RE.findall(text):
+        for item in from_list.split(",")[1:]:  # 第一个表已由 _TABLE_ALIAS_RE 找到
+            match = _TABLE_REF_RE.match(item)
+            if match:
+                refs.append(match.groups())
+
+    aliases = {}
+    for table, alias in refs:
+        if table.lower() in tables:
+            aliases[table.lower()] = table.lower()
+            if alias and alias.lower() not in _ALIAS_KEYWORDS:
+                aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL得到查询形态：只有字面量不同的查询视为同一形态
+
+    例如 SELECT * FROM t WHERE a = 'x' AND b IN (1, 2, 3);
+    规范化为 select * from t where a = ? and b in (?)
+    """
+    text = _COMMENT_RE.sub(" ", sql)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = " ".join(text.split()).lower().rstrip(";").strip()
+    return _IN_LIST_RE.sub("(?)", text)
+
+
+class QueryGuard:
+    """
+    查询计划检查（带计划缓存）和按查询形态的执行统计
+
+    Args:
+        scan_row_limit (int): 允许全表扫描的估计行数上限，0表示不限制
+        action (str): 超过上限时的处理方式，"reject" 或 "rewrite"
+        rewrite_limit (int): rewrite 时外层 LIMIT 的行数（应远小于结果行数上限，才能让扫描尽早结束）
+        plan_cache_size (int): 计划缓存的最大条数
+        max_shapes (int): 最多统计多少种查询形态，超出后淘汰最久未出现的
+    """
+
+    def __init__(self, scan_row_limit=100000, action="reject", rewrite_limit=100,
+                 plan_cache_size=256, max_shapes=1000):
+        self.scan_row_limit = scan_row_limit
+        self.action = action
+        self.rewrite_limit = rewrite_limit
+        self.plan_cache_size = plan_cache_size
+        self.max_shapes = max_shapes
+
+        self._lock = threading.Lock()
+        self._plans = OrderedDict()        # 查询形态 -> (schema_version, 计划分析结果)
+        self._row_estimates = {}           # 表名 -> (行数估计, 估计时间)
+        self._shapes = OrderedDict()       # 查询形态 -> 统计
+        self._plan_hits = 0
+        self._plan_misses = 0
+        self._rejected = 0
+        self._rewritten = 0
+
+    # ==================== 计划检查 ====================
+
+    def _explain(self, connection, sql):
+        """执行 EXPLAIN QUERY PLAN，返回计划明细和全表扫描的表（按所在循环分组）"""
+        rows = connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        tables = {name.lower() for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()}
+        aliases = table_aliases(sql, tables)
+
+        details = []
+        scans = {}  # 父节点ID -> 该层循环中全表扫描的表，同一层的多个扫描是嵌套循环
+        for row in rows:
+            parent, detail = row[1], row[3]
+            details.append(detail)
+            match = _SCAN_RE.match(detail)
+            if match:
+                table = aliases.get(match.group(1).lower())
+                if table:  # 子查询、CTE 等不是实际的表
+                    scans.setdefault(parent, []).append(table)
+        return {
+            'plan': details,
+            'scans': list(scans.values()),
+            'temp_btree': any('TEMP B-TREE' in detail for detail in details),
+        }
+
+    def _estimate_rows(self, connection, table):
+        """估计表的行数（用最大rowid，O(log n)），结果缓存 ROW_ESTIMATE_TTL 秒"""
+        now = time.monotonic()
+        cached = self._row_estimates.get(table)
+        if cached and now - cached[1] < ROW_ESTIMATE_TTL:
+            return cached[0]
+        try:
+            estimate = connection.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+        except Exception:
+            estimate = connection.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+        self._row_estimates[table] = (estimate, now)
+        return estimate
+
+    def get_plan(self, connection, sql, shape=None):
+        """获取查询计划分析结果（按查询形态缓存，schema变化时重新分析）"""
+        shape = shape or normalize_sql(sql)
+        schema_version = connection.execute("PRAGMA schema_version").fetchone()[0]
+        with self._lock:
+            cached = self._plans.get(shape)
+            if cached and cached[0] == schema_version:
+                self._plans.move_to_end(shape)
+                self._plan_hits += 1
+                return cached[1]
+            self._plan_misses += 1
+
+        analysis = self._explain(connection, sql)
+        with self._lock:
+            self._plans[shape] = (schema_version, analysis)
+            self._plans.move_to_end(shape)
+            while len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+        return analysis
+
+    def check(self, connection, sql):
+        """
+        执行前检查查询计划
+
+        Returns:
+            dict: action 为 "allow"、"rewrite" 或 "reject"；
+                  rewrite 时 sql 为改写后的语句，reject 时 message 为拒绝原因；
+                  另含 shape（查询形态）、plan（计划明细）、scan_rows（估计扫描行数）
+        """
+        shape = normalize_sql(sql)
+        analysis = self.get_plan(connection, sql, shape)
+
+        scan_rows = 0
+        for loop_tables in analysis['scans']:
+            loop_rows = 1
+            for table in loop_tables:
+                loop_rows *= self._estimate_rows(connection, table)
+            scan_rows = max(scan_rows, loop_rows)
+
+        result = {'action': 'allow', 'sql': sql, 'shape': shape, 'plan': analysis['plan'], 'scan_rows': scan_rows}
+        if not self.scan_row_limit or scan_rows <= self.scan_row_limit:
+            return result
+
+        scanned = sorted({table for loop_tables in analysis['scans'] for table in loop_tables})
+        # 没有排序/分组/去重（TEMP B-TREE）和聚合函数时，外层 LIMIT 可以让扫描提前结束
+        can_rewrite = not analysis['temp_btree'] and not _AGGREGATE_RE.search(shape)
+        if self.action == "rewrite" and can_rewrite:
+            inner_sql = sql.strip().rstrip(";").strip()
+            result.update({
+                'action': 'rewrite',
+                'sql': f"SELECT * FROM (\n{inner_sql}\n) LIMIT {int(self.rewrite_limit)}",
+                'message': f"查询需要全表扫描 {', '.join(scanned)}（估计 {scan_rows} 行），已限制为最多返回 {self.rewrite_limit} 行"
+            })
+            with self._lock:
+                self._rewritten += 1
+        else:
+            result.update({
+                'action': 'reject',
+                'message': (f"查询被拒绝：需要全表扫描 {', '.join(scanned)}（估计 {scan_rows} 行，上限 {self.scan_row_limit} 行），"
+                            f"请在 WHERE 中使用有索引的字段或缩小查询范围")
+            })
+            with self._lock:
+                self._rejected += 1
+        return result
+
+    # ==================== 查询统计 ====================
+
+    def record(self, shape, elapsed, rows=0, status="success", rewritten=False, sql=None):
+        """
+        记录一次查询的执行结果
+
+        Args:
+            status (str): "success"、"error" 或 "rejected"
+            rewritten (bool): 是否被改写后执行
+        """
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                stats = {'shape': shape, 'example': (sql or shape)[:500], 'count': 0, 'errors': 0, 'rejected': 0,
+                         'rewritten': 0, 'time_total': 0.0, 'time_max': 0.0, 'rows_total': 0}
+                self._shapes[shape] = stats
+            self._shapes.move_to_end(shape)
+            stats['count'] += 1
+            stats['time_total'] += elapsed
+            stats['time_max'] = max(stats['time_max'], elapsed)
+            stats['rows_total'] += rows
+            stats['last_seen'] = time.time()
+            if status == 'error':
+                stats['errors'] += 1
+            elif status == 'rejected':
+                stats['rejected'] += 1
+            if rewritten:
+                stats['rewritten'] += 1
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+
+    def stats(self, top=10):
+        """
+        获取统计：最慢（按平均耗时）和最频繁的查询形态，以及计划缓存命中情况
+        """
+        with self._lock:
+            shapes = [dict(stats) for stats in self._shapes.values()]
+            plan_total = self._plan_hits + self._plan_misses
+            summary = {
+                'plan_cache': {
+                    'entries': len(self._plans),
+                    'max_entries': self.plan_cache_size,
+                    'hits': self._plan_hits,
+                    'misses': self._plan_misses,
+                    'hit_rate': round(self._plan_hits / plan_total, 4) if plan_total else 0.0,
+                },
+                'scan_row_limit': self.scan_row_limit,
+                'action': self.action,
+                'rejected': self._rejected,
+                'rewritten': self._rewritten,
+                'shapes': len(shapes),
+            }
+
+        for stats in shapes:
+            stats['time_avg_ms'] = round(stats['time_total'] * 1000 / stats['count'], 3)
+            stats['time_max_ms'] = round(stats.pop('time_max') * 1000, 3)
+            stats['time_total_ms'] = round(stats.pop('time_total') * 1000, 3)
+            stats['rows_avg'] = round(stats.pop('rows_total') / stats['count'], 1)
+
+        summary['slowest'] = sorted(shapes, key=lambda s: s['time_avg_ms'], reverse=True)[:top]
+        summary['most_frequent'] = sorted(shapes, key=lambda s: s['count'], reverse=True)[:top]
+        return summary
+
+
+# ==================== 进程内实例 ====================
+
+_guard = None
+_guard_lock = threading.Lock()
+
+
+def get_query_guard():
+    """获取进程内唯一的 QueryGuard（按配置创建）"""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                config = get_guard_config()
+                _guard = QueryGuard(
+                    scan_row_limit=config['scan_row_limit'],
+                    action=config['action'],
+                    rewrite_limit=config['rewrite_limit'],
+                    plan_cache_size=config['plan_cache_size']
+                )
+    return _guard
@@ -0,0 +1,135 @@
+# query_workers.py - 查询工作池
+"""
+把 /query-sql 的查询交给固定大小的工作池执行，限制同时执行的查询数：
+
+- thread:  ThreadPoolExecutor，连接来自 mode=ro 只读连接池
+- process: ProcessPoolExecutor（spawn启动），每个工作进程有自己的只读连接池，
+           结果转换等Python代码不受GIL限制，慢查询不会拖慢同时到达的快查询
+- inline:  不使用工作池，直接在请求线程中执行
+
+流式（NDJSON）响应需要边取边发送，始终在请求线程中执行。
+process 模式下查询形态统计（/query-stats）记录在各工作进程中，请求进程只统计流式查询；
+请求指标（/metrics）中的SQL耗时也只包含 thread/inline 模式和流式查询。
+"""
+
+import contextvars
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+try:
+    from .db_config import get_worker_config, get_query_limits
+    from .sql_query import query_sql, query_sql_page
+except ImportError:
+    from db_config import get_worker_config, get_query_limits
+    from sql_query import query_sql, query_sql_page
+
+RESULT_TIMEOUT_MARGIN = 5.0  # 等待结果的超时 = 时间预算 + 排队余量（秒）
+
+
+class QueryWorkers:
+    """
+    查询工作池
+
+    Args:
+        mode (str): "thread"、"process" 或 "inline"
+        workers (int): 工作线程/进程数
+    """
+
+    def __init__(self, mode="thread", workers=4):
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        if mode == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        elif mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="query-worker")
+        else:
+            self._executor = None
+
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._time_total = 0.0
+
+    def run(self, func, *args, **kwargs):
+        """在工作池中执行查询函数并等待结果（返回值为查询函数的结果字典）"""
+        time_budget = kwargs.get("time_budget") or get_query_limits()["time_budget"]
+        start = time.perf_counter()
+        with self._lock:
+            self._submitted += 1
+            self._in_flight += 1
+            self._max_in_flight = max(self._max_in_flight, self._in_flight)
+        try:
+            if self._executor is None:
+                return func(*args, **kwargs)
+            if self.mode == "thread":
+                # 在请求的上下文中执行，工作线程的SQL耗时计入请求指标（common/metrics.py）
+                future = self._executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+            else:
+                future = self._executor.submit(func, *args, **kwargs)
+            try:
+                return future.result(timeout=time_budget + RESULT_TIMEOUT_MARGIN if time_budget else None)
+            except FutureTimeoutError:
+                future.cancel()  # 还在排队时取消；已开始执行的查询会被时间预算中断
+                with self._lock:
+                    self._timeouts += 1
+                return {"status": "error", "message": "查询超时：查询工作池繁忙，请稍后重试"}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._time_total += time.perf_counter() - start
+
+    def query(self, sql, **kwargs):
+        """在工作池中执行 query_sql"""
+        return self.run(query_sql, sql, **kwargs)
+
+    def query_page(self, sql, **kwargs):
+        """在工作池中执行 query_sql_page"""
+        return self.run(query_sql_page, sql, **kwargs)
+
+    def stats(self):
+        """
+        获取工作池指标
+
+        Returns:
+            dict: 模式、工作数、提交/完成/超时次数、当前和最大并发、平均耗时（含排队）
+        """
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'workers': self.workers,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'timeouts': self._timeouts,
+                'in_flight': self._in_flight,
+                'max_in_flight': self._max_in_flight,
+                'time_avg_ms': round(self._time_total * 1000 / self._completed, 3) if self._completed else 0.0,
+            }
+
+    def shutdown(self):
+        """关闭工作池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ==================== 进程内实例 ====================
+
+_workers = None
+_workers_lock = threading.Lock()
+
+
+def get_query_workers():
+    """获取进程内唯一的查询工作池（按配置创建，首次使用时启动）"""
+    global _workers
+    if _workers is None:
+        with _workers_lock:
+            if _workers is None:
+                config = get_worker_config()
+                _workers = QueryWorkers(mode=config["mode"], workers=config["workers"])
+    return _workers
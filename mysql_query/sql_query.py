@@ -1,44 +1,357 @@
-# sql_query.py - SQLite版本
+# sql_query.py - SQLite/MySQL后端共用（db_config.py 中的 DB_BACKEND，见 common/db_backend.py）
+import base64
+import hashlib
+import json
+import re
 import sqlite3
+import time
 try:
-    from .db_config import get_db_path
+    from .db_config import get_db_path, get_backend, get_query_limits, get_worker_config
+    from .query_guard import get_query_guard, normalize_sql
 except ImportError:
-    from db_config import get_db_path
+    from db_config import get_db_path, get_backend, get_query_limits, get_worker_config
+    from query_guard import get_query_guard, normalize_sql
 
-def query_sql(sql: str) -> dict:
+from common.db_backend import DB_ERRORS, SQLITE, DatabaseError, MYSQL_QUERY_TIMEOUT
+
+FETCH_CHUNK_SIZE = 200            # 每次从游标中取出的行数
+PROGRESS_HANDLER_INTERVAL = 1000  # 每执行多少条SQLite虚拟机指令检查一次时间预算
+
+
+class QueryError(Exception):
+    """查询被拒绝或执行失败，message 为返回给调用方的错误信息"""
+
+
+def check_select(sql: str) -> str:
+    """
+    检查是否为 SELECT 语句
+
+    Returns:
+        str: 错误信息，检查通过时返回None
+    """
+    if not isinstance(sql, str) or not sql.strip().lower().startswith(("select")):
+        return "仅允许执行 SELECT 语句"
+    return None
+
+
+def open_query_connection(time_budget=None):
+    """
+    打开查询连接，并用进度回调实现时间预算：超时后SQLite中断当前语句
+
+    只读模式下从 mode=ro 连接池借出连接（close() 时归还），查询与插入服务的写入互不阻塞。
+    MySQL后端从连接池借出连接，时间预算由 iter_query_rows 以 MAX_EXECUTION_TIME 提示加在语句上。
+
+    Args:
+        time_budget (float, optional): 时间预算（秒），None时使用配置值，0表示不限制
+    """
+    if time_budget is None:
+        time_budget = get_query_limits()["time_budget"]
+
+    backend = get_backend()
+    if backend.name != SQLITE:
+        return backend.connect()
+
+    worker_config = get_worker_config()
+    if worker_config["readonly"]:
+        connection = backend.connect()
+    else:
+        connection = sqlite3.connect(get_db_path())
+    connection.row_factory = sqlite3.Row  # 使结果可以通过列名访问
+    if time_budget and time_budget > 0:
+        deadline = time.monotonic() + time_budget
+        # 回调返回非0时SQLite中断执行，抛出 sqlite3.OperationalError: interrupted
+        connection.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, PROGRESS_HANDLER_INTERVAL)
+    return connection
+
+
+def format_db_error(e, time_budget=None) -> str:
+    """把数据库异常转换为错误信息，时间预算耗尽（SQLite进度回调中断、MySQL MAX_EXECUTION_TIME 超时）单独提示"""
+    interrupted = isinstance(e, sqlite3.OperationalError) and str(e) == "interrupted"
+    if interrupted or (isinstance(e, DatabaseError) and e.errno == MYSQL_QUERY_TIMEOUT):
+        if time_budget is None:
+            time_budget = get_query_limits()["time_budget"]
+        return f"查询超时：超过时间预算 {time_budget} 秒"
+    return f"数据库错误: {e}"
+
+
+def iter_query_rows(sql: str, max_rows=None, time_budget=None, connection=None, guard=True, shape=None, guard_info=None,
+                    params=()):
+    """
+    逐批取出查询结果，逐行返回字典（不会一次性把全部结果读入内存）
+
+    执行前先检查查询计划（见 query_guard.py，只支持SQLite后端）：估计全表扫描行数过大的查询会被拒绝或加 LIMIT 改写。
+    执行结束后按查询形态记录耗时和返回行数。
+
+    Args:
+        sql (str): SELECT 语句
+        max_rows (int, optional): 最多返回的行数，None时使用配置的硬上限
+        time_budget (float, optional): 时间预算（秒）
+        connection: 已打开的连接（用于参数化的分页查询），None时自动打开并在结束时关闭
+        guard (bool): 是否检查查询计划（分页查询已在外层检查过原始语句）
+        shape (str, optional): 统计时使用的查询形态，默认为规范化后的 sql
+        guard_info (dict, optional): 传入时写入计划检查结果（action、message、scan_rows）
+        params (tuple): SQL中 ? 占位符的参数（键集分页的上一页最后一行的键值）
+
+    Yields:
+        dict: 每行结果
+
+    Raises:
+        QueryError: 非 SELECT 语句、查询被拒绝或数据库错误
+    """
+    error = check_select(sql)
+    if error:
+        raise QueryError(error)
+    if max_rows is None:
+        max_rows = get_query_limits()["max_rows"]
+    if time_budget is None:
+        time_budget = get_query_limits()["time_budget"]
+
+    backend = get_backend()
+    query_guard = get_query_guard()
+    own_connection = connection is None
+    start = time.perf_counter()
+    count = 0
+    status = "error"
+    rewritten = False
+    try:
+        if own_connection:
+            connection = open_query_connection(time_budget)
+        if guard and backend.name == SQLITE:
+            decision = query_guard.check(connection, sql)
+            shape = decision["shape"]
+            if guard_info is not None:
+                guard_info.update({key: decision.get(key) for key in ("action", "message", "scan_rows")})
+            if decision["action"] == "reject":
+                status = "rejected"
+                raise QueryError(decision["message"])
+            rewritten = decision["action"] == "rewrite"
+            sql = decision["sql"]
+
+        # SQLite的时间预算由连接的进度回调实现，MySQL在语句上加 MAX_EXECUTION_TIME 提示
+        cursor = connection.execute(backend.dialect.with_time_budget(sql, time_budget), params)
+        columns = [column[0] for column in cursor.description or ()]
+        remaining = max_rows
+        while remaining > 0:
+            rows = cursor.fetchmany(min(FETCH_CHUNK_SIZE, remaining))
+            if not rows:
+                break
+            remaining -= len(rows)
+            for row in rows:
+                count += 1
+                yield dict(zip(columns, row))
+        status = "success"
+    except GeneratorExit:
+        status = "success"  # 调用方提前结束（如流式响应达到行数上限）
+        raise
+    except DB_ERRORS as e:
+        raise QueryError(format_db_error(e, time_budget))
+    finally:
+        if own_connection and connection is not None:
+            connection.close()
+        query_guard.record(shape or normalize_sql(sql), time.perf_counter() - start, count, status, rewritten, sql)
+
+
+def query_sql(sql: str, max_rows=None, time_budget=None) -> dict:
     """
     执行 SQL 语句（只允许 SELECT），无查询结果时返回空列表
+
+    结果最多返回 max_rows 行（默认为配置的硬上限），超出时 truncated 为 True
     """
-    if not sql.strip().lower().startswith(("select")):
-        return {"status": "error", "message": "仅允许执行 SELECT 语句"}
-    
-    db_path = get_db_path()
-    # print(f"数据库路径: {db_path}")
-    
+    error = check_select(sql)
+    if error:
+        return {"status": "error", "message": error}
+    if max_rows is None:
+        max_rows = get_query_limits()["max_rows"]
+
     try:
-        connection = sqlite3.connect(db_path)
-        connection.row_factory = sqlite3.Row  # 使结果可以通过列名访问
-        cursor = connection.cursor()
-        cursor.execute(sql)
-        result = cursor.fetchall()  # 获取查询结果
-        # print(result) 
-        # print(type(result))
-        
-        # 将结果转换为字典列表
-        formatted_result = []
-        if result:
-            for row in result:
-                formatted_result.append(dict(row))
-                
-        return {"status": "success", "data": formatted_result}
-    except sqlite3.Error as e:
-        return {"status": "error", "message": f"数据库错误: {e}"}
+        # 多取一行，用于判断结果是否被截断
+        guard_info = {}
+        formatted_result = list(iter_query_rows(sql, max_rows + 1, time_budget, guard_info=guard_info))
+        truncated = len(formatted_result) > max_rows
+        result = {"status": "success", "data": formatted_result[:max_rows], "truncated": truncated}
+        if guard_info.get("action") == "rewrite":
+            result["message"] = guard_info["message"]
+        return result
+    except QueryError as e:
+        return {"status": "error", "message": str(e)}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals() and connection:
+
+
+# ==================== 分页查询 ====================
+
+_ORDER_BY_RE = re.compile(r"\border\s+by\b")
+_KEY_COLUMN_RE = re.compile(r"^\w+$")
+
+
+def has_order_by(sql: str) -> bool:
+    """检查语句最外层（不在括号中的子查询、窗口函数里）是否有 ORDER BY，字符串常量和注释不计"""
+    depth = 0
+    outer = []
+    for char in normalize_sql(sql):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif depth == 0:
+            outer.append(char)
+    return bool(_ORDER_BY_RE.search("".join(outer)))
+
+
+def parse_page_key(key) -> list:
+    """
+    解析键集分页的键列：列名列表或逗号分隔的字符串，为空时返回空列表（按偏移量分页）
+
+    Raises:
+        QueryError: 键列不是简单列名
+    """
+    if not key:
+        return []
+    columns = [column.strip() for column in key.split(",")] if isinstance(key, str) else list(key)
+    if not all(isinstance(column, str) and _KEY_COLUMN_RE.match(column) for column in columns):
+        raise QueryError("分页键 key 必须是查询结果中的列名")
+    return columns
+
+
+def _query_fingerprint(sql: str, key=()) -> str:
+    """查询语句（和分页键列）的指纹，保证游标只能用于生成它的那条查询"""
+    text = " ".join(sql.split()) + "\n" + ",".join(key)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def encode_cursor(sql: str, offset=None, key=(), last_key=None) -> str:
+    """生成下一页的游标（对调用方不透明）：偏移量分页记录 offset，键集分页记录上一页最后一行的键值"""
+    payload = {"q": _query_fingerprint(sql, key)}
+    if key:
+        payload["k"] = last_key
+    else:
+        payload["o"] = offset
+    # 键值为日期、Decimal 等类型时（MySQL后端）按字符串保存，比较时由数据库转换
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(sql: str, cursor: str, key=()):
+    """
+    解析游标
+
+    Returns:
+        int | list: 偏移量分页返回偏移量，键集分页返回上一页最后一行的键值
+
+    Raises:
+        QueryError: 游标格式错误或不属于这条查询
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        fingerprint = payload["q"]
+        position = list(payload["k"]) if key else int(payload["o"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise QueryError("无效的分页游标")
+    if fingerprint != _query_fingerprint(sql, key):
+        raise QueryError("分页游标与查询语句不匹配")
+    if key:
+        if len(position) != len(key) or not all(isinstance(value, (str, int, float)) for value in position):
+            raise QueryError("无效的分页游标")
+    elif position < 0:
+        raise QueryError("无效的分页游标")
+    return position
+
+
+def build_page_sql(sql: str, page_size: int, key=(), position=None) -> str:
+    """
+    把查询包装为子查询，生成取一页（多取一行用于判断 has_more）的SQL
+
+    - 键集分页：按键列排序，从上一页最后一行的键值之后开始读（WHERE 键 > ?），每页的代价与页码无关
+    - 偏移量分页：LIMIT/OFFSET，每页都要先读出并丢弃前 offset 行
+    """
+    # 去掉结尾的分号；换行避免原语句末尾的 -- 注释吞掉右括号
+    inner_sql = sql.strip().rstrip(";").strip()
+    # 子查询加别名，MySQL要求派生表必须有别名
+    page_sql = f"SELECT * FROM (\n{inner_sql}\n) AS page"
+    if not key:
+        return f"{page_sql} LIMIT {page_size + 1} OFFSET {position or 0}"
+    columns = ", ".join(key)
+    if position is not None:
+        placeholders = ", ".join("?" for _ in key)
+        # 多列时使用行值比较 (a, b) > (?, ?)，SQLite 3.15+ 和 MySQL 都支持
+        page_sql += f" WHERE {columns} > ?" if len(key) == 1 else f" WHERE ({columns}) > ({placeholders})"
+    return f"{page_sql} ORDER BY {columns} LIMIT {page_size + 1}"
+
+
+def query_sql_page(sql: str, cursor=None, page_size=None, time_budget=None, key=None) -> dict:
+    """
+    分页执行 SQL 语句：把查询包装为子查询，每次只取一页
+
+    两种分页方式：
+    - 键集分页（指定 key）：key 为查询结果中能唯一确定一行且不为NULL的列（如 id），结果按 key 升序返回，
+      游标记录上一页最后一行的键值。每页只读取本页的行，翻页期间有新插入的数据也不会跳过或重复
+    - 偏移量分页（不指定 key）：游标只是偏移量，查询必须带 ORDER BY（否则每页的行顺序不确定）。
+      每页都要重新读出并丢弃前 offset 行，代价为 O(offset)，取完全部结果为 O(n²)；
+      翻页期间有新插入的数据时可能跳过或重复行。结果较多时应使用键集分页
+
+    Args:
+        sql (str): SELECT 语句
+        cursor (str, optional): 上一页返回的 next_cursor，为空时从第一页开始
+        page_size (int, optional): 每页行数，不超过配置的行数硬上限
+        key (str | list, optional): 键集分页的键列，列名列表或逗号分隔的字符串
+
+    Returns:
+        dict: status、data、下一页游标 next_cursor（没有更多数据时为None）、has_more
+    """
+    error = check_select(sql)
+    if error:
+        return {"status": "error", "message": error}
+
+    limits = get_query_limits()
+    if page_size is None:
+        page_size = limits["page_size"]
+    page_size = max(1, min(int(page_size), limits["max_rows"]))
+
+    try:
+        key = parse_page_key(key)
+        if not key and not has_order_by(sql):
+            raise QueryError("分页查询需要 ORDER BY 子句，或用 key 指定唯一的键列进行键集分页")
+        position = decode_cursor(sql, cursor, key) if cursor else None
+        page_sql = build_page_sql(sql, page_size, key, position)
+
+        connection = open_query_connection(time_budget)
+        try:
+            # 按原始语句检查查询计划；分页本身限制了每次读取的行数，改写（加LIMIT）的查询照常分页
+            shape = normalize_sql(sql)
+            if get_backend().name == SQLITE:
+                decision = get_query_guard().check(connection, sql)
+                shape = decision["shape"]
+                if decision["action"] == "reject":
+                    get_query_guard().record(shape, 0.0, 0, "rejected", sql=sql)
+                    raise QueryError(decision["message"])
+            rows = list(iter_query_rows(page_sql, page_size + 1, time_budget, connection=connection,
+                                        guard=False, shape=shape, params=tuple(position) if key and position else ()))
+        finally:
             connection.close()
 
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        next_cursor = None
+        if has_more and key:
+            last_key = [rows[-1][column] for column in key]
+            if any(value is None for value in last_key):
+                raise QueryError("分页键列的值不能为NULL")
+            next_cursor = encode_cursor(sql, key=key, last_key=last_key)
+        elif has_more:
+            next_cursor = encode_cursor(sql, (position or 0) + page_size)
+        return {
+            "status": "success",
+            "data": rows,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+    except QueryError as e:
+        return {"status": "error", "message": str(e)}
+    except DB_ERRORS as e:
+        return {"status": "error", "message": format_db_error(e, time_budget)}
+    except Exception as e:
+        return {"status": "error", "message": f"系统错误: {str(e)}"}
+
+
 if __name__ == "__main__":
     # 测试 execute_sql 函数
     test_sql = "SELECT DISTINCT 保护级别 FROM protected_species;"
@@ -46,4 +359,8 @@ if __name__ == "__main__":
     result = query_sql(test_sql)
     print(result)
 
-    
\ No newline at end of file
+    # 测试分页查询（键集分页）
+    page = query_sql_page("SELECT * FROM protected_species;", page_size=2, key="id")
+    print(page)
+    if page["status"] == "success" and page["next_cursor"]:
+        print(query_sql_page("SELECT * FROM protected_species;", cursor=page["next_cursor"], page_size=2, key="id"))
@@ -1,7 +1,67 @@
-from flask import Flask, request, jsonify
-from mysql_query.sql_query import query_sql  # SQLite版本
+import json
+from flask import Flask, request, jsonify, Response
+from mysql_query.sql_query import iter_query_rows, check_select, QueryError  # SQLite/MySQL后端见 db_config.py 中的 DB_BACKEND
+from mysql_query.db_config import get_query_limits
+from mysql_query.query_guard import get_query_guard
+from mysql_query.query_workers import get_query_workers
+from common.sqlite_pool import get_all_pool_stats
+from common.mysql_pool import get_all_mysql_pool_stats
+from common.metrics import init_metrics
 
 app = Flask(__name__)
+init_metrics(app, "mysql_query")  # 请求耗时和SQL耗时指标：GET /metrics
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request_data):
+    """请求体 "stream": true 或 Accept: application/x-ndjson 时以NDJSON流式返回"""
+    if request_data.get("stream") is True:
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def stream_query_rows(query):
+    """
+    以NDJSON流式返回查询结果：每行一条JSON记录，边取边发送
+
+    最后一行为结束标记 {"_end": true, "status": ..., "rows": 行数, "truncated": 是否超过行数上限}，
+    查询中途出错（如超过时间预算）时结束标记的 status 为 error 并带有 message，
+    查询因全表扫描被改写（加LIMIT）时结束标记带有说明 message
+    """
+    max_rows = get_query_limits()["max_rows"]
+    guard_info = {}
+    rows = iter_query_rows(query, max_rows + 1, guard_info=guard_info)  # 多取一行，用于判断结果是否被截断
+
+    # 先取第一行：语法错误等在开始发送之前就能以普通JSON错误返回
+    try:
+        first_row = next(rows, None)
+    except QueryError as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    def generate():
+        count = 0
+        trailer = {"_end": True, "status": "success", "truncated": False}
+        if guard_info.get("action") == "rewrite":
+            trailer["message"] = guard_info["message"]
+        try:
+            row = first_row
+            while row is not None:
+                if count >= max_rows:
+                    trailer["truncated"] = True
+                    break
+                yield json.dumps(row, ensure_ascii=False) + "\n"
+                count += 1
+                row = next(rows, None)
+        except QueryError as e:
+            trailer.update({"status": "error", "message": str(e)})
+        finally:
+            rows.close()  # 客户端断开或提前结束时也会关闭连接
+        trailer["rows"] = count
+        yield json.dumps(trailer, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype=NDJSON_MIMETYPE)
+
 
 @app.route("/query-sql", methods=["POST"])
 def exec_query_sql():
@@ -36,15 +96,41 @@ def exec_query_sql():
             }), 400 
         print(query) 
               
-        # 执行SQL
-        execute_result = query_sql(query)
+        error = check_select(query)
+        if error:
+            return jsonify({"status": "error", "message": error}), 500
+
+        # 流式返回（NDJSON）
+        if wants_ndjson(request_data):
+            return stream_query_rows(query)
+
+        # 分页返回：请求体带 cursor 或 page_size 时按页查询，用返回的 next_cursor 取下一页；
+        # 带 key（唯一的键列，如 "id"）时按键集分页，否则按偏移量分页（查询必须带 ORDER BY，见 sql_query.query_sql_page）
+        if "cursor" in request_data or "page_size" in request_data:
+            try:
+                page_size = int(request_data["page_size"]) if request_data.get("page_size") is not None else None
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "message": "page_size 必须是整数"}), 400
+            execute_result = get_query_workers().query_page(query, cursor=request_data.get("cursor"), page_size=page_size,
+                                                            key=request_data.get("key"))
+            if execute_result["status"] == "success":
+                return jsonify(execute_result), 200
+            return jsonify(execute_result), 500
+
+        # 执行SQL（结果行数不超过配置的硬上限）
+        execute_result = get_query_workers().query(query)
         
         # 返回执行结果
         if execute_result["status"] == "success":
-            return jsonify({
+            response = {
                 "status": "success",
-                "data": execute_result["data"]
-            }), 200
+                "data": execute_result["data"],
+                "truncated": execute_result["truncated"]
+            }
+            if "message" in execute_result:
+                # 查询因全表扫描被改写（加LIMIT）时的说明
+                response["message"] = execute_result["message"]
+            return jsonify(response), 200
         else:
             return jsonify({
                 "status": "error",
@@ -57,11 +143,39 @@ def exec_query_sql():
             "message": f"请求处理错误: {str(e)}"
         }), 500
 
+@app.route("/query-stats", methods=["GET"])
+def query_stats():
+    """
+    GET /query-stats?top=10
+    按查询形态（字面量替换为 ? 后的SQL）统计：最慢和最频繁的查询、计划缓存命中率、被拒绝/改写次数
+    """
+    top = request.args.get("top", 10, type=int)
+    return jsonify({
+        "status": "success",
+        "data": get_query_guard().stats(top=top)
+    })
+
+@app.route("/worker-stats", methods=["GET"])
+def worker_stats():
+    """
+    GET /worker-stats
+    查询工作池和只读连接池的指标
+    """
+    return jsonify({
+        "status": "success",
+        "workers": get_query_workers().stats(),
+        "pools": get_all_pool_stats() + get_all_mysql_pool_stats()
+    })
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    app.run(host="0.0.0.0", port=5002, debug=True, threaded=True)
 
 # SQLite查询示例:
 # {"query": "SELECT DISTINCT 保护级别 FROM protected_species;"}
+# 分页: {"query": "SELECT * FROM protected_species;", "page_size": 100, "key": "id"}
+#       {"query": "SELECT * FROM protected_species;", "page_size": 100, "key": "id", "cursor": "<上一页的next_cursor>"}
+#       {"query": "SELECT * FROM protected_species ORDER BY family, id;", "page_size": 100}（偏移量分页）
+# 流式: {"query": "SELECT * FROM protected_species;", "stream": true}
 
 # {
 # 	"object": "动物",
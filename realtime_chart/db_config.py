@@ -1,10 +1,33 @@
 # db_config.py
 import os
+import sys
 
-# SQLite数据库配置
-DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+# 添加项目根目录到Python路径，以便导入common模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from common.db_backend import CONFIGURED_BACKEND, get_backend as get_db_backend, migrate_at_startup
+
+# SQLite数据库配置（可用环境变量 IMAGE_INFO_DB_PATH 覆盖，如指向合成数据生成器生成的数据库）
+DB_PATH = os.environ.get(
+    "IMAGE_INFO_DB_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "Database", "image_info.db")
+)
 TABLE_NAME = "image_info"
 
+# 数据库后端（见 common/db_backend.py）：
+# - "sqlite": 本地SQLite数据库 DB_PATH（默认）
+# - "mysql":  MySQL，连接参数和驱动见 common/db_backend.py 中的 MYSQL_* 环境变量；没有预聚合表，图表直接在image_info上聚合
+DB_BACKEND = CONFIGURED_BACKEND
+
+# 图表聚合引擎：
+# - "sqlite":   查询由触发器维护的预聚合表（默认；MySQL后端时为在数据库中聚合）
+# - "columnar": 在内存列式快照上做向量化分组汇总（需要安装NumPy，见 common/columnar_snapshot.py，只支持SQLite后端）
+CHART_ENGINE = os.environ.get("CHART_ENGINE", "sqlite").lower()
+
+_snapshots = {}
+
 def get_db_path():
     """
     获取SQLite数据库文件路径
@@ -16,3 +39,55 @@ def get_table_name():
     获取主要数据表名
     """
     return TABLE_NAME
+
+def get_backend():
+    """
+    获取当前配置的数据访问后端（SQLiteBackend 或 MySQLBackend）
+    """
+    return get_db_backend(DB_BACKEND, get_db_path())
+
+def use_backend(name):
+    """
+    切换数据访问后端（"sqlite" 或 "mysql"），供基准测试使用
+    """
+    global DB_BACKEND
+    DB_BACKEND = name.lower()
+
+def migrate_schema():
+    """
+    服务启动时执行image_info表结构迁移，图表查询的预聚合表由迁移创建，仓库自带的 image_info.db 未迁移
+    迁移失败（如数据库只读）时打印错误后继续启动
+    """
+    migrate_at_startup(get_backend(), strict=False)
+
+def get_db_connection():
+    """
+    从当前后端的连接池借出连接（close() 时归还连接池），SQL使用 ? 占位符
+    表结构迁移在服务启动时执行（migrate_schema），请求中不执行，建池时只做只读检查
+    """
+    return get_backend().connect()
+
+def get_data_version():
+    """
+    读取image_info数据库的数据版本号（插入服务每次提交时加1），用于响应缓存失效
+    MySQL后端没有数据版本号，返回固定值，响应缓存只按TTL失效
+    """
+    return get_backend().data_version()
+
+def get_chart_engine():
+    """
+    获取图表聚合引擎（"sqlite" 或 "columnar"），MySQL后端不支持列式快照
+    """
+    return CHART_ENGINE if DB_BACKEND == "sqlite" else "sqlite"
+
+def get_columnar_snapshot():
+    """
+    获取当前数据库的列式内存快照（首次使用时全量加载，之后按数据版本号增量刷新）
+    """
+    db_path = get_db_path()
+    snapshot = _snapshots.get(db_path)
+    if snapshot is None:
+        # 只有 columnar 引擎需要NumPy，延迟导入
+        from common.columnar_snapshot import ColumnarSnapshot
+        snapshot = _snapshots.setdefault(db_path, ColumnarSnapshot(db_path, get_db_connection, get_data_version))
+    return snapshot
@@ -1,104 +1,127 @@
 """
-SQLite版本的实时图表数据获取函数集合
+实时图表数据获取函数集合（SQLite和MySQL后端共用）
 包含所有数据获取相关的函数：
 - get_animal_list: 获取动物种类列表
 - get_realtime_data: 获取实时统计数据
 - get_location_data: 获取地理位置统计数据
 - get_time_series_data: 获取时间序列数据
 - get_activity_data: 获取动物活动时间分布数据
+
+其中 get_realtime_data、get_location_data、get_time_series_data、get_activity_data
+查询的是由触发器增量维护的预聚合表（见 common/image_info_schema.py），
+图表刷新的开销不再随image_info记录数增长。
+配置 CHART_ENGINE=columnar 时改为在内存列式快照上做向量化分组汇总（见 common/columnar_snapshot.py）
+
+数据库访问经过 common/db_backend.py，SQLite和MySQL后端共用这些函数（db_config.py 中的 DB_BACKEND）：
+MySQL后端没有预聚合表，同样的统计直接在image_info上聚合，方言差异（如取小时）由后端的 dialect 生成。
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 try:
-    from realtime_chart.db_config import get_db_path, get_table_name
+    from realtime_chart.db_config import get_table_name, get_backend, get_db_connection, get_chart_engine, get_columnar_snapshot
 except ImportError:
-    from db_config import get_db_path, get_table_name
+    from db_config import get_table_name, get_backend, get_db_connection, get_chart_engine, get_columnar_snapshot
+
+from common.db_backend import DB_ERRORS
+from common.image_info_schema import quarter_expr
+
+
+def _animal_filters(animal_filter=None, behavior_filter=None):
+    """把动物/行为筛选参数转换为列式快照的等值筛选条件（'all' 表示不筛选）"""
+    filters = {}
+    if animal_filter and animal_filter != 'all':
+        filters['animal'] = animal_filter
+    if behavior_filter and behavior_filter != 'all':
+        filters['behavior'] = behavior_filter
+    return filters
 
 
 def get_animal_list():
     """从image_info数据库获取所有动物种类列表"""
     try:
-        db_path = get_db_path()
         table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 查询所有不同的动物种类
-        # 从 image_info 表中获取所有不重复、非空的 animal 值，并按字母顺序排列。
-        sql = f"SELECT DISTINCT animal FROM {table_name} WHERE animal IS NOT NULL AND animal != '' ORDER BY animal;"
-        cursor.execute(sql)
-        result = cursor.fetchall()
-        
-        # 转换为列表
-        animals = [row[0] for row in result]
-        
-        return {'status': 'success', 'data': animals}
-        
-    except sqlite3.Error as e:
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 查询所有不同的动物种类
+            # 从 image_info 表中获取所有不重复、非空的 animal 值，并按字母顺序排列。
+            sql = f"SELECT DISTINCT animal FROM {table_name} WHERE animal IS NOT NULL AND animal != '' ORDER BY animal;"
+            cursor.execute(sql)
+            result = cursor.fetchall()
+
+            # 转换为列表
+            animals = [row[0] for row in result]
+
+            return {'status': 'success', 'data': animals}
+        finally:
+            connection.close()  # 归还连接池
+
+    except DB_ERRORS as e:
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals():
-            connection.close()
 
 
 def get_realtime_data(days_filter=None):
     """从image_info数据库获取图像识别统计数据（支持时间筛选）"""
     try:
-        db_path = get_db_path()
-        table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 构建SQL查询，支持时间筛选
-        if days_filter:
-            # SQLite中计算日期差异的方法
-            cutoff_date = (datetime.now() - timedelta(days=days_filter)).strftime('%Y%m%d')
-            sql = f"""
-            SELECT animal, SUM(count) as total_count 
-            FROM {table_name} 
-            WHERE date >= ?
-            GROUP BY animal 
-            ORDER BY total_count DESC 
-            LIMIT 10;
-            """
-            cursor.execute(sql, (cutoff_date,))
-            # WHERE命令：
-            # 只保留最近 days_filter 天及以后的记录
-            # 使用Python计算截止日期，然后与数据库中的date字段比较
-        else:
-            # 查询动物识别统计数据，使用SUM(count)统计每种动物的总数量
-            sql = f"""
-            SELECT animal, SUM(count) as total_count 
-            FROM {table_name} 
-            GROUP BY animal 
-            ORDER BY total_count DESC 
-            LIMIT 10;
-            """
-            cursor.execute(sql)
-        
-        result = cursor.fetchall()
-        
-        # 转换为字典列表
-        data = []
-        for row in result:
-            data.append({
-                'animal': row[0],
-                'count': row[1]
-            })
-        # print("get_realtime_data:", data)
-        
-        return {'status': 'success', 'data': data}
-        
-    except sqlite3.Error as e:
+        if get_chart_engine() == "columnar":
+            cutoff_date = (datetime.now() - timedelta(days=days_filter)).strftime('%Y%m%d') if days_filter else None
+            result = get_columnar_snapshot().top_counts('animal', date_from=cutoff_date, limit=10)
+            return {'status': 'success', 'data': [{'animal': animal, 'count': count} for animal, count in result]}
+
+        # 有预聚合表时查询预聚合表，否则（MySQL后端）直接在image_info上汇总
+        backend = get_backend()
+        source, total = ("rollup_animal_date", "total_count") if backend.has_rollups else (get_table_name(), "count")
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 构建SQL查询，支持时间筛选
+            if days_filter:
+                # 在Python中计算截止日期（YYYYMMDD），两种后端都直接与date字段比较
+                cutoff_date = (datetime.now() - timedelta(days=days_filter)).strftime('%Y%m%d')
+                sql = f"""
+                SELECT animal, SUM({total}) as total_count 
+                FROM {source} 
+                WHERE date >= ?
+                GROUP BY animal 
+                ORDER BY total_count DESC 
+                LIMIT 10;
+                """
+                cursor.execute(sql, (cutoff_date,))
+                # WHERE命令：
+                # 只保留最近 days_filter 天及以后的记录
+                # 使用Python计算截止日期，然后与数据库中的date字段比较
+            else:
+                # 查询动物识别统计数据，汇总每种动物的总数量
+                sql = f"""
+                SELECT animal, SUM({total}) as total_count 
+                FROM {source} 
+                GROUP BY animal 
+                ORDER BY total_count DESC 
+                LIMIT 10;
+                """
+                cursor.execute(sql)
+
+            result = cursor.fetchall()
+
+            # 转换为字典列表
+            data = []
+            for row in result:
+                data.append({
+                    'animal': row[0],
+                    'count': row[1]
+                })
+            # print("get_realtime_data:", data)
+
+            return {'status': 'success', 'data': data}
+        finally:
+            connection.close()  # 归还连接池
+
+    except DB_ERRORS as e:
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals():
-            connection.close()
 
 
 def get_location_data(animal_filter=None):
@@ -108,51 +131,54 @@ def get_location_data(animal_filter=None):
         animal_filter (str, optional): 动物种类筛选条件，如果为None则显示所有动物
     """
     try:
-        db_path = get_db_path()
-        table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 构建SQL查询，根据是否有动物筛选条件
-        if animal_filter and animal_filter != 'all':
-            sql = f"""
-            SELECT location, SUM(count) as total_count 
-            FROM {table_name} 
-            WHERE animal = ? 
-            GROUP BY location 
-            ORDER BY total_count DESC 
-            LIMIT 10;
-            """
-            cursor.execute(sql, (animal_filter,))
-        else:
-            sql = f"""
-            SELECT location, SUM(count) as total_count 
-            FROM {table_name} 
-            GROUP BY location 
-            ORDER BY total_count DESC 
-            LIMIT 10;
-            """
-            cursor.execute(sql)
-        result = cursor.fetchall()
-        
-        # 转换为字典列表
-        data = []
-        for row in result:
-            data.append({
-                'location': row[0],
-                'count': row[1]
-            })
-        # print("get_location_data:", data)
-        
-        return {'status': 'success', 'data': data}
-        
-    except sqlite3.Error as e:
+        if get_chart_engine() == "columnar":
+            result = get_columnar_snapshot().top_counts('location', _animal_filters(animal_filter), limit=10)
+            return {'status': 'success', 'data': [{'location': location, 'count': count} for location, count in result]}
+
+        backend = get_backend()
+        source, total = ("rollup_animal_location", "total_count") if backend.has_rollups else (get_table_name(), "count")
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 构建SQL查询，根据是否有动物筛选条件
+            if animal_filter and animal_filter != 'all':
+                sql = f"""
+                SELECT location, SUM({total}) as total_count 
+                FROM {source} 
+                WHERE animal = ? 
+                GROUP BY location 
+                ORDER BY total_count DESC 
+                LIMIT 10;
+                """
+                cursor.execute(sql, (animal_filter,))
+            else:
+                sql = f"""
+                SELECT location, SUM({total}) as total_count 
+                FROM {source} 
+                GROUP BY location 
+                ORDER BY total_count DESC 
+                LIMIT 10;
+                """
+                cursor.execute(sql)
+            result = cursor.fetchall()
+
+            # 转换为字典列表
+            data = []
+            for row in result:
+                data.append({
+                    'location': row[0],
+                    'count': row[1]
+                })
+            # print("get_location_data:", data)
+
+            return {'status': 'success', 'data': data}
+        finally:
+            connection.close()  # 归还连接池
+
+    except DB_ERRORS as e:
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals():
-            connection.close()
 
 
 def get_time_series_data(animal_filter=None):
@@ -162,191 +188,196 @@ def get_time_series_data(animal_filter=None):
         animal_filter (str, optional): 动物种类筛选条件，如果为None则显示所有动物
     """
     try:
-        db_path = get_db_path()
-        table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 构建SQL查询，按季度聚合数据
-        if animal_filter and animal_filter != 'all':
-            sql = f"""
-            SELECT 
-                substr(date, 1, 4) as year,
-                CASE 
-                    WHEN substr(date, 5, 2) IN ('01', '02', '03') THEN '1季度'
-                    WHEN substr(date, 5, 2) IN ('04', '05', '06') THEN '2季度'
-                    WHEN substr(date, 5, 2) IN ('07', '08', '09') THEN '3季度'
-                    WHEN substr(date, 5, 2) IN ('10', '11', '12') THEN '4季度'
-                    ELSE '未知'
-                END as quarter,
-                SUM(count) as total_count, 
-                AVG(confidence) as avg_confidence, 
-                AVG(percentage) as avg_percentage 
-            FROM {table_name} 
-            WHERE date IS NOT NULL AND date != '' AND animal = ?
-            GROUP BY year, quarter
-            ORDER BY year DESC, quarter DESC 
-            LIMIT 20
-            """
-            cursor.execute(sql, (animal_filter,))
-        # 1. SELECT 子句：要返回的列
-        #   date：原始的日期字段，用来区分不同天的数据。
-        #   SUM(count) AS total_count：对这一日期组内的 count 列做求和，把结果命名为 total_count，表示当天所有记录里"count"字段的累积值。
-        #   AVG(confidence) AS avg_confidence：计算当天所有记录 confidence 字段的算术平均值，命名为 avg_confidence。
-        #   AVG(percentage) AS avg_percentage：计算当天所有记录 percentage 字段的平均值，命名为 avg_percentage。
-        # 2. FROM 子句：数据来源于表image_info
-        # 3. WHERE 子句：过滤条件
-        #   date IS NOT NULL AND date != ''：去掉日期为空或空字符串的记录，确保分组时日期有效。
-        #   AND animal = ?：只统计 animal 列等于调用时传入参数（animal_filter）的那种动物。
-        # 4. GROUP BY 子句：按日期分组
-        #   GROUP BY date 会将所有同一天的记录聚到一起，分别计算每组的 SUM(count)、AVG(confidence)、AVG(percentage)。
-        # 5. ORDER BY 子句：排序
-        #   ORDER BY date DESC 按日期倒序排列，把最新的日期排在最前面。
-        # 6. LIMIT 子句：数量限制
-        #   LIMIT 20 只取前 20 条结果，也就是最近的 20 天的统计数据。
+        if get_chart_engine() == "columnar":
+            result = get_columnar_snapshot().quarter_series(_animal_filters(animal_filter), limit=20)
+            return {'status': 'success', 'data': _format_quarter_rows(result)}
+
+        backend = get_backend()
+        if backend.has_rollups:
+            select_sql = """
+                year,
+                quarter,
+                SUM(total_count) as total_count, 
+                SUM(confidence_sum) * 1.0 / NULLIF(SUM(confidence_n), 0) as avg_confidence, 
+                SUM(percentage_sum) * 1.0 / NULLIF(SUM(percentage_n), 0) as avg_percentage 
+            FROM rollup_animal_quarter"""
+            where_conditions = ["1=1"]
         else:
-            sql = f"""
-            SELECT 
+            # 没有预聚合表（MySQL后端）时，用与预聚合表相同的年份/季度表达式在image_info上汇总
+            table_name = get_table_name()
+            select_sql = f"""
                 substr(date, 1, 4) as year,
-                CASE 
-                    WHEN substr(date, 5, 2) IN ('01', '02', '03') THEN '1季度'
-                    WHEN substr(date, 5, 2) IN ('04', '05', '06') THEN '2季度'
-                    WHEN substr(date, 5, 2) IN ('07', '08', '09') THEN '3季度'
-                    WHEN substr(date, 5, 2) IN ('10', '11', '12') THEN '4季度'
-                    ELSE '未知'
-                END as quarter,
+                {quarter_expr(table_name)} as quarter,
                 SUM(count) as total_count, 
                 AVG(confidence) as avg_confidence, 
                 AVG(percentage) as avg_percentage 
-            FROM {table_name} 
-            WHERE date IS NOT NULL AND date != '' 
-            GROUP BY year, quarter
-            ORDER BY year DESC, quarter DESC 
-            LIMIT 20
-            """
-            cursor.execute(sql)
-        result = cursor.fetchall()
-        
-        # 转换为字典列表，格式化为"2021年1季度"的形式
-        data = []
-        for row in result:
-            quarter_label = f"{row[0]}年{row[1]}"
-            data.append({
-                'date': quarter_label,
-                'count': row[2],
-                'confidence': round(float(row[3]) if row[3] else 0, 2),
-                'percentage': round(float(row[4]) if row[4] else 0, 2)
-            })
-        
-        # 反转数据，使时间顺序正确（从早到晚）
-        data.reverse()
-        
-        return {'status': 'success', 'data': data}
-        
+            FROM {table_name}"""
+            where_conditions = ["date IS NOT NULL AND date != ''"]
+        params = []
+
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 构建SQL查询，按季度聚合数据
+            if animal_filter and animal_filter != 'all':
+                where_conditions.append("animal = ?")
+                params.append(animal_filter)
+            # 1. SELECT 子句：要返回的列
+            #   date：原始的日期字段，用来区分不同天的数据。
+            #   SUM(count) AS total_count：对这一日期组内的 count 列做求和，把结果命名为 total_count，表示当天所有记录里"count"字段的累积值。
+            #   AVG(confidence) AS avg_confidence：计算当天所有记录 confidence 字段的算术平均值，命名为 avg_confidence。
+            #   AVG(percentage) AS avg_percentage：计算当天所有记录 percentage 字段的平均值，命名为 avg_percentage。
+            #   预聚合表中保存的是置信度/占比的和与非空个数，平均值 = 和 / 非空个数，与 AVG() 的结果一致。
+            # 2. FROM 子句：数据来源于预聚合表 rollup_animal_quarter（已按 动物+年份+季度 汇总，
+            #   并且只包含 date 非空的记录，由image_info上的触发器增量维护）
+            # 3. WHERE 子句：过滤条件
+            #   animal = ?：只统计 animal 列等于调用时传入参数（animal_filter）的那种动物。
+            # 4. GROUP BY 子句：按日期分组
+            #   GROUP BY date 会将所有同一天的记录聚到一起，分别计算每组的 SUM(count)、AVG(confidence)、AVG(percentage)。
+            # 5. ORDER BY 子句：排序
+            #   ORDER BY date DESC 按日期倒序排列，把最新的日期排在最前面。
+            # 6. LIMIT 子句：数量限制
+            #   LIMIT 20 只取前 20 条结果，也就是最近的 20 天的统计数据。
+            where_clause = " AND ".join(where_conditions)
+            sql = f"""
+                SELECT {select_sql}
+                WHERE {where_clause}
+                GROUP BY year, quarter
+                ORDER BY year DESC, quarter DESC 
+                LIMIT 20
+                """
+            cursor.execute(sql, params)
+            result = cursor.fetchall()
+
+            return {'status': 'success', 'data': _format_quarter_rows(result)}
+        finally:
+            connection.close()  # 归还连接池
+
     except Exception as e:
         return {'status': 'error', 'message': str(e)}
-    finally:
-        if 'connection' in locals():
-            connection.close()
+
+
+def _format_quarter_rows(result):
+    """把 (年份, 季度, 数量, 平均置信度, 平均占比) 按时间倒序的结果转换为图表数据（从早到晚）"""
+    # 转换为字典列表，格式化为"2021年1季度"的形式
+    data = []
+    for row in result:
+        quarter_label = f"{row[0]}年{row[1]}"
+        data.append({
+            'date': quarter_label,
+            'count': row[2],
+            'confidence': round(float(row[3]) if row[3] else 0, 2),
+            'percentage': round(float(row[4]) if row[4] else 0, 2)
+        })
+    
+    # 反转数据，使时间顺序正确（从早到晚）
+    data.reverse()
+    return data
 
 
 def get_behavior_list(animal_filter=None):
     """从image_info数据库获取行为列表"""
     try:
-        db_path = get_db_path()
         table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 构建SQL查询，获取行为列表
-        if animal_filter and animal_filter != 'all':
-            sql = f"""
-            SELECT DISTINCT behavior 
-            FROM {table_name} 
-            WHERE animal = ? AND behavior IS NOT NULL AND behavior != '' 
-            ORDER BY behavior;
-            """
-            cursor.execute(sql, (animal_filter,))
-        else:
-            sql = f"""
-            SELECT DISTINCT behavior 
-            FROM {table_name} 
-            WHERE behavior IS NOT NULL AND behavior != '' 
-            ORDER BY behavior;
-            """
-            cursor.execute(sql)
-        
-        result = cursor.fetchall()
-        
-        # 转换为列表
-        behaviors = [row[0] for row in result]
-        
-        return {'status': 'success', 'data': behaviors}
-        
-    except sqlite3.Error as e:
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 构建SQL查询，获取行为列表
+            if animal_filter and animal_filter != 'all':
+                sql = f"""
+                SELECT DISTINCT behavior 
+                FROM {table_name} 
+                WHERE animal = ? AND behavior IS NOT NULL AND behavior != '' 
+                ORDER BY behavior;
+                """
+                cursor.execute(sql, (animal_filter,))
+            else:
+                sql = f"""
+                SELECT DISTINCT behavior 
+                FROM {table_name} 
+                WHERE behavior IS NOT NULL AND behavior != '' 
+                ORDER BY behavior;
+                """
+                cursor.execute(sql)
+
+            result = cursor.fetchall()
+
+            # 转换为列表
+            behaviors = [row[0] for row in result]
+
+            return {'status': 'success', 'data': behaviors}
+        finally:
+            connection.close()  # 归还连接池
+
+    except DB_ERRORS as e:
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals():
-            connection.close()
 
 
 def get_activity_data(animal_filter=None, behavior_filter=None):
     """从image_info数据库获取动物活动时间分布数据（支持动物和行为筛选）"""
     try:
-        db_path = get_db_path()
-        table_name = get_table_name()
-        connection = sqlite3.connect(db_path)
-        
-        cursor = connection.cursor()
-        # 构建SQL查询，按小时统计动物活动
-        # 时间格式是 HH:MM，使用SQLite的时间函数解析
-        
-        # 构建WHERE条件
-        where_conditions = ["time IS NOT NULL AND time != ''"]
-        params = []
-        
-        if animal_filter and animal_filter != 'all':
-            where_conditions.append("animal = ?")
-            params.append(animal_filter)
-            
-        if behavior_filter and behavior_filter != 'all':
-            where_conditions.append("behavior = ?")
-            params.append(behavior_filter)
-        
-        where_clause = " AND ".join(where_conditions)
-        
-        sql = f"""
-        SELECT 
-            CAST(strftime('%H', time) AS INTEGER) as hour,
-            SUM(count) as total_count
-        FROM {table_name} 
-        WHERE {where_clause}
-        GROUP BY CAST(strftime('%H', time) AS INTEGER)
-        ORDER BY hour;
-        """
-        cursor.execute(sql, params)
-        
-        result = cursor.fetchall()
-        
-        # 初始化24小时的数据（0-23小时）
-        hour_counts = {row[0]: row[1] for row in result}
-        
-        # 构建24小时的数据字典，键为小时数，值为计数
-        activity_data = {}
-        for hour in range(24):
-            activity_data[hour] = hour_counts.get(hour, 0)
-        
-        return {'status': 'success', 'data': activity_data}
-        
-    except sqlite3.Error as e:
+        if get_chart_engine() == "columnar":
+            activity_data = get_columnar_snapshot().hourly_counts(_animal_filters(animal_filter, behavior_filter))
+            return {'status': 'success', 'data': activity_data}
+
+        backend = get_backend()
+        connection = get_db_connection()  # 从连接池借出，close() 时归还
+        try:
+            cursor = connection.cursor()
+            # 构建SQL查询，按小时统计动物活动
+            # 时间格式是 HH:MM，小时已在预聚合表 rollup_animal_behavior_hour 中用SQLite的时间函数解析好，
+            # 且只包含 time 非空的记录；没有预聚合表（MySQL后端）时按方言的取小时表达式在image_info上汇总
+            if backend.has_rollups:
+                hour_sql, total, source = "hour", "total_count", "rollup_animal_behavior_hour"
+                where_conditions = ["1=1"]
+            else:
+                hour_sql, total, source = backend.dialect.hour_of("time"), "count", get_table_name()
+                where_conditions = ["time IS NOT NULL AND time != ''"]
+
+            # 构建WHERE条件
+            params = []
+
+            if animal_filter and animal_filter != 'all':
+                where_conditions.append("animal = ?")
+                params.append(animal_filter)
+
+            if behavior_filter and behavior_filter != 'all':
+                where_conditions.append("behavior = ?")
+                params.append(behavior_filter)
+
+            where_clause = " AND ".join(where_conditions)
+
+            sql = f"""
+            SELECT 
+                {hour_sql} as hour,
+                SUM({total}) as total_count
+            FROM {source} 
+            WHERE {where_clause}
+            GROUP BY hour
+            ORDER BY hour;
+            """
+            cursor.execute(sql, params)
+
+            result = cursor.fetchall()
+
+            # 初始化24小时的数据（0-23小时）
+            hour_counts = {row[0]: row[1] for row in result}
+
+            # 构建24小时的数据字典，键为小时数，值为计数
+            activity_data = {}
+            for hour in range(24):
+                activity_data[hour] = hour_counts.get(hour, 0)
+
+            return {'status': 'success', 'data': activity_data}
+        finally:
+            connection.close()  # 归还连接池
+
+    except DB_ERRORS as e:
         return {"status": "error", "message": f"数据库错误: {e}"}
     except Exception as e:
         return {"status": "error", "message": f"系统错误: {str(e)}"}
-    finally:
-        if 'connection' in locals():
-            connection.close()
 
 
 def main():
@@ -9,9 +9,20 @@ from realtime_chart.realtime_chart_data_functions import (
     get_activity_data,
     get_behavior_list
 )
+from realtime_chart.db_config import get_data_version, get_chart_engine, get_columnar_snapshot, migrate_schema
+from common.sqlite_pool import get_all_pool_stats
+from common.mysql_pool import get_all_mysql_pool_stats
+from common.response_cache import ResponseCache
+from common.metrics import init_metrics
 
 app = Flask(__name__, static_folder='realtime_chart', static_url_path='')
 CORS(app)
+init_metrics(app, "realtime_chart")  # 请求耗时和SQL耗时指标：GET /metrics
+
+migrate_schema()  # 启动时执行表结构迁移，不在请求中执行
+
+# 列表接口的响应缓存：TTL到期或插入服务提交新数据（数据版本号变化）时失效
+response_cache = ResponseCache(ttl=300, max_entries=512, version_getter=get_data_version)
 
 @app.route("/")
 def index():
@@ -35,11 +46,13 @@ def debug():
 
 
 @app.route("/api/animal-list")
+@response_cache.cached()
 def api_animal_list():
     """提供动物种类列表API"""
     return jsonify(get_animal_list())
 
 @app.route("/api/behavior-list")
+@response_cache.cached()
 def api_behavior_list():
     """提供行为列表API（支持动物筛选）"""
     try:
@@ -90,6 +103,23 @@ def api_activity_data():
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/api/pool-stats")
+def api_pool_stats():
+    """连接池使用和等待指标API（SQLite连接池和MySQL后端的连接池）"""
+    return jsonify(get_all_pool_stats() + get_all_mysql_pool_stats())
+
+@app.route("/api/cache-stats")
+def api_cache_stats():
+    """响应缓存命中/未命中指标API"""
+    return jsonify(response_cache.stats())
+
+@app.route("/api/snapshot-stats")
+def api_snapshot_stats():
+    """列式内存快照指标API（CHART_ENGINE=columnar 时可用）"""
+    if get_chart_engine() != "columnar":
+        return jsonify({"status": "error", "message": "未启用列式快照引擎（CHART_ENGINE=columnar）"}), 404
+    return jsonify({"status": "success", "data": get_columnar_snapshot().stats()})
+
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5003, debug=True)
@@ -0,0 +1,41 @@
+# conftest.py - pytest公共夹具
+"""
+运行方式（在仓库根目录）：
+    python -m pytest -q tests
+
+测试数据库均由合成数据生成器（benchmark/generate_image_info.py）在临时目录中生成，不会修改 Database/ 中的数据库。
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (PROJECT_ROOT, os.path.join(PROJECT_ROOT, 'benchmark')):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from generate_image_info import create_database
+
+# 地图和看板应用在导入时执行表结构迁移：导入前把默认数据库指向临时合成数据库，避免迁移仓库自带的 image_info.db
+_DEFAULT_DB_DIR = tempfile.mkdtemp(prefix='image_info_tests_')
+atexit.register(shutil.rmtree, _DEFAULT_DB_DIR, True)
+os.environ['IMAGE_INFO_DB_PATH'] = os.path.join(_DEFAULT_DB_DIR, 'image_info.db')
+create_database(os.environ['IMAGE_INFO_DB_PATH'], 200)
+
+
+@pytest.fixture
+def image_info_db(tmp_path):
+    """
+    已执行表结构迁移的合成image_info数据库
+
+    Returns:
+        tuple: (数据库路径, 生成器)，生成器的 records(n) 可生成与数据库同分布的待插入记录
+    """
+    db_path = str(tmp_path / 'image_info.db')
+    generator = create_database(db_path, 500)
+    return db_path, generator
@@ -0,0 +1,197 @@
+# test_db_backend.py - 数据访问后端（common/db_backend.py）和查询服务的分页/错误提示（mysql_query/sql_query.py）
+import importlib
+import sqlite3
+import sys
+
+import pytest
+
+from common import db_backend, mysql_shim
+from common.image_info_schema import COVERING_INDEXES, ensure_mysql_image_info_schema
+from common.db_backend import (DatabaseError, MySQLBackend, SQLiteBackend, MYSQL_QUERY_TIMEOUT, _to_pyformat)
+from mysql_query import sql_query
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM t WHERE a = ?", "SELECT * FROM t WHERE a = %s"),
+    ("SELECT * FROM t WHERE a = ? AND b LIKE '%x%'", "SELECT * FROM t WHERE a = %s AND b LIKE '%%x%%'"),
+    ("SELECT '?', a % 2 FROM t WHERE b = ?", "SELECT '?', a %% 2 FROM t WHERE b = %s"),   # 字符串常量中的 ? 不替换
+    ("SELECT 'it''s ?' FROM t WHERE a = ?", "SELECT 'it''s ?' FROM t WHERE a = %s"),       # 转义的单引号
+    ("SELECT DATE_FORMAT(d, '%Y') FROM t", "SELECT DATE_FORMAT(d, '%%Y') FROM t"),
+])
+def test_to_pyformat(sql, expected):
+    assert _to_pyformat(sql) == expected
+
+
+class FakeConnectorError(Exception):
+    """mysql.connector 风格：errno 属性"""
+
+    def __init__(self, errno, msg):
+        super().__init__(msg)
+        self.errno = errno
+
+
+def test_database_error_keeps_driver_errno():
+    assert DatabaseError.from_driver(FakeConnectorError(3024, "Query execution was interrupted")).errno == 3024
+    # pymysql 风格：args[0] 为错误码
+    assert DatabaseError.from_driver(Exception(1146, "Table doesn't exist")).errno == 1146
+    assert DatabaseError.from_driver(sqlite3.OperationalError("no such table: t")).errno is None
+
+
+def test_mysql_execution_timeout_maps_to_time_budget_message():
+    timeout = DatabaseError("Query execution was interrupted, maximum statement execution time exceeded",
+                            MYSQL_QUERY_TIMEOUT)
+    assert sql_query.format_db_error(timeout, time_budget=2) == "查询超时：超过时间预算 2 秒"
+    assert sql_query.format_db_error(sqlite3.OperationalError("interrupted"), time_budget=2) == "查询超时：超过时间预算 2 秒"
+    assert sql_query.format_db_error(DatabaseError("Table doesn't exist", 1146)).startswith("数据库错误")
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def query_backend(request, image_info_db, monkeypatch):
+    """查询服务分别使用SQLite后端和MySQL后端（SQLite替身驱动）"""
+    db_path, _ = image_info_db
+    if request.param == "sqlite":
+        backend = SQLiteBackend(db_path, image_info=False, pool_size=2)
+    else:
+        monkeypatch.setattr(mysql_shim, '_prepared_paths', set())
+        backend = MySQLBackend({}, driver="shim", shim_path=db_path, image_info=False, pool_size=2)
+    monkeypatch.setattr(sql_query, 'get_backend', lambda: backend)
+    monkeypatch.setattr(sql_query, 'get_db_path', lambda: db_path)
+    return db_path
+
+
+def test_cursor_pagination_walks_all_rows(query_backend):
+    sql = "SELECT id, sensor_id FROM image_info WHERE id <= 23 ORDER BY id;"
+    rows, cursor, pages = [], None, 0
+    while True:
+        page = sql_query.query_sql_page(sql, cursor=cursor, page_size=10)
+        assert page['status'] == 'success', page
+        rows.extend(page['data'])
+        pages += 1
+        if not page['has_more']:
+            assert page['next_cursor'] is None
+            break
+        cursor = page['next_cursor']
+    assert pages == 3
+    assert [row['id'] for row in rows] == list(range(1, 24))
+
+
+def walk_pages(sql, **kwargs):
+    rows, cursor = [], None
+    while True:
+        page = sql_query.query_sql_page(sql, cursor=cursor, **kwargs)
+        assert page['status'] == 'success', page
+        rows.extend(page['data'])
+        if not page['has_more']:
+            return rows
+        cursor = page['next_cursor']
+
+
+def test_keyset_pagination_walks_all_rows(query_backend):
+    rows = walk_pages("SELECT id, animal FROM image_info WHERE id <= 23", page_size=10, key="id")
+    assert [row['id'] for row in rows] == list(range(1, 24))
+
+    rows = walk_pages("SELECT id, animal FROM image_info", page_size=7, key=["animal", "id"])
+    assert len(rows) == 500
+    assert [(row['animal'], row['id']) for row in rows] == sorted((row['animal'], row['id']) for row in rows)
+
+
+def test_keyset_pagination_survives_deletes_before_the_cursor(query_backend):
+    sql = "SELECT id FROM image_info"
+    first = sql_query.query_sql_page(sql, page_size=10, key="id")
+    # 翻页期间删除已读过的行：偏移量分页会跳过行，键集分页从上一页最后的键值之后继续
+    connection = sqlite3.connect(query_backend)
+    connection.execute("DELETE FROM image_info WHERE id <= 5")
+    connection.commit()
+    connection.close()
+    second = sql_query.query_sql_page(sql, cursor=first['next_cursor'], page_size=10, key="id")
+    assert [row['id'] for row in second['data']] == list(range(11, 21))
+
+
+def test_offset_pagination_requires_order_by(query_backend):
+    message = sql_query.query_sql_page("SELECT id FROM image_info", page_size=5)['message']
+    assert "ORDER BY" in message
+    # 子查询和窗口函数中的 ORDER BY、字符串中的 order by 不算
+    assert not sql_query.has_order_by("SELECT * FROM (SELECT id FROM image_info ORDER BY id) AS t")
+    assert not sql_query.has_order_by("SELECT id, ROW_NUMBER() OVER (ORDER BY id) FROM image_info")
+    assert not sql_query.has_order_by("SELECT id FROM image_info WHERE caption = 'order by'")
+    assert sql_query.has_order_by("SELECT id FROM image_info -- 注释\nORDER BY id")
+    assert sql_query.query_sql_page("SELECT id FROM image_info", key="id; DROP TABLE x")['status'] == 'error'
+
+
+def test_cursor_is_bound_to_its_query(query_backend):
+    first = sql_query.query_sql_page("SELECT id FROM image_info ORDER BY id", page_size=5)
+    other = sql_query.query_sql_page("SELECT id FROM image_info ORDER BY id DESC", cursor=first['next_cursor'])
+    assert other == {"status": "error", "message": "分页游标与查询语句不匹配"}
+    assert sql_query.query_sql_page("SELECT id FROM image_info", cursor="not-a-cursor")['status'] == 'error'
+    keyset = sql_query.query_sql_page("SELECT id FROM image_info ORDER BY id", page_size=5, key="id")
+    assert sql_query.query_sql_page("SELECT id FROM image_info ORDER BY id", cursor=keyset['next_cursor'],
+                                    page_size=5)['status'] == 'error'
+
+
+@pytest.mark.parametrize("module", [
+    'mysql_query.mysql.sql_query_mysql',
+    'mysql_insert.mysql.sql_insert_mysql',
+    'realtime_chart.mysql.realtime_chart_data_functions_mysql',
+    'ECharts_map.mysql.echarts_map_data_functions_mysql',
+])
+def test_mysql_compat_entry_requires_env_backend(monkeypatch, module):
+    from mysql_query import db_config
+    monkeypatch.setattr(db_backend, 'CONFIGURED_BACKEND', 'sqlite')
+    monkeypatch.setattr(db_config, 'DB_BACKEND', 'mysql')  # 只在当前进程切换（use_backend）不算部署时选择了MySQL
+    monkeypatch.delitem(sys.modules, module, raising=False)
+    with pytest.raises(RuntimeError, match="DB_BACKEND=mysql"):
+        importlib.import_module(module)
+
+
+def test_mysql_connect_leaves_schema_to_migrate(image_info_db, monkeypatch):
+    db_path, _ = image_info_db
+    monkeypatch.setattr(mysql_shim, '_prepared_paths', set())
+    calls = []
+    monkeypatch.setattr(db_backend, 'ensure_mysql_image_info_schema', lambda connection: calls.append(1) or 0)
+    backend = MySQLBackend({}, driver="shim", shim_path=db_path, pool_size=1)
+
+    connection = backend.connect()
+    connection.close()
+    assert calls == []   # 连接时不执行迁移
+    assert backend.migrate() == 0
+    assert calls == [1]
+
+
+class CreateIndexFailure:
+    """包装MySQL连接：建覆盖索引时抛出指定错误码的驱动异常"""
+
+    def __init__(self, connection, errno):
+        self.connection = connection
+        self.errno = errno
+
+    def execute(self, sql, params=()):
+        if sql.startswith("CREATE INDEX") and "lon_lat" not in sql:
+            try:
+                raise FakeConnectorError(self.errno, "index error")
+            except FakeConnectorError as e:
+                raise DatabaseError.from_driver(e) from e
+        return self.connection.execute(sql, params)
+
+    def commit(self):
+        self.connection.commit()
+
+
+@pytest.mark.parametrize("errno, skipped", [(1170, True), (1142, False)])
+def test_mysql_covering_index_skips_only_prefix_length_errors(image_info_db, monkeypatch, errno, skipped):
+    db_path, _ = image_info_db
+    monkeypatch.setattr(mysql_shim, '_prepared_paths', set())
+    backend = MySQLBackend({}, driver="shim", shim_path=db_path, pool_size=1)
+    connection = backend.connect()
+    try:
+        for name, table_name, _ in COVERING_INDEXES:
+            if table_name == 'image_info':
+                connection.execute(f"DROP INDEX IF EXISTS {name}")
+        failing = CreateIndexFailure(connection, errno)
+        if skipped:
+            ensure_mysql_image_info_schema(failing)
+        else:
+            with pytest.raises(DatabaseError) as info:
+                ensure_mysql_image_info_schema(failing)
+            assert info.value.errno == errno
+    finally:
+        connection.close()
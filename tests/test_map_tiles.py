@@ -0,0 +1,124 @@
+# test_map_tiles.py - 地图瓦片（echarts_map_app.py / ECharts_map/echarts_map_data_functions.py）
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+import echarts_map_app
+import echarts_map_data_functions as map_functions
+import db_config as map_db_config  # ECharts_map/db_config.py，echarts_map_app 导入时已加入路径
+from common.image_info_schema import SCHEMA_VERSION
+from conftest import PROJECT_ROOT
+
+
+@pytest.fixture
+def client(image_info_db, monkeypatch):
+    db_path, _ = image_info_db
+    monkeypatch.setattr(map_db_config, 'DB_PATH', db_path)
+    echarts_map_app.tile_cache.clear()
+    echarts_map_app.app.config['TESTING'] = True
+    with echarts_map_app.app.test_client() as client:
+        yield client
+    echarts_map_app.tile_cache.clear()
+
+
+@pytest.mark.parametrize("zoom, rows", [(0, 1), (1, 1), (2, 2), (5, 16), (16, 2 ** 15)])
+def test_tile_rows_cover_latitude_range(zoom, rows):
+    assert map_functions.tile_rows(zoom) == rows
+    if zoom >= 1:
+        # 最后一行的下边界正好是南纬90度
+        assert map_functions.tile_bounds(zoom, 0, rows - 1)[1] == pytest.approx(-90.0)
+
+
+def test_tile_keys_stay_within_rows():
+    keys = map_functions.get_tile_keys((-180.0, -90.0, 180.0, 90.0), 3)
+    assert {y for _, _, y in keys} == set(range(map_functions.tile_rows(3)))
+    assert all(map_functions.is_valid_tile(*key) for key in keys)
+
+
+@pytest.mark.parametrize("query, status", [
+    ("z=2&x=3&y=1", 200),
+    ("z=0&x=0&y=0", 200),
+    ("z=2&x=0&y=2", 400),    # y >= 2**(z-1)：超出南纬90度
+    ("z=2&x=4&y=0", 400),    # x >= 2**z
+    ("z=2&x=0&y=-1", 400),
+    ("z=17&x=0&y=0", 400),   # 超过 MAX_TILE_ZOOM
+    ("z=2&x=0", 400),
+])
+def test_map_tile_rejects_out_of_range_tiles(client, query, status):
+    assert client.get(f"/api/map-tile?{query}").status_code == status
+
+
+def test_map_tile_returns_clusters(client, image_info_db):
+    db_path, _ = image_info_db
+    connection = sqlite3.connect(db_path)
+    lon, lat, total = connection.execute(
+        "SELECT lon, lat, SUM(count) FROM image_info WHERE lon IS NOT NULL GROUP BY lon, lat LIMIT 1").fetchone()
+    connection.close()
+    zoom, x, y = map_functions.get_tile_keys((lon, lat, lon, lat), map_functions.MAX_TILE_ZOOM)[0]
+
+    response = client.get(f"/api/map-tile?z={zoom}&x={x}&y={y}")
+    assert response.status_code == 200
+    clusters = response.get_json()['clusters']
+    assert len(clusters) == 1
+    assert clusters[0]['value'] == total
+
+
+def test_failed_tile_is_not_cached(client, monkeypatch):
+    # z=2, x=3, y=0：东经90~180度、北纬0~90度，合成数据的监测点都在其中
+    real_connect = map_functions.get_db_connection
+    calls = {'n': 0}
+
+    def flaky_connect():
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return real_connect()
+
+    monkeypatch.setattr(map_functions, 'get_db_connection', flaky_connect)
+
+    failed = client.get("/api/map-tile?z=2&x=3&y=0")
+    assert failed.status_code == 500
+    assert 'error' in failed.get_json()
+    assert failed.headers['Cache-Control'] == 'no-store'
+
+    recovered = client.get("/api/map-tile?z=2&x=3&y=0")
+    assert recovered.status_code == 200
+    assert 'error' not in recovered.get_json()
+    assert recovered.get_json()['clusters']
+
+    # 成功的瓦片被缓存，不再查询数据库
+    client.get("/api/map-tile?z=2&x=3&y=0")
+    assert calls['n'] == 2
+
+
+def test_startup_migration_enables_map_queries_on_bundled_db(tmp_path, monkeypatch):
+    # 仓库自带的 image_info.db 没有 lon/lat 列：在副本上执行启动迁移后地图查询才有数据
+    db_path = str(tmp_path / 'image_info.db')
+    shutil.copyfile(os.path.join(PROJECT_ROOT, 'Database', 'image_info.db'), db_path)
+    monkeypatch.setattr(map_db_config, 'DB_PATH', db_path)
+
+    map_db_config.migrate_schema()
+    connection = sqlite3.connect(db_path)
+    assert connection.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    connection.close()
+    assert len(map_functions.get_map_data()) > 0
+
+
+@pytest.mark.parametrize("url", ["/api/animal-list", "/api/location-list", "/api/map-data"])
+def test_list_errors_are_not_cached(client, monkeypatch, url):
+    echarts_map_app.response_cache.clear()
+
+    def broken_connection():
+        raise sqlite3.OperationalError("no such column: lon")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(map_functions, 'get_db_connection', broken_connection)
+        assert client.get(url).status_code == 500
+    assert echarts_map_app.response_cache.stats()['entries'] == 0
+
+    # 数据库恢复后下一次请求重新查询，而不是返回缓存的空列表
+    response = client.get(url)
+    assert response.status_code == 200
+    assert len(response.get_json()) > 0
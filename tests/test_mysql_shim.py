@@ -0,0 +1,53 @@
+# test_mysql_shim.py - MySQL驱动的SQLite替身（common/mysql_shim.py）
+import os
+import threading
+
+import pytest
+
+from common import mysql_shim
+
+
+def test_requires_explicit_path_outside_bundled_database_dir():
+    with pytest.raises(ValueError):
+        mysql_shim.connect()
+    with pytest.raises(ValueError):
+        mysql_shim.connect(os.path.join(mysql_shim.BUNDLED_DB_DIR, 'image_info.db'))
+
+
+def test_concurrent_first_connects_migrate_once(image_info_db, monkeypatch):
+    db_path, _ = image_info_db
+    calls = []
+    real_ensure = mysql_shim.ensure_mysql_columns
+
+    def counting_ensure(connection):
+        calls.append(threading.current_thread().name)
+        real_ensure(connection)
+
+    monkeypatch.setattr(mysql_shim, 'ensure_mysql_columns', counting_ensure)
+    monkeypatch.setattr(mysql_shim, '_prepared_paths', set())
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def first_connect():
+        barrier.wait()
+        try:
+            mysql_shim.connect(db_path).close()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=first_connect) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(calls) == 1
+
+    connection = mysql_shim.connect(db_path)
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("SELECT image_path, created_at FROM image_info WHERE date = %s LIMIT 1", ('19000101',))
+        assert cursor.column_names == ('image_path', 'created_at')
+    finally:
+        connection.close()
@@ -0,0 +1,86 @@
+# test_query_guard.py - 查询计划检查（mysql_query/query_guard.py）
+import sqlite3
+
+import pytest
+
+from mysql_query.query_guard import QueryGuard, table_aliases, normalize_sql, _SCAN_RE
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE species (id INTEGER PRIMARY KEY, name TEXT, level TEXT)")
+    connection.execute("CREATE INDEX idx_species_name ON species (name)")
+    connection.execute("CREATE TABLE sightings (id INTEGER PRIMARY KEY, species TEXT, site TEXT)")
+    connection.executemany("INSERT INTO species (name, level) VALUES (?, ?)",
+                           [(f"s{i}", "一级" if i % 2 else "二级") for i in range(2000)])
+    connection.executemany("INSERT INTO sightings (species, site) VALUES (?, ?)",
+                           [(f"s{i % 50}", f"site{i % 7}") for i in range(300)])
+    yield connection
+    connection.close()
+
+
+def test_default_action_rejects_large_full_scan(connection):
+    guard = QueryGuard(scan_row_limit=1000)
+    decision = guard.check(connection, "SELECT * FROM species WHERE level LIKE '%一%'")
+    assert decision['action'] == 'reject'
+    assert decision['scan_rows'] == 2000
+    assert 'species' in decision['message']
+
+
+def test_rewrite_adds_small_outer_limit(connection):
+    guard = QueryGuard(scan_row_limit=1000, action="rewrite", rewrite_limit=50)
+    decision = guard.check(connection, "SELECT * FROM species WHERE level LIKE '%一%';")
+    assert decision['action'] == 'rewrite'
+    assert decision['sql'].endswith("LIMIT 50")
+    assert len(connection.execute(decision['sql']).fetchall()) == 50
+
+
+def test_rewrite_still_rejects_aggregates(connection):
+    guard = QueryGuard(scan_row_limit=1000, action="rewrite")
+    decision = guard.check(connection, "SELECT level, COUNT(*) FROM species GROUP BY level")
+    assert decision['action'] == 'reject'
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM species WHERE name = 's1'",    # 走索引
+    "SELECT * FROM sightings WHERE site = 'site1'",  # 全表扫描，但表很小
+])
+def test_allows_index_lookups_and_small_scans(connection, sql):
+    guard = QueryGuard(scan_row_limit=1000)
+    assert guard.check(connection, sql)['action'] == 'allow'
+
+
+def test_comma_join_counts_aliased_tables(connection):
+    guard = QueryGuard(scan_row_limit=100000)
+    sql = "SELECT * FROM sightings g, species AS s WHERE s.level > g.site"
+    decision = guard.check(connection, sql)
+    # 两张表在同一层嵌套循环中扫描，估计行数为两表行数之积
+    assert decision['scan_rows'] == 300 * 2000
+    assert decision['action'] == 'reject'
+
+
+def test_table_aliases_handles_comma_joins_and_subqueries():
+    tables = {'species', 'sightings'}
+    sql = ("SELECT * FROM sightings g, species AS s, (SELECT 1 AS x) t "
+           "JOIN species s2 ON s2.id = g.id WHERE s.name = 'a, b'")
+    assert table_aliases(sql, tables) == {
+        'sightings': 'sightings', 'g': 'sightings', 'species': 'species', 's': 'species', 's2': 'species'
+    }
+
+
+@pytest.mark.parametrize("detail, table", [
+    ("SCAN species", "species"),
+    ("SCAN TABLE species", "species"),      # SQLite 3.36 之前的格式
+    ("SCAN TABLE species AS s", "species"),
+])
+def test_scan_regex_accepts_old_and_new_plan_formats(detail, table):
+    assert _SCAN_RE.match(detail).group(1) == table
+
+
+def test_plan_cache_hits_for_same_shape(connection):
+    guard = QueryGuard(scan_row_limit=1000)
+    guard.check(connection, "SELECT * FROM species WHERE name = 's1'")
+    guard.check(connection, "SELECT * FROM species WHERE name = 's2'")
+    assert normalize_sql("SELECT * FROM species WHERE name = 's1'") == "select * from species where name = ?"
+    assert guard.stats()['plan_cache']['hits'] == 1
@@ -0,0 +1,109 @@
+# test_sensor_registry.py - 摄像头登记表和内存网格索引（heatmap/sensor_registry.py）
+import os
+import sqlite3
+import sys
+
+import pytest
+
+from common import mysql_shim
+from common.coordinates import parse_longitude, parse_latitude
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'heatmap'))
+from sensor_registry import SensorGridIndex, SensorRegistry  # noqa: E402
+
+
+def sensor(sensor_id, lon, lat):
+    return {'sensor_id': sensor_id, 'longitude': lon, 'latitude': lat}
+
+
+def test_nearest_picks_closest_sensor_within_distance():
+    index = SensorGridIndex([sensor('a', 103.100, 31.020), sensor('b', 103.106, 31.020)], cell_size=0.01)
+    assert index.nearest(103.101, 31.020)['sensor_id'] == 'a'
+    assert index.nearest(103.105, 31.020)['sensor_id'] == 'b'
+    assert index.nearest(103.200, 31.020) is None
+
+
+def test_nearest_searches_wider_in_longitude_at_high_latitude():
+    # 北纬70度时经度差0.025度缩放后约0.0086度，在吸附距离之内，但相隔两个以上单元
+    index = SensorGridIndex([sensor('arctic', 20.025, 70.0)], cell_size=0.01)
+    assert index.nearest(20.0, 70.0, max_distance=0.01)['sensor_id'] == 'arctic'
+    assert index.nearest(19.97, 70.0, max_distance=0.01) is None
+
+
+def test_nearest_near_the_pole_stays_bounded():
+    index = SensorGridIndex([sensor('pole', 150.0, 89.9999)], cell_size=1.0)
+    assert index.nearest(-30.0, 89.9999, max_distance=1.0)['sensor_id'] == 'pole'
+
+
+def test_nearest_with_larger_max_distance_than_cell():
+    index = SensorGridIndex([sensor('far', 0.035, 0.0)], cell_size=0.01)
+    assert index.nearest(0.0, 0.0, max_distance=0.01) is None
+    assert index.nearest(0.0, 0.0, max_distance=0.04)['sensor_id'] == 'far'
+
+
+@pytest.fixture
+def shim_connect(image_info_db, monkeypatch):
+    db_path, _ = image_info_db
+    monkeypatch.setattr(mysql_shim, '_prepared_paths', set())
+    return lambda: mysql_shim.connect(db_path)
+
+
+def test_only_lock_owner_rebuilds_registry(shim_connect, tmp_path):
+    lock_path = str(tmp_path / 'sensor_registry.lock')
+    owner = SensorRegistry(shim_connect, refresh_interval=0, lock_path=lock_path).start()
+    reader = SensorRegistry(shim_connect, refresh_interval=0, lock_path=lock_path).start()
+
+    assert owner.stats()['rebuild_owner'] and owner.stats()['rebuilds'] == 1
+    assert not reader.stats()['rebuild_owner'] and reader.stats()['rebuilds'] == 0
+    assert reader.stats()['sensors'] == owner.stats()['sensors'] > 0
+
+    # 点击登记表中的点位坐标，两个进程解析到同一个点位
+    first = owner._index.sensors[0]
+    assert reader.nearest(first['longitude'], first['latitude'])['point_id'] == first['point_id']
+    assert reader.object_counts(first['point_id']) == owner.object_counts(first['point_id'])
+
+
+def test_start_does_not_raise_when_tables_are_missing(shim_connect, tmp_path):
+    lock_path = str(tmp_path / 'sensor_registry.lock')
+    holder = open(lock_path, 'a+')
+    try:
+        from common.file_lock import try_lock
+        assert try_lock(holder)   # 模拟另一个进程持有重建锁，且尚未建表
+        registry = SensorRegistry(shim_connect, refresh_interval=0, lock_path=lock_path).start()
+        assert registry.stats()['reload_errors'] == 1
+        assert registry.nearest(103.1, 31.0) is None
+    finally:
+        holder.close()
+
+
+def test_registry_keys_points_by_coordinate(image_info_db, shim_connect, tmp_path):
+    db_path, _ = image_info_db
+    connection = sqlite3.connect(db_path)
+    # 仓库自带的数据没有 sensor_id；另把一个摄像头放到两个坐标上
+    connection.execute("UPDATE image_info SET sensor_id = NULL")
+    coordinates = connection.execute("SELECT DISTINCT longitude, latitude FROM image_info LIMIT 2").fetchall()
+    for longitude, latitude in coordinates:
+        connection.execute("UPDATE image_info SET sensor_id = 'cam-1' WHERE id = "
+                           "(SELECT MIN(id) FROM image_info WHERE longitude = ? AND latitude = ?)", (longitude, latitude))
+    distinct = connection.execute("SELECT COUNT(*) FROM (SELECT DISTINCT longitude, latitude FROM image_info)").fetchone()[0]
+    connection.commit()
+    connection.close()
+
+    registry = SensorRegistry(shim_connect, refresh_interval=0, lock_path=str(tmp_path / 'lock')).start()
+    assert registry.stats()['sensors'] == distinct
+    points = [registry.nearest(parse_longitude(lon), parse_latitude(lat)) for lon, lat in coordinates]
+    assert [point['sensor_id'] for point in points] == ['cam-1', 'cam-1']
+    assert points[0]['point_id'] != points[1]['point_id']
+    assert all(sum(registry.object_counts(point['point_id']).values()) == point['total_count'] for point in points)
+
+
+def test_old_sensor_id_registry_tables_are_replaced(shim_connect, tmp_path):
+    connection = shim_connect()
+    cursor = connection.cursor()
+    cursor.execute("CREATE TABLE sensor_registry (sensor_id VARCHAR(64) NOT NULL PRIMARY KEY, location VARCHAR(255))")
+    cursor.execute("CREATE TABLE sensor_object_counts (sensor_id VARCHAR(64) NOT NULL, object VARCHAR(255), count INT)")
+    connection.commit()
+    connection.close()
+
+    registry = SensorRegistry(shim_connect, refresh_interval=0, lock_path=str(tmp_path / 'lock')).start()
+    assert registry.stats()['reload_errors'] == 0 and registry.stats()['sensors'] > 0
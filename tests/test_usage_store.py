@@ -0,0 +1,82 @@
+# test_usage_store.py - 推理用量记录（vLLm/data_analysis/usage_store.py）
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from vLLm.data_analysis import usage_store
+from vLLm.data_analysis.usage_store import UsageRecorder
+
+
+def fake_response(total_tokens=120, content='{"animal": "扬子鳄"}'):
+    message = SimpleNamespace(content=content)
+    usage = SimpleNamespace(prompt_tokens=total_tokens - 20, completion_tokens=20, total_tokens=total_tokens)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def count_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM inference_usage").fetchone()[0]
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'inference_usage.db')
+
+
+def test_writer_thread_uses_one_connection(db_path, monkeypatch, tmp_path):
+    connects = []
+    real_connect = usage_store.connect
+
+    def counting_connect(path):
+        connects.append(threading.current_thread().name)
+        return real_connect(path)
+
+    monkeypatch.setattr(usage_store, 'connect', counting_connect)
+    with UsageRecorder(db_path, root=str(tmp_path), flush_every=2) as recorder:
+        for i in range(7):
+            recorder.record("Qwen2.5-VL-3B", "描述图像", str(tmp_path / 'cam1' / f'{i}.jpg'), fake_response(), 0.5, True)
+        recorder.flush()
+        assert count_rows(db_path) == 7
+    assert connects == ['usage-writer']
+
+
+def test_interval_flush_writes_without_reaching_batch_size(db_path, tmp_path):
+    recorder = UsageRecorder(db_path, flush_every=100, flush_interval=0.05)
+    try:
+        recorder.record("m", "p", str(tmp_path / 'a.jpg'), fake_response(), 0.1, True)  # 缓冲区未满，不启动写入线程
+        recorder.record("m", "p", str(tmp_path / 'b.jpg'), None, 0.1, False, RuntimeError("timeout"))
+        recorder.flush()
+        assert count_rows(db_path) == 2
+        recorder.record("m", "p", str(tmp_path / 'c.jpg'), fake_response(), 0.1, True)
+        for _ in range(100):
+            if count_rows(db_path) == 3:
+                break
+            threading.Event().wait(0.02)
+        assert count_rows(db_path) == 3
+    finally:
+        recorder.close()
+
+
+def test_report_breaks_camera_cost_down_by_day(db_path, tmp_path):
+    with UsageRecorder(db_path, root=str(tmp_path)) as recorder:
+        for camera in ('cam1', 'cam1', 'cam2'):
+            recorder.record("m", "p", str(tmp_path / camera / 'x.jpg'), fake_response(1000), 3.6, True)
+        recorder.record("m", "p", str(tmp_path / 'cam2' / 'y.jpg'), None, 1.0, False, RuntimeError("refused"))
+
+    connection = sqlite3.connect(db_path)
+    connection.execute("UPDATE inference_usage SET created_at = created_at - 86400 WHERE id = 1")  # 前一天
+    connection.commit()
+    connection.close()
+
+    result = usage_store.report(db_path, token_price=1.0, gpu_hour_price=1000.0)
+    cam1 = [row for row in result['cameras'] if row['camera_id'] == 'cam1']
+    assert [row['calls'] for row in cam1] == [1, 1]
+    assert cam1[0]['day'] < cam1[1]['day']
+    assert cam1[0]['cost'] == pytest.approx(1.0 + 1.0)
+    assert result['prompts'][0]['request_errors'] == 1
+    usage_store.print_report(result)
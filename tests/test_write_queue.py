@@ -0,0 +1,170 @@
+# test_write_queue.py - 插入服务写入队列（mysql_insert/write_queue.py）
+import json
+import sqlite3
+
+import pytest
+
+import mysql_insert.db_config as insert_db_config
+import mysql_insert.write_queue as write_queue
+from mysql_insert.write_queue import WriteQueue, JournalLockedError, STATE_TABLE
+
+
+def count_rows(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM image_info").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def read_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'insert_queue.jsonl')
+
+
+@pytest.fixture
+def make_queue(image_info_db, journal_path):
+    """创建并启动写入队列，测试结束时关闭"""
+    db_path, _ = image_info_db
+    queues = []
+
+    def make(**kwargs):
+        q = WriteQueue(db_path, journal_path, max_wait=0.01, **kwargs).start()
+        queues.append(q)
+        return q
+
+    yield make
+    for q in queues:
+        q.close(timeout=5)
+
+
+def test_enqueue_commits_and_truncates_journal(image_info_db, journal_path, make_queue):
+    db_path, generator = image_info_db
+    before = count_rows(db_path)
+    q = make_queue()
+    results = [q.enqueue(record) for record in generator.records(5)]
+
+    assert [r['status'] for r in results] == ['success'] * 5
+    assert [r['seq'] for r in results] == [1, 2, 3, 4, 5]
+    assert q.flush(timeout=5)
+    assert count_rows(db_path) == before + 5
+    assert read_lines(journal_path) == []
+    assert q.stats()['committed'] == 5
+
+
+def test_replay_skips_committed_records(image_info_db, journal_path, make_queue):
+    db_path, generator = image_info_db
+    first, second, third = generator.records(3)
+    q = make_queue()
+    q.enqueue(first)
+    assert q.flush(timeout=5)
+    q.close(timeout=5)
+    before = count_rows(db_path)
+
+    # 模拟崩溃：日志中还留着已提交的序号1、未提交的2和3，以及写了一半的一行
+    with open(journal_path, 'w', encoding='utf-8') as f:
+        for seq, record in ((1, first), (2, second), (3, third)):
+            f.write(json.dumps({'seq': seq, 'data': record}, ensure_ascii=False) + '\n')
+        f.write('{"seq": 4, "da')
+
+    q = make_queue()
+    assert q.flush(timeout=5)
+    assert q.stats()['replayed'] == 2
+    assert count_rows(db_path) == before + 2
+    # 新记录的序号接在日志中最大的序号之后
+    assert q.enqueue(first)['seq'] == 4
+
+
+def test_permanent_error_goes_to_failed_journal_without_retrying(image_info_db, journal_path, make_queue):
+    db_path, generator = image_info_db
+    q = make_queue()
+    connection = sqlite3.connect(db_path)
+    connection.execute("ALTER TABLE image_info RENAME TO image_info_moved")
+    connection.commit()
+    connection.close()
+
+    for record in generator.records(3):
+        assert q.enqueue(record)['status'] == 'success'
+    assert q.flush(timeout=5)
+
+    stats = q.stats()
+    assert stats['failed'] == 3
+    assert stats['retries'] == 0
+    assert [entry['seq'] for entry in read_lines(q.failed_path)] == [1, 2, 3]
+
+
+def test_busy_retries_are_bounded(image_info_db, journal_path, make_queue, monkeypatch):
+    db_path, generator = image_info_db
+    monkeypatch.setattr(write_queue, 'BUSY_RETRIES', 3)
+    q = make_queue()
+    q._connection.execute("PRAGMA busy_timeout = 0")
+
+    blocker = sqlite3.connect(db_path)
+    blocker.execute("BEGIN IMMEDIATE")  # 其他连接一直持有写锁
+    try:
+        for record in generator.records(2):
+            q.enqueue(record)
+        assert q.flush(timeout=10)
+    finally:
+        blocker.rollback()
+        blocker.close()
+
+    stats = q.stats()
+    assert stats['retries'] == 2
+    assert stats['failed'] == 2
+    assert 'locked' in stats['last_error']
+    assert len(read_lines(q.failed_path)) == 2
+
+    # 锁释放后恢复正常写入
+    before = count_rows(db_path)
+    q.enqueue(generator.records(1)[0])
+    assert q.flush(timeout=5)
+    assert count_rows(db_path) == before + 1
+
+
+def test_journal_is_owned_by_one_queue(image_info_db, journal_path, make_queue):
+    db_path, _ = image_info_db
+    owner = make_queue()
+    with pytest.raises(JournalLockedError):
+        WriteQueue(db_path, journal_path).start()
+
+    owner.close(timeout=5)
+    make_queue()  # 持有者关闭后可以接管
+
+
+def test_enqueue_record_falls_back_to_sync_insert_when_journal_locked(image_info_db, journal_path, make_queue,
+                                                                      monkeypatch):
+    db_path, generator = image_info_db
+    monkeypatch.setattr(insert_db_config, 'DB_PATH', db_path)
+    monkeypatch.setattr(write_queue, 'get_db_path', lambda: db_path)
+    monkeypatch.setattr(write_queue, 'get_queue_config',
+                        lambda: {'journal_path': journal_path, 'max_batch': 500, 'max_wait': 0.01})
+    monkeypatch.setattr(write_queue, '_write_queue', None)
+    monkeypatch.setattr(write_queue, '_lock_retry_at', 0.0)
+    make_queue()  # 相当于另一个进程持有日志
+
+    before = count_rows(db_path)
+    result = write_queue.enqueue_record(generator.records(1)[0])
+    assert result['status'] == 'success'
+    assert 'seq' not in result
+    assert count_rows(db_path) == before + 1
+    assert write_queue.get_write_queue_stats() is None
+
+
+def test_progress_is_saved_with_each_batch(image_info_db, journal_path, make_queue):
+    db_path, generator = image_info_db
+    q = make_queue()
+    for record in generator.records(3):
+        q.enqueue(record)
+    assert q.flush(timeout=5)
+
+    connection = sqlite3.connect(db_path)
+    try:
+        assert connection.execute(f"SELECT last_seq FROM {STATE_TABLE} WHERE id = 1").fetchone()[0] == 3
+    finally:
+        connection.close()
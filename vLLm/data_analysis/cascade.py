@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import asyncio
+from tqdm import tqdm
+
+from .promotion import PROMOTION_EDGE_ANIMAL, PROMOTION_CLOUD_ANIMAL
+from .tools import get_file_list
+from .pre_process import ImagePreprocessor, JPEG_QUALITY, CACHE_DIR
+from .video_sampler import is_video, VIDEO_EXTENSIONS
+from .usage_store import UsageRecorder, USAGE_DB
+from .inference import (async_single_inference, make_async_client, produce_inputs, new_record,
+                        load_annotations, BATCH_MAX_RETRIES, BATCH_BACKOFF)
+
+# 级联参数
+EDGE_MODEL = "Qwen2.5-VL-3B"    # 边缘快判模型：小模型、高并发，对每一帧做 PASS/DROP 判断
+CLOUD_MODEL = "Qwen2.5-VL-7B"   # 云端专家模型：只处理 PASS 的帧，输出详细结构化数据
+EDGE_CONCURRENCY = 32
+CLOUD_CONCURRENCY = 8
+EDGE_MAX_TOKENS = 256           # 边缘模型只输出极简JSON
+
+# 云端阶段没有成功的帧时（例如边缘模型丢弃了所有帧），“全部送云端” 的基线按以下每帧成本估算，环境变量可覆盖
+# CLOUD_BASELINE_TOKENS 为0时按 边缘平均输入token数 + 云端 max_tokens 估算（同一张图、同样分辨率，输入token数相近）
+CLOUD_BASELINE_TOKENS = int(os.environ.get("CASCADE_CLOUD_BASELINE_TOKENS", "0"))
+CLOUD_BASELINE_LATENCY = float(os.environ.get("CASCADE_CLOUD_BASELINE_LATENCY", "2.0"))   # 秒
+CLOUD_MAX_TOKENS = 1024         # cloud_params 未指定 max_tokens 时估算用的云端输出上限
+
+
+class StageStats:
+    """单个级联阶段的统计：帧数、失败数、token数、推理耗时和吞吐量"""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.failed = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_tokens = 0
+        self.latency_total = 0.0    # 各请求耗时之和（近似GPU占用时间）
+        self.first_start = None
+        self.last_end = None
+
+    def start(self):
+        if self.first_start is None:
+            self.first_start = time.perf_counter()
+
+    def record(self, result=None):
+        self.frames += 1
+        self.last_end = time.perf_counter()
+        if result is None:
+            self.failed += 1
+            return
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+            setattr(self, key, getattr(self, key) + result["tokens"][key])
+        self.latency_total += result["latency"]
+
+    def summary(self):
+        elapsed = (self.last_end - self.first_start) if self.first_start and self.last_end else 0.0
+        succeeded = self.frames - self.failed
+        return {
+            "frames": self.frames,
+            "failed": self.failed,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "avg_tokens": round(self.total_tokens / succeeded, 1) if succeeded else 0,
+            "avg_latency": round(self.latency_total / succeeded, 3) if succeeded else 0,
+            "elapsed": round(elapsed, 2),
+            "frames_per_second": round(self.frames / elapsed, 2) if elapsed else 0,
+            "tokens_per_second": round(self.total_tokens / elapsed, 1) if elapsed else 0,
+        }
+
+
+def edge_passed(content):
+    """边缘模型的判断：输出 "pass": true 或 "PASS" 时转发云端"""
+    value = content.get("pass") if isinstance(content, dict) else None
+    if isinstance(value, str):
+        return value.strip().upper() in ("PASS", "TRUE")
+    return bool(value)
+
+
+async def _cascade_async(image_paths, labeling_file_path, preprocessor, done, sampling,
+                         edge_model, cloud_model, edge_prompt, cloud_prompt,
+                         edge_concurrency, cloud_concurrency, edge_params, cloud_params,
+                         max_retries, backoff, recorder):
+    """
+    级联推理的事件循环部分
+    produce_inputs -> 边缘协程（edge_concurrency 个）-> PASS 的帧 -> 云端协程（cloud_concurrency 个）
+    两个阶段各用一个客户端和连接池，云端直接复用边缘阶段的编码结果。
+    边缘模型出错或输出无法解析时按 PASS 处理（宁可多送云端，不漏检）。
+    """
+    edge, cloud = StageStats("edge"), StageStats("cloud")
+    counts = {"passed": 0, "dropped": 0, "edge_fallback": 0}
+    encoded = asyncio.Queue(maxsize=edge_concurrency)
+    forwarded = asyncio.Queue(maxsize=cloud_concurrency * 2)  # (记录, 编码结果)，None 表示结束
+
+    async with make_async_client(edge_model, edge_concurrency) as edge_client, \
+            make_async_client(cloud_model, cloud_concurrency) as cloud_client:
+        with open(labeling_file_path, 'a', encoding='utf-8') as f, tqdm(desc="级联推理") as progress:
+
+            def write(record):
+                # 每条结果立即写入并刷新，中断后可以从标注文件续跑
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                progress.update(1)
+
+            async def edge_worker():
+                while True:
+                    item = await encoded.get()
+                    if item is None:
+                        return
+                    image_path, frame, encoding = item
+                    record = new_record(image_path, frame)
+                    try:
+                        image_url = await encoding
+                    except Exception as e:
+                        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+                        write(record)
+                        continue
+
+                    edge.start()
+                    try:
+                        result = await async_single_inference(
+                            edge_client, image_path, edge_prompt, model=edge_model,
+                            max_retries=max_retries, backoff=backoff, image_url=image_url, recorder=recorder,
+                            frame_index=frame["index"] if frame else None, concurrency=edge_concurrency,
+                            **edge_params)
+                        edge.record(result)
+                        record["edge"] = result
+                        passed = edge_passed(result["content"])
+                    except Exception as e:
+                        edge.record()
+                        record["edge"] = {"error": f"{type(e).__name__}: {e}"}
+                        counts["edge_fallback"] += 1
+                        passed = True
+
+                    record["pass"] = passed
+                    if passed:
+                        counts["passed"] += 1
+                        await forwarded.put((record, image_url))
+                    else:
+                        counts["dropped"] += 1
+                        record["status"] = "success"
+                        write(record)
+
+            async def cloud_worker():
+                while True:
+                    item = await forwarded.get()
+                    if item is None:
+                        return
+                    record, image_url = item
+                    cloud.start()
+                    try:
+                        result = await async_single_inference(
+                            cloud_client, record["image_path"], cloud_prompt, model=cloud_model,
+                            max_retries=max_retries, backoff=backoff, image_url=image_url, recorder=recorder,
+                            frame_index=record["frame"]["index"] if "frame" in record else None,
+                            concurrency=cloud_concurrency, **cloud_params)
+                        cloud.record(result)
+                        record.update({"status": "success", "cloud": result})
+                    except Exception as e:
+                        cloud.record()
+                        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+                    write(record)
+
+            async def edge_stage():
+                await asyncio.gather(*(edge_worker() for _ in range(edge_concurrency)))
+                for _ in range(cloud_concurrency):
+                    await forwarded.put(None)
+
+            await asyncio.gather(
+                produce_inputs(image_paths, preprocessor, done, sampling, encoded, edge_concurrency),
+                edge_stage(),
+                *(cloud_worker() for _ in range(cloud_concurrency)))
+
+    return edge, cloud, counts
+
+
+def cloud_frame_cost(edge, cloud, cloud_baseline_tokens=CLOUD_BASELINE_TOKENS,
+                     cloud_baseline_latency=CLOUD_BASELINE_LATENCY, cloud_max_tokens=CLOUD_MAX_TOKENS):
+    """
+    云端模型处理一帧的成本
+    :returns: (token数, 耗时秒, 来源)，来源为 "cloud"（本次云端实测平均值）、"configured"（配置值）或 "estimated"（估算值）
+    """
+    cloud_summary = cloud.summary()
+    if cloud.frames > cloud.failed:
+        return cloud_summary["avg_tokens"], cloud_summary["avg_latency"], "cloud"
+    if cloud_baseline_tokens:
+        return cloud_baseline_tokens, cloud_baseline_latency, "configured"
+    edge_succeeded = edge.frames - edge.failed
+    edge_prompt_tokens = edge.prompt_tokens / edge_succeeded if edge_succeeded else 0
+    return round(edge_prompt_tokens + cloud_max_tokens, 1), cloud_baseline_latency, "estimated"
+
+
+def cascade_summary(edge, cloud, counts, cloud_baseline_tokens=CLOUD_BASELINE_TOKENS,
+                    cloud_baseline_latency=CLOUD_BASELINE_LATENCY, cloud_max_tokens=CLOUD_MAX_TOKENS):
+    """
+    汇总级联统计
+    token节省按 “每一帧都直接送云端模型” 估算：云端每帧token数 × 边缘判断的帧数 - 级联实际消耗的token数
+    云端每帧成本优先用本次云端的实测平均值，云端没有成功的帧时用配置值或估算值（见 cloud_frame_cost）
+    """
+    edge_summary, cloud_summary = edge.summary(), cloud.summary()
+    judged = counts["passed"] + counts["dropped"]
+    frame_tokens, frame_latency, baseline_source = cloud_frame_cost(
+        edge, cloud, cloud_baseline_tokens, cloud_baseline_latency, cloud_max_tokens)
+    baseline_tokens = round(frame_tokens * judged)
+    cascade_tokens = edge.total_tokens + cloud.total_tokens
+    baseline_latency = frame_latency * judged
+    cascade_latency = edge.latency_total + cloud.latency_total
+    return {
+        "edge": edge_summary,
+        "cloud": cloud_summary,
+        "passed": counts["passed"],
+        "dropped": counts["dropped"],
+        "edge_fallback": counts["edge_fallback"],
+        "drop_rate": round(counts["dropped"] / judged, 4) if judged else 0,
+        "baseline_source": baseline_source,
+        "baseline_tokens": baseline_tokens,
+        "cascade_tokens": cascade_tokens,
+        "saved_tokens": baseline_tokens - cascade_tokens,
+        "saved_tokens_rate": round((baseline_tokens - cascade_tokens) / baseline_tokens, 4) if baseline_tokens else 0,
+        "saved_latency_rate": round((baseline_latency - cascade_latency) / baseline_latency, 4) if baseline_latency else 0,
+    }
+
+
+def cascade_inference(input_dir, labeling_file_path,
+        edge_model=EDGE_MODEL,
+        cloud_model=CLOUD_MODEL,
+        edge_prompt=PROMOTION_EDGE_ANIMAL,
+        cloud_prompt=PROMOTION_CLOUD_ANIMAL,
+        edge_concurrency=EDGE_CONCURRENCY,
+        cloud_concurrency=CLOUD_CONCURRENCY,
+        edge_params=None,
+        cloud_params=None,
+        max_retries=BATCH_MAX_RETRIES,
+        backoff=BATCH_BACKOFF,
+        extensions=(".jpg", ".jpeg", ".png") + VIDEO_EXTENSIONS,
+        preprocess_workers=None,
+        resolution=(448, 448),
+        quality=JPEG_QUALITY,
+        cache_dir=CACHE_DIR,
+        sampling=None,
+        usage_db=USAGE_DB,
+        cloud_baseline_tokens=CLOUD_BASELINE_TOKENS,
+        cloud_baseline_latency=CLOUD_BASELINE_LATENCY):
+    """
+    边缘/云端级联标注
+    小模型用 PROMOTION_EDGE_ANIMAL 高并发筛选每一帧，只有 PASS 的帧转发给大模型用 PROMOTION_CLOUD_ANIMAL 输出结构化数据。
+    每帧一条JSONL记录：{"image_path", ["type", "frame"], "status", "pass", "edge", ["cloud"]}，续跑规则与 batch_inference 相同。
+    :param input_dir: 图像/视频目录（递归查找）
+    :param labeling_file_path: JSONL标注文件路径
+    :param edge_params: 边缘模型的 temperature / top_p / max_tokens，max_tokens 默认 EDGE_MAX_TOKENS
+    :param cloud_params: 云端模型的 temperature / top_p / max_tokens
+    :param sampling: 视频抽帧参数
+    :param usage_db: 推理用量库，两个阶段的调用记在同一个 run_id 下，为None或空字符串时不记录
+    :param cloud_baseline_tokens: 云端没有成功的帧时，token节省基线使用的云端每帧token数，0表示按输入token数 + max_tokens 估算
+    :param cloud_baseline_latency: 云端没有成功的帧时，推理耗时节省基线使用的云端每帧耗时（秒）
+    :returns:
+        级联统计字典：各阶段的帧数、吞吐量、token数，丢弃率和token节省
+    """
+    edge_params = {"max_tokens": EDGE_MAX_TOKENS, **(edge_params or {})}
+    image_paths = get_file_list(input_dir, extensions)
+    done = load_annotations(labeling_file_path)
+    pending = [path for path in image_paths if is_video(path) or path not in done]
+    print(f"共 {len(image_paths)} 个文件，已完成 {len(image_paths) - len(pending)} 张图像，本次处理 {len(pending)} 个文件")
+    os.makedirs(os.path.dirname(os.path.abspath(labeling_file_path)), exist_ok=True)
+
+    start = time.perf_counter()
+    recorder = UsageRecorder(usage_db, input_dir, resolution) if usage_db else None
+    with ImagePreprocessor(preprocess_workers, resolution, quality, cache_dir) as preprocessor:
+        try:
+            edge, cloud, counts = asyncio.run(_cascade_async(
+                pending, labeling_file_path, preprocessor, done, sampling or {},
+                edge_model, cloud_model, edge_prompt, cloud_prompt,
+                edge_concurrency, cloud_concurrency, edge_params, cloud_params or {},
+                max_retries, backoff, recorder))
+        finally:
+            if recorder is not None:
+                recorder.close()
+    cloud_max_tokens = (cloud_params or {}).get("max_tokens") or CLOUD_MAX_TOKENS
+    summary = cascade_summary(edge, cloud, counts, cloud_baseline_tokens, cloud_baseline_latency, cloud_max_tokens)
+    summary["run_id"] = recorder.run_id if recorder is not None else None
+    summary["elapsed"] = round(time.perf_counter() - start, 2)
+    print_cascade_summary(summary)
+    return summary
+
+
+def print_cascade_summary(summary):
+    """打印级联统计"""
+    print("级联推理完成:")
+    for stage in ("edge", "cloud"):
+        s = summary[stage]
+        print(f"  {stage:<6} 帧数 {s['frames']}，失败 {s['failed']}，{s['frames_per_second']} 帧/秒，"
+              f"{s['tokens_per_second']} tokens/秒，平均 {s['avg_tokens']} tokens / {s['avg_latency']} 秒")
+    print(f"  PASS {summary['passed']}，DROP {summary['dropped']}（丢弃率 {summary['drop_rate']:.1%}），"
+          f"边缘失败按PASS处理 {summary['edge_fallback']}")
+    source = {"cloud": "云端实测", "configured": "配置值", "estimated": "估算值"}[summary["baseline_source"]]
+    print(f"  token: 全部送云端约 {summary['baseline_tokens']}（每帧成本取{source}），级联 {summary['cascade_tokens']}，"
+          f"节省 {summary['saved_tokens']}（{summary['saved_tokens_rate']:.1%}），"
+          f"推理耗时节省 {summary['saved_latency_rate']:.1%}，总耗时 {summary['elapsed']} 秒")
+
+
+if __name__ == "__main__":
+    # 级联标注（中断后再次运行会从标注文件续跑）
+    cascade_inference(
+        input_dir="/mnt/ckpt-chinasatcom-2/wyt/show_system/files/images/animal_image",
+        labeling_file_path="/mnt/ckpt-chinasatcom-2/wyt/show_system/files/images/animal_image/cascade.jsonl")
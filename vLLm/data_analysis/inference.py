@@ -1,20 +1,101 @@
 import os
 import json
 import time
+import random
+import asyncio
+from functools import lru_cache
 from tqdm import tqdm
 from PIL import Image
-from openai import OpenAI
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
 
 from .promotion import *
 from .tools import  get_file_list, normalize_path
-from .pre_process import image_to_base64, contains_chinese, safe_rename
+from .pre_process import image_to_base64, contains_chinese, safe_rename, ImagePreprocessor, JPEG_QUALITY, CACHE_DIR
+from .video_sampler import iter_keyframes, is_video, VIDEO_EXTENSIONS
+from .usage_store import UsageRecorder, get_default_recorder, usage_tokens, USAGE_DB
 from .params import PARAMS
 
+DEFAULT_PORT = 11434        # lm_model_info.json 中没有配置的模型使用的端口
+API_KEY = "wyt"
+
+# 批量推理参数
+BATCH_CONCURRENCY = 16      # 同时在途的请求数，让vLLM的连续批处理保持满载
+BATCH_MAX_RETRIES = 3       # 连接失败、超时、限流、5xx时的重试次数
+BATCH_BACKOFF = 1.0         # 重试退避的初始等待（秒），每次翻倍并加随机抖动
+REQUEST_TIMEOUT = 300.0     # 单个请求的超时（秒）
+
+# 可重试的错误：请求没有到达模型或服务端临时不可用
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError)
+
+
+@lru_cache(maxsize=1)
+def load_model_info():
+    """加载模型信息配置文件 files/lm_model_info.json（每个进程只读一次）"""
+    model_info_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "files", "lm_model_info.json")
+    try:
+        with open(model_info_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"加载模型信息配置文件失败: {e}")
+        return {}
+
+
+def get_base_url(model):
+    """模型服务地址：端口取自 lm_model_info.json，没有找到时使用默认端口11434"""
+    model_port = load_model_info().get(model, {}).get("port", DEFAULT_PORT)
+    return f"http://localhost:{model_port}/v1"
+
+
+@lru_cache(maxsize=None)
+def get_client(model):
+    """同一模型服务复用一个客户端（及其HTTP连接池）"""
+    return OpenAI(base_url=get_base_url(model), api_key=API_KEY)
+
+
+def build_messages(prompt, image_url):
+    """构建单张图像的对话消息"""
+    return [{
+        "role": "user",
+        "content": [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": image_url}}]
+    }]
+
+
+def build_request(model, prompt, image_url, temperature, top_p, max_tokens):
+    """chat.completions.create 的参数（同步和异步推理共用）"""
+    return dict(
+        model=model,
+        messages=build_messages(prompt, image_url),
+        max_tokens=max_tokens,
+        temperature=temperature,
+        top_p=top_p,
+        frequency_penalty=PARAMS["frequency_penalty"],  # 频率惩罚系数，默认0
+        presence_penalty=PARAMS["presence_penalty"],  # 存在惩罚系数，默认0
+        stop=PARAMS["stop"])
+
+
+def parse_response(response):
+    """
+    解析模型响应
+    :returns: 包含文本内容和token使用信息的字典
+    :raises json.JSONDecodeError: 模型输出不是合法JSON
+    """
+    content = response.choices[0].message.content  # 提取核心文本内容
+    content_json = content.replace("```json\n", "").replace("\n```", "")
+
+    # 统计输入给模型的 token 数量、输出模型的 token 数量、总 token 数量
+    return {
+        "content": json.loads(content_json),
+        "tokens": usage_tokens(response)
+    }
+
 
 def single_inference(image_path, prompt,
-        temperature=PARAMS["temperature"], 
-        top_p=PARAMS["top_p"], 
-        max_tokens=PARAMS["max_tokens"], 
+        temperature=PARAMS["temperature"],
+        top_p=PARAMS["top_p"],
+        max_tokens=PARAMS["max_tokens"],
         model="Qwen2.5-VL-3B"):
     """
     单张图像推理
@@ -27,64 +108,318 @@ def single_inference(image_path, prompt,
     :returns:
         包含文本内容和token使用信息的字典
     """
-    # 加载模型信息配置文件
-    import json
-    import os
-    model_info_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "files", "lm_model_info.json")
-    print("model_info_path:", model_info_path)
+    request = build_request(model, prompt, image_to_base64(image_path), temperature, top_p, max_tokens)
+    return _recorded_call(lambda: get_client(model).chat.completions.create(**request),
+                          get_default_recorder(), model, prompt, image_path)
 
+
+def _recorded_call(create, recorder, model, prompt, image_path, frame_index=None):
+    """同步请求并解析响应，调用（包括失败的调用）记录到推理用量库"""
+    start = time.perf_counter()
+    response = None
     try:
-        with open(model_info_path, 'r', encoding='utf-8') as f:
-            lm_model_info = json.load(f)
+        response = create()
+        result = parse_response(response)
     except Exception as e:
-        print(f"加载模型信息配置文件失败: {e}")
-        lm_model_info = {}
-    
-    # 获取模型对应的端口，如果没有找到则使用默认端口11434
-    model_port = lm_model_info.get(model, {}).get("port", 11434)
-    
-    # 构建base_url
-    base_url = f"http://localhost:{model_port}/v1"
-    print("base_url:", base_url)
-    # 初始化模型服务
-    client = OpenAI(
-        base_url=base_url,
-        api_key="wyt")
-
-    response = client.chat.completions.create(
-        model=model,
-        messages=[{
-            "role": "user", 
-            "content": [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {"url": image_to_base64(image_path)}}]
-        }],
-        max_tokens=max_tokens,
-        temperature=temperature,
-        top_p=top_p,
-        frequency_penalty=PARAMS["frequency_penalty"],  # 频率惩罚系数，默认0
-        presence_penalty=PARAMS["presence_penalty"],  # 存在惩罚系数，默认0
-        stop=PARAMS["stop"])
-    
-    content = response.choices[0].message.content  # 提取核心文本内容
-    print("content:", content)
+        if recorder is not None:
+            recorder.record(model, prompt, image_path, response, time.perf_counter() - start, False, e, frame_index)
+        raise
+    if recorder is not None:
+        recorder.record(model, prompt, image_path, response, time.perf_counter() - start, True, None, frame_index)
+    return result
 
-    content_json = content.replace("```json\n", "").replace("\n```", "")
-    print("content_json:", content_json)
 
-    # 提取响应数据
-    result = {
-        "content": json.loads(content_json),
-        "tokens": {
-            "prompt_tokens": response.usage.prompt_tokens if hasattr(response.usage, "prompt_tokens") else 0,
-            "completion_tokens": response.usage.completion_tokens if hasattr(response.usage, "completion_tokens") else 0,
-            "total_tokens": response.usage.total_tokens if hasattr(response.usage, "total_tokens") else 0
-        }
-    }
-    # 统计输入给模型的 token 数量、输出模型的 token 数量、总 token 数量
+def video_inference(video_path, prompt,
+        temperature=PARAMS["temperature"],
+        top_p=PARAMS["top_p"],
+        max_tokens=PARAMS["max_tokens"],
+        model="Qwen2.5-VL-3B",
+        **sampling):
+    """
+    单个视频推理：流式抽取关键帧（见 video_sampler.iter_keyframes），逐帧按单张图像推理
+    :param video_path: 视频文件路径
+    :param sampling: 抽帧参数 mode / max_frames / stride_seconds / scene_threshold 等
+    :returns:
+        每个关键帧的结果列表，每项在 single_inference 的结果上增加 frame（帧序号、时间、差异）
+    """
+    results = []
+    for keyframe in iter_keyframes(video_path, **sampling):
+        request = build_request(model, prompt, keyframe.image_url, temperature, top_p, max_tokens)
+        result = _recorded_call(lambda: get_client(model).chat.completions.create(**request),
+                                get_default_recorder(), model, prompt, video_path, keyframe.index)
+        result["frame"] = frame_info(keyframe)
+        results.append(result)
+    return results
+
+
+def frame_info(keyframe):
+    """标注记录中的关键帧信息：由视频的哪一帧得到的检测结果"""
+    return {"index": keyframe.index, "timestamp": keyframe.timestamp, "score": keyframe.score}
+
+
+def annotation_key(image_path, frame_index=None):
+    """标注记录的续跑键：图像为路径，视频关键帧为 路径#帧序号"""
+    image_path = normalize_path(image_path)
+    return image_path if frame_index is None else f"{image_path}#{frame_index}"
+
+
+async def async_single_inference(client, image_path, prompt,
+        temperature=PARAMS["temperature"],
+        top_p=PARAMS["top_p"],
+        max_tokens=PARAMS["max_tokens"],
+        model="Qwen2.5-VL-3B",
+        max_retries=BATCH_MAX_RETRIES,
+        backoff=BATCH_BACKOFF,
+        preprocessor=None,
+        image_url=None,
+        recorder=None,
+        frame_index=None,
+        concurrency=None):
+    """
+    单张图像异步推理（请求参数和结果格式与 single_inference 相同）
+    :param client: AsyncOpenAI 客户端（批量推理中共用）
+    :param max_retries: 连接失败、超时、限流、5xx时的重试次数
+    :param backoff: 重试退避的初始等待（秒）
+    :param preprocessor: ImagePreprocessor（进程池 + 磁盘缓存），为None时在线程中编码
+    :param image_url: 已编码的图像（批量推理中预先编码），传入时不再编码
+    :param recorder: UsageRecorder，调用（包括失败的调用）记录到推理用量库
+    :param frame_index: 视频关键帧序号（记录用）
+    :param concurrency: 所在阶段的并发数（记录用）
+    :returns:
+        包含文本内容、token使用信息、耗时和重试次数的字典
+    """
+    # 图像解码、缩放和编码是CPU操作，不在事件循环中执行，与其他在途请求重叠
+    if image_url is not None:
+        pass
+    elif preprocessor is not None:
+        image_url = await preprocessor.encode(image_path)
+    else:
+        image_url = await asyncio.to_thread(image_to_base64, image_path)
+    request = build_request(model, prompt, image_url, temperature, top_p, max_tokens)
+
+    start = time.perf_counter()
+    attempt = 0
+    response = None
+    try:
+        while True:
+            try:
+                response = await client.chat.completions.create(**request)
+                break
+            except RETRYABLE_ERRORS:
+                if attempt >= max_retries:
+                    raise
+                # 指数退避 + 随机抖动，避免所有失败的请求同时重试
+                await asyncio.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+        result = parse_response(response)
+    except Exception as e:
+        if recorder is not None:
+            recorder.record(model, prompt, image_path, response, time.perf_counter() - start, False, e,
+                            frame_index, concurrency)
+        raise
+
+    latency = time.perf_counter() - start
+    if recorder is not None:
+        recorder.record(model, prompt, image_path, response, latency, True, None, frame_index, concurrency)
+    result["latency"] = round(latency, 3)
+    result["retries"] = attempt
     return result
 
 
+def load_annotations(labeling_file_path):
+    """
+    读取已有的标注文件，返回已成功标注的续跑键集合（见 annotation_key）
+    失败的记录不计入，续跑时会重新推理；写到一半的最后一行会被忽略。
+    """
+    done = set()
+    if not os.path.exists(labeling_file_path):
+        return done
+    with open(labeling_file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "success":
+                done.add(annotation_key(record["image_path"], record.get("frame", {}).get("index")))
+    return done
+
+
+def make_async_client(model, concurrency):
+    """异步客户端：连接池大小与并发数相同，重试由 async_single_inference 处理"""
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        timeout=REQUEST_TIMEOUT)
+    return AsyncOpenAI(base_url=get_base_url(model), api_key=API_KEY, max_retries=0, http_client=http_client)
+
+
+async def produce_inputs(image_paths, preprocessor, done, sampling, queue, consumers):
+    """
+    按顺序把待推理的输入放入队列：(图像路径, 关键帧信息, 编码任务)，最后放入 consumers 个 None 表示结束
+    图像提交给 preprocessor（进程池）编码，队列容量即最多提前编码的张数；
+    视频在线程中流式抽取关键帧（已编码），跳过 done 中已成功的帧。
+    """
+    loop = asyncio.get_running_loop()
+
+    def ready(value=None, error=None):
+        """已完成的编码任务（视频关键帧在抽帧时已编码）"""
+        future = loop.create_future()
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+        return future
+
+    async def produce_video(video_path):
+        keyframes = iter_keyframes(video_path, resolution=preprocessor.resolution, quality=preprocessor.quality, **sampling)
+        try:
+            while True:
+                keyframe = await asyncio.to_thread(next, keyframes, None)
+                if keyframe is None:
+                    return
+                if annotation_key(video_path, keyframe.index) not in done:
+                    await queue.put((video_path, frame_info(keyframe), ready(keyframe.image_url)))
+        except Exception as e:
+            await queue.put((video_path, None, ready(error=e)))  # 视频无法打开或解码失败，记为一条失败记录
+        finally:
+            keyframes.close()
+
+    try:
+        for image_path in image_paths:
+            if is_video(image_path):
+                await produce_video(image_path)
+            else:
+                await queue.put((image_path, None, asyncio.ensure_future(preprocessor.encode(image_path))))
+    finally:
+        for _ in range(consumers):
+            await queue.put(None)
+
+
+def new_record(image_path, frame):
+    """标注记录的公共字段"""
+    record = {"image_path": image_path}
+    if frame is not None:
+        record.update({"type": "video", "frame": frame})
+    return record
+
+
+async def _batch_inference_async(image_paths, prompt, labeling_file_path, model, concurrency,
+                                 max_retries, backoff, preprocessor, done, sampling, recorder, **params):
+    """
+    批量推理的事件循环部分
+    produce_inputs 提前编码最多 concurrency 张图像，concurrency 个推理协程取出编码结果发送请求，
+    共用一个客户端和连接池，CPU上的编码与网络上的在途请求重叠执行。
+    """
+    summary = {"total": 0, "success": 0, "failed": 0, "video_frames": 0,
+               "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    encoded = asyncio.Queue(maxsize=concurrency)
+
+    async with make_async_client(model, concurrency) as client:
+        with open(labeling_file_path, 'a', encoding='utf-8') as f, \
+                tqdm(desc="批量推理") as progress:
+
+            async def worker():
+                while True:
+                    item = await encoded.get()
+                    if item is None:
+                        return
+                    image_path, frame, encoding = item
+                    record = new_record(image_path, frame)
+                    try:
+                        result = await async_single_inference(
+                            client, image_path, prompt, model=model,
+                            max_retries=max_retries, backoff=backoff, image_url=await encoding, recorder=recorder,
+                            frame_index=frame["index"] if frame else None, **params)
+                        record.update({"status": "success", **result})
+                        summary["success"] += 1
+                        for key in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                            summary[key] += result["tokens"][key]
+                    except Exception as e:
+                        record.update({"status": "error", "error": f"{type(e).__name__}: {e}"})
+                        summary["failed"] += 1
+                    summary["total"] += 1
+                    summary["video_frames"] += frame is not None
+                    # 每条结果立即写入并刷新，中断后可以从标注文件续跑
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    progress.update(1)
+
+            await asyncio.gather(produce_inputs(image_paths, preprocessor, done, sampling, encoded, concurrency),
+                                 *(worker() for _ in range(concurrency)))
+    return summary
+
+
+def batch_inference(input_dir, prompt, labeling_file_path,
+        model="Qwen2.5-VL-3B",
+        concurrency=BATCH_CONCURRENCY,
+        max_retries=BATCH_MAX_RETRIES,
+        backoff=BATCH_BACKOFF,
+        extensions=(".jpg", ".jpeg", ".png") + VIDEO_EXTENSIONS,
+        preprocess_workers=None,
+        resolution=(448, 448),
+        quality=JPEG_QUALITY,
+        cache_dir=CACHE_DIR,
+        sampling=None,
+        usage_db=USAGE_DB,
+        **params):
+    """
+    图像批量标注
+    异步并发发送请求（同时在途 concurrency 个），每张图像的结果追加写入JSONL标注文件：
+    成功 {"image_path", "status": "success", "content", "tokens", "latency", "retries"}，
+    失败 {"image_path", "status": "error", "error"}。
+    再次运行时跳过标注文件中已成功的图像，只推理剩余和失败的图像。
+    图像预处理在进程池中执行，结果按 文件哈希 + 分辨率 + 质量 缓存在磁盘上，换提示词重新标注时不再重复编码。
+    视频按 sampling 流式抽取关键帧后逐帧推理，记录中增加 "type": "video" 和 "frame"（帧序号、时间、差异），
+    续跑时重新抽帧，跳过已成功的帧。
+    :param input_dir: 图像目录（递归查找）
+    :param prompt: 提示文本
+    :param labeling_file_path: JSONL标注文件路径
+    :param model: 模型名称
+    :param concurrency: 同时在途的请求数
+    :param max_retries: 单张图像的重试次数
+    :param backoff: 重试退避的初始等待（秒）
+    :param extensions: 图像扩展名
+    :param preprocess_workers: 预处理进程数，默认CPU核数，0 表示在线程中执行
+    :param resolution: 图像缩放分辨率
+    :param quality: JPEG编码质量
+    :param cache_dir: 预处理缓存目录，为None时不使用缓存
+    :param sampling: 视频抽帧参数（mode / max_frames / stride_seconds / scene_threshold 等）
+    :param usage_db: 推理用量库（见 usage_store），为None或空字符串时不记录
+    :param params: temperature / top_p / max_tokens
+    :returns:
+        本次运行的统计字典（图像数、成功/失败数、token数、耗时、吞吐量、用量库中的 run_id）
+    """
+    image_paths = get_file_list(input_dir, extensions)
+    done = load_annotations(labeling_file_path)
+    pending = [path for path in image_paths if is_video(path) or path not in done]
+    print(f"共 {len(image_paths)} 个文件，已完成 {len(image_paths) - len(pending)} 张图像，"
+          f"本次推理 {len(pending)} 个文件（其中视频 {sum(map(is_video, pending))} 个）")
+
+    labeling_dir = os.path.dirname(os.path.abspath(labeling_file_path))
+    os.makedirs(labeling_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    recorder = UsageRecorder(usage_db, input_dir, resolution, concurrency) if usage_db else None
+    with ImagePreprocessor(preprocess_workers, resolution, quality, cache_dir) as preprocessor:
+        try:
+            summary = asyncio.run(_batch_inference_async(
+                pending, prompt, labeling_file_path, model, concurrency, max_retries, backoff, preprocessor,
+                done, sampling or {}, recorder, **params))
+        finally:
+            if recorder is not None:
+                recorder.close()
+        summary.update(preprocessor.stats())
+    summary["run_id"] = recorder.run_id if recorder is not None else None
+    summary["skipped"] = len(image_paths) - len(pending)
+    summary["elapsed"] = round(time.perf_counter() - start, 2)
+    summary["images_per_second"] = round(summary["total"] / summary["elapsed"], 2) if summary["elapsed"] else 0
+    summary["tokens_per_second"] = round(summary["total_tokens"] / summary["elapsed"], 1) if summary["elapsed"] else 0
+    print(f"批量推理完成: 成功 {summary['success']} 张，失败 {summary['failed']} 张（视频关键帧 {summary['video_frames']} 张），"
+          f"耗时 {summary['elapsed']} 秒，{summary['images_per_second']} 张/秒，{summary['tokens_per_second']} tokens/秒，"
+          f"预处理缓存命中 {summary['cache_hits']} 张")
+    return summary
+
+
 if __name__ == "__main__":
     image_path = "/mnt/ckpt-chinasatcom-2/wyt/show_system/files/images/animal_image/90.jpg"
     # video_path = "/mnt/ckpt-chinasatcom-2/wyt/show_system/files/images/animal_video/bear.mp4"
@@ -94,12 +429,13 @@ if __name__ == "__main__":
     print(single_inference(image_path, PROMOTION_SELECTION_ANIMAL, model="Qwen2.5-VL-7B"))
 
     # print(get_gpu_memory_usage())
-    
-    # 图像批量标注
+
+    # 图像批量标注（中断后再次运行会从标注文件续跑）
     # batch_inference(
     #     input_dir="D:/zhijiang/06-Source_Code/show_system/images_test", prompt=PROMOTION_SELECTION_ANIMAL,
-    #     labeling_file_path="D:/zhijiang/06-Source_Code/show_system/images_test/annotations.jsonl")
-    
+    #     labeling_file_path="D:/zhijiang/06-Source_Code/show_system/images_test/annotations.jsonl",
+    #     concurrency=16)
+
 
     # image_paths = get_file_list("C:/Users/chenningyu/Desktop/images", [".jpg", ".png"])
     # print(image_paths)
\ No newline at end of file
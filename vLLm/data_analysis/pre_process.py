@@ -3,18 +3,124 @@ import re
 import cv2
 import uuid
 import base64
+import asyncio
+import hashlib
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 
+JPEG_QUALITY = 95           # JPEG编码质量（与OpenCV默认值相同）
+# 预处理结果缓存目录：files/image_cache
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "files", "image_cache")
 
-def image_to_base64(image_path, resolution=(448, 448)):
-    """将图像转为Base64编码（适配Qwen-VL输入格式）"""
+
+def encode_image(image_path, resolution=(448, 448), quality=JPEG_QUALITY):
+    """解码图像、缩放到模型推荐分辨率并编码为JPEG字节"""
     img = cv2.imread(image_path)
     if img is None: 
         raise FileNotFoundError(f"无法从路径加载图像: {image_path}")
     img = cv2.resize(img, resolution)  # 模型推荐分辨率
-    _, buffer = cv2.imencode(".jpg", img)
-    
-    return "data:image/jpeg;base64," + base64.b64encode(buffer).decode("utf-8")
+    _, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def to_data_url(jpeg_bytes):
+    """JPEG字节转为Base64 data URL（适配Qwen-VL输入格式）"""
+    return "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode("utf-8")
+
+
+def image_to_base64(image_path, resolution=(448, 448), quality=JPEG_QUALITY):
+    """将图像转为Base64编码（适配Qwen-VL输入格式）"""
+    return to_data_url(encode_image(image_path, resolution, quality))
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """文件内容的SHA-1（分块读取）"""
+    digest = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(cache_dir, digest, resolution, quality):
+    """缓存文件路径：按 文件哈希 + 分辨率 + 质量 区分，按哈希前两位分子目录"""
+    return os.path.join(cache_dir, digest[:2], f"{digest}_{resolution[0]}x{resolution[1]}_q{quality}.jpg")
+
+
+def preprocess_image(image_path, resolution=(448, 448), quality=JPEG_QUALITY, cache_dir=CACHE_DIR):
+    """
+    带磁盘缓存的图像预处理（可在进程池中执行）
+    同一图像内容、分辨率和质量只编码一次，换提示词重新推理时直接读取缓存。
+    :param cache_dir: 缓存目录，为None时不使用缓存
+    :returns: (Base64 data URL, 是否命中缓存)
+    """
+    resolution = tuple(resolution)
+    if cache_dir is None:
+        return image_to_base64(image_path, resolution, quality), False
+
+    path = cache_path(cache_dir, file_hash(image_path), resolution, quality)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return to_data_url(f.read()), True
+
+    jpeg_bytes = encode_image(image_path, resolution, quality)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(jpeg_bytes)
+    os.replace(temp_path, path)  # 先写临时文件再重命名，并发写入同一缓存文件时不会读到半个文件
+    return to_data_url(jpeg_bytes), False
+
+
+class ImagePreprocessor:
+    """
+    异步图像预处理：解码、缩放、编码在进程池中执行，与在途的推理请求重叠
+    :param workers: 进程数，0 表示在线程中执行（不启动进程池）
+    :param resolution: 缩放分辨率
+    :param quality: JPEG质量
+    :param cache_dir: 缓存目录，为None时不使用缓存
+    """
+
+    def __init__(self, workers=None, resolution=(448, 448), quality=JPEG_QUALITY, cache_dir=CACHE_DIR):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.resolution = tuple(resolution)
+        self.quality = quality
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._executor = None
+        if self.workers > 0:
+            # spawn启动：不继承父进程的事件循环和线程状态
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def encode(self, image_path):
+        """返回图像的Base64 data URL"""
+        args = (image_path, self.resolution, self.quality, self.cache_dir)
+        if self._executor is None:
+            data_url, hit = await asyncio.to_thread(preprocess_image, *args)
+        else:
+            data_url, hit = await asyncio.get_running_loop().run_in_executor(self._executor, preprocess_image, *args)
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return data_url
+
+    def stats(self):
+        return {"workers": self.workers, "cache_hits": self.hits, "cache_misses": self.misses}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
 
 
 def draw_bbox_on_image(image_path, bbox, output_path=None):
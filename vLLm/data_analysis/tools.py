@@ -0,0 +1,26 @@
+import os
+
+
+def normalize_path(path):
+    """
+    规范化文件路径：转为绝对路径，统一使用 "/" 作为分隔符（Windows和Linux下的标注文件可以互相续跑）
+    :param path: 文件路径
+    :returns: 规范化后的路径字符串
+    """
+    return os.path.abspath(os.path.expanduser(str(path))).replace("\\", "/")
+
+
+def get_file_list(input_dir, extensions=(".jpg", ".jpeg", ".png")):
+    """
+    递归获取目录下指定扩展名的文件（按路径排序，保证每次运行的顺序一致）
+    :param input_dir: 输入目录
+    :param extensions: 扩展名列表，不区分大小写
+    :returns: 规范化后的文件路径列表
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    file_list = []
+    for root, _, files in os.walk(input_dir):
+        for name in files:
+            if name.lower().endswith(extensions):
+                file_list.append(normalize_path(os.path.join(root, name)))
+    return sorted(file_list)
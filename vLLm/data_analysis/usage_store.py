@@ -0,0 +1,402 @@
+import os
+import time
+import uuid
+import queue
+import atexit
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from . import promotion
+
+# 推理用量库：files/inference_usage.db，环境变量 INFERENCE_USAGE_DB 可覆盖，设为空字符串时不记录
+USAGE_DB = os.environ.get(
+    "INFERENCE_USAGE_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "files", "inference_usage.db"))
+FLUSH_EVERY = 100           # 每累计多少条写入一次
+FLUSH_INTERVAL = 5.0        # 不足 FLUSH_EVERY 条时，后台写入线程每隔多少秒写入一次积压的记录
+
+CREATE_SQL = """
+CREATE TABLE IF NOT EXISTS inference_usage (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,               -- 请求完成时间（Unix时间戳）
+    run_id TEXT NOT NULL,                   -- 一次批量/级联运行
+    model TEXT NOT NULL,
+    prompt_id TEXT NOT NULL,                -- promotion.py 中的变量名，其他提示词为 custom_<哈希>
+    camera_id TEXT,
+    image_path TEXT,
+    frame_index INTEGER,                    -- 视频关键帧序号，图像为NULL
+    width INTEGER,                          -- 送入模型的图像分辨率
+    height INTEGER,
+    concurrency INTEGER NOT NULL DEFAULT 1, -- 请求时的并发数，用于估算GPU占用时间
+    latency REAL,                           -- 请求耗时（秒，含重试）
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    output_chars INTEGER NOT NULL DEFAULT 0,
+    parse_ok INTEGER NOT NULL,              -- 模型输出是否解析为JSON
+    error TEXT
+)
+"""
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_usage_model_prompt ON inference_usage(model, prompt_id)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_run ON inference_usage(run_id)",
+    "CREATE INDEX IF NOT EXISTS idx_usage_camera ON inference_usage(camera_id, created_at)",
+]
+INSERT_SQL = """
+INSERT INTO inference_usage (created_at, run_id, model, prompt_id, camera_id, image_path, frame_index,
+    width, height, concurrency, latency, prompt_tokens, completion_tokens, total_tokens, output_chars, parse_ok, error)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def connect(db_path=USAGE_DB):
+    """打开用量库（不存在时建表）"""
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    connection = sqlite3.connect(db_path, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(CREATE_SQL)
+    for sql in INDEX_SQL:
+        connection.execute(sql)
+    connection.commit()
+    return connection
+
+
+def prompt_id(prompt):
+    """提示词标识：promotion.py 中的变量名，其他提示词为 custom_<SHA-1前8位>"""
+    for name, value in vars(promotion).items():
+        if name.isupper() and value == prompt:
+            return name
+    return "custom_" + hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+
+
+def usage_tokens(response):
+    """响应中的 token 使用信息"""
+    usage = getattr(response, "usage", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "total_tokens": getattr(usage, "total_tokens", 0) or 0,
+    }
+
+
+class UsageRecorder:
+    """
+    推理用量记录器：每次推理调用（包括失败和输出无法解析的调用）一行，缓冲后批量写入
+    写入在后台线程中进行（持有一个连接，建表只做一次），record 不会阻塞事件循环
+    :param db_path: 用量库路径
+    :param root: 输入目录，camera_id 取图像路径在其下的第一级子目录（不在其下时取图像所在目录名）
+    :param resolution: 送入模型的图像分辨率
+    :param concurrency: 并发数
+    :param flush_every: 累计多少条写入一次
+    :param flush_interval: 不足 flush_every 条时，每隔多少秒写入一次积压的记录
+    """
+
+    def __init__(self, db_path=USAGE_DB, root=None, resolution=(448, 448), concurrency=1, flush_every=FLUSH_EVERY,
+                 flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.run_id = time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        self.root = os.path.abspath(root) if root else None
+        self.resolution = tuple(resolution) if resolution else (None, None)
+        self.concurrency = concurrency
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._lock = threading.Lock()
+        self._prompt_ids = {}
+        self._batches = queue.Queue()   # 待写入的批次，None 表示停止
+        self._writer = None
+
+    def camera_of(self, image_path):
+        """图像路径对应的相机"""
+        if self.root:
+            relative = os.path.relpath(os.path.abspath(image_path), self.root)
+            parts = relative.replace("\\", "/").split("/")
+            if len(parts) > 1 and parts[0] != "..":
+                return parts[0]
+        return os.path.basename(os.path.dirname(os.path.abspath(image_path)))
+
+    def record(self, model, prompt, image_path, response, latency, parse_ok, error=None, frame_index=None,
+               concurrency=None):
+        """
+        记录一次推理调用（只追加到缓冲区，满 flush_every 条时交给后台线程写入）
+        :param response: 模型响应，请求失败时为None
+        :param error: 异常，成功时为None
+        :param concurrency: 本次调用所在阶段的并发数，默认使用记录器的并发数
+        """
+        if prompt not in self._prompt_ids:
+            self._prompt_ids[prompt] = prompt_id(prompt)
+        tokens = usage_tokens(response) if response is not None else {}
+        content = response.choices[0].message.content if response is not None else None
+        row = (time.time(), self.run_id, model, self._prompt_ids[prompt], self.camera_of(image_path), image_path,
+               frame_index, self.resolution[0], self.resolution[1], concurrency or self.concurrency,
+               round(latency, 4) if latency is not None else None,
+               tokens.get("prompt_tokens", 0), tokens.get("completion_tokens", 0), tokens.get("total_tokens", 0),
+               len(content or ""), int(bool(parse_ok)),
+               f"{type(error).__name__}: {error}" if error is not None else None)
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.flush_every:
+                self._submit_locked()
+
+    def flush(self):
+        """把缓冲区交给后台线程并等待写入完成"""
+        with self._lock:
+            self._submit_locked()
+        self._batches.join()
+
+    def _submit_locked(self):
+        if not self._rows:
+            return
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop, name="usage-writer", daemon=True)
+            self._writer.start()
+        self._batches.put(self._rows)
+        self._rows = []
+
+    def _write_loop(self):
+        """后台写入线程：整个生命周期使用同一个连接"""
+        connection = None
+        try:
+            while True:
+                try:
+                    rows = self._batches.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    # 定时提交积压的记录（单张推理等调用量小的场景），经队列写入，flush 可以等待它完成
+                    with self._lock:
+                        self._submit_locked()
+                    continue
+                try:
+                    if rows is None:
+                        return
+                    connection = self._write(connection, rows)
+                finally:
+                    self._batches.task_done()
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def _write(self, connection, rows):
+        try:
+            if connection is None:
+                connection = connect(self.db_path)
+            connection.executemany(INSERT_SQL, rows)
+            connection.commit()
+        except sqlite3.Error as e:
+            print(f"写入推理用量失败（丢弃 {len(rows)} 条）: {e}")  # 用量记录失败不影响推理
+            if connection is not None:
+                connection.close()
+            connection = None   # 下一批重新连接
+        return connection
+
+    def close(self):
+        """写入剩余记录并停止后台线程"""
+        self.flush()
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._batches.put(None)
+            writer.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+_default_recorder = None
+_default_recorder_lock = threading.Lock()
+
+
+def get_default_recorder():
+    """
+    single_inference 使用的记录器，INFERENCE_USAGE_DB 为空时返回None
+    与批量推理一样缓冲写入：满 FLUSH_EVERY 条或每隔 FLUSH_INTERVAL 秒写入一次，进程退出时写入剩余记录
+    """
+    global _default_recorder
+    if not USAGE_DB:
+        return None
+    with _default_recorder_lock:
+        if _default_recorder is None:
+            _default_recorder = UsageRecorder(USAGE_DB)
+            atexit.register(_default_recorder.close)
+    return _default_recorder
+
+
+# ==================== 报表 ====================
+
+def report(db_path=USAGE_DB, since=None, run_ids=None, token_price=0.0, gpu_hour_price=0.0):
+    """
+    推理用量报表
+    :param since: 只统计该时间（Unix时间戳）之后的记录
+    :param run_ids: 只统计这些运行
+    :param token_price: 每千token价格
+    :param gpu_hour_price: 每GPU小时价格（GPU时间按 请求耗时 / 并发数 估算）
+    :returns: {"models": [...], "prompts": [...], "cameras": [...]}，cameras 每个相机每天一行
+    """
+    conditions, params = [], []
+    if since is not None:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if run_ids:
+        conditions.append(f"run_id IN ({','.join('?' * len(run_ids))})")
+        params.extend(run_ids)
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+
+    connection = connect(db_path)
+    connection.row_factory = sqlite3.Row
+    try:
+        # 吞吐量：每次运行的墙钟时间 = 最后完成 - 最早开始，按 模型 + 提示词 汇总
+        models = connection.execute(f"""
+            WITH runs AS (
+                SELECT model, prompt_id, run_id, COUNT(*) AS calls, SUM(total_tokens) AS tokens,
+                       MAX(created_at) - MIN(created_at - COALESCE(latency, 0)) AS span
+                FROM inference_usage {where}
+                GROUP BY model, prompt_id, run_id
+            )
+            SELECT model, prompt_id, SUM(calls) AS calls, SUM(tokens) AS tokens, SUM(span) AS span,
+                   ROUND(SUM(calls) / NULLIF(SUM(span), 0), 2) AS calls_per_second,
+                   ROUND(SUM(tokens) / NULLIF(SUM(span), 0), 1) AS tokens_per_second
+            FROM runs GROUP BY model, prompt_id ORDER BY model, prompt_id
+        """, params).fetchall()
+
+        # 提示词对比：速度和输出大小
+        prompts = connection.execute(f"""
+            SELECT model, prompt_id, COUNT(*) AS calls,
+                   ROUND(AVG(parse_ok), 4) AS parse_rate,
+                   ROUND(AVG(latency), 3) AS avg_latency,
+                   ROUND(AVG(prompt_tokens), 1) AS avg_prompt_tokens,
+                   ROUND(AVG(completion_tokens), 1) AS avg_completion_tokens,
+                   ROUND(AVG(output_chars), 1) AS avg_output_chars,
+                   SUM(error IS NOT NULL AND parse_ok = 0 AND total_tokens = 0) AS request_errors
+            FROM inference_usage {where}
+            GROUP BY model, prompt_id ORDER BY model, avg_latency
+        """, params).fetchall()
+        latencies = {}
+        for row in connection.execute(f"SELECT model, prompt_id, latency FROM inference_usage {where} "
+                                      f"{'AND' if where else 'WHERE'} latency IS NOT NULL ORDER BY latency", params):
+            latencies.setdefault((row["model"], row["prompt_id"]), []).append(row["latency"])
+
+        # 每个相机每天的成本（按推理日期逐日列出）
+        cameras = connection.execute(f"""
+            SELECT camera_id, date(created_at, 'unixepoch', 'localtime') AS day,
+                   COUNT(*) AS calls, SUM(total_tokens) AS tokens,
+                   SUM(COALESCE(latency, 0) / concurrency) AS gpu_seconds
+            FROM inference_usage {where}
+            GROUP BY camera_id, day ORDER BY camera_id, day
+        """, params).fetchall()
+    finally:
+        connection.close()
+
+    prompt_rows = []
+    for row in prompts:
+        values = latencies.get((row["model"], row["prompt_id"]), [])
+        item = dict(row)
+        item["p95_latency"] = round(values[min(len(values) - 1, int(len(values) * 0.95))], 3) if values else None
+        prompt_rows.append(item)
+
+    camera_rows = []
+    for row in cameras:
+        tokens = row["tokens"] or 0
+        cost = tokens / 1000 * token_price + row["gpu_seconds"] / 3600 * gpu_hour_price
+        camera_rows.append({
+            "camera_id": row["camera_id"],
+            "day": row["day"],
+            "calls": row["calls"],
+            "tokens": tokens,
+            "gpu_seconds": round(row["gpu_seconds"], 1),
+            "cost": round(cost, 4),
+        })
+    return {"models": [dict(row) for row in models], "prompts": prompt_rows, "cameras": camera_rows}
+
+
+def print_report(result):
+    """打印推理用量报表"""
+    print("📊 吞吐量（按 模型 + 提示词）")
+    print(f"  {'模型':<18}{'提示词':<28}{'调用数':>8}{'调用/秒':>10}{'tokens/秒':>12}")
+    for row in result["models"]:
+        print(f"  {row['model']:<18}{row['prompt_id']:<28}{row['calls']:>8}"
+              f"{row['calls_per_second'] or 0:>10}{row['tokens_per_second'] or 0:>12}")
+
+    print("\n📊 提示词对比（速度和输出大小）")
+    print(f"  {'模型':<18}{'提示词':<28}{'调用数':>8}{'解析率':>8}{'请求失败':>8}{'平均秒':>8}{'p95秒':>8}"
+          f"{'输入tok':>9}{'输出tok':>9}{'输出字符':>9}")
+    for row in result["prompts"]:
+        print(f"  {row['model']:<18}{row['prompt_id']:<28}{row['calls']:>8}{row['parse_rate']:>8.1%}"
+              f"{row['request_errors']:>8}{row['avg_latency'] or 0:>8}{row['p95_latency'] or 0:>8}"
+              f"{row['avg_prompt_tokens']:>9}{row['avg_completion_tokens']:>9}{row['avg_output_chars']:>9}")
+
+    print("\n📊 每个相机每天")
+    print(f"  {'相机':<20}{'日期':<12}{'调用数':>8}{'tokens':>12}{'GPU秒':>10}{'成本':>10}")
+    for row in result["cameras"]:
+        print(f"  {str(row['camera_id']):<20}{row['day']:<12}{row['calls']:>8}{row['tokens']:>12}"
+              f"{row['gpu_seconds']:>10}{row['cost']:>10}")
+
+
+def compare_prompts(input_dir, prompt_names, model="Qwen2.5-VL-3B", limit=50, db_path=USAGE_DB, **kwargs):
+    """
+    在同一批样本上对比 promotion.py 中的提示词：每个提示词跑一次批量推理（标注写入临时文件），返回这些运行的报表
+    :param prompt_names: promotion.py 中的变量名列表
+    :param limit: 每个提示词最多推理的文件数（取目录中排序后的前 limit 个）
+    """
+    import tempfile
+    import shutil
+    from .inference import batch_inference
+    from .tools import get_file_list
+
+    sample_dir = tempfile.mkdtemp(prefix="prompt_compare_")
+    try:
+        # 用符号链接组成样本目录，各提示词使用同一批文件
+        for path in get_file_list(input_dir, kwargs.pop("extensions", (".jpg", ".jpeg", ".png")))[:limit]:
+            relative = os.path.relpath(path, input_dir)
+            target = os.path.join(sample_dir, relative)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.symlink(path, target)
+        run_ids = []
+        for name in prompt_names:
+            summary = batch_inference(sample_dir, getattr(promotion, name), os.path.join(sample_dir, f"{name}.jsonl"),
+                                      model=model, usage_db=db_path, **kwargs)
+            run_ids.append(summary["run_id"])
+        return report(db_path, run_ids=run_ids)
+    finally:
+        shutil.rmtree(sample_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推理用量报表")
+    parser.add_argument("--db", default=USAGE_DB, help="用量库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    report_parser = subparsers.add_parser("report", help="吞吐量、提示词对比、每个相机每天的成本")
+    report_parser.add_argument("--days", type=float, help="只统计最近N天")
+    report_parser.add_argument("--run", action="append", help="只统计指定运行（可重复）")
+    report_parser.add_argument("--token-price", type=float, default=0.0, help="每千token价格")
+    report_parser.add_argument("--gpu-hour-price", type=float, default=0.0, help="每GPU小时价格")
+
+    compare_parser = subparsers.add_parser("compare", help="在同一批样本上对比提示词")
+    compare_parser.add_argument("--input-dir", required=True, help="样本目录")
+    compare_parser.add_argument("--prompts", required=True, help="promotion.py 中的变量名，逗号分隔")
+    compare_parser.add_argument("--model", default="Qwen2.5-VL-3B")
+    compare_parser.add_argument("--limit", type=int, default=50, help="每个提示词推理的文件数")
+    compare_parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    if args.command == "report":
+        since = time.time() - args.days * 86400 if args.days else None
+        print_report(report(args.db, since=since, run_ids=args.run,
+                            token_price=args.token_price, gpu_hour_price=args.gpu_hour_price))
+    else:
+        prompt_names = [name.strip() for name in args.prompts.split(",") if name.strip()]
+        unknown = [name for name in prompt_names if not isinstance(getattr(promotion, name, None), str)]
+        if unknown:
+            parser.error(f"promotion.py 中没有提示词: {', '.join(unknown)}")
+        print_report(compare_prompts(args.input_dir, prompt_names, model=args.model, limit=args.limit,
+                                     db_path=args.db, concurrency=args.concurrency))
+
+
+if __name__ == "__main__":
+    # 在 vLLm 目录下运行：python -m data_analysis.usage_store report
+    main()
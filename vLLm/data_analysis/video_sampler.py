@@ -0,0 +1,125 @@
+import os
+import cv2
+import numpy as np
+from collections import namedtuple
+
+from .pre_process import to_data_url, JPEG_QUALITY
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+# 抽帧参数
+SAMPLE_MODE = "scene"       # scene: 场景变化检测; stride: 固定间隔
+MAX_FRAMES = 8              # 每个视频最多抽取的帧数（帧预算）
+STRIDE_SECONDS = 2.0        # stride 模式的抽帧间隔（秒）
+SCENE_THRESHOLD = 0.12      # scene 模式下与上一关键帧的平均灰度差异阈值（0-1）
+MIN_GAP_SECONDS = 0.5       # scene 模式下两个关键帧的最小间隔（秒）
+ANALYZE_FPS = 4.0           # scene 模式每秒分析的帧数，其余帧只 grab 不转换
+THUMB_SIZE = (64, 36)       # 计算帧差异用的灰度缩略图尺寸
+
+# 抽取的关键帧：帧序号、时间（秒）、与上一关键帧的差异、Base64 data URL
+Keyframe = namedtuple("Keyframe", ["index", "timestamp", "score", "image_url"])
+
+
+def is_video(file_path):
+    """按扩展名判断是否为视频文件"""
+    return file_path.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def _thumbnail(frame):
+    """灰度缩略图（float32，0-1），用于计算帧差异"""
+    gray = cv2.cvtColor(cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    return gray.astype(np.float32) / 255.0
+
+
+def _encode_frame(frame, resolution, quality):
+    """缩放到模型推荐分辨率并编码为JPEG data URL（与图像预处理相同）"""
+    frame = cv2.resize(frame, resolution)
+    _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return to_data_url(buffer.tobytes())
+
+
+def iter_keyframes(video_path,
+        mode=SAMPLE_MODE,
+        max_frames=MAX_FRAMES,
+        stride_seconds=STRIDE_SECONDS,
+        scene_threshold=SCENE_THRESHOLD,
+        analyze_fps=ANALYZE_FPS,
+        resolution=(448, 448),
+        quality=JPEG_QUALITY):
+    """
+    流式抽取视频关键帧：逐帧读取，不把整个视频解码到内存中，内存中只保留当前帧和上一关键帧的缩略图
+    - stride: 每隔 stride_seconds 取一帧；视频较长时自动加大间隔，使抽帧均匀覆盖整个视频且不超过帧预算
+    - scene:  第一帧总是取；之后按 analyze_fps 分析帧，与上一关键帧的平均灰度差异超过 scene_threshold 时取，
+              两个关键帧之间至少间隔 视频时长 / max_frames，避免帧预算在视频开头就用完；
+              画面长时间不变（如固定机位的红外相机）时，超过两倍最小间隔也取一帧，保证覆盖整个视频
+    跳过的帧只调用 grab()，不做颜色转换。
+    :param video_path: 视频路径
+    :param mode: "scene" 或 "stride"
+    :param max_frames: 帧预算
+    :returns: Keyframe 生成器
+    :raises FileNotFoundError: 视频无法打开
+    """
+    if mode not in ("scene", "stride"):
+        raise ValueError(f"不支持的抽帧方式: {mode}")
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"无法从路径加载视频: {video_path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        resolution = tuple(resolution)
+
+        if mode == "stride":
+            step = max(1, round(stride_seconds * fps))
+            if frame_count > 0:
+                step = max(step, -(-frame_count // max_frames))
+            min_gap = step
+            analyze_step = step
+            refresh_gap = None
+        else:
+            min_gap = max(1, round(fps * MIN_GAP_SECONDS), frame_count // max_frames)
+            refresh_gap = 2 * min_gap
+            analyze_step = max(1, round(fps / analyze_fps))
+
+        emitted = 0
+        index = -1
+        last_index = None
+        last_thumb = None
+        while emitted < max_frames:
+            if not capture.grab():
+                break
+            index += 1
+            if index % analyze_step != 0:
+                continue
+            if last_index is not None and index - last_index < min_gap:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                break
+
+            score = 1.0
+            if mode == "scene":
+                thumb = _thumbnail(frame)
+                if last_thumb is not None:
+                    score = float(np.abs(thumb - last_thumb).mean())
+                    if score < scene_threshold and index - last_index < refresh_gap:
+                        continue
+                last_thumb = thumb
+
+            yield Keyframe(index, round(index / fps, 3), round(score, 4), _encode_frame(frame, resolution, quality))
+            emitted += 1
+            last_index = index
+    finally:
+        capture.release()
+
+
+def sample_video(video_path, **kwargs):
+    """抽取视频关键帧，返回 Keyframe 列表（参数同 iter_keyframes）"""
+    return list(iter_keyframes(video_path, **kwargs))
+
+
+if __name__ == "__main__":
+    video_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                              "Dataset", "一只大熊猫在吃竹子.mp4")
+    for keyframe in iter_keyframes(video_path):
+        print(keyframe.index, keyframe.timestamp, keyframe.score, len(keyframe.image_url))